@@ -0,0 +1,293 @@
+# app/admission.py
+"""
+Rajadas de leitura sem estourar o threadpool: coalescência de GETs idênticos
+e controle de admissão por rota.
+
+- Coalescência (single-flight): um GET que chega enquanto outro idêntico
+  (tenant, caminho, query e os cabeçalhos de VARY_HEADERS) está em andamento
+  espera por ele e recebe os mesmos bytes; o banco roda uma vez. Só entram as
+  rotas de CRM_COALESCE_ROUTES, que respondem de uma vez (nunca streams como
+  /ui/events) e sem nada próprio da requisição no corpo: nas de
+  CRM_COALESCE_FRAGMENT_ROUTES só o fragmento do HTMX (HX-Request), já que a
+  página inteira leva o client id da aba para o SSE. Toda escrita concluída
+  (método fora de SAFE_METHODS) avança a época do tenant: quem chega depois
+  dela não pega carona numa execução que começou antes, então ninguém deixa
+  de ver a própria escrita.
+- Admissão: cada rota (método + molde) executa no máximo
+  CRM_ADMISSION_DEFAULT_LIMIT requisições ao mesmo tempo; padrões de
+  CRM_ADMISSION_LIMITS ("/deals/summary/*") formam grupos com limite próprio,
+  dividido entre as rotas do grupo. Acima do limite a requisição espera numa
+  fila de até CRM_ADMISSION_MAX_QUEUE por até CRM_ADMISSION_QUEUE_TIMEOUT_MS;
+  fila cheia ou prazo vencido = 503 com Retry-After, sem tocar no threadpool.
+  Uma rota lenta ocupa no máximo o seu limite em threads e as rápidas seguem.
+
+Os dois ficam por dentro do cache de respostas (acerto não passa aqui) e a
+coalescência por fora da admissão: carona não ocupa vaga. O estado é por
+processo, como o do cache; com vários workers a época só vê as escritas do
+próprio worker.
+"""
+import asyncio
+import re
+from dataclasses import dataclass, field
+from fnmatch import translate
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from fastapi.responses import JSONResponse
+
+from .database import current_tenant
+from .metrics import UNMATCHED, _route_template
+from .settings import settings
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+# cabeçalhos que mudam a resposta de uma mesma URL (HTMX devolve só o fragmento)
+VARY_HEADERS = (b"accept", b"accept-encoding", b"hx-request")
+MAX_MEMO = 4096
+
+
+def _patterns(globs: Sequence[str]) -> Optional["re.Pattern"]:
+    return re.compile("|".join(f"(?:{translate(g)})" for g in globs)) if globs else None
+
+
+# ------------------- coalescência ------------------- #
+
+@dataclass
+class CoalesceStats:
+    leaders: int = 0  # execuções de fato
+    followers: int = 0  # requisições que pegaram carona
+    failures: int = 0  # execuções que falharam com caronas esperando (elas rodam por conta própria)
+
+
+class _Flight:
+    __slots__ = ("epoch", "done", "start", "body", "complete")
+
+    def __init__(self, epoch: int):
+        self.epoch = epoch
+        self.done = asyncio.Event()
+        self.start: dict = {}
+        self.body: List[bytes] = []
+        self.complete = False
+
+
+class Coalescer:
+    def __init__(self, routes: Sequence[str], fragment_routes: Sequence[str] = (), enabled: bool = True):
+        self.enabled = enabled
+        self.routes = _patterns(routes)
+        self.fragment_routes = _patterns(fragment_routes)
+        self.stats = CoalesceStats()
+        self._flights: Dict[tuple, _Flight] = {}
+        self._epochs: Dict[Optional[str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def matches(self, path: str, fragment: bool = False) -> bool:
+        if self.routes is None or self.routes.match(path) is None:
+            return False
+        return fragment or self.fragment_routes is None or self.fragment_routes.match(path) is None
+
+    def epoch(self, tenant: Optional[str]) -> int:
+        return self._epochs.get(tenant, 0)
+
+    def wrote(self, tenant: Optional[str]) -> None:
+        self._epochs[tenant] = self._epochs.get(tenant, 0) + 1
+
+
+coalescer = Coalescer(settings.coalesce_routes, settings.coalesce_fragment_routes, settings.coalesce_enabled)
+
+
+def _key(scope, tenant: Optional[str]) -> tuple:
+    headers = dict(scope["headers"])
+    return (tenant, scope["path"], scope.get("query_string", b""), *(headers.get(h) for h in VARY_HEADERS))
+
+
+class CoalescingMiddleware:
+    def __init__(self, app, coalescer: Coalescer = coalescer):
+        self.app = app
+        self.coalescer = coalescer
+
+    async def __call__(self, scope, receive, send):
+        c = self.coalescer
+        if scope["type"] != "http" or not c.enabled:
+            return await self.app(scope, receive, send)
+        if scope["method"] not in SAFE_METHODS:
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                # também com erro: a escrita pode ter sido gravada antes dele
+                c.wrote(current_tenant())
+        fragment = any(name == b"hx-request" for name, _ in scope["headers"])
+        if scope["method"] != "GET" or not c.matches(scope["path"], fragment):
+            return await self.app(scope, receive, send)
+
+        tenant = current_tenant()
+        key = _key(scope, tenant)
+        epoch = c.epoch(tenant)
+        flight = c._flights.get(key)
+        if flight is not None and flight.epoch == epoch:
+            c.stats.followers += 1
+            await flight.done.wait()
+            if flight.complete:
+                await send(flight.start)
+                await send({"type": "http.response.body", "body": b"".join(flight.body)})
+                return
+            return await self.app(scope, receive, send)
+
+        flight = c._flights[key] = _Flight(epoch)
+        c.stats.leaders += 1
+
+        async def capture(message):
+            # guarda antes de enviar: cliente que caiu no meio não tira a resposta das caronas
+            if message["type"] == "http.response.start":
+                flight.start = message
+            elif message["type"] == "http.response.body":
+                flight.body.append(message.get("body", b""))
+                flight.complete = not message.get("more_body", False)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            if c._flights.get(key) is flight:
+                del c._flights[key]
+            if not flight.complete:
+                c.stats.failures += 1
+            flight.done.set()
+
+
+# ------------------- admissão ------------------- #
+
+@dataclass
+class GateStats:
+    admitted: int = 0
+    queued: int = 0  # admitidas depois de esperar na fila
+    rejected: int = 0  # fila cheia: 503 na hora
+    timeouts: int = 0  # prazo da fila vencido: 503
+    wait_seconds: float = 0.0
+
+
+@dataclass
+class Gate:
+    name: str
+    limit: int
+    max_queue: int
+    timeout: float
+    stats: GateStats = field(default_factory=GateStats)
+    active: int = 0
+    waiting: int = 0
+
+    def __post_init__(self):
+        self._semaphore = asyncio.Semaphore(self.limit)
+
+    async def acquire(self) -> bool:
+        if self.waiting == 0 and not self._semaphore.locked():
+            await self._semaphore.acquire()  # vaga livre: não suspende
+        else:
+            if self.waiting >= self.max_queue:
+                self.stats.rejected += 1
+                return False
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                self.stats.timeouts += 1
+                return False
+            finally:
+                self.waiting -= 1
+                self.stats.wait_seconds += loop.time() - start
+            self.stats.queued += 1
+        self.stats.admitted += 1
+        self.active += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+
+class Admission:
+    def __init__(
+        self,
+        default_limit: int,
+        limits: Mapping[str, int],
+        max_queue: int,
+        queue_timeout_ms: float,
+        exempt: Sequence[str] = (),
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.default_limit = default_limit
+        self.max_queue = max_queue
+        self.timeout = queue_timeout_ms / 1000
+        # na ordem da configuração: o primeiro padrão que casa define o grupo
+        self.limits: List[Tuple["re.Pattern", str, int]] = [
+            (re.compile(translate(glob)), glob, limit) for glob, limit in limits.items()
+        ]
+        self.exempt = _patterns(exempt)
+        self.gates: Dict[str, Gate] = {}
+        self._memo: Dict[Tuple[str, str], Optional[Gate]] = {}
+
+    def gate(self, app, scope) -> Optional[Gate]:
+        """Grupo da requisição, ou None se ela não tem limite."""
+        memo_key = (scope["method"], scope["path"])
+        if memo_key in self._memo:
+            return self._memo[memo_key]
+        gate = self._resolve(app, scope)
+        if len(self._memo) >= MAX_MEMO:
+            self._memo.clear()  # caminhos com id se renovam o tempo todo
+        self._memo[memo_key] = gate
+        return gate
+
+    def _resolve(self, app, scope) -> Optional[Gate]:
+        path = scope["path"]
+        if self.exempt is not None and self.exempt.match(path):
+            return None
+        for pattern, name, limit in self.limits:
+            if pattern.match(path):
+                break
+        else:
+            template = _route_template(app, scope)
+            if template == UNMATCHED:
+                return None
+            name, limit = f'{scope["method"]} {template}', self.default_limit
+        if limit <= 0:
+            return None
+        gate = self.gates.get(name)
+        if gate is None:
+            gate = self.gates[name] = Gate(name, limit, self.max_queue, self.timeout)
+        return gate
+
+
+admission = Admission(
+    default_limit=settings.admission_default_limit,
+    limits=settings.admission_limits,
+    max_queue=settings.admission_max_queue,
+    queue_timeout_ms=settings.admission_queue_timeout_ms,
+    exempt=settings.admission_exempt,
+    enabled=settings.admission_enabled,
+)
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, router_app=None, admission: Admission = admission):
+        self.app = app
+        # o FastAPI em si, para achar o molde da rota antes do roteamento (como em app/metrics.py)
+        self.router_app = router_app
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.admission.enabled:
+            return await self.app(scope, receive, send)
+        gate = self.admission.gate(self.router_app, scope)
+        if gate is None:
+            return await self.app(scope, receive, send)
+        if not await gate.acquire():
+            response = JSONResponse(
+                {"detail": "Servidor ocupado; tente mais tarde"}, status_code=503, headers={"Retry-After": "1"}
+            )
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
@@ -0,0 +1,282 @@
+# app/bulk.py
+"""
+Criação em lote para /companies/bulk, /contacts/bulk e /deals/bulk.
+
+O corpo pode ser um array JSON (application/json), NDJSON (application/x-ndjson)
+ou CSV com cabeçalho (text/csv). NDJSON e CSV são lidos em streaming: cada lote
+de linhas é validado com o modelo *Create de sempre e inserido com um único
+INSERT executemany. Linhas inválidas entram no relatório de erros e não
+interrompem as demais. Cada lote é uma transação curta, aberta só depois que
+as linhas dele já chegaram: um cliente lento não segura a trava de escrita do
+SQLite enquanto o corpo ainda vem pela rede. Se o envio cair no meio, os
+lotes anteriores ficam gravados (`inserted` conta os que entraram).
+"""
+import codecs
+import csv
+import json
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+
+from .cache import invalidate_all
+from .database import current_binds
+from .models import BulkError, BulkResult, Company
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+CSV_TYPES = ("text/csv", "application/csv")
+
+Record = Tuple[int, object]  # (número da linha, dados brutos ou exceção de parse)
+
+
+def bulk_openapi(*schemas: str) -> dict:
+    """
+    Documenta no OpenAPI os formatos aceitos, já que o corpo é lido à mão.
+    Mais de um schema (rota que atende várias entidades) vira um oneOf.
+    """
+    refs = [{"$ref": f"#/components/schemas/{schema}"} for schema in schemas]
+    ref = refs[0] if len(refs) == 1 else {"oneOf": refs}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": ref}},
+                "application/x-ndjson": {"schema": ref},
+                "text/csv": {"schema": {"type": "string"}},
+            },
+        }
+    }
+
+
+async def _lines(request: Request) -> AsyncIterator[str]:
+    # decoder incremental: um caractere multibyte pode vir partido entre chunks
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buf = ""
+    async for chunk in request.stream():
+        buf += decoder.decode(chunk)
+        *lines, buf = buf.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buf += decoder.decode(b"", final=True)
+    if buf.strip():
+        yield buf.rstrip("\r")
+
+
+class _NdjsonParser:
+    """Uma linha por vez -> registros; o mesmo para o corpo em streaming e para o arquivo de um job."""
+
+    def __init__(self):
+        self.n = 0
+
+    def feed(self, line: str) -> Iterator[Record]:
+        if not line.strip():
+            return
+        self.n += 1
+        try:
+            yield self.n, json.loads(line)
+        except ValueError as exc:
+            yield self.n, exc
+
+
+class _CsvParser:
+    def __init__(self):
+        self.header: Optional[List[str]] = None
+        self.pending = ""
+        self.n = 0
+
+    def feed(self, line: str) -> Iterator[Record]:
+        # campo entre aspas pode conter quebra de linha: junta até as aspas fecharem
+        self.pending = f"{self.pending}\n{line}" if self.pending else line
+        if self.pending.count('"') % 2:
+            return
+        record, self.pending = self.pending, ""
+        if not record.strip():
+            return
+        values = next(csv.reader([record]))
+        if self.header is None:
+            self.header = [h.strip() for h in values]
+            return
+        self.n += 1
+        if len(values) != len(self.header):
+            yield self.n, ValueError(f"esperadas {len(self.header)} colunas, recebidas {len(values)}")
+            return
+        # célula vazia vira None, como um campo ausente no JSON
+        yield self.n, {k: (v if v != "" else None) for k, v in zip(self.header, values)}
+
+
+PARSERS = {"ndjson": _NdjsonParser, "csv": _CsvParser}
+
+
+def _json_array(body: bytes) -> Iterator[Record]:
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise HTTPException(400, "JSON inválido")
+    if not isinstance(data, list):
+        raise HTTPException(422, "Envie um array JSON de registros")
+    yield from enumerate(data, start=1)
+
+
+async def _streamed_records(request: Request, fmt: str) -> AsyncIterator[Record]:
+    parser = PARSERS[fmt]()
+    async for line in _lines(request):
+        for record in parser.feed(line):
+            yield record
+
+
+async def _json_records(request: Request) -> AsyncIterator[Record]:
+    for record in _json_array(await request.body()):
+        yield record
+
+
+def body_format(content_type: Optional[str]) -> str:
+    """Content-Type -> "json", "ndjson" ou "csv" (415 para o resto)."""
+    content_type = (content_type or "application/json").split(";")[0].strip().lower()
+    if content_type in NDJSON_TYPES:
+        return "ndjson"
+    if content_type in CSV_TYPES:
+        return "csv"
+    if content_type == "application/json":
+        return "json"
+    raise HTTPException(415, "Use application/json, application/x-ndjson ou text/csv")
+
+
+def iter_records(request: Request) -> AsyncIterator[Record]:
+    fmt = body_format(request.headers.get("content-type"))
+    return _json_records(request) if fmt == "json" else _streamed_records(request, fmt)
+
+
+def file_records(path: Path, fmt: str) -> Iterator[Record]:
+    """Registros de um arquivo já gravado (o upload de um job de importação)."""
+    if fmt == "json":
+        yield from _json_array(path.read_bytes())
+        return
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        parser = PARSERS[fmt]()
+        for line in f:
+            yield from parser.feed(line.rstrip("\n").rstrip("\r"))
+
+
+def _error_detail(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(p) for p in err['loc']) or 'registro'}: {err['msg']}" for err in exc.errors()
+        )
+    if isinstance(exc, HTTPException):
+        return str(exc.detail)
+    return str(exc)
+
+
+def _insert_batch(
+    model,
+    create_model,
+    batch: List[Record],
+    check: Optional[Callable[[object], None]],
+    result: BulkResult,
+) -> None:
+    valid: List[Tuple[int, Dict]] = []
+    for n, raw in batch:
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            data = create_model.model_validate(raw)
+            if check:
+                check(data)
+            valid.append((n, data.model_dump()))
+        except (ValidationError, HTTPException, ValueError, TypeError) as exc:
+            _report(result, n, _error_detail(exc))
+
+    if not valid:
+        return
+    with Session(current_binds().engine) as session:
+        # contatos e negócios: a empresa precisa existir (o SQLite não força a FK)
+        if "company_id" in model.__table__.c:
+            wanted = {row["company_id"] for _, row in valid}
+            found = set(session.exec(select(Company.id).where(Company.id.in_(wanted))).all())
+            missing = [(n, row) for n, row in valid if row["company_id"] not in found]
+            for n, row in missing:
+                _report(result, n, f"company_id {row['company_id']} não encontrada")
+            if missing:
+                valid = [(n, row) for n, row in valid if row["company_id"] in found]
+        if valid:
+            session.execute(insert(model.__table__), [row for _, row in valid])
+            session.commit()
+            result.inserted += len(valid)
+
+
+def insert_records(
+    records: Iterable[Record],
+    model,
+    create_model,
+    check: Optional[Callable[[object], None]] = None,
+    batch_size: int = BATCH_SIZE,
+    on_batch: Optional[Callable[[int], None]] = None,
+) -> BulkResult:
+    """
+    bulk_insert fora de uma requisição (jobs): mesmos lotes, um commit por
+    lote; `on_batch(n)` recebe o tamanho de cada lote processado e pode
+    interromper levantando exceção (os lotes anteriores ficam).
+    """
+    result = BulkResult()
+    batch: List[Record] = []
+    try:
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                _insert_batch(model, create_model, batch, check, result)
+                if on_batch:
+                    on_batch(len(batch))
+                batch = []
+        if batch:
+            _insert_batch(model, create_model, batch, check, result)
+            if on_batch:
+                on_batch(len(batch))
+    finally:
+        if result.inserted:
+            invalidate_all(model.__tablename__)
+    result.errors.sort(key=lambda err: err.row)
+    return result
+
+
+def _report(result: BulkResult, row: int, detail: str) -> None:
+    result.error_count += 1
+    if len(result.errors) < MAX_REPORTED_ERRORS:
+        result.errors.append(BulkError(row=row, detail=detail))
+
+
+async def bulk_insert(
+    request: Request,
+    model,
+    create_model,
+    check: Optional[Callable[[object], None]] = None,
+    batch_size: int = BATCH_SIZE,
+) -> BulkResult:
+    """
+    Lê os registros do corpo, valida com `create_model` (+ `check`, que pode
+    levantar HTTPException) e insere em lotes, um commit por lote. O banco
+    roda fora do event loop.
+    """
+    result = BulkResult()
+    records = iter_records(request)
+    batch: List[Record] = []
+    try:
+        async for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                await run_in_threadpool(_insert_batch, model, create_model, batch, check, result)
+                batch = []
+        if batch:
+            await run_in_threadpool(_insert_batch, model, create_model, batch, check, result)
+    finally:
+        # também com erro no meio do corpo: os lotes anteriores já foram gravados
+        if result.inserted:
+            invalidate_all(model.__tablename__)
+    result.errors.sort(key=lambda err: err.row)
+    return result
@@ -0,0 +1,168 @@
+# app/bulk_delete.py
+"""
+Exclusão em massa para /companies/bulk-delete, /contacts/bulk-delete e
+/deals/bulk-delete, e a cascata empresa -> contatos e negócios (que o DELETE
+de uma empresa só também usa: o SQLite roda sem PRAGMA foreign_keys).
+
+Os alvos são os filtros da listagem (query string) e/ou `ids` no corpo. Os
+ids são lidos do pool de leitura em lotes de CRM_BULK_DELETE_CHUNK, por id,
+e cada lote é uma transação curta com poucos DELETE ... WHERE: negócios e
+contatos das empresas do lote, depois as empresas. O filtro é conferido de
+novo dentro da transação (linha que deixou de casar fica) e a trava de
+escrita é solta entre um lote e outro, então as demais escritas seguem.
+Empresa com mais dependentes do que um lote ganha transações extras só de
+dependentes antes da que a apaga: nenhuma transação passa de um lote por
+tabela e nunca sobra contato ou negócio órfão.
+
+FTS, agregados por etapa e tombstones do feed de mudanças vêm dos triggers,
+como em qualquer DELETE. Com archive=true as linhas apagadas saem pelo
+RETURNING e são gravadas em NDJSON ({"entity": ..., "row": {...}}) em
+CRM_BULK_DELETE_ARCHIVE_DIR antes do commit de cada lote.
+"""
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Iterator, List, Optional, Sequence
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from .cache import invalidate_all
+from .database import current_binds, current_tenant
+from .live import notify_company_reload
+from .models import BulkDelete, BulkDeleteResult, Company, Contact, Deal
+from .settings import settings
+
+# quem aponta para company.id, na ordem em que é apagado
+DEPENDENTS = (Deal, Contact)
+ENTITIES = {Company: "company", Contact: "contact", Deal: "deal"}
+RESULT_FIELDS = {Company: "companies", Contact: "contacts", Deal: "deals"}
+
+
+def company_cascade(company_ids) -> List:
+    """DELETEs dos contatos e negócios de `company_ids`, para rodar antes do da empresa, na mesma transação."""
+    return [
+        delete(child).where(child.company_id.in_(company_ids)).execution_options(synchronize_session=False)
+        for child in DEPENDENTS
+    ]
+
+
+def invalidate_dependents(counts: Sequence[int]) -> None:
+    """`counts` na ordem de DEPENDENTS, como os rowcount de company_cascade."""
+    for child, n in zip(DEPENDENTS, counts):
+        if n:
+            invalidate_all(ENTITIES[child])
+
+
+def require_targets(data: BulkDelete, confirmed: bool, label: str, *filters) -> None:
+    if data.ids is None and not confirmed and all(f is None for f in filters):
+        raise HTTPException(422, f"Sem filtros nem ids isso apaga {label}; confirme com all=true")
+
+
+def archive_dir() -> Path:
+    # com tenants, uma pasta por tenant, como os resultados dos jobs
+    tenant = current_tenant()
+    path = Path(settings.bulk_delete_archive_dir)
+    path = path / tenant if tenant else path
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _id_chunks(model, stmt, ids: Optional[Sequence[int]], size: int) -> Iterator[List[int]]:
+    if ids is not None:
+        unique = sorted(set(ids))
+        for start in range(0, len(unique), size):
+            yield unique[start:start + size]
+        return
+    # paginação por id: o que já foi apagado some da consulta seguinte
+    page = stmt.with_only_columns(model.id).order_by(model.id).limit(size)
+    last = 0
+    while True:
+        with current_binds().read_engine.connect() as conn:
+            chunk = conn.execute(page.where(model.id > last)).scalars().all()
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+
+
+class _Deleter:
+    def __init__(self, archive: Optional[IO[bytes]]):
+        self.archive = archive
+        self.result = BulkDeleteResult()
+
+    def run(self, session: Session, model, where) -> int:
+        stmt = delete(model).where(where).execution_options(synchronize_session=False)
+        if self.archive is None:
+            n = session.execute(stmt).rowcount
+        else:
+            rows = session.execute(stmt.returning(*model.__table__.c)).mappings().all()
+            entity = ENTITIES[model]
+            self.archive.write(b"".join(orjson.dumps({"entity": entity, "row": dict(r)}) + b"\n" for r in rows))
+            n = len(rows)
+        field = RESULT_FIELDS[model]
+        setattr(self.result, field, getattr(self.result, field) + n)
+        return n
+
+    def commit(self, session: Session) -> None:
+        if self.archive is not None:
+            self.archive.flush()  # o arquivo nunca fica atrás do banco
+        session.commit()
+        self.result.transactions += 1
+
+
+def _delete_chunk(d: _Deleter, model, stmt, chunk: List[int], size: int) -> None:
+    engine = current_binds().engine
+    # o filtro de novo, dentro da transação
+    targets = stmt.with_only_columns(model.id).where(model.id.in_(chunk))
+    if model is not Company:
+        with Session(engine) as session:
+            d.run(session, model, model.id.in_(targets))
+            d.commit(session)
+        return
+    while True:
+        with Session(engine) as session:
+            full = False
+            for child in DEPENDENTS:
+                batch = select(child.id).where(child.company_id.in_(targets)).limit(size)
+                full = d.run(session, child, child.id.in_(batch)) == size or full
+            if not full:
+                d.run(session, Company, Company.id.in_(targets))
+            d.commit(session)
+        if not full:
+            return
+
+
+def bulk_delete(model, stmt, data: BulkDelete) -> BulkDeleteResult:
+    """
+    Apaga as linhas de `stmt` (o select filtrado de build_*_query) em lotes;
+    com `data.ids`, só as desses ids que também casam com o filtro.
+    """
+    size = settings.bulk_delete_chunk
+    archive = None
+    if data.archive:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        path = archive_dir() / f"{ENTITIES[model]}-{stamp}-{uuid.uuid4().hex[:8]}.ndjson"
+        archive = open(path, "wb")
+    d = _Deleter(archive)
+    try:
+        for chunk in _id_chunks(model, stmt, data.ids, size):
+            _delete_chunk(d, model, stmt, chunk, size)
+    finally:
+        if archive is not None:
+            archive.close()
+        # também com erro: os lotes anteriores já foram gravados
+        _invalidate(d.result)
+    if archive is not None:
+        d.result.archive = path.name
+    return d.result
+
+
+def _invalidate(result: BulkDeleteResult) -> None:
+    for model, field in RESULT_FIELDS.items():
+        if getattr(result, field):
+            invalidate_all(ENTITIES[model])
+    if result.companies:
+        notify_company_reload()
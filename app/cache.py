@@ -0,0 +1,299 @@
+# app/cache.py
+"""
+Cache de respostas GET em memória (LRU + TTL) com ETag/Last-Modified.
+
+O middleware guarda o corpo já serializado das leituras cacheáveis (detalhe
+por id, primeira página das listagens, resumos por etapa). Um acerto devolve
+os bytes guardados sem chegar ao handler; `If-None-Match`/`If-Modified-Since`
+batendo devolve 304 sem corpo.
+
+Cada entrada leva tags ("deal", "deal:list", "deal:42", "deal:summary") e os
+handlers de escrita chamam `invalidate_*` depois do commit, derrubando só o
+que a escrita afeta. O cache é por processo: com vários workers, o TTL limita
+por quanto tempo outro worker pode servir uma leitura anterior à escrita.
+Com tenants (app/tenancy.py), chaves e tags levam o nome do tenant.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from .database import current_tenant
+from .settings import settings
+
+ENTITIES = {"companies": "company", "contacts": "contact", "deals": "deal"}
+
+_DETAIL = re.compile(r"^/(companies|contacts|deals)/(\d+)$")
+_LIST = re.compile(r"^/(companies|contacts|deals)/$")
+_SUMMARY = re.compile(r"^/deals/summary/[\w-]+$")
+_OVERVIEW = re.compile(r"^/companies/(\d+)/overview$")
+
+# cabeçalhos que não fazem sentido repetir a partir do cache
+_SKIP_HEADERS = {b"content-length", b"date", b"server", b"etag", b"last-modified", b"cache-control"}
+
+
+def cache_tags(path: str, params: List[Tuple[str, str]]) -> Optional[Tuple[str, ...]]:
+    """Tags de uma leitura cacheável, ou None se a rota não entra no cache."""
+    query = dict(params)
+    # ?expand=company embute dados da empresa: qualquer escrita em empresa derruba
+    embedded = ("company:embedded",) if "company" in query.get("expand", "") else ()
+    m = _DETAIL.match(path)
+    if m:
+        entity = ENTITIES[m.group(1)]
+        return (entity, f"{entity}:{m.group(2)}") + embedded
+    m = _LIST.match(path)
+    if m:
+        # só a primeira página: páginas profundas quase nunca se repetem
+        if query.get("cursor") or query.get("offset", "0") not in ("", "0"):
+            return None
+        entity = ENTITIES[m.group(1)]
+        return (entity, f"{entity}:list") + embedded
+    if _SUMMARY.match(path):
+        return "deal", "deal:summary"
+    m = _OVERVIEW.match(path)
+    if m:
+        # junta empresa, contatos e negócios: escrita em qualquer um (unitária ou em lote) derruba
+        return "company", f"company:{m.group(1)}", "contact", "contact:list", "deal", "deal:list"
+    return None
+
+
+def tenant_tags(tags: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Tags do tenant da requisição: escrita num tenant não derruba o cache dos outros."""
+    tenant = current_tenant()
+    return tags if tenant is None else tuple(f"{tenant}/{tag}" for tag in tags)
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    headers: List[Tuple[bytes, bytes]]
+    etag: str
+    last_modified: float
+    expires: float
+    tags: Tuple[str, ...]
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    not_modified: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+
+@dataclass
+class ResponseCache:
+    max_entries: int = 1024
+    max_bytes: int = 64 * 1024 * 1024
+    ttl: float = 30.0
+    enabled: bool = True
+    stats: CacheStats = field(default_factory=CacheStats)
+
+    def __post_init__(self):
+        self._entries: "OrderedDict[tuple, CacheEntry]" = OrderedDict()
+        self._by_tag: Dict[str, Set[tuple]] = {}
+        self._tag_gen: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: tuple) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry
+
+    def generations(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._tag_gen.get(tag, 0) for tag in tags)
+
+    def put(self, key: tuple, entry: CacheEntry, generations: Tuple[int, ...]) -> bool:
+        """
+        Guarda a entrada se nenhuma das tags foi invalidada desde `generations`
+        (uma escrita concorrente com a leitura deixaria a resposta velha no cache).
+        """
+        if entry.size > self.max_bytes:
+            return False
+        with self._lock:
+            if tuple(self._tag_gen.get(tag, 0) for tag in entry.tags) != generations:
+                return False
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.stats.evictions += 1
+            return True
+
+    def invalidate(self, *tags: str) -> None:
+        with self._lock:
+            for tag in tags:
+                self._tag_gen[tag] = self._tag_gen.get(tag, 0) + 1
+                for key in list(self._by_tag.get(tag, ())):
+                    self._drop(key)
+                    self.stats.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for tag in list(self._by_tag):
+                self._tag_gen[tag] = self._tag_gen.get(tag, 0) + 1
+            self._entries.clear()
+            self._by_tag.clear()
+            self._bytes = 0
+
+    def _drop(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+
+response_cache = ResponseCache(
+    max_entries=settings.cache_max_entries,
+    max_bytes=settings.cache_max_bytes,
+    ttl=settings.cache_ttl_seconds,
+    enabled=settings.cache_enabled,
+)
+
+
+# ------------------- invalidação (chamada pelos handlers de escrita) ------------------- #
+
+def invalidate_company(*ids: int) -> None:
+    response_cache.invalidate(*tenant_tags(("company:list", "company:embedded", *(f"company:{i}" for i in ids))))
+
+
+def invalidate_contact(*ids: int) -> None:
+    response_cache.invalidate(*tenant_tags(("contact:list", *(f"contact:{i}" for i in ids))))
+
+
+def invalidate_deal(*ids: int) -> None:
+    response_cache.invalidate(*tenant_tags(("deal:list", "deal:summary", *(f"deal:{i}" for i in ids))))
+
+
+def invalidate_all(entity: str) -> None:
+    """Para escritas em massa, que tocam ids demais para listar."""
+    response_cache.invalidate(*tenant_tags((entity,)))
+
+
+# ------------------- middleware ------------------- #
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _not_modified(scope, entry: CacheEntry) -> bool:
+    if_none_match = _header(scope, b"if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or entry.etag in tags or f"W/{entry.etag}" in tags
+    if_modified_since = _header(scope, b"if-modified-since")
+    if if_modified_since:
+        try:
+            return int(entry.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _validators(entry: CacheEntry, hit: bool) -> List[Tuple[bytes, bytes]]:
+    return [
+        (b"etag", entry.etag.encode()),
+        (b"last-modified", formatdate(entry.last_modified, usegmt=True).encode()),
+        # cliente/proxy podem guardar, mas revalidam sempre (304 é barato)
+        (b"cache-control", b"no-cache"),
+        (b"x-cache", b"HIT" if hit else b"MISS"),
+    ]
+
+
+class ResponseCacheMiddleware:
+    def __init__(self, app, cache: ResponseCache = response_cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not self.cache.enabled:
+            return await self.app(scope, receive, send)
+        params = sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+        tags = cache_tags(scope["path"], params)
+        if tags is None:
+            return await self.app(scope, receive, send)
+
+        tags = tenant_tags(tags)
+        key = (current_tenant(), scope["path"], urlencode(params))
+        entry = self.cache.get(key)
+        if entry is not None:
+            return await self._send_entry(scope, send, entry, hit=True)
+
+        generations = self.cache.generations(tags)
+        start: dict = {}
+        chunks: List[bytes] = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+
+        body = b"".join(chunks)
+        if start.get("status") != 200:
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        now = time.time()
+        entry = CacheEntry(
+            body=body,
+            headers=[(k, v) for k, v in start.get("headers", []) if k.lower() not in _SKIP_HEADERS],
+            etag='"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest(),
+            last_modified=now,
+            expires=time.monotonic() + self.cache.ttl,
+            tags=tags,
+        )
+        self.cache.put(key, entry, generations)
+        await self._send_entry(scope, send, entry, hit=False)
+
+    async def _send_entry(self, scope, send, entry: CacheEntry, hit: bool):
+        if _not_modified(scope, entry):
+            self.cache.stats.not_modified += 1
+            await send({"type": "http.response.start", "status": 304, "headers": _validators(entry, hit)})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers = entry.headers + [(b"content-length", str(len(entry.body)).encode())] + _validators(entry, hit)
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": entry.body})
@@ -0,0 +1,236 @@
+# app/changes.py
+"""
+Feed de mudanças incremental (GET /changes?since=<versão>).
+
+Toda linha de company, contact e deal carrega row_version e updated_at. Um
+contador global (change_seq) sobe a cada escrita e triggers carimbam a linha
+inserida ou alterada com o novo valor, na mesma transação; exclusões deixam
+uma tombstone em change_tombstone com a versão da exclusão. Como é tudo
+trigger, qualquer caminho de escrita (ORM, lote, PATCH, UPDATE em massa, UI)
+entra no feed. As versões são únicas entre as três tabelas.
+
+Cada tabela tem índice em row_version: `row_version > since` lê só o que
+mudou, qualquer que seja o tamanho da tabela.
+
+Caches em memória (app/deal_snapshot.py, app/dedup.py) se põem em dia com
+`read_delta`: as linhas alteradas e os ids excluídos desde a versão que têm.
+
+Tombstones antigas podem ser descartadas; quem pedir um `since` anterior à
+limpeza recebe 410 e refaz a carga completa (since=0):
+    python -m app.changes prune --keep-days 30
+"""
+import argparse
+import heapq
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from operator import itemgetter
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import orjson
+from sqlalchemy import select
+
+from .models import ChangeTombstone, Company, CompanyRead, Contact, ContactRead, Deal, DealRead
+
+CHANGE_TABLES = {
+    "company": (Company, CompanyRead),
+    "contact": (Contact, ContactRead),
+    "deal": (Deal, DealRead),
+}
+# colunas que não contam como mudança (os próprios carimbos)
+VERSION_COLUMNS = ("id", "row_version", "updated_at")
+
+YIELD_PER = 2000
+CHUNK_LINES = 500
+
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+_BUMP = "UPDATE change_seq SET version = version + 1 WHERE id = 1;"
+_CURRENT = "(SELECT version FROM change_seq WHERE id = 1)"
+
+# opção de execução: a transação da conexão é uma transação de leitura de verdade
+SNAPSHOT_OPTION = "crm_snapshot"
+
+
+def data_columns(model) -> List[str]:
+    return [c.name for c in model.__table__.columns if c.name not in VERSION_COLUMNS]
+
+
+def _triggers(base: str, cols: Sequence[str]) -> List[str]:
+    stamp = f"UPDATE {base} SET row_version = {_CURRENT}, updated_at = {NOW} WHERE id = new.id;"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {base}_version_ai AFTER INSERT ON {base} BEGIN {_BUMP} {stamp} END",
+        # "OF colunas de dados": o próprio carimbo não redispara o trigger
+        f"CREATE TRIGGER IF NOT EXISTS {base}_version_au AFTER UPDATE OF {', '.join(cols)} ON {base} "
+        f"BEGIN {_BUMP} {stamp} END",
+        f"CREATE TRIGGER IF NOT EXISTS {base}_version_ad AFTER DELETE ON {base} BEGIN {_BUMP} "
+        f"INSERT INTO change_tombstone(entity, entity_id, row_version, deleted_at) "
+        f"VALUES ('{base}', old.id, {_CURRENT}, {NOW}); END",
+    ]
+
+
+def stamp_unversioned(conn, tables: Sequence[str]) -> None:
+    """
+    Dá versão às linhas com row_version = 0: colunas recém-migradas ou cargas
+    feitas com os triggers suspensos (app/seed_data.py). Cada linha recebe
+    base + id, então as versões continuam únicas e paginam pelo feed.
+    """
+    for base in tables:
+        if not conn.exec_driver_sql(f"SELECT 1 FROM {base} WHERE row_version = 0 LIMIT 1").first():
+            continue
+        start = conn.exec_driver_sql("SELECT version FROM change_seq WHERE id = 1").scalar()
+        conn.exec_driver_sql(
+            f"UPDATE {base} SET row_version = ? + id, updated_at = {NOW} WHERE row_version = 0", (start,)
+        )
+        top = conn.exec_driver_sql(f"SELECT MAX(row_version) FROM {base}").scalar()
+        conn.exec_driver_sql("UPDATE change_seq SET version = MAX(version, ?) WHERE id = 1", (top,))
+
+
+def install_changes(engine) -> None:
+    """Cria o contador, os triggers de versão e carimba linhas ainda sem versão."""
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT OR IGNORE INTO change_seq(id, version, pruned_through) VALUES (1, 0, 0)")
+        for base, (model, _) in CHANGE_TABLES.items():
+            for ddl in _triggers(base, data_columns(model)):
+                conn.exec_driver_sql(ddl)
+        stamp_unversioned(conn, list(CHANGE_TABLES))
+
+
+def current_version(conn) -> Tuple[int, int]:
+    """(versão atual, pruned_through)."""
+    return tuple(conn.exec_driver_sql("SELECT version, pruned_through FROM change_seq WHERE id = 1").one())
+
+
+def begin_snapshot(conn) -> None:
+    """
+    Listener de "begin" dos engines (app/database.py). O pysqlite só abre a
+    transação antes da primeira escrita; com SNAPSHOT_OPTION o BEGIN sai já no
+    begin() e todas as leituras até o commit veem o mesmo instante do banco.
+    """
+    if conn.get_execution_options().get(SNAPSHOT_OPTION):
+        conn.exec_driver_sql("BEGIN")
+
+
+class Delta(NamedTuple):
+    since: int
+    version: int  # o delta leva de `since` a `version`
+    rows: list  # linhas inseridas ou alteradas, com as colunas pedidas
+    gone: List[int]  # ids excluídos
+
+
+def read_delta(conn, entity: str, since: int, columns: Sequence, cap: int) -> Optional[Delta]:
+    """
+    Escritas em `entity` desde `since`, para um cache em memória aplicar:
+    exclusões antes das linhas (um id reaproveitado volta pelas linhas). None
+    quando é melhor recarregar: tombstones já descartadas ou mais de `cap` linhas.
+    `conn` sem transação aberta.
+    """
+    model = CHANGE_TABLES[entity][0]
+    # uma transação de leitura: versão, linhas e tombstones do mesmo instante
+    with conn.execution_options(**{SNAPSHOT_OPTION: True}).begin():
+        version, pruned_through = current_version(conn)
+        if version == since:
+            return Delta(since, version, [], [])
+        if since < pruned_through:
+            return None
+        window = (model.row_version > since, model.row_version <= version)
+        rows = conn.execute(select(*columns).where(*window).limit(cap + 1)).all()
+        if len(rows) > cap:
+            return None
+        gone = conn.execute(
+            select(ChangeTombstone.entity_id).where(
+                ChangeTombstone.entity == entity,
+                ChangeTombstone.row_version > since,
+                ChangeTombstone.row_version <= version,
+            )
+        ).scalars().all()
+    return Delta(since, version, rows, gone)
+
+
+def parse_entities(entities: Optional[str]) -> List[str]:
+    names = [part.strip() for part in (entities or "").split(",") if part.strip()]
+    return [n for n in CHANGE_TABLES if n in names] if names else list(CHANGE_TABLES)
+
+
+def change_statements(since: int, until: int, limit: Optional[int], entities: Sequence[str]):
+    """(nome, campos, select) por tabela e um das tombstones, todos em ordem de versão."""
+    out = []
+    for base in entities:
+        model, read_model = CHANGE_TABLES[base]
+        fields = list(read_model.model_fields)
+        stmt = (
+            select(model.row_version, model.updated_at, *[getattr(model, f) for f in fields])
+            .where(model.row_version > since, model.row_version <= until)
+            .order_by(model.row_version)
+            .limit(limit)
+        )
+        out.append((base, fields, stmt))
+    tombstones = (
+        select(ChangeTombstone.row_version, ChangeTombstone.deleted_at, ChangeTombstone.entity, ChangeTombstone.entity_id)
+        .where(ChangeTombstone.row_version > since, ChangeTombstone.row_version <= until)
+        .where(ChangeTombstone.entity.in_(list(entities)))
+        .order_by(ChangeTombstone.row_version)
+        .limit(limit)
+    )
+    out.append((None, None, tombstones))
+    return out
+
+
+def _changes(conn, base: Optional[str], fields: Optional[List[str]], stmt) -> Iterator[Tuple[int, bytes]]:
+    result = conn.execution_options(stream_results=True, yield_per=YIELD_PER).execute(stmt)
+    for rows in result.partitions():
+        for row in rows:
+            if base is None:
+                change = {"entity": row[2], "op": "delete", "id": row[3], "version": row[0], "at": row[1]}
+            else:
+                data = dict(zip(fields, row[2:]))
+                change = {"entity": base, "op": "upsert", "id": data["id"], "version": row[0], "at": row[1], "data": data}
+            yield row[0], orjson.dumps(change)
+
+
+def stream_changes(bind, since: int, until: int, limit: Optional[int], entities: Sequence[str]) -> Iterator[bytes]:
+    """
+    NDJSON das mudanças em (since, until], em ordem de versão. As fontes são
+    lidas em paralelo e intercaladas (heap), então a memória não depende do volume.
+    """
+    with bind.connect() as conn:
+        sources = [_changes(conn, *spec) for spec in change_statements(since, until, limit, entities)]
+        lines: List[bytes] = []
+        for _, line in islice(heapq.merge(*sources, key=itemgetter(0)), limit):
+            lines.append(line)
+            if len(lines) >= CHUNK_LINES:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+
+
+def prune_tombstones(engine, keep_days: float) -> int:
+    """Apaga tombstones mais velhas que `keep_days` e avança pruned_through."""
+    # deleted_at é gravado em UTC pelo strftime('now') do SQLite
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=keep_days)).strftime("%Y-%m-%d %H:%M:%S")
+    with engine.begin() as conn:
+        top = conn.exec_driver_sql(
+            "SELECT MAX(row_version) FROM change_tombstone WHERE deleted_at < ?", (cutoff,)
+        ).scalar()
+        if top is None:
+            return 0
+        deleted = conn.exec_driver_sql("DELETE FROM change_tombstone WHERE row_version <= ?", (top,)).rowcount
+        conn.exec_driver_sql("UPDATE change_seq SET pruned_through = MAX(pruned_through, ?) WHERE id = 1", (top,))
+    return deleted
+
+
+def main():
+    from .database import create_db_and_tables, engine
+
+    parser = argparse.ArgumentParser(description="Manutenção do feed de mudanças.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    prune = sub.add_parser("prune", help="descarta tombstones antigas")
+    prune.add_argument("--keep-days", type=float, default=30)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    deleted = prune_tombstones(engine, args.keep_days)
+    print(f"{deleted} tombstone(s) descartada(s).")
+
+
+if __name__ == "__main__":
+    main()
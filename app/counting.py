@@ -0,0 +1,164 @@
+# app/counting.py
+"""
+Totais da paginação da UI sem um COUNT a cada página ou tecla na busca.
+
+- Última página: a sonda de `size + 1` linhas (app/pagination.py) já mostra
+  que não há próxima, e o total sai de graça: offset + linhas da página.
+- Sem busca: COUNT(*) exato da tabela.
+- Com busca: conta no máximo `ui_count_exact_limit` ids (app/search.match_ids).
+- Filtros de igualdade (`filters`, ex. etapa dos negócios) entram no WHERE e
+  na chave do cache.
+  Abaixo do teto o total é exato; no teto a busca é ampla e o total é estimado
+  pela densidade dos ids, que chegam em ordem: teto * MAX(id) / último id visto.
+
+Os totais ficam num LRU por texto de busca. Os exatos caem quando uma escrita
+invalida as tags da tabela no cache de respostas (os mesmos contadores de
+geração); as estimativas só expiram pelo TTL. Com tenants, a chave e as tags
+levam o tenant.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from .cache import response_cache, tenant_tags
+from .database import current_tenant
+from .search import match_ids
+from .settings import settings
+
+
+@dataclass(frozen=True)
+class Total:
+    value: int
+    exact: bool = True
+
+
+@dataclass
+class CountStats:
+    hits: int = 0
+    misses: int = 0
+    estimates: int = 0
+    skipped: int = 0  # última página: nem consultou
+
+
+class CountCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CountStats()
+        self._entries: "OrderedDict[tuple, Tuple[Tuple[int, ...], float, Total]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, generations: Tuple[int, ...]) -> Optional[Total]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                gens, expires, total = item
+                if expires >= time.monotonic() and (not total.exact or gens == generations):
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    return total
+                del self._entries[key]
+            self.stats.misses += 1
+            return None
+
+    def put(self, key: tuple, generations: Tuple[int, ...], total: Total) -> None:
+        with self._lock:
+            self._entries[key] = (generations, time.monotonic() + self.ttl, total)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+count_cache = CountCache(settings.ui_count_cache_entries, settings.ui_count_ttl_seconds)
+
+
+def _tags(model) -> Tuple[str, str]:
+    base = model.__tablename__
+    return tenant_tags((base, f"{base}:list"))
+
+
+Filters = Tuple[Tuple[str, Any], ...]
+
+
+def count_statement(model, q: Optional[str], cap: int, filters: Filters = ()):
+    """Sem busca: COUNT(*). Com busca: (ids até o teto, maior id visto)."""
+    where = [getattr(model, name) == value for name, value in filters]
+    if not q:
+        return select(func.count()).select_from(model).where(*where)
+    ids = match_ids(model, q)
+    if where:
+        # ids do FTS que passam nos filtros, ainda em ordem crescente (a estimativa depende disso)
+        hits = ids.subquery()
+        ids = select(model.id.label("id")).join(hits, hits.c.id == model.id).where(*where).order_by(model.id)
+    ids = ids.limit(cap).subquery()
+    return select(func.count(), func.max(ids.c.id))
+
+
+def top_id_statement(model):
+    return select(func.max(model.id))
+
+
+def _cached(model, q: Optional[str], filters: Filters):
+    key = (current_tenant(), model.__tablename__, " ".join((q or "").split()), filters)
+    generations = response_cache.generations(_tags(model))
+    return key, generations, count_cache.get(key, generations)
+
+
+def _last_page(offset: int, rows: int, has_next: bool) -> Optional[Total]:
+    # página vazia depois do fim (ex.: a última linha foi excluída) não prova nada
+    if not has_next and (rows or not offset):
+        count_cache.stats.skipped += 1
+        return Total(offset + rows)
+    return None
+
+
+def _at_least(total: Total, offset: int, rows: int, has_next: bool) -> Total:
+    # a página vista é prova: o total (em cache ou estimado) não fica abaixo dela
+    floor = offset + rows + has_next if rows else 0
+    return total if total.value >= floor else Total(floor, total.exact)
+
+
+def _estimate(seen: int, last_seen: Optional[int], top: Optional[int]) -> Total:
+    count_cache.stats.estimates += 1
+    return Total(round(seen * (top or 0) / last_seen) if last_seen else seen, exact=False)
+
+
+def count_total(
+    session, model, q: Optional[str], offset: int, rows: int, has_next: bool, filters: Filters = ()
+) -> Total:
+    """Total para a página em `offset` com `rows` linhas; nunca menor do que a página prova."""
+    total = _last_page(offset, rows, has_next)
+    if total is not None:
+        return total
+    key, generations, total = _cached(model, q, filters)
+    if total is None:
+        cap = settings.ui_count_exact_limit
+        row = session.execute(count_statement(model, q, cap, filters)).one()
+        if q and row[0] >= cap:
+            total = _estimate(row[0], row[1], session.execute(top_id_statement(model)).scalar())
+        else:
+            total = Total(row[0])
+        count_cache.put(key, generations, total)
+    return _at_least(total, offset, rows, has_next)
+
+
+async def acount_total(
+    session, model, q: Optional[str], offset: int, rows: int, has_next: bool, filters: Filters = ()
+) -> Total:
+    total = _last_page(offset, rows, has_next)
+    if total is not None:
+        return total
+    key, generations, total = _cached(model, q, filters)
+    if total is None:
+        cap = settings.ui_count_exact_limit
+        row = (await session.execute(count_statement(model, q, cap, filters))).one()
+        if q and row[0] >= cap:
+            total = _estimate(row[0], row[1], (await session.execute(top_id_statement(model))).scalar())
+        else:
+            total = Total(row[0])
+        count_cache.put(key, generations, total)
+    return _at_least(total, offset, rows, has_next)
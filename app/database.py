@@ -1,7 +1,287 @@
-from sqlmodel import SQLModel, create_engine
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, NamedTuple, Optional
 
-DATABASE_URL = "sqlite:///./crm.db"
-engine = create_engine(DATABASE_URL, echo=False)
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.schema import CreateColumn, CreateIndex
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.util import LRUCache
+from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from .metrics import instrument_engine
+from .changes import begin_snapshot, install_changes
+from .search import install_search
+from .settings import Settings, settings
+from .stats import install_stats
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+READ_METHODS = ("GET", "HEAD")
+
+
+def _is_memory(url) -> bool:
+    return url.database in (None, "", ":memory:") or "mode=memory" in str(url)
+
+
+def _read_only_url(url):
+    # URI do SQLite: mode=ro abre o arquivo sem permissão de escrita
+    return url.set(database=f"file:{url.database}", query={**url.query, "mode": "ro", "uri": "true"})
+
+
+def _pragmas(cfg: Settings, read_only: bool):
+    pragmas = [
+        f"busy_timeout={cfg.busy_timeout_ms}",
+        f"cache_size={-cfg.cache_size_kib}",  # negativo = KiB
+        f"mmap_size={cfg.mmap_size}",
+        f"temp_store={cfg.temp_store}",
+        f"synchronous={cfg.synchronous}",
+    ]
+    if read_only:
+        pragmas.append("query_only=ON")
+    else:
+        # journal_mode é do arquivo; só quem escreve pode trocá-lo
+        pragmas.insert(0, f"journal_mode={cfg.journal_mode}")
+    return pragmas
+
+
+def _set_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+    return on_connect
+
+
+def _engine_args(url, cfg: Settings, read_only: bool):
+    kwargs = {"echo": cfg.echo_sql}
+    if url.get_backend_name() == "sqlite" and not _is_memory(url):
+        kwargs["pool_size"] = cfg.read_pool_size if read_only else cfg.pool_size
+        kwargs["max_overflow"] = cfg.max_overflow
+        if read_only:
+            url = _read_only_url(url)
+    return url, kwargs
+
+
+def make_engine(url=None, read_only: bool = False, cfg: Settings = settings):
+    """
+    Engine sync configurado por `cfg`: pool dimensionado e PRAGMAs do SQLite
+    (WAL, synchronous, cache, mmap, temp_store, busy_timeout) em cada conexão.
+    read_only=True abre o arquivo em modo somente leitura (pool dos GETs).
+    """
+    url, kwargs = _engine_args(make_url(url or cfg.database_url), cfg, read_only)
+    sqlite = url.get_backend_name() == "sqlite"
+    if sqlite:
+        # a conexão pode passar por mais de uma thread do threadpool na mesma requisição
+        kwargs["connect_args"] = {"check_same_thread": False}
+    new_engine = create_engine(url, **kwargs)
+    if sqlite:
+        event.listen(new_engine, "connect", _set_pragmas(_pragmas(cfg, read_only)))
+        event.listen(new_engine, "begin", begin_snapshot)
+    if cfg.metrics_enabled:
+        instrument_engine(new_engine)
+    return new_engine
+
+
+def make_async_engine(url=None, read_only: bool = False, cfg: Settings = settings):
+    """Mesmo que make_engine, via aiosqlite, para as rotas async."""
+    url = make_url(url or cfg.database_url)
+    if url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    url, kwargs = _engine_args(url, cfg, read_only)
+    new_engine = create_async_engine(url, **kwargs)
+    if url.get_backend_name() == "sqlite":
+        event.listen(new_engine.sync_engine, "connect", _set_pragmas(_pragmas(cfg, read_only)))
+    if cfg.metrics_enabled:
+        instrument_engine(new_engine.sync_engine)
+    return new_engine
+
+
+class Binds(NamedTuple):
+    """Engines de um banco: escrita, leitura e os async (None se CRM_ASYNC estiver desligado)."""
+    engine: object
+    read_engine: object
+    async_engine: object = None
+    async_read_engine: object = None
+    tenant: Optional[str] = None  # None = banco padrão (CRM_DATABASE_URL)
+
+
+def make_binds(url=None, cfg: Settings = settings, use_async: bool = True, tenant: Optional[str] = None) -> Binds:
+    """
+    Os engines de um banco. Pool só de leitura: GETs não disputam conexões (nem
+    o lock) com as escritas. Banco em memória não tem como ser aberto duas
+    vezes, então usa o mesmo engine.
+    """
+    url = make_url(url or cfg.database_url)
+    split = cfg.read_pool and not _is_memory(url)
+    write = make_engine(url, cfg=cfg)
+    read = make_engine(url, read_only=True, cfg=cfg) if split else write
+    if not use_async:
+        return Binds(write, read, tenant=tenant)
+    async_write = make_async_engine(url, cfg=cfg)
+    async_read = make_async_engine(url, read_only=True, cfg=cfg) if split else async_write
+    return Binds(write, read, async_write, async_read, tenant)
+
+
+# ------------------- engines de tenant ------------------- #
+# Um create_engine por tenant traz um dialeto e um cache de SQL compilado
+# próprios: cada consulta seria compilada de novo em cada tenant, o que custa
+# mais do que a própria consulta num banco pequeno, e os caches somam memória.
+# Os engines de tenant dividem um dialeto (sync e async) e um cache; só o pool
+# e os PRAGMAs são de cada arquivo.
+
+TENANT_SQL_CACHE_SIZE = 1000
+
+_shared_dialects: Dict[bool, object] = {}
+_shared_lock = threading.Lock()
+_tenant_sql_cache = LRUCache(TENANT_SQL_CACHE_SIZE)
+
+
+def _shared_dialect(is_async: bool):
+    """Dialeto já inicializado (primeira conexão feita) num banco em memória."""
+    with _shared_lock:
+        dialect = _shared_dialects.get(is_async)
+        if dialect is None:
+            if is_async:
+                base = create_async_engine("sqlite+aiosqlite://")
+
+                async def first_connect():
+                    async with base.connect():
+                        pass
+                    await base.dispose()
+
+                # thread própria: quem chama pode estar dentro de um event loop
+                thread = threading.Thread(target=asyncio.run, args=(first_connect(),))
+                thread.start()
+                thread.join()
+                dialect = base.sync_engine.dialect
+            else:
+                base = create_engine("sqlite://")
+                with base.connect():
+                    pass
+                base.dispose()
+                dialect = base.dialect
+            _shared_dialects[is_async] = dialect
+        return dialect
+
+
+def _tenant_engine(url, cfg: Settings, read_only: bool, is_async: bool) -> Engine:
+    url, kwargs = _engine_args(url, cfg, read_only)
+    dialect = _shared_dialect(is_async)
+    cargs, cparams = dialect.create_connect_args(url)
+    if not is_async:
+        cparams["check_same_thread"] = False
+    pool_class = AsyncAdaptedQueuePool if is_async else QueuePool
+    pool = pool_class(
+        lambda: dialect.connect(*cargs, **cparams),
+        pool_size=kwargs["pool_size"], max_overflow=kwargs["max_overflow"], dialect=dialect,
+    )
+    on_connect = dialect.on_connect_url(url)  # funções do SQLite que o dialeto registra (regexp etc.)
+    if on_connect is not None:
+        event.listen(pool, "connect", lambda dbapi_connection, record: on_connect(dbapi_connection))
+    event.listen(pool, "connect", _set_pragmas(_pragmas(cfg, read_only)))
+    new_engine = Engine(
+        pool, dialect, url, echo=cfg.echo_sql, query_cache_size=0,
+        execution_options={"compiled_cache": _tenant_sql_cache},
+    )
+    if not is_async:
+        event.listen(new_engine, "begin", begin_snapshot)
+    if cfg.metrics_enabled:
+        instrument_engine(new_engine)
+    return new_engine
+
+
+def make_tenant_binds(path: str, cfg: Settings = settings, tenant: Optional[str] = None) -> Binds:
+    """Como make_binds, para o arquivo de um tenant, com dialeto e cache de SQL compartilhados."""
+    url = make_url(f"sqlite:///{path}")
+    write = _tenant_engine(url, cfg, False, False)
+    read = _tenant_engine(url, cfg, True, False) if cfg.read_pool else write
+    if not cfg.async_routes:
+        return Binds(write, read, tenant=tenant)
+    async_url = url.set(drivername="sqlite+aiosqlite")
+    async_write = AsyncEngine(_tenant_engine(async_url, cfg, False, True))
+    async_read = AsyncEngine(_tenant_engine(async_url, cfg, True, True)) if cfg.read_pool else async_write
+    return Binds(write, read, async_write, async_read, tenant)
+
+
+DATABASE_URL = settings.database_url
+# banco padrão; os async (aiosqlite) servem as rotas de CRM_ASYNC=1 (ver app/main.py)
+default_binds = make_binds()
+engine, read_engine, async_engine, async_read_engine, _ = default_binds
+
+# engines da requisição: os do tenant (app/tenancy.py) ou os padrão
+_current_binds: ContextVar[Optional[Binds]] = ContextVar("crm_binds", default=None)
+
+
+def current_binds() -> Binds:
+    return _current_binds.get() or default_binds
+
+
+def current_tenant() -> Optional[str]:
+    return current_binds().tenant
+
+
+@contextmanager
+def use_binds(binds: Binds):
+    """Troca os engines de current_binds() dentro do bloco (tenant da requisição, jobs, CLI)."""
+    token = _current_binds.set(binds)
+    try:
+        yield binds
+    finally:
+        _current_binds.reset(token)
+
+
+def engine_for(request: Request):
+    binds = current_binds()
+    return binds.read_engine if request.method in READ_METHODS else binds.engine
+
+
+def add_missing_columns(bind) -> list:
+    """
+    create_all não altera tabelas que já existem: acrescenta com ALTER TABLE
+    ADD COLUMN as colunas do modelo que faltam no banco (precisam aceitar null
+    ou ter server_default). Devolve "tabela.coluna" de cada uma.
+    """
+    added = []
+    with bind.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            have = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+            if not have:
+                continue  # tabela nova: é do create_all
+            for column in table.columns:
+                if column.name not in have:
+                    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                    added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def create_db_and_tables(bind=None):
+    bind = bind or current_binds().engine
+    SQLModel.metadata.create_all(bind)
+    add_missing_columns(bind)
+    # create_all não cria índices novos em tabelas que já existiam; IF NOT EXISTS
+    # em vez de checkfirst, que não enxerga índice de expressão (lower(email))
+    with bind.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+    install_search(bind)
+    install_stats(bind)
+    install_changes(bind)
+
+
+# Dependências de sessão: GET/HEAD vão para o pool somente leitura
+def get_session(request: Request):
+    with Session(engine_for(request)) as session:
+        yield session
+
+
+async def get_async_session(request: Request):
+    binds = current_binds()
+    bind = binds.async_read_engine if request.method in READ_METHODS else binds.async_engine
+    async with AsyncSession(bind) as session:
+        yield session
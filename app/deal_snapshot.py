@@ -0,0 +1,408 @@
+# app/deal_snapshot.py
+"""
+Snapshot colunar de `deal` em arrays NumPy, um por engine, compartilhado
+pelas consultas analíticas em memória (app/forecast.py e app/facets.py).
+
+As colunas ficam em ordem de id, com folga no fim, e etapa/vendedor já vêm
+codificados. Antes de cada consulta o snapshot é posto em dia pelo feed de
+row_version/tombstones (app/changes.py): alterações são gravadas no lugar,
+inserções vão para a folga e exclusões só desligam a linha (alive). Quem
+consulta nunca vê dado anterior à última escrita gravada. Delta grande
+demais ou tombstones já descartadas recarregam tudo; linhas mortas demais
+disparam uma recarga em segundo plano.
+
+A leitura do delta corre fora do lock; o lock só cobre a aplicação. A
+consulta calcula sobre um DealView, recorte imutável dos arrays: delta que
+chega com consultas em andamento copia antes as colunas que vai alterar
+(copy-on-write), então as consultas não fazem fila nem leem linha pela metade.
+"""
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Integer, cast, func, select
+from sqlalchemy.dialects import sqlite
+
+from .changes import read_delta
+from .models import STAGES, Deal
+from .settings import settings
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependência opcional
+    np = None
+
+ENGINES = ("auto", "numpy", "sql")
+
+LOAD_CHUNK = 100_000
+
+# delta acima de max(DELTA_MIN, linhas / DELTA_FRACTION) recarrega o snapshot
+DELTA_MIN = 10_000
+DELTA_FRACTION = 4
+
+# sem data de fechamento vira o menor int32 (fora de qualquer faixa de datas)
+NULL_DAY = -(2 ** 31)
+# dia 0 (1970-01-01) é quinta: (dia + 3) // 7 conta semanas de segunda a domingo
+WEEK_SHIFT = 3
+# mês/semana sem data: acima de qualquer período, então `min(período - início, n)` cai no último
+# código; com folga até o int32 para a subtração não estourar com início negativo (antes de 1970)
+NULL_PERIOD = 2 ** 30
+
+# faixas de valor padrão das facetas: (-inf, 1 mil), [1 mil, 5 mil), ..., [1 milhão, inf)
+VALUE_EDGES = (1_000.0, 5_000.0, 10_000.0, 25_000.0, 50_000.0, 100_000.0, 250_000.0, 500_000.0, 1_000_000.0)
+
+_DAY = func.coalesce(cast(func.julianday(Deal.expected_close_date) - 2440587.5, Integer), NULL_DAY)
+SNAPSHOT_COLUMNS = (Deal.id, Deal.company_id, Deal.value, Deal.probability, Deal.stage, Deal.owner, _DAY)
+# a carga usa o cursor do driver direto: o custo é por linha
+SNAPSHOT_SQL = str(
+    select(*SNAPSHOT_COLUMNS).order_by(Deal.id).compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+)
+
+COLUMNS = {
+    "ids": "int64", "company_id": "int32", "value": "float64", "probability": "int16", "weighted": "float64",
+    "stage": "int32", "owner": "int32", "day": "int32", "month": "int32", "week": "int32", "bucket": "int8",
+    "alive": "bool",
+}
+PERIODS = ("month", "week")
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+def encode(values: Sequence, index: Dict) -> "np.ndarray":
+    """Valores -> códigos int32; valor novo ganha o próximo código de `index`."""
+    for new in set(values).difference(index):
+        index[new] = len(index)
+    return np.fromiter(map(index.__getitem__, values), dtype=np.int32, count=len(values))
+
+
+def _columns(rows, stage_index: Dict[str, int], owner_index: Dict[Optional[str], int]) -> Dict[str, "np.ndarray"]:
+    """Linhas de SNAPSHOT_COLUMNS -> colunas do snapshot."""
+    ids, company_id, value, probability, stage, owner, day = zip(*rows)
+    value = np.array(value, dtype=np.float64)
+    probability = np.array(probability, dtype=np.int16)
+    day = np.array(day, dtype=np.int32)
+    valid = day != NULL_DAY
+    month = day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    week = (day.astype(np.int64) + WEEK_SHIFT) // 7
+    return {
+        "ids": np.array(ids, dtype=np.int64),
+        "company_id": np.array(company_id, dtype=np.int32),
+        "value": value,
+        "probability": probability,
+        "weighted": value * probability / 100.0,
+        "stage": encode(stage, stage_index),
+        "owner": encode(owner, owner_index),
+        "day": day,
+        "month": np.where(valid, month, NULL_PERIOD).astype(np.int32),
+        "week": np.where(valid, week, NULL_PERIOD).astype(np.int32),
+        # faixa de valor com os limites padrão, calculada uma vez por linha
+        "bucket": np.searchsorted(VALUE_EDGES, value, side="right").astype(np.int8),
+        "alive": np.ones(len(ids), dtype=bool),
+    }
+
+
+def _bounds(periods: "np.ndarray", lo: int = 0, hi: int = -1) -> Tuple[int, int]:
+    """Menor e maior período com data, somados a (lo, hi); hi < lo é faixa vazia."""
+    dated = periods[periods != NULL_PERIOD]
+    if not len(dated):
+        return lo, hi
+    new_lo, new_hi = int(dated.min()), int(dated.max())
+    return (new_lo, new_hi) if hi < lo else (min(lo, new_lo), max(hi, new_hi))
+
+
+class _Pin:
+    """Consultas em andamento sobre um buffer; com alguma, o delta copia antes de escrever."""
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+
+class DealView:
+    """Recorte imutável do snapshot para uma consulta: arrays [:n], rótulos e versão."""
+
+    def __init__(self, snapshot: "DealSnapshot"):
+        n = snapshot.n
+        for name in COLUMNS:
+            setattr(self, name, getattr(snapshot, name)[:n])
+        self.n = n
+        self.live = snapshot.live
+        self.stages: List[str] = list(snapshot.stage_index)
+        self.owners: List[Optional[str]] = list(snapshot.owner_index)
+        self.company_card = snapshot.company_card
+        # (início, quantidade) dos meses e semanas com data; podem sobrar períodos vazios
+        self.periods = {name: (lo, hi - lo + 1) for name, (lo, hi) in snapshot.bounds.items()}
+        self.version = snapshot.version
+        self.loaded_at = snapshot.loaded_at
+
+    def __len__(self) -> int:
+        return self.live
+
+    @property
+    def all_alive(self) -> bool:
+        return self.live == self.n
+
+    def find(self, ids: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+        """(posições, encontrado) de cada id, por busca binária na coluna ordenada."""
+        return _find(self.ids, self.n, ids)
+
+
+def _find(column: "np.ndarray", n: int, ids: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+    pos = np.searchsorted(column[:n], ids)
+    if not n:
+        return pos, np.zeros(len(ids), dtype=bool)
+    found = column[np.minimum(pos, n - 1)] == ids
+    return pos, found & (pos < n)
+
+
+class DealSnapshot:
+    """Buffers das colunas (com folga no fim); só o SnapshotStore escreve, com o lock."""
+
+    def __init__(self, columns: Dict[str, "np.ndarray"], stage_index: Dict[str, int],
+                 owner_index: Dict[Optional[str], int], version: int):
+        n = len(columns["ids"])
+        capacity = n + max(1024, n // 8)
+        for name in COLUMNS:
+            array = np.zeros(capacity, dtype=columns[name].dtype)
+            array[:n] = columns[name]
+            setattr(self, name, array)
+        self._pins = {name: _Pin() for name in COLUMNS}
+        self.n = n
+        self.live = int(self.alive[:n].sum())
+        self.stage_index = stage_index
+        self.owner_index = owner_index
+        self.company_card = int(self.company_id[:n].max()) + 1 if n else 1
+        self.bounds = {name: _bounds(getattr(self, name)[:n]) for name in PERIODS}
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.load_seconds = 0.0
+
+    def __len__(self) -> int:
+        return self.live
+
+    @property
+    def dead(self) -> int:
+        return self.n - self.live
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in COLUMNS)
+
+    @classmethod
+    def load(cls, bind) -> "DealSnapshot":
+        started = time.monotonic()
+        stage_index: Dict[str, int] = {stage: i for i, stage in enumerate(STAGES)}
+        owner_index: Dict[Optional[str], int] = {}
+        parts: List[Dict[str, "np.ndarray"]] = []
+        raw = bind.raw_connection()
+        try:
+            cursor = raw.cursor()
+            # versão antes das linhas: o que mudar durante a leitura volta pelo delta (reaplicar não faz mal)
+            version = cursor.execute("SELECT version FROM change_seq WHERE id = 1").fetchone()[0]
+            cursor.execute(SNAPSHOT_SQL)
+            while True:
+                rows = cursor.fetchmany(LOAD_CHUNK)
+                if not rows:
+                    break
+                parts.append(_columns(rows, stage_index, owner_index))
+            cursor.close()
+        finally:
+            raw.close()
+        columns = {
+            name: np.concatenate([p[name] for p in parts]) if parts else np.empty(0, dtype=dtype)
+            for name, dtype in COLUMNS.items()
+        }
+        snapshot = cls(columns, stage_index, owner_index, version)
+        snapshot.load_seconds = time.monotonic() - started
+        return snapshot
+
+    # ---- leitura ----
+
+    def view(self) -> Tuple[DealView, List[_Pin]]:
+        """Recorte atual e os pins dos buffers dele; chamado com o lock do store."""
+        pins = list({id(p): p for p in self._pins.values()}.values())
+        for pin in pins:
+            pin.count += 1
+        return DealView(self), pins
+
+    # ---- delta ----
+
+    def _writable(self, names: Sequence[str]) -> None:
+        # buffer em uso por uma consulta é copiado antes da escrita no lugar
+        for name in names:
+            if self._pins[name].count:
+                setattr(self, name, getattr(self, name).copy())
+                self._pins[name] = _Pin()
+
+    def _reserve(self, extra: int) -> None:
+        if self.n + extra <= len(self.ids):
+            return
+        capacity = max(2 * len(self.ids), self.n + extra)
+        for name in COLUMNS:
+            old = getattr(self, name)
+            array = np.zeros(capacity, dtype=old.dtype)
+            array[: self.n] = old[: self.n]
+            setattr(self, name, array)
+            self._pins[name] = _Pin()
+
+    def apply(self, rows, gone: Sequence[int]) -> None:
+        """Tombstones e depois linhas: um id reaproveitado depois da exclusão volta pelas linhas."""
+        if gone:
+            pos, found = _find(self.ids, self.n, np.unique(np.array(gone, dtype=np.int64)))
+            pos = pos[found]
+            if len(pos):
+                self._writable(("alive",))
+                self.live -= int(self.alive[pos].sum())
+                self.alive[pos] = False
+        if not rows:
+            return
+        cols = _columns(rows, self.stage_index, self.owner_index)
+        pos, found = _find(self.ids, self.n, cols["ids"])
+        at = pos[found]
+        if len(at):
+            self._writable(tuple(COLUMNS))
+            self.live += int((~self.alive[at]).sum())
+            for name in COLUMNS:
+                getattr(self, name)[at] = cols[name][found]
+        new = ~found
+        if new.any():
+            k = int(new.sum())
+            self._reserve(k)
+            # a folga fica depois do n dos recortes já entregues: escrever nela não os afeta
+            start, end = self.n, self.n + k
+            order = np.argsort(cols["ids"][new], kind="stable")
+            for name in COLUMNS:
+                getattr(self, name)[start:end] = cols[name][new][order]
+            # ids novos vêm depois do maior; fora disso (id explícito) reordena tudo
+            if start and self.ids[start] < self.ids[start - 1]:
+                self._writable(tuple(COLUMNS))
+                order = np.argsort(self.ids[:end], kind="stable")
+                for name in COLUMNS:
+                    array = getattr(self, name)
+                    array[:end] = array[:end][order]
+            self.n = end
+            self.live += k
+        self.company_card = max(self.company_card, int(cols["company_id"].max()) + 1)
+        # só alarga: período que ficou vazio não atrapalha (some na contagem)
+        self.bounds = {name: _bounds(cols[name], *self.bounds[name]) for name in PERIODS}
+
+
+@dataclass
+class SnapshotStats:
+    loads: int = 0
+    deltas: int = 0  # catch-ups que trouxeram alguma mudança
+    delta_rows: int = 0  # linhas e tombstones aplicadas
+    views: int = 0  # consultas servidas
+
+
+class SnapshotStore:
+    """Snapshot de um engine, posto em dia pelo feed de mudanças a cada consulta."""
+
+    def __init__(self, bind):
+        self.bind = bind
+        self.stats = SnapshotStats()
+        self._snapshot: Optional[DealSnapshot] = None
+        self._lock = threading.Lock()  # aplicação do delta, troca do snapshot e pins
+        self._load_lock = threading.Lock()  # uma carga completa por vez
+        self._compacting = False
+
+    @property
+    def snapshot(self) -> Optional[DealSnapshot]:
+        return self._snapshot
+
+    def _reload(self, stale: Optional[DealSnapshot]) -> None:
+        with self._load_lock:
+            if self._snapshot is not stale:
+                return  # outra thread recarregou enquanto esta esperava
+            snapshot = DealSnapshot.load(self.bind)
+            with self._lock:
+                self._snapshot = snapshot
+                self.stats.loads += 1
+
+    @contextmanager
+    def view(self) -> Iterator[DealView]:
+        """Recorte em dia com a última escrita gravada, fixo enquanto o bloco roda."""
+        while True:
+            snapshot = self._snapshot
+            if snapshot is None:
+                self._reload(None)
+                continue
+            cap = max(DELTA_MIN, snapshot.n // DELTA_FRACTION)
+            with self.bind.connect() as conn:
+                delta = read_delta(conn, "deal", snapshot.version, SNAPSHOT_COLUMNS, cap)
+            if delta is None:
+                self._reload(snapshot)
+                continue
+            with self._lock:
+                if self._snapshot is not snapshot:
+                    continue
+                if snapshot.version < delta.version:
+                    if snapshot.version != delta.since:
+                        continue  # outra thread aplicou parte do caminho: lê a partir de onde ela parou
+                    if delta.rows or delta.gone:
+                        snapshot.apply(delta.rows, delta.gone)
+                        self.stats.deltas += 1
+                        self.stats.delta_rows += len(delta.rows) + len(delta.gone)
+                    snapshot.version = delta.version
+                view, pins = snapshot.view()
+                self.stats.views += 1
+                compact = snapshot.dead > cap and not self._compacting
+                if compact:
+                    self._compacting = True
+            break
+        if compact:
+            self._compact_async(snapshot)
+        try:
+            yield view
+        finally:
+            with self._lock:
+                for pin in pins:
+                    pin.count -= 1
+
+    def _compact_async(self, old: DealSnapshot) -> None:
+        """Recarrega sem as linhas mortas; as consultas seguem no atual até a troca."""
+
+        def run():
+            try:
+                with self._load_lock:
+                    snapshot = DealSnapshot.load(self.bind)
+                    with self._lock:
+                        if self._snapshot is old:
+                            self._snapshot = snapshot  # a próxima consulta aplica o que veio depois
+                            self.stats.loads += 1
+            finally:
+                self._compacting = False
+
+        threading.Thread(target=run, name="crm-deal-snapshot-compact", daemon=True).start()
+
+    def warm_async(self) -> None:
+        """Carrega o snapshot numa thread; consultas que chegarem antes esperam por ela."""
+        threading.Thread(target=self._reload, args=(None,), name="crm-deal-snapshot-warm", daemon=True).start()
+
+
+_stores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_stores_lock = threading.Lock()
+
+
+def snapshot_store(bind) -> SnapshotStore:
+    with _stores_lock:
+        store = _stores.get(bind)
+        if store is None:
+            store = _stores[bind] = SnapshotStore(bind)
+        return store
+
+
+def all_stores() -> List[SnapshotStore]:
+    with _stores_lock:
+        return list(_stores.values())
+
+
+def warm_snapshot(bind) -> None:
+    """Carga no startup, em segundo plano, se algum endpoint for usar o snapshot."""
+    if np is not None and (settings.forecast_snapshot or settings.facets_snapshot):
+        snapshot_store(bind).warm_async()
@@ -0,0 +1,621 @@
+# app/dedup.py
+"""
+Duplicatas de empresas e contatos sem comparar todos os pares.
+
+Cada registro vira um punhado de chaves de bloqueio e só quem divide alguma
+chave é comparado:
+
+- exatas, sobre valores normalizados: e-mail (minúsculo, sem +tag) e, nas
+  empresas, o domínio do site e o do e-mail (fora provedores gratuitos);
+- do nome: MinHash dos trigramas do nome normalizado (sem acento, pontuação e
+  formas jurídicas como Ltda/S.A./ME), em BANDS faixas de ROWS valores (LSH).
+  Nomes com Jaccard 0,7 caem juntos em alguma faixa com ~97% de chance; com
+  0,3, em ~20%. Os números do nome ("Filial 2") e, nos contatos, a empresa
+  entram na chave: "Loja 2" e "Loja 3" nunca viram candidatos.
+
+Os candidatos são conferidos com o Jaccard exato dos trigramas e pontuados:
+e-mail igual 1,0; domínio igual 0,9; nome = Jaccard. Dois contatos com
+e-mails diferentes valem metade pelo nome.
+
+O índice fica em memória, por engine e entidade: as chaves num array NumPy
+ordenado (~100 bytes por registro), consultado por busca binária. Escritas
+chegam pelo feed de row_version/tombstones (app/changes.py) e vão para um
+delta em dicionários; delta grande remonta o índice em segundo plano. Sem
+NumPy o índice inteiro fica nos dicionários (mais lento e mais pesado).
+
+Os pares da base são pontuados no primeiro relatório e guardados; os
+seguintes só descartam os que tocam registros alterados e pontuam os do delta.
+
+Enquanto o índice não sobe (startup, tenant recém-aberto), o POST confere só
+as chaves exatas direto no SQLite: mesmo e-mail (lower(email), indexado) ou
+mesmo nome (nas empresas; nos contatos, dentro da mesma empresa).
+"""
+import random
+import re
+import threading
+import time
+import unicodedata
+import weakref
+import zlib
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import chain
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import and_, func, or_, select
+
+from .changes import current_version, read_delta
+from .models import Company, CompanyRead, Contact, ContactRead
+from .serialization import read_select
+from .settings import settings
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependência opcional
+    np = None
+
+DUPLICATES_HEADER = "X-Possible-Duplicates"
+
+SHINGLE = 3
+BANDS = 8
+ROWS = 3
+NUM_HASHES = BANDS * ROWS
+PRIME = 4_294_967_311  # primo > 2**32: a * x + b cabe em 64 bits
+MASK64 = (1 << 64) - 1
+
+DOMAIN_SCORE = 0.9
+NAME_REASON = 0.5  # Jaccard a partir do qual "name" entra nos motivos
+MAX_BUCKET = 64  # chave com mais registros (nome genérico) não gera candidatos
+MAX_REPORTED = 10  # ids no cabeçalho do create
+LOAD_CHUNK = 10_000
+FETCH_CHUNK = 500
+REBUILD_MIN = 5_000  # delta a partir do qual o índice é remontado
+FALLBACK_LIMIT = 100  # candidatos da conferência direta no banco, sem o índice
+
+# parâmetros fixos: o mesmo nome gera a mesma assinatura em qualquer processo
+_rng = random.Random(20_240_601)
+_A = [_rng.randrange(1, 1 << 31) for _ in range(NUM_HASHES)]
+_B = [_rng.randrange(0, PRIME) for _ in range(NUM_HASHES)]
+_MIX = [_rng.randrange(1 << 62, 1 << 64) | 1 for _ in range(ROWS + 2)]
+
+LEGAL_FORMS = {"ltda", "sa", "me", "epp", "eireli", "mei", "cia", "inc", "llc", "ltd", "corp", "gmbh", "plc"}
+STOPWORDS = {"de", "da", "do", "das", "dos", "e", "the", "of", "and"}
+FREE_MAIL = {
+    "gmail.com", "hotmail.com", "outlook.com", "live.com", "yahoo.com", "yahoo.com.br", "icloud.com",
+    "bol.com.br", "uol.com.br", "terra.com.br", "ig.com.br", "protonmail.com",
+}
+
+
+# ------------------- normalização ------------------- #
+
+def _ascii(text: str) -> str:
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+
+
+def name_parts(name: Optional[str], drop: Set[str]) -> Tuple[str, Tuple[str, ...]]:
+    """("technova", ("2",)) para "Tech-Nova Ltda. 2": letras juntas, números à parte."""
+    # pontuação sai sem virar espaço: "S.A." -> "sa", "Tech-Nova" -> "technova"
+    tokens = re.sub(r"[^\w\s]", "", _ascii(name or "").lower()).replace("_", " ").split()
+    words = [t for t in tokens if not t.isdigit() and t not in drop]
+    return "".join(words), tuple(t for t in tokens if t.isdigit())
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    local, _, domain = (email or "").strip().lower().partition("@")
+    local = local.split("+", 1)[0]
+    return f"{local}@{domain}" if local and domain else None
+
+
+def normalize_domain(url: Optional[str]) -> Optional[str]:
+    host = re.sub(r"^[a-z][a-z0-9+.-]*://", "", (url or "").strip().lower())
+    host = host.split("/", 1)[0].split(":", 1)[0].strip(".")
+    return host.removeprefix("www.") or None
+
+
+def shingles(text: str) -> frozenset:
+    if not text:
+        return frozenset()
+    grams = [text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)] or [text]
+    return frozenset(zlib.crc32(g.encode()) for g in grams)
+
+
+@lru_cache(maxsize=1 << 16)
+def _name_grams(name: Optional[str], company: bool) -> Tuple[frozenset, Tuple[str, ...]]:
+    # nomes se repetem muito (contatos principalmente): a mesma frozenset serve a todos
+    text, numbers = name_parts(name, LEGAL_FORMS | STOPWORDS if company else STOPWORDS)
+    return shingles(text), numbers
+
+
+@dataclass(frozen=True)
+class Features:
+    grams: frozenset  # hashes dos trigramas do nome
+    numbers: Tuple[str, ...]
+    email: Optional[str]
+    domains: Tuple[str, ...]
+    scope: int = 0  # empresa do contato; nomes só se comparam dentro do mesmo escopo
+
+    @property
+    def band_scope(self) -> int:
+        numbers = zlib.crc32(" ".join(self.numbers).encode()) if self.numbers else 0
+        return (self.scope << 32) | numbers
+
+
+def company_features(name, email, website) -> Features:
+    grams, numbers = _name_grams(name, True)
+    email = normalize_email(email)
+    domains = {normalize_domain(website)}
+    if email and email.split("@", 1)[1] not in FREE_MAIL:
+        domains.add(email.split("@", 1)[1])
+    return Features(grams, numbers, email, tuple(sorted(d for d in domains if d)))
+
+
+def contact_features(name, email, company_id) -> Features:
+    grams, numbers = _name_grams(name, False)
+    return Features(grams, numbers, normalize_email(email), (), company_id or 0)
+
+
+# ------------------- chaves ------------------- #
+
+def minhash(grams: frozenset) -> List[int]:
+    return [min((a * x + b) % PRIME for x in grams) for a, b in zip(_A, _B)]
+
+
+def band_key(band: int, values: Sequence[int], scope: int) -> int:
+    key = sum(v * m for v, m in zip(values, _MIX)) + (band + 1) * _MIX[ROWS] + scope * _MIX[ROWS + 1]
+    return key & MASK64
+
+
+def _exact_keys(f: Features) -> List[int]:
+    # hash() do Python muda entre processos, mas o índice também não sai do processo
+    keys = [hash(("email", f.email)) & MASK64] if f.email else []
+    return keys + [hash(("domain", d)) & MASK64 for d in f.domains]
+
+
+def record_keys(f: Features) -> List[int]:
+    keys = _exact_keys(f)
+    if f.grams:
+        sig, scope = minhash(f.grams), f.band_scope
+        keys += [band_key(b, sig[b * ROWS:(b + 1) * ROWS], scope) for b in range(BANDS)]
+    return keys
+
+
+def _batch_keys(features: Sequence[Features]) -> Tuple["np.ndarray", "np.ndarray"]:
+    """(chaves, posição do registro) de um bloco; mesmas chaves que record_keys, vetorizado."""
+    keys: List[int] = []
+    pos: List[int] = []
+    for i, f in enumerate(features):
+        exact = _exact_keys(f)
+        keys += exact
+        pos += [i] * len(exact)
+    named = [i for i, f in enumerate(features) if f.grams]
+    out_keys = [np.array(keys, dtype=np.uint64)]
+    out_pos = [np.array(pos, dtype=np.int64)]
+    if named:
+        # uma assinatura por nome distinto do bloco
+        distinct: Dict[frozenset, int] = {}
+        which = np.fromiter((distinct.setdefault(features[i].grams, len(distinct)) for i in named),
+                            dtype=np.int64, count=len(named))
+        lengths = np.fromiter(map(len, distinct), dtype=np.int64, count=len(distinct))
+        flat = np.fromiter(chain.from_iterable(distinct), dtype=np.uint64, count=int(lengths.sum()))
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        a, b = np.array(_A, dtype=np.uint64), np.array(_B, dtype=np.uint64)
+        sig = np.minimum.reduceat((flat[:, None] * a + b) % np.uint64(PRIME), starts, axis=0)[which]
+        mix = np.array(_MIX, dtype=np.uint64)
+        scopes = np.fromiter((features[i].band_scope for i in named), dtype=np.uint64, count=len(named))
+        # aritmética em uint64 dá a volta em 2**64, igual ao "& MASK64" de band_key
+        band = (sig.reshape(len(named), BANDS, ROWS) * mix[:ROWS]).sum(axis=2, dtype=np.uint64)
+        band += np.arange(1, BANDS + 1, dtype=np.uint64) * mix[ROWS]
+        band += (scopes * mix[ROWS + 1])[:, None]
+        out_keys.append(band.ravel())
+        out_pos.append(np.repeat(np.array(named, dtype=np.int64), BANDS))
+    return np.concatenate(out_keys), np.concatenate(out_pos)
+
+
+# ------------------- pontuação ------------------- #
+
+def name_similarity(a: Features, b: Features) -> float:
+    if a.scope != b.scope or a.numbers != b.numbers or not a.grams or not b.grams:
+        return 0.0
+    return len(a.grams & b.grams) / len(a.grams | b.grams)
+
+
+def score_pair(entity: str, a: Features, b: Features) -> Tuple[float, List[str]]:
+    score, reasons = 0.0, []
+    if a.email and a.email == b.email:
+        score = 1.0
+        reasons.append("email")
+    if set(a.domains) & set(b.domains):
+        score = max(score, DOMAIN_SCORE)
+        reasons.append("domain")
+    similarity = name_similarity(a, b)
+    if entity == "contact" and a.email and b.email and a.email != b.email:
+        similarity /= 2  # homônimos na mesma empresa, cada um com seu e-mail
+    if similarity >= NAME_REASON:
+        reasons.append("name")
+    return max(score, round(similarity, 4)), reasons
+
+
+# ------------------- entidades ------------------- #
+
+@dataclass(frozen=True)
+class EntitySpec:
+    name: str
+    model: type
+    read_model: type
+    columns: Tuple[str, ...]  # o que as features leem, nessa ordem
+    features: Callable[..., Features]
+
+    def of(self, record) -> Features:
+        get = record.get if isinstance(record, dict) else lambda c: getattr(record, c)
+        return self.features(*(get(c) for c in self.columns))
+
+
+ENTITIES: Dict[str, EntitySpec] = {
+    "company": EntitySpec("company", Company, CompanyRead, ("name", "email", "website"), company_features),
+    "contact": EntitySpec("contact", Contact, ContactRead, ("name", "email", "company_id"), contact_features),
+}
+
+
+def fetch_records(conn, spec: EntitySpec, ids, full: bool = True) -> Dict[int, dict]:
+    """Registros por id, em blocos: campos do *Read, ou só os das features (full=False)."""
+    ids = sorted(ids)
+    if full:
+        stmt, fields = read_select(select(spec.model), spec.read_model)
+    else:
+        fields = ["id", *spec.columns]
+        stmt = select(*[getattr(spec.model, f) for f in fields])
+    out = {}
+    for i in range(0, len(ids), FETCH_CHUNK):
+        for row in conn.execute(stmt.where(spec.model.id.in_(ids[i:i + FETCH_CHUNK]))):
+            record = dict(zip(fields, row))
+            out[record["id"]] = record
+    return out
+
+
+# ------------------- índice ------------------- #
+
+class DedupIndex:
+    """Chaves de uma entidade: base ordenada (NumPy) + delta das escritas seguintes."""
+
+    def __init__(self, keys: Optional["np.ndarray"], ids: Optional["np.ndarray"], version: int, records: int):
+        if keys is not None:
+            order = np.argsort(keys, kind="stable")
+            keys, ids = keys[order], ids[order]
+        self.keys = keys
+        self.ids = ids
+        self.version = version  # última versão do feed já aplicada
+        self.records = records
+        self.stale: Set[int] = set()  # ids cujas chaves na base não valem mais
+        self.delta: Dict[int, Set[int]] = {}  # chave -> ids
+        self.delta_keys: Dict[int, List[int]] = {}  # id -> chaves
+        self.loaded_at = time.monotonic()
+        self.load_seconds = 0.0
+        # pares da base já pontuados, [(-score, a, b, motivos)] em ordem; montados no 1º relatório
+        self.base_scored: Optional[List[tuple]] = None
+        self.base_compared = 0
+
+    @property
+    def size(self) -> int:
+        return (0 if self.keys is None else len(self.keys)) + sum(map(len, self.delta.values()))
+
+    @property
+    def pending(self) -> int:
+        return len(self.stale) + len(self.delta_keys)
+
+    def remove(self, record_id: int) -> None:
+        self.stale.add(record_id)
+        for key in self.delta_keys.pop(record_id, ()):
+            bucket = self.delta[key]
+            bucket.discard(record_id)
+            if not bucket:
+                del self.delta[key]
+
+    def add(self, record_id: int, f: Features) -> None:
+        self.remove(record_id)
+        keys = record_keys(f)
+        for key in keys:
+            self.delta.setdefault(key, set()).add(record_id)
+        self.delta_keys[record_id] = keys
+
+    def _base(self, keys: Sequence[int]) -> List[Tuple[int, Optional[Set[int]]]]:
+        """Ids da base por chave, sem os stale; None quando a chave passa de MAX_BUCKET."""
+        if self.keys is None or not len(self.keys) or not keys:
+            return [(key, set()) for key in keys]
+        probe = np.array(keys, dtype=np.uint64)
+        lo = np.searchsorted(self.keys, probe, "left").tolist()
+        hi = np.searchsorted(self.keys, probe, "right").tolist()
+        return [
+            (key, set(self.ids[a:b].tolist()) - self.stale if b - a <= MAX_BUCKET else None)
+            for key, a, b in zip(keys, lo, hi)
+        ]
+
+    def candidates(self, keys: Sequence[int]) -> Set[int]:
+        out: Set[int] = set()
+        for key, bucket in self._base(keys):
+            if bucket is None:
+                continue
+            bucket |= self.delta.get(key, set())
+            if len(bucket) <= MAX_BUCKET:
+                out |= bucket
+        return out
+
+    def base_pairs(self) -> Set[Tuple[int, int]]:
+        """Pares (menor id, maior id) que dividem alguma chave da base, stale incluídos."""
+        out: Set[Tuple[int, int]] = set()
+        if self.keys is None or len(self.keys) < 2:
+            return out
+        keys, ids = self.keys, self.ids
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        lengths = np.diff(np.append(starts, len(keys)))
+        ok = (lengths >= 2) & (lengths <= MAX_BUCKET)
+        starts, lengths = starts[ok], lengths[ok]
+        if not len(starts):
+            return out
+        # só as entradas das corridas aceitas; par = (i, i + d) na mesma corrida
+        run = np.repeat(np.arange(len(starts)), lengths)
+        offset = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        member = ids[np.repeat(starts, lengths) + offset]
+        for d in range(1, int(lengths.max())):
+            same = (run[d:] == run[:-d]) & (member[d:] != member[:-d])
+            a, b = member[:-d][same], member[d:][same]
+            out.update(zip(np.minimum(a, b).tolist(), np.maximum(a, b).tolist()))
+        return out
+
+    def delta_pairs(self) -> Set[Tuple[int, int]]:
+        """Pares com algum registro do delta (contra a base e contra o próprio delta)."""
+        out: Set[Tuple[int, int]] = set()
+        for key, bucket in self._base(list(self.delta)):
+            fresh = self.delta[key]
+            if bucket is None or len(bucket | fresh) > MAX_BUCKET:
+                continue
+            bucket |= fresh
+            for a in fresh:
+                out.update((min(a, b), max(a, b)) for b in bucket if b != a)
+        return out
+
+
+def build_index(bind, spec: EntitySpec) -> DedupIndex:
+    started = time.monotonic()
+    cols = [spec.model.id] + [getattr(spec.model, c) for c in spec.columns]
+    parts_keys, parts_ids, loose = [], [], []
+    records = 0
+    with bind.connect() as conn:
+        # versão e linhas na mesma transação de leitura: o que vier depois entra pelo delta
+        version = current_version(conn)[0]
+        result = conn.execution_options(stream_results=True, yield_per=LOAD_CHUNK).execute(select(*cols))
+        for rows in result.partitions():
+            records += len(rows)
+            features = [spec.features(*row[1:]) for row in rows]
+            if np is None:
+                loose += [(row[0], f) for row, f in zip(rows, features)]
+                continue
+            keys, pos = _batch_keys(features)
+            parts_keys.append(keys)
+            parts_ids.append(np.array([row[0] for row in rows], dtype=np.int64)[pos])
+    if np is None:
+        index = DedupIndex(None, None, version, records)
+        for record_id, f in loose:
+            index.add(record_id, f)
+        index.stale.clear()
+    else:
+        keys = np.concatenate(parts_keys) if parts_keys else np.empty(0, dtype=np.uint64)
+        ids = np.concatenate(parts_ids) if parts_ids else np.empty(0, dtype=np.int64)
+        index = DedupIndex(keys, ids, version, records)
+    index.load_seconds = time.monotonic() - started
+    return index
+
+
+@dataclass
+class DedupStats:
+    builds: int = 0
+    checks: int = 0
+    flagged: int = 0  # creates com alguma possível duplicata
+
+
+class DedupStore:
+    """Índice de uma entidade num engine, atualizado pelo feed de mudanças a cada uso."""
+
+    def __init__(self, bind, spec: EntitySpec):
+        self.bind = bind
+        self.spec = spec
+        self.stats = DedupStats()
+        self._index: Optional[DedupIndex] = None
+        self._lock = threading.Lock()
+        self._score_lock = threading.Lock()  # pontuação da base: uma por vez
+        self._building = False
+
+    @property
+    def index(self) -> Optional[DedupIndex]:
+        return self._index
+
+    def _catch_up(self, index: DedupIndex) -> bool:
+        """Aplica as escritas desde index.version; False se forem muitas (remontar)."""
+        model = self.spec.model
+        cols = [model.id] + [getattr(model, c) for c in self.spec.columns]
+        with self.bind.connect() as conn:
+            delta = read_delta(conn, self.spec.name, index.version, cols, REBUILD_MIN)
+        if delta is None:
+            return False
+        # exclusões antes: um id reaproveitado depois da exclusão volta pelas linhas
+        for record_id in delta.gone:
+            index.remove(record_id)
+        for row in delta.rows:
+            index.add(row[0], self.spec.features(*row[1:]))
+        index.version = delta.version
+        return index.pending <= max(REBUILD_MIN, index.records // 4)
+
+    def _build(self) -> DedupIndex:
+        index = build_index(self.bind, self.spec)
+        self.stats.builds += 1
+        return index
+
+    def warm_async(self) -> None:
+        """Monta (ou remonta) o índice numa thread; o atual segue valendo até a troca."""
+        with self._lock:
+            self._spawn_build()
+
+    def _spawn_build(self) -> None:
+        # chamado com o lock
+        if self._building:
+            return
+        self._building = True
+
+        def run():
+            try:
+                index = self._build()
+                with self._lock:
+                    self._catch_up(index)
+                    self._index = index
+            finally:
+                self._building = False
+
+        threading.Thread(target=run, name=f"crm-dedup-{self.spec.name}", daemon=True).start()
+
+    def _current(self) -> DedupIndex:
+        # chamado com o lock
+        if self._index is None:
+            self._index = self._build()
+        elif not self._catch_up(self._index):
+            self._spawn_build()
+        return self._index
+
+    def candidates(self, keys: Sequence[int]) -> Optional[Set[int]]:
+        """Ids que dividem alguma chave; None se o índice ainda não foi montado."""
+        with self._lock:
+            if self._index is None:
+                return None
+            return self._current().candidates(keys)
+
+    def _score(self, pairs: Set[Tuple[int, int]]) -> List[tuple]:
+        """[(-score, a, b, motivos)] dos pares com score > 0, em ordem, com os dados atuais."""
+        with self.bind.connect() as conn:
+            records = fetch_records(conn, self.spec, set(chain.from_iterable(pairs)), full=False)
+        features = {record_id: self.spec.of(rec) for record_id, rec in records.items()}
+        out = []
+        for a, b in pairs:
+            if a in features and b in features:
+                score, reasons = score_pair(self.spec.name, features[a], features[b])
+                if score > 0:
+                    out.append((-score, a, b, tuple(reasons)))
+        out.sort()
+        return out
+
+    def report(self, min_score: float, limit: int) -> dict:
+        """
+        Payload de CompanyDuplicates/ContactDuplicates. Os pares da base são
+        pontuados uma vez por montagem do índice; a cada relatório só saem os que
+        tocam registros alterados e entram os pares do delta.
+        """
+        with self._lock:
+            index = self._current()
+            fresh = index.delta_pairs()
+            stale = set(index.stale)
+        with self._score_lock:
+            if index.base_scored is None:
+                pairs = index.base_pairs()
+                index.base_scored, index.base_compared = self._score(pairs), len(pairs)
+        found = []
+        for item in index.base_scored:
+            if -item[0] < min_score:
+                break
+            if item[1] not in stale and item[2] not in stale:
+                found.append(item)
+        found += [item for item in self._score(fresh) if -item[0] >= min_score]
+        found.sort()
+        top = found[:limit]
+        with self.bind.connect() as conn:
+            records = fetch_records(conn, self.spec, {i for item in top for i in item[1:3]})
+        return {
+            "candidate_count": index.base_compared + len(fresh),
+            "pair_count": len(found),
+            "pairs": [
+                {"score": -neg, "reasons": list(reasons), "a": records[a], "b": records[b]}
+                for neg, a, b, reasons in top
+                if a in records and b in records
+            ],
+        }
+
+
+_stores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_stores_lock = threading.Lock()
+
+
+def dedup_store(bind, entity: str) -> DedupStore:
+    with _stores_lock:
+        stores = _stores.setdefault(bind, {})
+        store = stores.get(entity)
+        if store is None:
+            store = stores[entity] = DedupStore(bind, ENTITIES[entity])
+        return store
+
+
+def all_stores() -> List[DedupStore]:
+    with _stores_lock:
+        return [store for stores in list(_stores.values()) for store in stores.values()]
+
+
+# ------------------- entrada ------------------- #
+
+def duplicate_report(bind, entity: str, min_score: Optional[float], limit: int) -> dict:
+    """min_score None = CRM_DEDUP_MIN_SCORE."""
+    min_score = settings.dedup_min_score if min_score is None else min_score
+    return dedup_store(bind, entity).report(min_score, limit)
+
+
+def exact_match_stmt(spec: EntitySpec, record, record_id: int):
+    """Outros registros com o mesmo e-mail ou nome: a conferência sem o índice, só por índices do SQLite."""
+    model = spec.model
+    get = record.get if isinstance(record, dict) else lambda c: getattr(record, c)
+    conds = []
+    email = normalize_email(get("email"))
+    if email:
+        # o que foi gravado com +tag ou noutra caixa além do lower() fica para o índice
+        conds.append(func.lower(model.email).in_(sorted({email, get("email").strip().lower()})))
+    if model is Contact:
+        conds.append(and_(Contact.company_id == get("company_id"), Contact.name == get("name")))
+    else:
+        conds.append(model.name == get("name"))
+    cols = [model.id] + [getattr(model, c) for c in spec.columns]
+    return select(*cols).where(or_(*conds), model.id != record_id).limit(FALLBACK_LIMIT)
+
+
+def check_duplicates(bind, entity: str, record) -> List[int]:
+    """
+    Ids de possíveis duplicatas de um registro recém-gravado, da maior pontuação
+    para a menor. Com o índice ainda sendo montado (a primeira chamada dispara
+    a montagem em segundo plano), só as chaves exatas, direto no banco.
+    """
+    store = dedup_store(bind, entity)
+    spec = store.spec
+    features = spec.of(record)
+    record_id = record["id"] if isinstance(record, dict) else record.id
+    store.stats.checks += 1
+    if store.index is None:
+        store.warm_async()
+        with store.bind.connect() as conn:
+            rows = conn.execute(exact_match_stmt(spec, record, record_id)).all()
+        found = {row[0]: dict(zip(spec.columns, row[1:])) for row in rows}
+    else:
+        ids = (store.candidates(record_keys(features)) or set()) - {record_id}
+        if not ids:
+            return []
+        with store.bind.connect() as conn:
+            found = fetch_records(conn, spec, ids, full=False)
+    min_score = settings.dedup_min_score
+    scored = sorted(
+        (-score_pair(spec.name, features, spec.of(rec))[0], other) for other, rec in found.items()
+    )
+    out = [other for neg, other in scored if -neg >= min_score][:MAX_REPORTED]
+    if out:
+        store.stats.flagged += 1
+    return out
+
+
+def report_duplicates(response, ids: Optional[List[int]]) -> None:
+    if ids:
+        response.headers[DUPLICATES_HEADER] = ",".join(map(str, ids))
+
+
+def warm_dedup(bind) -> None:
+    for entity in ENTITIES:
+        dedup_store(bind, entity).warm_async()
@@ -0,0 +1,60 @@
+# app/expand.py
+"""
+Relações embutidas (`?expand=company`) para contatos e negócios.
+
+As linhas da página saem do caminho rápido (tuplas de colunas, ver
+app/serialization.py); as empresas referenciadas vêm numa única consulta
+extra `WHERE id IN (...)`, como um selectinload, e entram em cada item como
+"company". Sem expand nada muda na resposta.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from fastapi import HTTPException
+from sqlmodel import select
+
+from .models import Company, CompanyRead
+
+EXPANDABLE = {"company"}
+EXPAND_DESCRIPTION = "Relações embutidas, separadas por vírgula: company"
+
+COMPANY_FIELDS = list(CompanyRead.model_fields)
+
+
+def parse_expand(expand: Optional[str]) -> Set[str]:
+    names = {part.strip() for part in (expand or "").split(",") if part.strip()}
+    unknown = names - EXPANDABLE
+    if unknown:
+        raise HTTPException(422, f"expand inválido: {', '.join(sorted(unknown))}. Use: {', '.join(sorted(EXPANDABLE))}")
+    return names
+
+
+def _companies_stmt(ids: Iterable[int]):
+    return select(*[getattr(Company, f) for f in COMPANY_FIELDS]).where(Company.id.in_(sorted(ids)))
+
+
+def _items(fields: List[str], rows: Sequence[Sequence]) -> List[dict]:
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def _embed(items: List[dict], company_rows) -> List[dict]:
+    companies: Dict[int, dict] = {row.id: dict(zip(COMPANY_FIELDS, row)) for row in company_rows}
+    for item in items:
+        item["company"] = companies.get(item["company_id"])
+    return items
+
+
+def expand_rows(session, fields: List[str], rows: Sequence[Sequence], expand: Set[str]) -> List[dict]:
+    """Linhas (com company_id) -> dicts, com a empresa embutida se pedida."""
+    items = _items(fields, rows)
+    if "company" not in expand or not items:
+        return items
+    return _embed(items, session.execute(_companies_stmt({i["company_id"] for i in items})).all())
+
+
+async def aexpand_rows(session, fields: List[str], rows: Sequence[Sequence], expand: Set[str]) -> List[dict]:
+    """Versão de expand_rows para AsyncSession."""
+    items = _items(fields, rows)
+    if "company" not in expand or not items:
+        return items
+    result = await session.execute(_companies_stmt({i["company_id"] for i in items}))
+    return _embed(items, result.all())
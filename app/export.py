@@ -0,0 +1,98 @@
+# app/export.py
+"""
+Exportação em streaming (CSV ou NDJSON) para /deals/export, /contacts/export e
+/companies/export.
+
+As linhas saem de um cursor do servidor (`stream_results` + `yield_per`) e são
+escritas em blocos, então a memória fica constante qualquer que seja o volume.
+A resposta abre a própria conexão: a sessão da dependência já foi fechada
+quando o corpo começa a ser enviado. Exportações grandes também podem rodar
+como job (POST /jobs, kind "export"), gravando num arquivo (`write_export`).
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from .database import current_binds
+from .serialization import read_select
+
+YIELD_PER = 2000
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} não serializável")
+
+
+def _stream(
+    stmt, columns: List[str], fmt: str, on_rows: Optional[Callable[[int], None]] = None
+) -> Iterator[bytes]:
+    """`on_rows(n)` é chamado a cada bloco lido (progresso/cancelamento dos jobs)."""
+    with current_binds().read_engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=YIELD_PER).execute(stmt)
+        partitions = result.partitions() if on_rows is None else _counted(result.partitions(), on_rows)
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(columns)
+            for rows in partitions:
+                writer.writerows(rows)
+                yield buf.getvalue().encode()
+                buf.seek(0)
+                buf.truncate()
+        else:
+            for rows in partitions:
+                chunk = "".join(
+                    json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False) + "\n"
+                    for row in rows
+                )
+                yield chunk.encode()
+
+
+def _counted(partitions, on_rows: Callable[[int], None]):
+    for rows in partitions:
+        yield rows
+        on_rows(len(rows))
+
+
+def export_select(stmt, read_model, fmt: str):
+    """
+    `stmt` é o select filtrado de uma entidade (como os build_*_query devolvem);
+    só as colunas de `read_model` são exportadas, na ordem do modelo, por id.
+    """
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(422, "Formato inválido. Use csv ou ndjson")
+    entity = stmt.column_descriptions[0]["entity"]
+    stmt, columns = read_select(stmt, read_model)
+    return stmt.order_by(entity.id), columns
+
+
+def write_export(stmt, columns: List[str], fmt: str, path: Path, on_rows: Callable[[int], None]) -> int:
+    """Grava a exportação em `path`; devolve o tamanho em bytes."""
+    size = 0
+    with open(path, "wb") as out:
+        for chunk in _stream(stmt, columns, fmt, on_rows):
+            out.write(chunk)
+            size += len(chunk)
+    return size
+
+
+def export_response(stmt, read_model, fmt: str, filename: str) -> StreamingResponse:
+    stmt, columns = export_select(stmt, read_model, fmt)
+    return StreamingResponse(
+        _stream(stmt, columns, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
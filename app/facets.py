@@ -0,0 +1,274 @@
+# app/facets.py
+"""
+Facetas dos negócios (GET /deals/facets): para os filtros da listagem,
+quantidade e soma de valor por etapa, vendedor, empresa e faixa de valor,
+mais os totais, numa resposta só.
+
+Cada faceta ignora o próprio filtro: com stage=proposta a faceta de etapas
+continua mostrando quanto cada etapa teria com os demais filtros (as abas do
+quadro), e a de faixas de valor ignora min_value/max_value.
+
+Caminho principal: o snapshot de `deal` compartilhado com a previsão
+(app/deal_snapshot.py, posto em dia pelo feed de mudanças antes de cada
+consulta), uma máscara por filtro e bincounts; facetas que caem no mesmo
+recorte saem de um bincount só sobre a combinação dos códigos. O cálculo
+corre sobre um DealView imutável, sem lock. q passa pelo FTS5 (match_ids) e
+vira máscara por busca binária nos ids.
+
+Sem NumPy (ou com CRM_FACETS_SNAPSHOT=false) cada faceta é um GROUP BY no SQLite.
+"""
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, select
+
+from .deal_snapshot import ENGINES, VALUE_EDGES, DealView, snapshot_store
+from .models import STAGES, Company, Deal
+from .search import match_ids
+from .settings import settings
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependência opcional
+    np = None
+
+# etapa x vendedor x faixa contados juntos até esse número de combinações
+JOINT_MAX_BINS = 1 << 20
+
+
+@dataclass
+class FacetFilters:
+    company_id: Optional[int] = None
+    stage: Optional[str] = None
+    q: Optional[str] = None
+    min_value: Optional[float] = None
+    max_value: Optional[float] = None
+
+
+def parse_edges(values: Optional[Sequence[float]]) -> Tuple[float, ...]:
+    if not values:
+        return VALUE_EDGES
+    edges = tuple(float(v) for v in values)
+    if any(a >= b for a, b in zip(edges, edges[1:])):
+        raise HTTPException(422, "buckets: limites em ordem crescente, sem repetir")
+    return edges
+
+
+def _count(value, deal_count, value_sum) -> dict:
+    return {"value": value, "deal_count": int(deal_count), "value_sum": float(value_sum)}
+
+
+def _buckets(edges: Sequence[float], counts: Sequence[int], sums: Sequence[float]) -> List[dict]:
+    bounds = [None, *edges, None]
+    return [
+        {"min_value": lo, "max_value": hi, "deal_count": int(n), "value_sum": float(v)}
+        for lo, hi, n, v in zip(bounds, bounds[1:], counts, sums)
+    ]
+
+
+def _top(keys: List, counts: List[int], sums: List[float], limit: int) -> List[dict]:
+    # mais negócios primeiro; empate pela chave (sem vendedor por último)
+    order = sorted(range(len(keys)), key=lambda i: (-counts[i], keys[i] is None, keys[i] or 0))
+    return [_count(keys[i], counts[i], sums[i]) for i in order[:limit]]
+
+
+# ------------------- snapshot NumPy ------------------- #
+
+def snapshot_facets(view: DealView, f: FacetFilters, q_ids: Optional["np.ndarray"], edges: Sequence[float],
+                    limit: int) -> dict:
+    n = view.n
+    value = view.value
+    if tuple(edges) == VALUE_EDGES:
+        bucket = view.bucket
+    else:
+        bucket = np.searchsorted(np.asarray(edges, dtype=np.float64), value, side="right").astype(np.int32)
+    stages, owners = view.stages, view.owners
+    # faceta -> (códigos, cardinalidade, filtro que ela ignora)
+    dims = {
+        "stage": (view.stage, len(stages), "stage"),
+        "owner": (view.owner, max(len(owners), 1), None),
+        "value": (bucket, len(edges) + 1, "value"),
+        "company_id": (view.company_id, view.company_card, "company_id"),
+    }
+
+    own: Dict[str, "np.ndarray"] = {}
+    if f.company_id:
+        own["company_id"] = view.company_id == f.company_id
+    if f.stage:
+        own["stage"] = view.stage == (stages.index(f.stage) if f.stage in stages else -1)
+    if f.min_value is not None or f.max_value is not None:
+        cond = np.ones(n, dtype=bool)
+        if f.min_value is not None:
+            cond &= value >= f.min_value
+        if f.max_value is not None:
+            cond &= value <= f.max_value
+        own["value"] = cond
+    common = None if view.all_alive else view.alive
+    if q_ids is not None:
+        found = np.zeros(n, dtype=bool)
+        pos, hit = view.find(q_ids)
+        found[pos[hit]] = True
+        common = found if common is None else common & found
+
+    # facetas que caem no mesmo recorte (os mesmos filtros) são contadas juntas
+    groups: Dict[Tuple[str, ...], List[str]] = {}
+    for name, (_, _, skip) in dims.items():
+        groups.setdefault(tuple(k for k in own if k != skip), []).append(name)
+
+    counts: Dict[str, "np.ndarray"] = {}
+    sums: Dict[str, "np.ndarray"] = {}
+    for used, names in groups.items():
+        mask = common
+        for name in used:
+            mask = own[name] if mask is None else mask & own[name]
+        keep = None if mask is None else np.flatnonzero(mask)
+        v = value if keep is None else value[keep]
+        # etapa x vendedor x faixa num bincount só, somado depois por eixo (a empresa tem bins demais)
+        joint = [name for name in names if name != "company_id"]
+        cards = [dims[name][1] for name in joint]
+        if len(joint) > 1 and np.prod(cards) <= JOINT_MAX_BINS:
+            code = None
+            for name, card in zip(joint, cards):
+                c = dims[name][0] if keep is None else dims[name][0][keep]
+                code = c.astype(np.int32) if code is None else code * card + c
+            cell_counts = np.bincount(code, minlength=int(np.prod(cards))).reshape(cards)
+            cell_sums = np.bincount(code, weights=v, minlength=int(np.prod(cards))).reshape(cards)
+            for axis, name in enumerate(joint):
+                others = tuple(i for i in range(len(joint)) if i != axis)
+                counts[name], sums[name] = cell_counts.sum(axis=others), cell_sums.sum(axis=others)
+            names = [name for name in names if name not in joint]
+        for name in names:
+            c = dims[name][0] if keep is None else dims[name][0][keep]
+            counts[name] = np.bincount(c, minlength=dims[name][1])
+            sums[name] = np.bincount(c, weights=v, minlength=dims[name][1])
+
+    stage_rows = [
+        _count(label, counts["stage"][i], sums["stage"][i])
+        for i, label in enumerate(stages)
+        if i < len(STAGES) or counts["stage"][i]
+    ]
+
+    # o vendedor não tem filtro: seus grupos somam os totais
+    present = np.flatnonzero(counts["owner"]).tolist()
+    owner_rows = _top(
+        [owners[i] for i in present], counts["owner"][present].tolist(), sums["owner"][present].tolist(), limit
+    )
+    totals = _count(None, counts["owner"].sum(), sums["owner"].sum())
+
+    company_counts, company_sums = counts["company_id"], sums["company_id"]
+    companies = np.flatnonzero(company_counts)
+    top = companies
+    if len(companies) > limit:
+        # só os `limit` maiores (e os empatados com o último) passam para a ordenação em Python
+        cut = np.partition(company_counts[companies], len(companies) - limit)[len(companies) - limit]
+        top = companies[company_counts[companies] >= cut]
+    company_rows = _top(top.tolist(), company_counts[top].tolist(), company_sums[top].tolist(), limit)
+
+    return {
+        "totals": totals,
+        "stage": stage_rows,
+        "owner": owner_rows,
+        "owner_count": len(present),
+        "company": company_rows,
+        "company_count": len(companies),
+        "value": _buckets(edges, counts["value"].tolist(), sums["value"].tolist()),
+    }
+
+
+# ------------------- fallback SQL ------------------- #
+
+def _where(stmt, f: FacetFilters, skip: Optional[str] = None):
+    if f.company_id and skip != "company_id":
+        stmt = stmt.where(Deal.company_id == f.company_id)
+    if f.stage and skip != "stage":
+        stmt = stmt.where(Deal.stage == f.stage)
+    if f.q:
+        stmt = stmt.where(Deal.id.in_(match_ids(Deal, f.q)))
+    if skip != "value":
+        if f.min_value is not None:
+            stmt = stmt.where(Deal.value >= f.min_value)
+        if f.max_value is not None:
+            stmt = stmt.where(Deal.value <= f.max_value)
+    return stmt
+
+
+def sql_facets(session, f: FacetFilters, edges: Sequence[float], limit: int) -> dict:
+    aggs = (func.count(), func.coalesce(func.sum(Deal.value), 0.0))
+    count, value_sum = session.execute(_where(select(*aggs), f)).one()
+    totals = _count(None, count, value_sum)
+
+    by_stage = {stage: (n, v) for stage, n, v in session.execute(
+        _where(select(Deal.stage, *aggs), f, "stage").group_by(Deal.stage)
+    )}
+    stage_rows = [_count(stage, *by_stage.pop(stage, (0, 0.0))) for stage in STAGES]
+    stage_rows += [_count(stage, n, v) for stage, (n, v) in sorted(by_stage.items())]
+
+    owners = session.execute(_where(select(Deal.owner, *aggs), f).group_by(Deal.owner)).all()
+    owner_rows = _top([r[0] for r in owners], [r[1] for r in owners], [r[2] for r in owners], limit)
+
+    company_stmt = _where(select(Deal.company_id, *aggs), f, "company_id").group_by(Deal.company_id)
+    companies = session.execute(company_stmt.order_by(func.count().desc(), Deal.company_id).limit(limit)).all()
+    company_count = session.execute(select(func.count()).select_from(company_stmt.subquery())).scalar()
+    company_rows = _top([r[0] for r in companies], [r[1] for r in companies], [r[2] for r in companies], limit)
+
+    # faixa = quantos limites o valor alcança
+    bucket = sum((case((Deal.value >= edge, 1), else_=0) for edge in edges), start=0).label("bucket")
+    by_bucket = dict.fromkeys(range(len(edges) + 1), (0, 0.0))
+    for b, n, v in session.execute(_where(select(bucket, *aggs), f, "value").group_by(bucket)):
+        by_bucket[b] = (n, v)
+    counts, sums = zip(*(by_bucket[b] for b in sorted(by_bucket)))
+
+    return {
+        "totals": totals,
+        "stage": stage_rows,
+        "owner": owner_rows,
+        "owner_count": len(owners),
+        "company": company_rows,
+        "company_count": company_count,
+        "value": _buckets(edges, counts, sums),
+    }
+
+
+# ------------------- entrada ------------------- #
+
+def _match_ids(session, q: str) -> "np.ndarray":
+    """
+    Ids que casam com q (match_ids), ordenados. Cursor do driver direto: buscas
+    amplas devolvem centenas de milhares de ids e o Result custa o dobro.
+    """
+    conn = session.connection()
+    compiled = match_ids(Deal, q).compile(dialect=conn.dialect)
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        rows = cursor.execute(str(compiled), [compiled.params[name] for name in compiled.positiontup]).fetchall()
+    finally:
+        cursor.close()
+    # o FTS5 já entrega em ordem de id; o LIKE não
+    return np.sort(np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=len(rows)))
+
+
+def facets(session, f: FacetFilters, edges: Sequence[float] = VALUE_EDGES, limit: int = 20,
+           engine: str = "auto") -> dict:
+    """Payload de DealFacets; engine=auto usa o snapshot quando disponível."""
+    if engine not in ENGINES:
+        raise HTTPException(422, f"engine inválido. Use: {', '.join(ENGINES)}")
+    use_numpy = engine == "numpy" or (engine == "auto" and settings.facets_snapshot)
+    if use_numpy and np is None:
+        if engine == "numpy":
+            raise HTTPException(422, "engine=numpy indisponível: NumPy não instalado")
+        use_numpy = False
+    if use_numpy:
+        q_ids = _match_ids(session, f.q) if f.q else None
+        with snapshot_store(session.get_bind()).view() as view:
+            result = snapshot_facets(view, f, q_ids, edges, limit)
+        result.update(engine="numpy", version=view.version)
+    else:
+        result = sql_facets(session, f, edges, limit)
+        result.update(engine="sql", version=None)
+    ids = [row["value"] for row in result["company"]]
+    names = dict(session.execute(select(Company.id, Company.name).where(Company.id.in_(ids))).all()) if ids else {}
+    for row in result["company"]:
+        row["name"] = names.get(row["value"])
+    return result
@@ -0,0 +1,310 @@
+# app/forecast.py
+"""
+Previsão ponderada do pipeline: soma de value * probability / 100 agrupada por
+mês ou semana de fechamento, vendedor, empresa e etapa, com filtros.
+
+Caminho principal: o snapshot colunar de `deal` em arrays NumPy
+(app/deal_snapshot.py), posto em dia pelo feed de mudanças antes de cada
+consulta, agrupado com bincount. Cada consulta é uma máscara + três
+bincounts: dezenas de milissegundos em 5 milhões, contra segundos do SQLite,
+e já reflete a última escrita gravada.
+
+Sem NumPy (ou com CRM_FORECAST_SNAPSHOT=false) o mesmo resultado sai de um
+GROUP BY no SQLite, bem mais lento em bases grandes.
+"""
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import String, func, select
+
+from .deal_snapshot import ENGINES, NULL_DAY, WEEK_SHIFT, DealView, numpy_available, snapshot_store
+from .models import STAGES, Deal
+from .settings import settings
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependência opcional
+    np = None
+
+GROUPINGS = ("month", "week", "owner", "company_id", "stage")
+GROUP_BY_DESCRIPTION = f"Agrupamentos (repetível ou separado por vírgula): {'|'.join(GROUPINGS)}"
+ORDERINGS = ("key", "weighted_value")
+
+# acima disso (ou de ~2 bins por linha) o agrupamento ordena em vez de usar bincount
+DENSE_MAX_BINS = 1 << 24
+
+
+def parse_group_by(values: Optional[Sequence[str]]) -> List[str]:
+    names: List[str] = []
+    for value in values or ():
+        for part in value.split(","):
+            part = part.strip()
+            if part and part not in names:
+                names.append(part)
+    unknown = [n for n in names if n not in GROUPINGS]
+    if unknown:
+        raise HTTPException(422, f"group_by inválido: {', '.join(unknown)}. Use: {', '.join(GROUPINGS)}")
+    if "month" in names and "week" in names:
+        raise HTTPException(422, "group_by: use month ou week, não os dois")
+    return names
+
+
+@dataclass
+class ForecastFilters:
+    company_id: Optional[List[int]] = None
+    stage: Optional[List[str]] = None
+    owner: Optional[List[str]] = None
+    min_value: Optional[float] = None
+    max_value: Optional[float] = None
+    min_probability: Optional[int] = None
+    max_probability: Optional[int] = None
+    close_from: Optional[date] = None
+    close_to: Optional[date] = None
+
+
+def _row(group: Dict, count, value_sum, weighted) -> dict:
+    return {"group": group, "deal_count": int(count), "value_sum": float(value_sum), "weighted_value": float(weighted)}
+
+
+def _epoch_day(d: date) -> int:
+    return d.toordinal() - date(1970, 1, 1).toordinal()
+
+
+# ------------------- snapshot NumPy ------------------- #
+
+def _member(codes: "np.ndarray", card: int, wanted: List[int]) -> "np.ndarray":
+    # tabela de consulta por código: bem mais barata que np.isin em milhões de linhas
+    lookup = np.zeros(max(card, 1), dtype=bool)
+    lookup[wanted] = True
+    return lookup[codes]
+
+
+def _owner_rank(owners: List[Optional[str]]) -> "np.ndarray":
+    """Código do snapshot -> posição de exibição (ordem alfabética, sem vendedor por último)."""
+    order = sorted(range(len(owners)), key=lambda i: (owners[i] is None, owners[i] or ""))
+    rank = np.empty(max(len(owners), 1), dtype=np.int64)
+    rank[order] = np.arange(len(owners))
+    return rank
+
+
+def _mask(view: DealView, f: ForecastFilters) -> Optional["np.ndarray"]:
+    conds = [] if view.all_alive else [view.alive]
+    if f.company_id:
+        ids = [i for i in f.company_id if 0 <= i < view.company_card]
+        conds.append(_member(view.company_id, view.company_card, ids))
+    if f.stage:
+        conds.append(_member(view.stage, len(view.stages), [view.stages.index(s) for s in f.stage if s in view.stages]))
+    if f.owner:
+        conds.append(_member(view.owner, len(view.owners), [view.owners.index(o) for o in f.owner if o in view.owners]))
+    if f.min_value is not None:
+        conds.append(view.value >= f.min_value)
+    if f.max_value is not None:
+        conds.append(view.value <= f.max_value)
+    if f.min_probability is not None:
+        conds.append(view.probability >= f.min_probability)
+    if f.max_probability is not None:
+        conds.append(view.probability <= f.max_probability)
+    # NULL_DAY é o menor int32: já fica fora de qualquer ">="
+    if f.close_from is not None:
+        conds.append(view.day >= _epoch_day(f.close_from))
+    if f.close_to is not None:
+        conds.append((view.day != NULL_DAY) & (view.day <= _epoch_day(f.close_to)))
+    if not conds:
+        return None
+    # alive é do snapshot: não pode virar acumulador
+    out = conds[0].copy() if conds[0] is view.alive else conds[0]
+    for cond in conds[1:]:
+        out &= cond
+    return out
+
+
+def _dimension(view: DealView, name: str, keep: Optional["np.ndarray"]):
+    """
+    (códigos das linhas mantidas, cardinalidade, código -> rótulo, código ->
+    posição de exibição ou None quando o código já é a ordem) de um agrupamento.
+    """
+    def take(column):
+        return column if keep is None else column[keep]
+
+    if name == "stage":
+        return take(view.stage), len(view.stages), lambda c: view.stages[c], None
+    if name == "owner":
+        # vendedor fica com o código do snapshot; a ordem alfabética é aplicada aos grupos
+        owners = view.owners
+        return take(view.owner), max(len(owners), 1), lambda c: owners[c], _owner_rank(owners)
+    if name == "company_id":
+        return take(view.company_id), view.company_card, int, None
+    start, span = view.periods[name]
+    # sem data (NULL_PERIOD) passa de span e vira o último código
+    codes = np.minimum(take(getattr(view, name)) - start, span)
+    if name == "month":
+        return codes, span + 1, lambda c: None if c == span else str(np.datetime64(start + c, "M")), None
+    # rótulo da semana = a segunda-feira que a abre
+    return codes, span + 1, lambda c: None if c == span else str(np.datetime64((start + c) * 7 - WEEK_SHIFT, "D")), None
+
+
+def _decode(keys: "np.ndarray", dims) -> List["np.ndarray"]:
+    """Chave combinada -> código de cada agrupamento (de trás para frente)."""
+    parts = []
+    rest = keys
+    for _, dim_card, _, _ in reversed(dims):
+        parts.append(rest % dim_card)
+        rest = rest // dim_card
+    parts.reverse()
+    return parts
+
+
+def snapshot_forecast(view: DealView, group_by: List[str], f: ForecastFilters, order_by: str, limit: int) -> dict:
+    keep = _mask(view, f)
+    if keep is not None:
+        # índices em vez da máscara: indexar várias colunas com bool custa bem mais
+        keep = np.flatnonzero(keep)
+    value = view.value if keep is None else view.value[keep]
+    weighted = view.weighted if keep is None else view.weighted[keep]
+    if not group_by:
+        return {"rows": [], "group_count": 0, "totals": _row({}, len(value), value.sum(), weighted.sum())}
+
+    dims = [_dimension(view, name, keep) for name in group_by]
+    codes = None
+    card = 1
+    for dim_codes, dim_card, _, _ in dims:
+        c = dim_codes.astype(np.int64)
+        codes = c if codes is None else codes * dim_card + c
+        card *= dim_card
+
+    if card <= DENSE_MAX_BINS and card <= 2 * len(codes) + 4096:
+        counts = np.bincount(codes, minlength=card)
+        keys = np.flatnonzero(counts)
+        counts = counts[keys]
+        value_sums = np.bincount(codes, weights=value, minlength=card)[keys]
+        weighted_sums = np.bincount(codes, weights=weighted, minlength=card)[keys]
+    else:
+        keys, inverse = np.unique(codes, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys))
+        value_sums = np.bincount(inverse, weights=value, minlength=len(keys))
+        weighted_sums = np.bincount(inverse, weights=weighted, minlength=len(keys))
+
+    # totais a partir dos grupos: evita mais duas passadas nas colunas
+    totals = _row({}, len(value), value_sums.sum(), weighted_sums.sum())
+
+    if any(rank is not None for _, _, _, rank in dims):
+        # reordena só os grupos (não as linhas) para a ordem de exibição
+        display = None
+        for part, (_, dim_card, _, rank) in zip(_decode(keys, dims), dims):
+            part = part if rank is None else rank[part]
+            display = part if display is None else display * dim_card + part
+        perm = np.argsort(display)
+        keys, counts, value_sums, weighted_sums = keys[perm], counts[perm], value_sums[perm], weighted_sums[perm]
+    order = np.argsort(-weighted_sums, kind="stable") if order_by == "weighted_value" else np.arange(len(keys))
+    order = order[:limit]
+
+    parts = _decode(keys[order], dims)
+    labels = [[label(int(c)) for c in part] for part, (_, _, label, _) in zip(parts, dims)]
+    rows = [
+        _row(dict(zip(group_by, group)), n, v, w)
+        for group, n, v, w in zip(
+            zip(*labels), counts[order].tolist(), value_sums[order].tolist(), weighted_sums[order].tolist()
+        )
+    ]
+    return {"rows": rows, "group_count": len(keys), "totals": totals}
+
+
+# ------------------- fallback SQL ------------------- #
+
+def _sql_dimension(name: str):
+    if name == "month":
+        return func.strftime("%Y-%m", Deal.expected_close_date, type_=String)
+    if name == "week":
+        # segunda-feira da semana: avança até domingo (ou fica) e volta 6 dias
+        return func.date(Deal.expected_close_date, "weekday 0", "-6 days", type_=String)
+    return getattr(Deal, name)
+
+
+def _sort_key(group_by: List[str]):
+    stage_pos = {stage: i for i, stage in enumerate(STAGES)}
+
+    def key(row: dict):
+        out = []
+        for name in group_by:
+            v = row["group"][name]
+            if name == "stage":
+                out.append((0, stage_pos.get(v, len(stage_pos)), v))
+            else:
+                out.append((v is None, v if v is not None else 0))
+        return out
+
+    return key
+
+
+def sql_forecast(session, group_by: List[str], f: ForecastFilters, order_by: str, limit: int) -> dict:
+    dims = [_sql_dimension(name).label(name) for name in group_by]
+    aggs = [
+        func.count(),
+        func.coalesce(func.sum(Deal.value), 0.0),
+        func.coalesce(func.sum(Deal.value * Deal.probability), 0.0),
+    ]
+    stmt = select(*dims, *aggs)
+    if f.company_id:
+        stmt = stmt.where(Deal.company_id.in_(f.company_id))
+    if f.stage:
+        stmt = stmt.where(Deal.stage.in_(f.stage))
+    if f.owner:
+        stmt = stmt.where(Deal.owner.in_(f.owner))
+    if f.min_value is not None:
+        stmt = stmt.where(Deal.value >= f.min_value)
+    if f.max_value is not None:
+        stmt = stmt.where(Deal.value <= f.max_value)
+    if f.min_probability is not None:
+        stmt = stmt.where(Deal.probability >= f.min_probability)
+    if f.max_probability is not None:
+        stmt = stmt.where(Deal.probability <= f.max_probability)
+    if f.close_from is not None:
+        stmt = stmt.where(Deal.expected_close_date >= f.close_from)
+    if f.close_to is not None:
+        stmt = stmt.where(Deal.expected_close_date <= f.close_to)
+    if dims:
+        stmt = stmt.group_by(*dims)
+
+    rows, totals = [], [0, 0.0, 0.0]
+    n = len(dims)
+    for r in session.execute(stmt):
+        count, value_sum, weighted_sum = r[n:]
+        if not count:
+            continue
+        totals = [totals[0] + count, totals[1] + value_sum, totals[2] + weighted_sum]
+        if n:
+            rows.append(_row(dict(zip(group_by, r[:n])), count, value_sum, weighted_sum / 100.0))
+    rows.sort(key=_sort_key(group_by))
+    if order_by == "weighted_value":
+        rows.sort(key=lambda row: -row["weighted_value"])
+    return {
+        "rows": rows[:limit],
+        "group_count": len(rows),
+        "totals": _row({}, totals[0], totals[1], totals[2] / 100.0),
+    }
+
+
+# ------------------- entrada ------------------- #
+
+def forecast(session, group_by: List[str], f: ForecastFilters, order_by: str = "key",
+             limit: int = 1000, engine: str = "auto") -> dict:
+    """Payload de ForecastResult; engine=auto usa o snapshot quando disponível."""
+    if engine not in ENGINES:
+        raise HTTPException(422, f"engine inválido. Use: {', '.join(ENGINES)}")
+    if order_by not in ORDERINGS:
+        raise HTTPException(422, f"order_by inválido. Use: {', '.join(ORDERINGS)}")
+    use_numpy = engine == "numpy" or (engine == "auto" and settings.forecast_snapshot)
+    if use_numpy and not numpy_available():
+        if engine == "numpy":
+            raise HTTPException(422, "engine=numpy indisponível: NumPy não instalado")
+        use_numpy = False
+    if use_numpy:
+        with snapshot_store(session.get_bind()).view() as view:
+            result = snapshot_forecast(view, group_by, f, order_by, limit)
+        age = round(time.monotonic() - view.loaded_at, 3)
+        return {"group_by": group_by, **result, "engine": "numpy", "snapshot_age": age, "version": view.version}
+    result = sql_forecast(session, group_by, f, order_by, limit)
+    return {"group_by": group_by, **result, "engine": "sql", "snapshot_age": None, "version": None}
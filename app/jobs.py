@@ -0,0 +1,454 @@
+# app/jobs.py
+"""
+Jobs em segundo plano: exportações, relatórios e previsões pesadas rodam num
+pool de threads limitado (CRM_JOBS_WORKERS), fora do threadpool das
+requisições e sem esbarrar no timeout de proxy.
+
+    POST /jobs {"kind": "export", "params": {"entity": "deals", "format": "csv"}}
+      -> 202 + Location /jobs/{id}
+    POST /jobs/import/{entity}   corpo como o de /{entity}/bulk -> job "import"
+    GET  /jobs/{id}              status, progresso (done/total), erro
+    GET  /jobs/{id}/result       download quando status = succeeded
+    POST /jobs/{id}/cancel
+
+Cada job é uma linha da tabela `job` no próprio SQLite: o status sobrevive à
+requisição e pode ser consultado por qualquer worker. O progresso é gravado
+no máximo a cada CRM_JOBS_PROGRESS_SECONDS. O cancelamento é cooperativo: o
+job confere o pedido a cada bloco processado. Jobs de um processo que caiu
+(na fila ou rodando) ficam como failed no próximo startup.
+Resultados terminados há mais de CRM_JOBS_RETENTION_HOURS são apagados.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple, Type
+
+import orjson
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from sqlalchemy import func, update
+from sqlmodel import Session, SQLModel, select
+
+from .bulk import PARSERS, file_records, insert_records
+from .database import Binds, current_binds, current_tenant, use_binds
+from .export import MEDIA_TYPES, export_select, write_export
+from .forecast import ForecastFilters, forecast, parse_group_by
+from .live import notify_company_reload
+from .models import (
+    STAGES, Company, CompanyCreate, CompanyRead, Contact, ContactCreate, ContactRead, Deal, DealCreate, DealRead,
+    ExportJobParams, ForecastJobParams, ImportJobParams, Job, JobRead,
+)
+from .routers.companies import build_company_query
+from .routers.contacts import build_contact_query
+from .routers.deals import STAGE_VALUES_STMT, build_deal_query, ensure_valid_stage
+from .settings import settings
+
+ACTIVE = ("queued", "running")
+PURGE_EVERY = 3600.0  # segundos entre limpezas de jobs vencidos
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+@dataclass
+class JobContext:
+    """O que a função do job recebe: progresso, cancelamento e onde gravar."""
+    job_id: int
+    cancel: threading.Event
+    done: int = 0
+    total: Optional[int] = None
+    _flushed: float = field(default=0.0, repr=False)
+
+    def set_total(self, total: Optional[int]) -> None:
+        self.total = total
+        self._flush(force=True)
+
+    def advance(self, n: int = 1, message: Optional[str] = None) -> None:
+        """Soma `n` ao progresso; levanta JobCancelled se pediram o cancelamento."""
+        if self.cancel.is_set():
+            raise JobCancelled()
+        self.done += n
+        self._flush(message=message)
+
+    def output(self, suffix: str) -> Path:
+        return results_dir() / f"job-{self.job_id}.{suffix}"
+
+    def _flush(self, force: bool = False, message: Optional[str] = None) -> None:
+        now = time.monotonic()
+        if not force and now - self._flushed < settings.jobs_progress_seconds:
+            return
+        self._flushed = now
+        values: Dict[str, Any] = {"done": self.done, "total": self.total}
+        if message is not None:
+            values["message"] = message
+        # o pedido de cancelamento pode ter vindo por outro processo
+        if _set(self.job_id, **values):
+            self.cancel.set()
+
+
+class JobResult(NamedTuple):
+    path: Path
+    media_type: str
+    message: Optional[str] = None
+
+
+class JobKind(NamedTuple):
+    params: Type[SQLModel]
+    run: Callable[[JobContext, Any], JobResult]
+    # validações que dependem do banco/registro (levantam HTTPException 422)
+    check: Optional[Callable[[Any], None]] = None
+
+
+JOB_KINDS: Dict[str, JobKind] = {}
+
+
+def job_kind(name: str, params: Type[SQLModel], check: Optional[Callable[[Any], None]] = None):
+    def register(fn):
+        JOB_KINDS[name] = JobKind(params, fn, check)
+        return fn
+    return register
+
+
+def results_dir() -> Path:
+    # com tenants, uma pasta por tenant: os ids dos jobs se repetem entre bancos
+    tenant = current_tenant()
+    path = Path(settings.jobs_dir) / tenant if tenant else Path(settings.jobs_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _write_json(ctx: JobContext, payload) -> JobResult:
+    path = ctx.output("json")
+    path.write_bytes(orjson.dumps(payload))
+    return JobResult(path, "application/json")
+
+
+# ------------------- tipos de job ------------------- #
+
+def _export_query(p: ExportJobParams):
+    if p.entity == "companies":
+        return build_company_query(p.q)[0], CompanyRead
+    if p.entity == "contacts":
+        return build_contact_query(p.q, p.company_id)[0], ContactRead
+    return build_deal_query(p.company_id, p.stage, p.q, p.min_value, p.max_value)[0], DealRead
+
+
+def _check_export(p: ExportJobParams) -> None:
+    if p.entity not in ("companies", "contacts", "deals"):
+        raise HTTPException(422, "entity inválida. Use companies, contacts ou deals")
+    if p.stage is not None and p.stage not in STAGES:
+        raise HTTPException(422, f"Etapa inválida. Use: {', '.join(STAGES)}")
+    stmt, read_model = _export_query(p)
+    export_select(stmt, read_model, p.format)
+
+
+@job_kind("export", ExportJobParams, _check_export)
+def run_export(ctx: JobContext, p: ExportJobParams) -> JobResult:
+    stmt, read_model = _export_query(p)
+    with Session(current_binds().read_engine) as session:
+        ctx.set_total(session.execute(select(func.count()).select_from(stmt.subquery())).scalar())
+    stmt, columns = export_select(stmt, read_model, p.format)
+    path = ctx.output(p.format)
+    write_export(stmt, columns, p.format, path, ctx.advance)
+    return JobResult(path, MEDIA_TYPES[p.format], f"{ctx.done} linha(s)")
+
+
+@job_kind("stage-report", SQLModel)
+def run_stage_report(ctx: JobContext, p) -> JobResult:
+    """Contagem e soma de valores por etapa (o mesmo de /deals/summary/*)."""
+    totals = {stage: {"deal_count": 0, "value_sum": 0.0} for stage in STAGES}
+    with Session(current_binds().read_engine) as session:
+        for stage, count, value_sum in session.exec(STAGE_VALUES_STMT).all():
+            totals[stage] = {"deal_count": count, "value_sum": float(value_sum or 0.0) if count else 0.0}
+    ctx.advance(len(totals))
+    return _write_json(ctx, totals)
+
+
+def _check_forecast(p: ForecastJobParams) -> None:
+    parse_group_by(p.group_by)
+    for s in p.stage or ():
+        if s not in STAGES:
+            raise HTTPException(422, f"Etapa inválida. Use: {', '.join(STAGES)}")
+
+
+@job_kind("forecast", ForecastJobParams, _check_forecast)
+def run_forecast(ctx: JobContext, p: ForecastJobParams) -> JobResult:
+    filters = ForecastFilters(
+        p.company_id, p.stage, p.owner, p.min_value, p.max_value,
+        p.min_probability, p.max_probability, p.close_from, p.close_to,
+    )
+    with Session(current_binds().read_engine) as session:
+        payload = forecast(session, parse_group_by(p.group_by), filters, p.order_by, p.limit, p.engine)
+    ctx.advance(1)
+    return _write_json(ctx, payload)
+
+
+# entidade -> (modelo, *Create, validação extra), como em /{entity}/bulk
+IMPORT_TARGETS = {
+    "companies": (Company, CompanyCreate, None),
+    "contacts": (Contact, ContactCreate, None),
+    "deals": (Deal, DealCreate, lambda data: ensure_valid_stage(data.stage)),
+}
+IMPORT_FORMATS = ("json", *PARSERS)
+# nome gerado por save_upload: params não podem apontar para fora de CRM_JOBS_DIR
+UPLOAD_NAME = re.compile(r"upload-[0-9a-f]{32}\.(json|ndjson|csv)")
+
+
+def upload_path(name: str) -> Path:
+    return results_dir() / name
+
+
+async def save_upload(request: Request, fmt: str) -> str:
+    """Grava o corpo em CRM_JOBS_DIR como veio, sem abrir transação; devolve o nome para ImportJobParams."""
+    name = f"upload-{uuid.uuid4().hex}.{fmt}"
+    path = upload_path(name)
+    try:
+        with open(path, "wb") as f:
+            async for chunk in request.stream():
+                f.write(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return name
+
+
+def _check_import(p: ImportJobParams) -> None:
+    if p.entity not in IMPORT_TARGETS:
+        raise HTTPException(422, f"entity inválida. Use {', '.join(IMPORT_TARGETS)}")
+    if p.format not in IMPORT_FORMATS:
+        raise HTTPException(422, f"format inválido. Use {', '.join(IMPORT_FORMATS)}")
+    if not UPLOAD_NAME.fullmatch(p.upload) or not upload_path(p.upload).exists():
+        raise HTTPException(422, "upload não encontrado; envie o arquivo por POST /jobs/import/{entity}")
+
+
+def _count_records(path: Path, fmt: str) -> Optional[int]:
+    # linhas não vazias (menos o cabeçalho do CSV): aproximado se houver quebra de linha entre aspas
+    if fmt == "json":
+        return None
+    with open(path, "rb") as f:
+        lines = sum(1 for line in f if line.strip())
+    return max(lines - (fmt == "csv"), 0)
+
+
+@job_kind("import", ImportJobParams, _check_import)
+def run_import(ctx: JobContext, p: ImportJobParams) -> JobResult:
+    """Carga em lote de um arquivo enviado, com os mesmos lotes e validações de /{entity}/bulk."""
+    model, create_model, check = IMPORT_TARGETS[p.entity]
+    path = upload_path(p.upload)
+    try:
+        ctx.set_total(_count_records(path, p.format))
+        result = insert_records(file_records(path, p.format), model, create_model, check, on_batch=ctx.advance)
+    finally:
+        path.unlink(missing_ok=True)
+        if model is Company:
+            # as abas abertas recarregam a listagem uma vez, também se o job parou no meio
+            notify_company_reload()
+    out = _write_json(ctx, result.model_dump())
+    return out._replace(message=f"{result.inserted} inserido(s), {result.error_count} erro(s)")
+
+
+# ------------------- persistência ------------------- #
+
+def _set(job_id: int, **values) -> bool:
+    """Grava `values` e devolve se o cancelamento foi pedido."""
+    with current_binds().engine.begin() as conn:
+        stmt = update(Job).where(Job.id == job_id).values(**values).returning(Job.cancel_requested)
+        return bool(conn.execute(stmt).scalar())
+
+
+def _transition(job_id: int, source: Tuple[str, ...], *conditions, **values) -> bool:
+    """Muda o job só se ele ainda estiver em `source` (corrida com o cancelamento)."""
+    with current_binds().engine.begin() as conn:
+        stmt = update(Job).where(Job.id == job_id, Job.status.in_(source), *conditions).values(**values)
+        return conn.execute(stmt).rowcount == 1
+
+
+def job_payload(job: Job) -> dict:
+    progress = None
+    if job.status == "succeeded":
+        progress = 1.0
+    elif job.total:
+        progress = round(min(job.done / job.total, 1.0), 4)
+    data = JobRead(
+        **job.model_dump(exclude={"params", "result_file", "result_media_type"}),
+        params=json.loads(job.params),
+        progress=progress,
+        result_url=f"/jobs/{job.id}/result" if job.status == "succeeded" and job.result_file else None,
+    )
+    return data.model_dump(mode="json")
+
+
+# ------------------- execução ------------------- #
+
+class JobRunner:
+    def __init__(self, workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crm-job")
+        # por (tenant, id): os ids se repetem entre os bancos dos tenants
+        self._active: Dict[Tuple[Optional[str], int], Tuple[Future, threading.Event, Binds]] = {}
+        self._lock = threading.Lock()
+        self._purged_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+    def submit(self, session: Session, kind: str, raw_params: dict) -> Job:
+        spec = JOB_KINDS.get(kind)
+        if spec is None:
+            raise HTTPException(422, f"kind inválido. Use: {', '.join(JOB_KINDS)}")
+        try:
+            params = spec.params.model_validate(raw_params)
+        except ValidationError as exc:
+            raise HTTPException(422, exc.errors(include_url=False, include_context=False))
+        if spec.check is not None:
+            spec.check(params)
+        with self._lock:
+            if len(self._active) >= self.max_pending:
+                raise HTTPException(503, "Fila de jobs cheia; tente mais tarde", headers={"Retry-After": "5"})
+            job = Job(kind=kind, params=params.model_dump_json(exclude_unset=True), owner_pid=os.getpid())
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+            cancel = threading.Event()
+            # o job roda com os engines (tenant) da requisição que o criou
+            future = self._executor.submit(copy_context().run, self._run, job.id, spec, params, cancel)
+            key = (current_tenant(), job.id)
+            self._active[key] = (future, cancel, current_binds())
+        future.add_done_callback(lambda _, key=key: self._forget(key))
+        if time.monotonic() - self._purged_at > PURGE_EVERY:
+            self._purged_at = time.monotonic()
+            purge_jobs()
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Pede o cancelamento; False se o job já terminou. Na fila, sai na hora;
+        rodando, para no próximo bloco (em outro processo, na próxima gravação
+        de progresso).
+        """
+        if not _transition(job_id, ACTIVE, cancel_requested=True):
+            return False
+        with self._lock:
+            active = self._active.get((current_tenant(), job_id))
+        if active is not None:
+            future, cancel, _ = active
+            cancel.set()
+            if future.cancel():
+                _transition(job_id, ("queued",), status="cancelled", finished_at=_now())
+        return True
+
+    def _forget(self, key: Tuple[Optional[str], int]) -> None:
+        with self._lock:
+            self._active.pop(key, None)
+
+    def _run(self, job_id: int, spec: JobKind, params, cancel: threading.Event) -> None:
+        started = not cancel.is_set() and _transition(
+            job_id, ("queued",), Job.cancel_requested.is_(False), status="running", started_at=_now()
+        )
+        if not started:
+            _transition(job_id, ("queued",), status="cancelled", finished_at=_now())
+            return
+        ctx = JobContext(job_id, cancel)
+        result: Optional[JobResult] = None
+        try:
+            result = spec.run(ctx, params)
+        except JobCancelled:
+            _finish(ctx, "cancelled", None)
+        except HTTPException as exc:
+            _finish(ctx, "failed", None, error=str(exc.detail))
+        except Exception as exc:  # o job falha, o runner segue
+            _finish(ctx, "failed", None, error=f"{type(exc).__name__}: {exc}")
+        else:
+            _finish(ctx, "succeeded", result)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            active = list(self._active.items())
+        for (_, job_id), (future, cancel, binds) in active:
+            cancel.set()
+            if future.cancel():
+                with use_binds(binds):
+                    _transition(job_id, ("queued",), status="cancelled", finished_at=_now())
+        self._executor.shutdown(wait=True)
+
+
+def _finish(ctx: JobContext, status: str, result: Optional[JobResult], error: Optional[str] = None) -> None:
+    values: Dict[str, Any] = {"status": status, "done": ctx.done, "total": ctx.total,
+                              "error": error, "finished_at": _now()}
+    if result is not None:
+        values.update(result_file=result.path.name, result_media_type=result.media_type,
+                      result_bytes=result.path.stat().st_size, message=result.message)
+    else:
+        # resultado parcial de um job interrompido não serve para nada
+        for path in results_dir().glob(f"job-{ctx.job_id}.*"):
+            path.unlink(missing_ok=True)
+    _set(ctx.job_id, **values)
+
+
+runner = JobRunner(settings.jobs_workers, settings.jobs_max_pending)
+
+
+def _alive(pid: Optional[int]) -> bool:
+    # o próprio pid no startup só pode ser de um processo antigo (pid reaproveitado)
+    if pid is None or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def recover_jobs() -> None:
+    """
+    Startup (com tenants, na primeira abertura de cada um): jobs ativos de
+    processos que não existem mais não vão terminar (os de outros workers
+    vivos ficam como estão). Limpa também os vencidos.
+    """
+    with current_binds().engine.begin() as conn:
+        orphans = [
+            job_id for job_id, pid in conn.execute(select(Job.id, Job.owner_pid).where(Job.status.in_(ACTIVE)))
+            if not _alive(pid)
+        ]
+        if orphans:
+            conn.execute(
+                update(Job).where(Job.id.in_(orphans), Job.status.in_(ACTIVE))
+                .values(status="failed", error="Interrompido: o servidor reiniciou", finished_at=_now())
+            )
+    purge_jobs()
+
+
+def purge_jobs(retention_hours: Optional[float] = None) -> int:
+    """Apaga jobs terminados há mais de `retention_hours` e os arquivos deles."""
+    hours = settings.jobs_retention_hours if retention_hours is None else retention_hours
+    cutoff = _now() - timedelta(hours=hours)
+    with Session(current_binds().engine) as session:
+        old = session.exec(
+            select(Job).where(Job.status.not_in(ACTIVE), Job.finished_at < cutoff)
+        ).all()
+        for job in old:
+            if job.result_file:
+                (results_dir() / job.result_file).unlink(missing_ok=True)
+            if job.kind == "import":
+                # cancelado antes de rodar: o upload ficou
+                upload = json.loads(job.params).get("upload", "")
+                if UPLOAD_NAME.fullmatch(upload):
+                    upload_path(upload).unlink(missing_ok=True)
+            session.delete(job)
+        session.commit()
+    return len(old)
@@ -0,0 +1,154 @@
+# app/live.py
+"""
+Atualizações ao vivo da UI por Server-Sent Events (GET /ui/events).
+
+Toda escrita em empresa (UI ou API) renderiza uma vez um fragmento HTML
+pequeno e o publica para as abas abertas; a extensão sse do htmx aplica as
+trocas out-of-band: a linha nova entra na tabela, a excluída sai, a alterada
+é substituída. Nenhuma aba refaz o COUNT nem a página por causa disso.
+
+A aba que fez a escrita recebe o mesmo fragmento na própria resposta e é
+pulada no broadcast (cabeçalho X-UI-Client). Importações em lote e abas que
+ficaram para trás (fila cheia) recebem "company-reload", que recarrega a
+listagem uma vez.
+
+Como o cache de respostas, o broker é por processo: com vários workers, cada
+aba só vê as escritas feitas no worker em que está conectada. Com tenants,
+cada aba só recebe as escritas do próprio tenant.
+"""
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional, Set
+
+from .database import current_tenant
+from .settings import settings
+from .templating import templates
+
+CLIENT_HEADER = "X-UI-Client"
+RELOAD_EVENT = "company-reload"
+
+
+def format_event(event: str, data: str) -> bytes:
+    # cada linha do HTML vira uma linha "data:" (o navegador junta com \n); linhas em branco não fazem falta
+    lines = [f"event: {event}"] + [f"data: {line}" for line in data.splitlines() if line.strip()]
+    if len(lines) == 1:
+        lines.append("data: ")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+RELOAD = format_event(RELOAD_EVENT, "")
+HEARTBEAT = b": ping\n\n"
+
+
+@dataclass(eq=False)
+class Subscriber:
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue
+    client: Optional[str] = None
+    tenant: Optional[str] = None
+    lagging: bool = False
+
+    def offer(self, message: bytes) -> None:
+        """Roda no loop do assinante. Fila cheia: descarta o atraso e pede uma recarga."""
+        if self.lagging:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.lagging = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RELOAD)
+
+
+@dataclass
+class EventStats:
+    published: int = 0
+    delivered: int = 0
+    reloads: int = 0
+
+
+class EventBroker:
+    """Pub/sub em memória; publish pode ser chamado de qualquer thread."""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.stats = EventStats()
+        self._subscribers: Set[Subscriber] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, client: Optional[str] = None) -> Subscriber:
+        sub = Subscriber(asyncio.get_running_loop(), asyncio.Queue(self.queue_size), client, current_tenant())
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event: str, data: str, origin: Optional[str] = None) -> None:
+        message = format_event(event, data)
+        tenant = current_tenant()
+        with self._lock:
+            targets = [
+                s for s in self._subscribers if s.tenant == tenant and (origin is None or s.client != origin)
+            ]
+        self.stats.published += 1
+        for sub in targets:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, message)
+                self.stats.delivered += 1
+            except RuntimeError:  # loop já encerrado
+                self.unsubscribe(sub)
+
+    async def stream(self, client: Optional[str] = None) -> AsyncIterator[bytes]:
+        """
+        Corpo do text/event-stream. O heartbeat mantém proxies abertos e é o que
+        detecta a aba fechada (o envio falha e o gerador é encerrado).
+        """
+        sub = self.subscribe(client)
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(sub.queue.get(), settings.ui_events_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+                    continue
+                if message is RELOAD:
+                    sub.lagging = False
+                    self.stats.reloads += 1
+                yield message
+        finally:
+            self.unsubscribe(sub)
+
+
+broker = EventBroker(settings.ui_events_queue_size)
+
+
+# ------------------- empresas ------------------- #
+
+def company_fragment(op: str, company, flash: Optional[str] = None) -> str:
+    """op: created | updated | deleted; `company` pode ser o modelo ou um dict."""
+    return templates.get_template("companies/_live.html").render(op=op, c=company, flash=flash)
+
+
+def publish_company(op: str, company, origin: Optional[str] = None) -> None:
+    """Renderiza o fragmento uma vez e manda para todas as abas menos `origin`."""
+    broker.publish(f"company-{op}", company_fragment(op, company), origin)
+
+
+def notify_company(op: str, company) -> None:
+    """Escritas da API: só renderiza se houver alguma aba ouvindo."""
+    if broker:
+        publish_company(op, company)
+
+
+def notify_company_reload() -> None:
+    if broker:
+        broker.publish(RELOAD_EVENT, "")
@@ -1,21 +1,87 @@
 ﻿from fastapi import FastAPI
-from .database import create_db_and_tables
+from anyio import to_thread
+from fastapi.responses import PlainTextResponse
+from .admission import AdmissionMiddleware, CoalescingMiddleware
+from .cache import ResponseCacheMiddleware
+from .database import create_db_and_tables, read_engine
+from .dedup import warm_dedup
+from .deal_snapshot import warm_snapshot
+from .jobs import recover_jobs, runner as job_runner
+from .metrics import MetricsMiddleware, render_metrics
+from .settings import settings
 from .routers.companies import router as companies_router
 from .routers.contacts  import router as contacts_router
 from .routers.deals     import router as deals_router
 from .routers.ui        import router as ui_router
+from .routers.changes   import router as changes_router
+from .routers.jobs      import router as jobs_router
 
 app = FastAPI(title="CRM Simplificado", version="0.1.0")
+# mais internos: limite por rota e, por fora dele, caronas em GETs idênticos (ver app/admission.py)
+app.add_middleware(AdmissionMiddleware, router_app=app)
+app.add_middleware(CoalescingMiddleware)
+# GETs de detalhe, primeira página e resumos (ver app/cache.py)
+app.add_middleware(ResponseCacheMiddleware)
+# por fora do cache: chaves e tags do cache já saem com o tenant
+if settings.multi_tenant:
+    from .tenancy import TenantMiddleware, tenant_engines
+
+    app.add_middleware(TenantMiddleware)
+# por último = mais externo: mede também o que o cache respondeu
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware, router_app=app)
 
 @app.on_event("startup")
 def on_startup():
+    if settings.multi_tenant:
+        # cada tenant monta/migra o próprio banco na primeira requisição (app/tenancy.py)
+        return
     create_db_and_tables()
+    recover_jobs()
+    if settings.dedup_warmup:
+        # índices de duplicatas em segundo plano: o startup não espera
+        warm_dedup(read_engine)
+    if settings.deal_snapshot_warmup:
+        warm_snapshot(read_engine)
+
+@app.on_event("startup")
+async def size_threadpool():
+    # os limites de admissão por rota são frações deste total
+    to_thread.current_default_thread_limiter().total_tokens = settings.threadpool_size
+
+@app.on_event("shutdown")
+def on_shutdown():
+    # cancela o que está na fila e espera os jobs em andamento pararem no próximo bloco
+    job_runner.shutdown()
+
+if settings.multi_tenant:
+    @app.on_event("shutdown")
+    async def close_tenants():
+        await tenant_engines.aclose()
 
 @app.get("/")
 def root():
     return {"ok": True, "app": "CRM", "version": "0.1.0"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # formato texto do Prometheus
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# CRM_ASYNC=1: rotas async (AsyncSession/aiosqlite) na frente; o que elas não
+# cobrem (lote, exportação) segue para os routers sync logo abaixo
+if settings.async_routes:
+    from .routers.aio import companies as aio_companies, contacts as aio_contacts
+    from .routers.aio import deals as aio_deals, ui as aio_ui
+
+    app.include_router(aio_companies.router)
+    app.include_router(aio_contacts.router)
+    app.include_router(aio_deals.router)
+    app.include_router(aio_ui.router)
+
 app.include_router(companies_router)
 app.include_router(contacts_router)
 app.include_router(deals_router)
 app.include_router(ui_router)
+app.include_router(changes_router)
+app.include_router(jobs_router)
@@ -0,0 +1,423 @@
+# app/metrics.py
+"""
+Instrumentação por requisição: latência por rota, quantidade e tempo de SQL
+por requisição e log de consultas lentas, expostos em /metrics no formato
+texto do Prometheus (e, se ligado, no cabeçalho Server-Timing).
+
+O middleware abre um RequestStats num ContextVar; os hooks de engine
+(before/after_cursor_execute, instalados em app/database.py) somam cada
+statement nele. As rotas sync rodam no threadpool com uma cópia do contexto,
+mas o objeto é o mesmo, então as somas chegam ao middleware.
+
+O custo por requisição é um par de perf_counter por statement, um bisect por
+histograma e um lock curto: pode ficar ligado em produção.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, fields
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+from .settings import settings
+
+slow_log = logging.getLogger("crm.sql.slow")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+# rota não resolvida (404, método errado): um rótulo só, sem explodir a cardinalidade
+UNMATCHED = "<unmatched>"
+MAX_LOGGED_PARAMS = 500
+
+
+@dataclass
+class RequestStats:
+    route: str = UNMATCHED
+    sql_count: int = 0
+    sql_time: float = 0.0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("crm_request_stats", default=None)
+
+
+class Histogram:
+    """Histograma cumulativo por conjunto de rótulos, no formato do Prometheus."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, List[float]] = {}  # rótulos -> [contagem por bucket..., +Inf, soma]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in sorted(items):
+            base = _labels(self.labels, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), value: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            base = _labels(self.labels, labels)
+            lines.append(f"{self.name}{{{base}}} {_number(value)}" if base else f"{self.name} {_number(value)}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    return ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REQUESTS = Counter("crm_http_requests_total", "Requisições HTTP por rota e status.", ("method", "route", "status"))
+REQUEST_LATENCY = Histogram(
+    "crm_http_request_duration_seconds", "Latência das requisições.", ("method", "route"), LATENCY_BUCKETS
+)
+REQUEST_SQL_COUNT = Histogram(
+    "crm_http_request_sql_statements", "Statements SQL por requisição.", ("method", "route"), COUNT_BUCKETS
+)
+REQUEST_SQL_TIME = Histogram(
+    "crm_http_request_sql_duration_seconds", "Tempo em SQL por requisição.", ("method", "route"), LATENCY_BUCKETS
+)
+SQL_STATEMENTS = Counter("crm_sql_statements_total", "Statements SQL executados (dentro ou fora de requisições).")
+SQL_TIME = Counter("crm_sql_duration_seconds_total", "Tempo total em SQL.")
+SQL_SLOW = Counter("crm_sql_slow_statements_total", "Statements acima de CRM_SLOW_QUERY_MS.")
+
+
+# ------------------- hooks de engine ------------------- #
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("crm_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["crm_query_start"].pop()
+    SQL_STATEMENTS.inc()
+    SQL_TIME.inc(value=elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_time += elapsed
+    if elapsed * 1000 >= settings.slow_query_ms:
+        SQL_SLOW.inc()
+        params = repr(parameters)
+        if len(params) > MAX_LOGGED_PARAMS:
+            params = params[:MAX_LOGGED_PARAMS] + "..."
+        slow_log.warning(
+            "%.1f ms [%s] %s | params=%s",
+            elapsed * 1000,
+            stats.route if stats is not None else "-",
+            " ".join(statement.split()),
+            params,
+        )
+
+
+def _handle_error(exception_context):
+    # statement que falhou não passa pelo after_cursor_execute
+    starts = exception_context.connection.info.get("crm_query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine) -> None:
+    """Liga a contagem/tempo de SQL num engine sync (ou no sync_engine de um async)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# ------------------- middleware ------------------- #
+
+def _route_template(app, scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # respondida antes do roteamento (ex.: acerto do cache): resolve o molde aqui
+    for candidate in getattr(app, "routes", ()):
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return candidate.path
+    return UNMATCHED
+
+
+def _server_timing(total: float, stats: RequestStats) -> bytes:
+    return (
+        f'app;dur={total * 1000:.1f}, db;dur={stats.sql_time * 1000:.1f};desc="{stats.sql_count} queries"'
+    ).encode()
+
+
+class MetricsMiddleware:
+    """
+    Fica por fora de todos os outros middlewares, então mede o que o cliente
+    vê, inclusive respostas servidas pelo cache.
+    """
+
+    def __init__(self, app, router_app=None, server_timing: Optional[bool] = None):
+        self.app = app
+        # o FastAPI em si, para resolver o molde da rota quando não houve roteamento
+        self.router_app = router_app
+        self.server_timing = settings.metrics_server_timing if server_timing is None else server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(time.perf_counter() - start, stats)))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            stats.route = _route_template(self.router_app, scope)
+            labels = (scope["method"], stats.route)
+            REQUESTS.inc((scope["method"], stats.route, str(status)))
+            REQUEST_LATENCY.observe(labels, elapsed)
+            REQUEST_SQL_COUNT.observe(labels, stats.sql_count)
+            REQUEST_SQL_TIME.observe(labels, stats.sql_time)
+
+
+# ------------------- exposição ------------------- #
+
+def _family(name: str, kind: str, help: str, value, label: Optional[str] = None) -> List[str]:
+    """Uma métrica no formato texto; com `label`, `value` é {valor do rótulo: número}."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    if label is None:
+        return lines + [f"{name} {_number(value)}"]
+    return lines + [f"{name}{{{_labels((label,), (key,))}}} {_number(v)}" for key, v in value.items()]
+
+
+def stats_lines(prefix: str, stats, help: Dict[str, str], label: Optional[str] = None) -> List[str]:
+    """
+    Contadores de um dataclass de estatísticas, na ordem de `help`: o campo x
+    vira {prefix}_x_total. Com `label`, `stats` é {valor do rótulo: dataclass}.
+    """
+    lines = []
+    for name, text in help.items():
+        if label is None:
+            value = getattr(stats, name)
+        else:
+            value = {key: getattr(s, name) for key, s in stats.items()}
+        lines += _family(f"{prefix}_{name}_total", "counter", text, value, label)
+    return lines
+
+
+def _summed(items: Sequence, cls):
+    """Soma campo a campo (com tenants há um por tenant aberto)."""
+    return cls(**{f.name: sum(getattr(s, f.name) for s in items) for f in fields(cls)})
+
+
+def _cache_lines() -> List[str]:
+    from .cache import response_cache
+
+    return stats_lines("crm_cache", response_cache.stats, {
+        "hits": "Leituras servidas pelo cache de respostas.",
+        "misses": "Leituras cacheáveis que foram ao handler.",
+        "not_modified": "Respostas 304.",
+        "evictions": "Entradas descartadas por tamanho.",
+        "invalidations": "Entradas derrubadas por escritas.",
+    }) + [
+        *_family("crm_cache_entries", "gauge", "Entradas no cache.", len(response_cache)),
+        *_family("crm_cache_bytes", "gauge", "Bytes de corpo no cache.", response_cache.bytes),
+    ]
+
+
+def _count_lines() -> List[str]:
+    from .counting import count_cache
+
+    return stats_lines("crm_ui_count", count_cache.stats, {
+        "hits": "Totais da UI servidos pelo cache de contagens.",
+        "misses": "Totais da UI que foram ao banco.",
+        "estimates": "Totais estimados (buscas amplas).",
+        "skipped": "Totais deduzidos da última página, sem consulta.",
+    })
+
+
+def _event_lines() -> List[str]:
+    from .live import broker
+
+    return stats_lines("crm_ui_events", broker.stats, {
+        "published": "Eventos publicados pelas escritas.",
+        "delivered": "Eventos entregues às abas (um por aba).",
+        "reloads": "Recargas por fila cheia.",
+    }) + _family("crm_ui_event_subscribers", "gauge", "Abas conectadas em /ui/events.", len(broker))
+
+
+def _render_lines() -> List[str]:
+    from .rendering import fragments
+
+    s = fragments.stats
+    return [
+        *stats_lines("crm_ui", s, {"pages": "Páginas e listagens da UI renderizadas."}),
+        *stats_lines("crm_ui_pages", s, {
+            "streamed": "Páginas enviadas em streaming.",
+            "gzipped": "Páginas enviadas com gzip.",
+        }),
+        *stats_lines("crm_ui", s, {
+            "fragment_hits": "Linhas servidas pelo cache de fragmentos.",
+            "fragment_misses": "Linhas renderizadas.",
+            "fragment_evictions": "Linhas descartadas por tamanho.",
+        }),
+        *_family("crm_ui_fragment_entries", "gauge", "Linhas no cache de fragmentos.", len(fragments)),
+        *_family("crm_ui_fragment_bytes", "gauge", "Tamanho do HTML no cache de fragmentos.", fragments.bytes),
+    ]
+
+
+def _dedup_lines() -> List[str]:
+    from .dedup import DedupStats, all_stores
+
+    # com tenants há um índice por tenant aberto: soma por entidade (a duração é a maior)
+    by_entity: Dict[str, list] = {}
+    for s in all_stores():
+        if s.index is not None:
+            by_entity.setdefault(s.spec.name, []).append(s)
+    lines = []
+    for name, help, value, combine in (
+        ("crm_dedup_index_keys", "Chaves de bloqueio no índice de duplicatas.", lambda s: s.index.size, sum),
+        ("crm_dedup_index_pending", "Registros no delta desde a última montagem.", lambda s: s.index.pending, sum),
+        ("crm_dedup_build_seconds", "Duração da última montagem do índice.", lambda s: s.index.load_seconds, max),
+    ):
+        values = {entity: combine(value(s) for s in stores) for entity, stores in by_entity.items()}
+        lines += _family(name, "gauge", help, values, "entity")
+    stats = {entity: _summed([s.stats for s in stores], DedupStats) for entity, stores in by_entity.items()}
+    return lines + stats_lines("crm_dedup", stats, {
+        "builds": "Montagens do índice.",
+        "checks": "Conferências de duplicata nos POST.",
+        "flagged": "POST com alguma possível duplicata.",
+    }, "entity")
+
+
+def _deal_snapshot_lines() -> List[str]:
+    from .deal_snapshot import SnapshotStats, all_stores
+
+    # um snapshot por engine (por tenant aberto, com tenants): soma, e a maior duração de carga
+    stores = all_stores()
+    snapshots = [s.snapshot for s in stores if s.snapshot is not None]
+    return [
+        *_family("crm_deal_snapshot_rows", "gauge", "Negócios nos snapshots em memória.",
+                 sum(len(s) for s in snapshots)),
+        *_family("crm_deal_snapshot_bytes", "gauge", "Memória dos snapshots de negócios.",
+                 sum(s.nbytes for s in snapshots)),
+        *_family("crm_deal_snapshot_load_seconds", "gauge",
+                 "Duração da última carga completa (a maior entre os snapshots).",
+                 max((s.load_seconds for s in snapshots), default=0.0)),
+        *stats_lines("crm_deal_snapshot", _summed([s.stats for s in stores], SnapshotStats), {
+            "loads": "Cargas completas do snapshot.",
+            "deltas": "Escritas aplicadas ao snapshot pelo feed de mudanças.",
+            "delta_rows": "Linhas e exclusões aplicadas pelos deltas.",
+            "views": "Consultas de previsão e facetas servidas pelo snapshot.",
+        }),
+    ]
+
+
+def _admission_lines() -> List[str]:
+    from .admission import admission, coalescer
+
+    lines = stats_lines("crm_coalesce", coalescer.stats, {
+        "leaders": "GETs coalescíveis que executaram de fato.",
+        "followers": "GETs que receberam a resposta de um idêntico.",
+        "failures": "Execuções que terminaram sem resposta completa.",
+    }) + _family("crm_coalesce_in_flight", "gauge", "Execuções coalescíveis em andamento.", len(coalescer))
+    gates = {g.name: g for g in sorted(admission.gates.values(), key=lambda g: g.name)}
+    for name, help, value in (
+        ("crm_admission_limit", "Execuções simultâneas permitidas por rota ou grupo.", lambda g: g.limit),
+        ("crm_admission_active", "Requisições executando.", lambda g: g.active),
+        ("crm_admission_waiting", "Requisições na fila de admissão.", lambda g: g.waiting),
+    ):
+        lines += _family(name, "gauge", help, {key: value(g) for key, g in gates.items()}, "route")
+    return lines + stats_lines("crm_admission", {key: g.stats for key, g in gates.items()}, {
+        "admitted": "Requisições admitidas.",
+        "queued": "Admitidas depois de esperar na fila.",
+        "rejected": "503 por fila cheia.",
+        "timeouts": "503 por prazo da fila vencido.",
+        "wait_seconds": "Tempo total de espera na fila.",
+    }, "route")
+
+
+def _tenant_lines() -> List[str]:
+    from .tenancy import tenant_engines
+
+    return _family("crm_tenant_open", "gauge", "Tenants com engines abertos (LRU).", len(tenant_engines)) + stats_lines(
+        "crm_tenant", tenant_engines.stats, {
+            "hits": "Requisições de tenants já abertos.",
+            "opens": "Aberturas de engines de tenant.",
+            "evictions": "Tenants fechados por saírem do LRU.",
+            "created": "Bancos de tenant criados.",
+            "migrations": "Bancos que passaram por create_db_and_tables.",
+            "not_found": "Requisições de tenant sem banco (404).",
+        })
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in (REQUESTS, REQUEST_LATENCY, REQUEST_SQL_COUNT, REQUEST_SQL_TIME, SQL_STATEMENTS, SQL_TIME, SQL_SLOW):
+        lines += metric.render()
+    lines += _cache_lines()
+    lines += _count_lines()
+    lines += _event_lines()
+    lines += _render_lines()
+    lines += _dedup_lines()
+    lines += _deal_snapshot_lines()
+    lines += _admission_lines()
+    if settings.multi_tenant:
+        lines += _tenant_lines()
+    return "\n".join(lines) + "\n"
+
@@ -1,7 +1,8 @@
-from typing import Optional
-from datetime import date
+from typing import Any, Dict, List, Optional, Union
+from datetime import date, datetime, timezone
 
 from pydantic import EmailStr, field_validator
+from sqlalchemy import Index, text
 from sqlmodel import SQLModel, Field, Relationship
 
 # Etapas permitidas para Deal
@@ -15,6 +16,12 @@ STAGES = [
     "contrato",
 ]
 
+def _not_null(v):
+    # PATCH: campo omitido fica como está, mas null explícito só onde a coluna aceita
+    if v is None:
+        raise ValueError("não pode ser null")
+    return v
+
 # -------------------- COMPANIES --------------------
 
 class CompanyBase(SQLModel):
@@ -25,7 +32,18 @@ class CompanyBase(SQLModel):
     notes: Optional[str] = None
 
 class Company(CompanyBase, table=True):
+    # ordenação/cursor por nome (o rowid desempata dentro do índice)
+    __table_args__ = (
+        Index("ix_company_name", "name"),
+        Index("ix_company_row_version", "row_version"),
+        # e-mail sem caixa: busca de duplicatas enquanto o índice de app/dedup.py não sobe
+        Index("ix_company_email_lower", text("lower(email)")),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    # carimbados por trigger a cada escrita (ver app/changes.py)
+    row_version: int = Field(default=0, sa_column_kwargs={"server_default": text("0")})
+    updated_at: Optional[datetime] = None
     # ⚠️ Removemos por enquanto as coleções para evitar o bug de tipagem:
     # contacts: List["Contact"] = Relationship(back_populates="company")
     # deals:    List["Deal"]    = Relationship(back_populates="company")
@@ -37,6 +55,15 @@ class CompanyCreate(CompanyBase):
 class CompanyRead(CompanyBase):
     id: int
 
+class CompanyUpdate(SQLModel):
+    name: Optional[str] = None
+    email: Optional[EmailStr] = None
+    phone: Optional[str] = None
+    website: Optional[str] = None
+    notes: Optional[str] = None
+
+    _not_null = field_validator("name")(_not_null)
+
 # -------------------- CONTACTS --------------------
 
 class ContactBase(SQLModel):
@@ -46,7 +73,15 @@ class ContactBase(SQLModel):
     role: Optional[str] = None
 
 class Contact(ContactBase, table=True):
+    __table_args__ = (
+        Index("ix_contact_company_id", "company_id"),
+        Index("ix_contact_row_version", "row_version"),
+        Index("ix_contact_email_lower", text("lower(email)")),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    row_version: int = Field(default=0, sa_column_kwargs={"server_default": text("0")})
+    updated_at: Optional[datetime] = None
     company_id: int = Field(foreign_key="company.id")
     # Relação singular (lado filho) funciona bem e já atende a API/CRUD
     company: "Company" = Relationship()
@@ -58,6 +93,15 @@ class ContactRead(ContactBase):
     id: int
     company_id: int
 
+class ContactUpdate(SQLModel):
+    name: Optional[str] = None
+    email: Optional[EmailStr] = None
+    phone: Optional[str] = None
+    role: Optional[str] = None
+    company_id: Optional[int] = None
+
+    _not_null = field_validator("name", "company_id")(_not_null)
+
 # -------------------- DEALS --------------------
 
 class DealBase(SQLModel):
@@ -77,14 +121,288 @@ class DealBase(SQLModel):
         return v
 
 class Deal(DealBase, table=True):
+    # Índices das listagens (filtros e order_by); todo índice do SQLite termina
+    # no rowid, então "coluna, id" já sai ordenado para o cursor. O de etapa
+    # cobre value/probability para os resumos por etapa não lerem a tabela.
+    __table_args__ = (
+        Index("ix_deal_company_id_stage", "company_id", "stage"),
+        Index("ix_deal_stage_value_probability", "stage", "value", "probability"),
+        Index("ix_deal_value", "value"),
+        Index("ix_deal_expected_close_date", "expected_close_date"),
+        Index("ix_deal_probability", "probability"),
+        Index("ix_deal_row_version", "row_version"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    row_version: int = Field(default=0, sa_column_kwargs={"server_default": text("0")})
+    updated_at: Optional[datetime] = None
     company_id: int = Field(foreign_key="company.id")
     # Relação singular (lado filho)
     company: "Company" = Relationship()
 
+class DealStageStats(SQLModel, table=True):
+    """
+    Agregados por etapa mantidos por triggers em app/stats.py (insert, update,
+    delete e caminhos em lote), lidos pelos endpoints de resumo.
+    """
+    __tablename__ = "deal_stage_stats"
+
+    stage: str = Field(primary_key=True)
+    deal_count: int = 0
+    value_sum: float = 0.0
+    weighted_sum: float = 0.0  # soma de value * probability
+
 class DealCreate(DealBase):
     company_id: int
 
 class DealRead(DealBase):
     id: int
     company_id: int
+
+class DealUpdate(SQLModel):
+    title: Optional[str] = None
+    value: Optional[float] = Field(default=None, ge=0)
+    stage: Optional[str] = None
+    probability: Optional[int] = Field(default=None, ge=0, le=100)
+    expected_close_date: Optional[date] = None
+    owner: Optional[str] = None
+    notes: Optional[str] = None
+    company_id: Optional[int] = None
+
+    _not_null = field_validator("title", "value", "stage", "probability", "company_id")(_not_null)
+
+    @field_validator("stage")
+    @classmethod
+    def validate_stage(cls, v: Optional[str]) -> Optional[str]:
+        return DealBase.validate_stage(v)
+
+# -------------------- CHANGE FEED --------------------
+
+class ChangeSequence(SQLModel, table=True):
+    """
+    Contador global do feed de mudanças (linha única). pruned_through é a
+    última versão cujas tombstones já foram descartadas.
+    """
+    __tablename__ = "change_seq"
+
+    id: int = Field(default=1, primary_key=True)
+    version: int = 0
+    pruned_through: int = 0
+
+class ChangeTombstone(SQLModel, table=True):
+    """Exclusões de company/contact/deal, gravadas por trigger para o feed."""
+    __tablename__ = "change_tombstone"
+    __table_args__ = (Index("ix_change_tombstone_row_version", "row_version"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    entity: str
+    entity_id: int
+    row_version: int
+    deleted_at: datetime
+
+# -------------------- EXPAND / OVERVIEW --------------------
+
+class ContactReadWithCompany(ContactRead):
+    # só vem com ?expand=company
+    company: Optional[CompanyRead] = None
+
+class DealReadWithCompany(DealRead):
+    company: Optional[CompanyRead] = None
+
+class StageTotals(SQLModel):
+    deal_count: int = 0
+    value_sum: float = 0.0
+
+class CompanyOverview(SQLModel):
+    company: CompanyRead
+    contacts: List[ContactRead]
+    deals: List[DealRead]
+    # todas as etapas, zeradas quando a empresa não tem negócios nelas
+    stages: Dict[str, StageTotals]
+
+# -------------------- DUPLICATES --------------------
+
+class CompanyDuplicate(SQLModel):
+    score: float
+    reasons: List[str]  # email | domain | name
+    a: CompanyRead
+    b: CompanyRead
+
+class CompanyDuplicates(SQLModel):
+    candidate_count: int  # pares comparados (dividem alguma chave de bloqueio)
+    pair_count: int  # pares com score >= min_score, antes do limit
+    pairs: List[CompanyDuplicate]
+
+class ContactDuplicate(SQLModel):
+    score: float
+    reasons: List[str]  # email | name
+    a: ContactRead
+    b: ContactRead
+
+class ContactDuplicates(SQLModel):
+    candidate_count: int
+    pair_count: int
+    pairs: List[ContactDuplicate]
+
+# -------------------- FORECAST --------------------
+
+class ForecastRow(SQLModel):
+    # chave do grupo, ex.: {"month": "2025-03", "owner": "Ana"}; vazia nos totais
+    group: Dict[str, Optional[Union[str, int]]] = {}
+    deal_count: int = 0
+    value_sum: float = 0.0
+    weighted_value: float = 0.0  # soma de value * probability / 100
+
+class ForecastResult(SQLModel):
+    group_by: List[str]
+    rows: List[ForecastRow]
+    group_count: int  # grupos antes do limit
+    totals: ForecastRow
+    engine: str  # "numpy" (snapshot em memória) ou "sql"
+    snapshot_age: Optional[float] = None  # segundos desde a carga completa (as escritas seguintes já entram)
+    version: Optional[int] = None  # versão do feed de mudanças refletida no snapshot
+
+# -------------------- FACETS --------------------
+
+class FacetCount(SQLModel):
+    value: Optional[Union[str, int]] = None  # etapa, vendedor (null = sem vendedor) ou id da empresa
+    deal_count: int = 0
+    value_sum: float = 0.0
+
+class CompanyFacetCount(FacetCount):
+    name: Optional[str] = None
+
+class ValueBucketCount(SQLModel):
+    min_value: Optional[float] = None  # inclusive; null = sem piso
+    max_value: Optional[float] = None  # exclusivo; null = sem teto
+    deal_count: int = 0
+    value_sum: float = 0.0
+
+class DealFacets(SQLModel):
+    totals: FacetCount  # todos os filtros aplicados
+    stage: List[FacetCount]  # todas as etapas, na ordem do funil
+    owner: List[FacetCount]  # mais negócios primeiro, até facet_limit
+    owner_count: int  # vendedores distintos antes do limit
+    company: List[CompanyFacetCount]
+    company_count: int
+    value: List[ValueBucketCount]
+    engine: str  # "numpy" (snapshot em memória) ou "sql"
+    version: Optional[int] = None  # versão do feed de mudanças refletida no snapshot
+
+# -------------------- BULK --------------------
+
+class BulkError(SQLModel):
+    row: int
+    detail: str
+
+class BulkResult(SQLModel):
+    inserted: int = 0
+    error_count: int = 0
+    # limitado a app.bulk.MAX_REPORTED_ERRORS; error_count traz o total
+    errors: List[BulkError] = Field(default_factory=list)
+
+class DealBulkUpdate(SQLModel):
+    # o que /deals/bulk-update pode mudar em massa; campos omitidos ficam como estão
+    stage: Optional[str] = None
+    probability: Optional[int] = Field(default=None, ge=0, le=100)
+    owner: Optional[str] = None
+
+    _not_null = field_validator("stage", "probability")(_not_null)
+
+    @field_validator("stage")
+    @classmethod
+    def validate_stage(cls, v: Optional[str]) -> Optional[str]:
+        return DealBase.validate_stage(v)
+
+class BulkUpdateResult(SQLModel):
+    updated: int = 0
+
+class BulkDelete(SQLModel):
+    # corpo de /{entity}/bulk-delete; com ids, só os que também casam com os filtros da query string
+    ids: Optional[List[int]] = None
+    archive: bool = False  # grava as linhas apagadas (e os dependentes) num NDJSON antes de cada commit
+
+class BulkDeleteResult(SQLModel):
+    companies: int = 0
+    contacts: int = 0
+    deals: int = 0
+    transactions: int = 0  # lotes gravados (ver app/bulk_delete.py)
+    archive: Optional[str] = None  # nome do arquivo em CRM_BULK_DELETE_ARCHIVE_DIR
+
+# -------------------- JOBS --------------------
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+
+class Job(SQLModel, table=True):
+    """Operação em segundo plano (app/jobs.py); o resultado fica num arquivo em CRM_JOBS_DIR."""
+    __table_args__ = (Index("ix_job_status_finished", "status", "finished_at"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str
+    params: str = "{}"  # JSON
+    status: str = "queued"
+    cancel_requested: bool = False
+    owner_pid: Optional[int] = None  # processo que roda o job (ver app.jobs.recover_jobs)
+    done: int = 0
+    total: Optional[int] = None
+    message: Optional[str] = None
+    error: Optional[str] = None
+    result_file: Optional[str] = None
+    result_media_type: Optional[str] = None
+    result_bytes: Optional[int] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class JobCreate(SQLModel):
+    kind: str
+    params: Dict[str, Any] = {}
+
+class JobRead(SQLModel):
+    id: int
+    kind: str
+    params: Dict[str, Any]
+    status: str
+    cancel_requested: bool = False
+    done: int
+    total: Optional[int] = None
+    progress: Optional[float] = None  # done / total, quando o total é conhecido
+    message: Optional[str] = None
+    error: Optional[str] = None
+    result_url: Optional[str] = None  # só com status succeeded
+    result_bytes: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class ExportJobParams(SQLModel):
+    # mesmos filtros de GET /{entity}/export
+    entity: str = "deals"
+    format: str = "csv"
+    q: Optional[str] = None
+    company_id: Optional[int] = None
+    stage: Optional[str] = None
+    min_value: Optional[float] = Field(default=None, ge=0)
+    max_value: Optional[float] = Field(default=None, ge=0)
+
+class ImportJobParams(SQLModel):
+    # o arquivo vem de POST /jobs/import/{entity}, gravado em CRM_JOBS_DIR
+    entity: str = "deals"
+    format: str = "ndjson"
+    upload: str
+
+class ForecastJobParams(SQLModel):
+    # mesmos parâmetros de GET /deals/forecast
+    group_by: List[str] = ["month"]
+    company_id: Optional[List[int]] = None
+    stage: Optional[List[str]] = None
+    owner: Optional[List[str]] = None
+    min_value: Optional[float] = Field(default=None, ge=0)
+    max_value: Optional[float] = Field(default=None, ge=0)
+    min_probability: Optional[int] = Field(default=None, ge=0, le=100)
+    max_probability: Optional[int] = Field(default=None, ge=0, le=100)
+    close_from: Optional[date] = None
+    close_to: Optional[date] = None
+    order_by: str = "key"
+    limit: int = Field(default=100_000, ge=1, le=1_000_000)
+    engine: str = "auto"
@@ -0,0 +1,207 @@
+# app/pagination.py
+"""
+Paginação por cursor (keyset) para os endpoints de listagem.
+
+O cursor é opaco para o cliente: guarda a ordenação usada e a chave
+(valor da coluna ordenada, id) do último item da página. A próxima página
+começa logo depois dessa chave, então o SQLite não precisa ler e descartar
+as linhas anteriores como acontece com OFFSET.
+"""
+import base64
+import json
+from datetime import date
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(order_key: str, desc: bool, value: Any, last_id: int) -> str:
+    if isinstance(value, date):
+        value = value.isoformat()
+    raw = json.dumps([order_key, bool(desc), value, last_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order_key: str, desc: bool) -> Tuple[Any, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key, cur_desc, value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Cursor inválido")
+    if key != order_key or cur_desc != bool(desc) or not isinstance(last_id, int):
+        raise HTTPException(400, "Cursor não corresponde à ordenação pedida")
+    if isinstance(value, (list, dict)):
+        raise HTTPException(400, "Cursor inválido")
+    return value, last_id
+
+
+def _python_type(col) -> Optional[type]:
+    try:
+        return col.type.python_type
+    except (AttributeError, NotImplementedError):
+        return None
+
+
+def _nullable(col) -> bool:
+    return getattr(getattr(col, "expression", col), "nullable", True)
+
+
+def keyset_page(stmt, order_col, id_col, desc: bool, order_key: str, cursor: Optional[str]):
+    """
+    Ordena por (order_col, id) e, se houver cursor, filtra a partir da última chave.
+    O id desempata valores repetidos para a ordem ser total e estável.
+    """
+    if order_col is id_col:
+        stmt = stmt.order_by(id_col.desc() if desc else id_col.asc())
+    else:
+        stmt = stmt.order_by(
+            order_col.desc() if desc else order_col.asc(),
+            id_col.desc() if desc else id_col.asc(),
+        )
+    if not cursor:
+        return stmt
+
+    value, last_id = decode_cursor(cursor, order_key, desc)
+    if order_col is id_col:
+        return stmt.where(id_col < last_id if desc else id_col > last_id)
+
+    if value is not None and _python_type(order_col) is date:
+        try:
+            value = date.fromisoformat(value)
+        except (ValueError, TypeError):
+            raise HTTPException(400, "Cursor inválido")
+
+    # no SQLite NULL vem antes de tudo no ASC e depois de tudo no DESC
+    if value is None:
+        if desc:
+            return stmt.where(and_(order_col.is_(None), id_col < last_id))
+        return stmt.where(or_(order_col.is_not(None), and_(order_col.is_(None), id_col > last_id)))
+
+    if desc:
+        cond = tuple_(order_col, id_col) < tuple_(value, last_id)
+        if _nullable(order_col):
+            cond = or_(cond, order_col.is_(None))
+        return stmt.where(cond)
+    return stmt.where(tuple_(order_col, id_col) > tuple_(value, last_id))
+
+
+def split_page(
+    rows: Sequence[Any],
+    limit: int,
+    order_key: str,
+    desc: bool,
+    key: Optional[Callable[[Any], Tuple[Any, int]]] = None,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Recebe até limit+1 linhas e devolve (página, próximo cursor).
+    O cursor só existe quando a linha extra mostra que há mais resultados.
+    """
+    items = list(rows[:limit])
+    if len(rows) <= limit or not items:
+        return items, None
+    key = key or (lambda obj: (getattr(obj, order_key), obj.id))
+    value, last_id = key(items[-1])
+    return items, encode_cursor(order_key, desc, value, last_id)
+
+
+def _page_statements(stmt, order_col, id_col, desc, order_key, limit, cursor, offset):
+    stmt = keyset_page(stmt, order_col, id_col, desc, order_key, cursor)
+    if not cursor:
+        stmt = stmt.offset(offset)
+    # a coluna ordenada vem junto (pode não ser atributo da entidade, ex.: relevância)
+    with_key = order_col is not id_col
+    if with_key:
+        stmt = stmt.add_columns(order_col)
+    return stmt.limit(limit + 1), with_key
+
+
+def _split_rows(rows, limit, order_key, desc, with_key):
+    if not with_key:
+        return split_page(rows, limit, order_key, desc, key=lambda obj: (obj.id, obj.id))
+    items, next_cursor = split_page(rows, limit, order_key, desc, key=lambda row: (row[1], row[0].id))
+    return [row[0] for row in items], next_cursor
+
+
+def _split_flat(rows, limit, order_key, desc, with_key):
+    # linhas de colunas (..., id, ...[, valor ordenado]) em vez de entidades
+    if not with_key:
+        return split_page(rows, limit, order_key, desc, key=lambda row: (row.id, row.id))
+    items, next_cursor = split_page(rows, limit, order_key, desc, key=lambda row: (row[-1], row.id))
+    return [row[:-1] for row in items], next_cursor
+
+
+def fetch_page(
+    session,
+    stmt,
+    order_col,
+    id_col,
+    desc: bool,
+    order_key: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Executa uma página de `stmt` (select de uma entidade) e devolve (itens, próximo cursor).
+    Sem cursor mantém o offset antigo; a linha extra indica se há próxima página.
+    """
+    page, with_key = _page_statements(stmt, order_col, id_col, desc, order_key, limit, cursor, offset)
+    # execute() em vez de exec() para receber as tuplas (entidade, valor)
+    rows = session.execute(page).all() if with_key else session.exec(page).all()
+    return _split_rows(rows, limit, order_key, desc, with_key)
+
+
+async def afetch_page(
+    session,
+    stmt,
+    order_col,
+    id_col,
+    desc: bool,
+    order_key: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+) -> Tuple[List[Any], Optional[str]]:
+    """Versão de fetch_page para AsyncSession."""
+    page, with_key = _page_statements(stmt, order_col, id_col, desc, order_key, limit, cursor, offset)
+    rows = (await session.execute(page)).all() if with_key else (await session.exec(page)).all()
+    return _split_rows(rows, limit, order_key, desc, with_key)
+
+
+def fetch_rows(
+    session,
+    stmt,
+    order_col,
+    id_col,
+    desc: bool,
+    order_key: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Como fetch_page, mas `stmt` seleciona colunas soltas (uma delas "id"):
+    devolve tuplas, sem montar objetos ORM.
+    """
+    page, with_key = _page_statements(stmt, order_col, id_col, desc, order_key, limit, cursor, offset)
+    return _split_flat(session.execute(page).all(), limit, order_key, desc, with_key)
+
+
+async def afetch_rows(
+    session,
+    stmt,
+    order_col,
+    id_col,
+    desc: bool,
+    order_key: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+) -> Tuple[List[Any], Optional[str]]:
+    """Versão de fetch_rows para AsyncSession."""
+    page, with_key = _page_statements(stmt, order_col, id_col, desc, order_key, limit, cursor, offset)
+    rows = (await session.execute(page)).all()
+    return _split_flat(rows, limit, order_key, desc, with_key)
@@ -0,0 +1,176 @@
+# app/query_plans.py
+"""
+Regressão de planos de consulta das listagens.
+
+Monta, com os mesmos builders dos routers, toda combinação de filtros,
+order_by, direção e modo de paginação (offset e cursor) de list_deals,
+list_contacts e list_companies, roda EXPLAIN QUERY PLAN num banco vazio com o
+esquema atual e falha se alguma delas cair em varredura da tabela.
+
+A única varredura aceita é a listagem sem filtro andando pelo índice da
+própria ordenação (para no LIMIT). Com filtro, a tabela tem que ser acessada
+por busca (SEARCH) em algum índice ou pela chave primária a partir do FTS.
+
+    python -m app.query_plans          # sai com código 1 se houver regressão
+    python -m app.query_plans -v       # mostra todos os planos
+
+O mesmo conjunto roda no pytest (tests/test_query_plans.py), um caso por
+statement.
+"""
+import sys
+from datetime import date
+from itertools import combinations, product
+from typing import Dict, Iterator, List, Tuple
+
+from sqlmodel import create_engine
+
+from .changes import CHANGE_TABLES, change_statements
+from .database import create_db_and_tables
+from .dedup import ENTITIES as DEDUP_ENTITIES
+from .dedup import exact_match_stmt
+from .pagination import encode_cursor, keyset_page
+from .routers.companies import build_company_query, overview_queries
+from .routers.contacts import build_contact_query
+from .routers.deals import STAGE_COUNTS_STMT, STAGE_VALUES_STMT, build_deal_query
+
+DEAL_FILTERS = {
+    "company_id": 1,
+    "stage": "proposta",
+    "q": "projeto",
+    "min_value": 1000.0,
+    "max_value": 50000.0,
+}
+CONTACT_FILTERS = {"q": "ana", "company_id": 1}
+COMPANY_FILTERS = {"q": "tech"}
+
+# valor de exemplo por chave de ordenação, para montar um cursor válido
+CURSOR_SAMPLES = {
+    "id": 1,
+    "name": "m",
+    "value": 1000.0,
+    "expected_close_date": date(2025, 1, 1),
+    "probability": 50,
+    "relevance": -1.0,
+}
+
+LIMIT = 51
+
+
+def _subsets(filters: Dict[str, object]) -> Iterator[Dict[str, object]]:
+    keys = list(filters)
+    for n in range(len(keys) + 1):
+        for combo in combinations(keys, n):
+            yield {k: filters[k] for k in combo}
+
+
+def list_statements() -> Iterator[Tuple[str, str, bool, object]]:
+    """Gera (tabela base, descrição, tem filtro?, statement) para cada combinação."""
+    builders = [
+        ("deal", build_deal_query, DEAL_FILTERS),
+        ("contact", build_contact_query, CONTACT_FILTERS),
+        ("company", build_company_query, COMPANY_FILTERS),
+    ]
+    for base, build, filters in builders:
+        for kwargs in _subsets(filters):
+            stmt, order_map = build(**kwargs)
+            id_col = order_map["id"]
+            for order_key, desc, paging in product(order_map, (False, True), ("offset", "cursor")):
+                # contatos só ordenam por id ascendente
+                if base == "contact" and desc:
+                    continue
+                cursor = None
+                if paging == "cursor":
+                    cursor = encode_cursor(order_key, desc, CURSOR_SAMPLES[order_key], 1)
+                page = keyset_page(stmt, order_map[order_key], id_col, desc, order_key, cursor)
+                page = page.limit(LIMIT) if cursor else page.offset(LIMIT).limit(LIMIT)
+                label = f"{base} filters={sorted(kwargs)} order_by={order_key} desc={desc} {paging}"
+                yield base, label, bool(kwargs), page
+
+
+def summary_statements() -> Iterator[Tuple[str, str, bool, object]]:
+    # os do router: leem deal_stage_stats (uma linha por etapa) e nunca podem voltar a varrer deal
+    yield "deal", "stage-counts", True, STAGE_COUNTS_STMT
+    yield "deal", "stage-values", True, STAGE_VALUES_STMT
+
+
+def overview_statements() -> Iterator[Tuple[str, str, bool, object]]:
+    queries = overview_queries(1, LIMIT)
+    for (name, stmt), base in zip(queries._asdict().items(), ("company", "contact", "deal", "deal")):
+        yield base, f"overview {name}", True, stmt
+
+
+def changes_statements() -> Iterator[Tuple[str, str, bool, object]]:
+    for base, _, stmt in change_statements(10, 20, LIMIT, list(CHANGE_TABLES)):
+        base = base or "change_tombstone"
+        yield base, f"changes {base}", True, stmt
+
+
+def dedup_statements() -> Iterator[Tuple[str, str, bool, object]]:
+    # a conferência de duplicatas enquanto o índice de app/dedup.py não sobe
+    record = {"id": 1, "name": "Acme", "email": "Ana+crm@Acme.com", "website": None, "company_id": 1}
+    for base, spec in DEDUP_ENTITIES.items():
+        yield base, f"dedup {base}", True, exact_match_stmt(spec, record, 1)
+
+
+def explain(conn, stmt) -> List[str]:
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = [compiled.params[name] for name in compiled.positiontup]
+    params = [p.isoformat() if isinstance(p, date) else p for p in params]
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), tuple(params)).all()
+    return [row[-1] for row in rows]
+
+
+def table_scans(base: str, filtered: bool, plan: List[str]) -> List[str]:
+    """Linhas do plano que leem a tabela inteira (ou um índice inteiro, quando há filtro)."""
+    bad = []
+    for line in plan:
+        if line == f"SCAN {base}":
+            # sem filtro e sem ordenação extra é só o LIMIT andando pelo rowid
+            if filtered or any("TEMP B-TREE" in other for other in plan):
+                bad.append(line)
+        elif line.startswith(f"SCAN {base} USING") and filtered and "COVERING INDEX" not in line:
+            bad.append(line)
+    return bad
+
+
+def all_statements() -> Iterator[Tuple[str, str, bool, object]]:
+    for statements in (list_statements(), summary_statements(), overview_statements(), changes_statements(),
+                       dedup_statements()):
+        yield from statements
+
+
+def plan_engine():
+    """Banco em memória, vazio, com o esquema atual (tabelas, índices, FTS e triggers)."""
+    engine = create_engine("sqlite://")
+    create_db_and_tables(engine)
+    return engine
+
+
+def check(verbose: bool = False) -> List[str]:
+    engine = plan_engine()
+    failures = []
+    with engine.connect() as conn:
+        for base, label, filtered, stmt in all_statements():
+            plan = explain(conn, stmt)
+            bad = table_scans(base, filtered, plan)
+            if bad:
+                failures.append(f"{label}: {'; '.join(plan)}")
+            if verbose:
+                print(("FAIL " if bad else "ok   ") + label)
+                for line in plan:
+                    print("       " + line)
+    return failures
+
+
+def main():
+    failures = check(verbose="-v" in sys.argv[1:])
+    for failure in failures:
+        print("TABLE SCAN", failure)
+    if failures:
+        print(f"{len(failures)} plano(s) com varredura de tabela.")
+        sys.exit(1)
+    print("Nenhuma listagem cai em varredura de tabela.")
+
+
+if __name__ == "__main__":
+    main()
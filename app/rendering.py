@@ -0,0 +1,198 @@
+# app/rendering.py
+"""
+Páginas da UI (empresas, contatos e negócios) sobre o ambiente de
+app/templating.py.
+
+- Cache de fragmentos: o HTML de cada linha das tabelas fica num LRU limitado
+  em bytes (CRM_UI_FRAGMENT_CACHE_BYTES), com chave (tenant, template, id,
+  row_version, extras). row_version muda a cada escrita na linha (triggers de
+  app/changes.py): linha inalterada não é renderizada de novo e linha
+  alterada nunca sai velha. `extras` leva o que a linha mostra de outra
+  tabela (o nome da empresa).
+- Streaming: página com pelo menos CRM_UI_STREAM_ROWS linhas sai por
+  Template.generate(), em blocos de STREAM_CHUNK bytes; as menores saem de uma
+  vez, com Content-Length.
+- gzip quando o cliente aceita e o corpo passa de CRM_UI_GZIP_MIN_BYTES; em
+  streaming, cada bloco sai comprimido com Z_SYNC_FLUSH e o navegador já
+  mostra o começo da tabela.
+"""
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+from urllib.parse import urlencode
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from markupsafe import Markup
+
+from .database import current_tenant
+from .settings import settings
+from .templating import templates
+
+STREAM_CHUNK = 16 * 1024
+
+
+@dataclass
+class RenderStats:
+    pages: int = 0
+    streamed: int = 0
+    gzipped: int = 0
+    fragment_hits: int = 0
+    fragment_misses: int = 0
+    fragment_evictions: int = 0
+
+
+class FragmentCache:
+    """LRU de HTML de linhas; o tamanho conta caracteres (≈ bytes no HTML da UI)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.stats = RenderStats()
+        self._entries: "OrderedDict[tuple, str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def render(
+        self, name: str, items: Iterable[Any], key: Callable[[Any], tuple], context: Callable[[Any], dict]
+    ) -> List[Markup]:
+        """
+        Uma linha de `name` por item. `key(item)` identifica a versão da linha
+        (id, row_version e extras); `context(item)` é o contexto do template.
+        """
+        items = list(items)
+        tenant = current_tenant()
+        keys = [(tenant, name, *key(item)) for item in items]
+        out: List[Optional[str]] = []
+        with self._lock:
+            for k in keys:
+                html = self._entries.get(k)
+                if html is not None:
+                    self._entries.move_to_end(k)
+                out.append(html)
+        missing = [i for i, html in enumerate(out) if html is None]
+        self.stats.fragment_hits += len(out) - len(missing)
+        self.stats.fragment_misses += len(missing)
+        if missing:
+            # fora do lock: renderizar é o caro
+            template = templates.get_template(name)
+            for i in missing:
+                out[i] = template.render(context(items[i]))
+            if self.max_bytes:
+                self._put([(keys[i], out[i]) for i in missing])
+        return [Markup(html) for html in out]
+
+    def _put(self, entries) -> None:
+        with self._lock:
+            for k, html in entries:
+                old = self._entries.pop(k, None)
+                if old is not None:
+                    self._bytes -= len(old)
+                self._entries[k] = html
+                self._bytes += len(html)
+            while self._bytes > self.max_bytes and self._entries:
+                _, html = self._entries.popitem(last=False)
+                self._bytes -= len(html)
+                self.stats.fragment_evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+fragments = FragmentCache(settings.ui_fragment_cache_bytes)
+
+
+# ------------------- páginas ------------------- #
+
+def _query_value(value: Any) -> str:
+    return ("true" if value else "false") if isinstance(value, bool) else str(value)
+
+
+def page_context(
+    base_url: str,
+    rows: List[Markup],
+    total,
+    next_cursor: Optional[str],
+    page: int,
+    size: int,
+    filters: dict,
+    **extra,
+) -> dict:
+    """
+    Contexto das listagens: `filters` volta para o formulário e para os links
+    da paginação; `total` é um app.counting.Total.
+    """
+    params = {**filters, "size": size}
+    return {
+        **filters,
+        **extra,
+        "rows": rows,
+        "base_url": base_url,
+        "query": urlencode({k: _query_value(v) for k, v in params.items() if v not in (None, "")}),
+        "page": page,
+        "size": size,
+        "total": total.value,
+        "total_exact": total.exact,
+        "has_prev": page > 1,
+        "has_next": next_cursor is not None,
+        "next_cursor": next_cursor,
+    }
+
+
+def accepts_gzip(request: Request) -> bool:
+    return "gzip" in request.headers.get("accept-encoding", "").lower()
+
+
+def _blocks(pieces: Iterator[str]) -> Iterator[bytes]:
+    # generate() entrega pedaços de poucos bytes: junta antes de mandar
+    buf: List[str] = []
+    size = 0
+    for piece in pieces:
+        buf.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK:
+            yield "".join(buf).encode()
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode()
+
+
+def _gzip_blocks(blocks: Iterator[bytes]) -> Iterator[bytes]:
+    z = zlib.compressobj(settings.ui_gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        yield z.compress(block) + z.flush(zlib.Z_SYNC_FLUSH)
+    yield z.flush()
+
+
+def render_page(request: Request, name: str, ctx: dict) -> Response:
+    """Renderiza `name`; em streaming se a página tiver linhas demais, com gzip se couber."""
+    stats = fragments.stats
+    stats.pages += 1
+    template = templates.get_template(name)
+    gzip_ok = accepts_gzip(request)
+    headers = {"Vary": "Accept-Encoding"}
+    if len(ctx.get("rows", ())) >= settings.ui_stream_rows:
+        stats.streamed += 1
+        body = _blocks(template.generate(ctx))
+        if gzip_ok:
+            stats.gzipped += 1
+            body = _gzip_blocks(body)
+            headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(body, media_type="text/html; charset=utf-8", headers=headers)
+    content = template.render(ctx).encode()
+    if gzip_ok and len(content) >= settings.ui_gzip_min_bytes:
+        stats.gzipped += 1
+        content = gzip.compress(content, settings.ui_gzip_level, mtime=0)
+        headers["Content-Encoding"] = "gzip"
+    return HTMLResponse(content, headers=headers)
@@ -0,0 +1,3 @@
+# Versões async (AsyncSession + aiosqlite) das rotas de leitura e CRUD.
+# Ativadas com CRM_ASYNC=1; as rotas que não estão aqui (lote, exportação)
+# continuam atendidas pelos routers sync, incluídos depois em app/main.py.
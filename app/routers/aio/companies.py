@@ -0,0 +1,112 @@
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ...models import Company, CompanyCreate, CompanyOverview, CompanyRead, CompanyUpdate
+from ...database import current_binds, get_async_session
+from ...pagination import NEXT_CURSOR_HEADER, afetch_rows
+from ...serialization import (
+    json_response, patch_miss, read_select, returned_response, returned_row, rows_response, update_returning,
+)
+from ..companies import OVERVIEW_LIMIT, build_company_query, overview_payload, overview_queries
+from ...bulk_delete import company_cascade, invalidate_dependents
+from ...cache import invalidate_company
+from ...live import notify_company
+from ...dedup import check_duplicates, report_duplicates
+from ...settings import settings
+
+router = APIRouter(prefix="/companies", tags=["companies"])
+
+@router.post("/", response_model=CompanyRead, status_code=201)
+async def create_company(data: CompanyCreate, response: Response, session: AsyncSession = Depends(get_async_session)):
+    company = Company.model_validate(data)
+    session.add(company)
+    await session.commit()
+    invalidate_company()
+    await session.refresh(company)
+    notify_company("created", company)
+    if settings.dedup_check_on_create:
+        ids = await run_in_threadpool(check_duplicates, current_binds().read_engine, "company", company)
+        report_duplicates(response, ids)
+    return company
+
+@router.get("/", response_model=List[CompanyRead])
+async def list_companies(
+    session: AsyncSession = Depends(get_async_session),
+    q: Optional[str] = Query(None, description="Busca por nome (prefixo das palavras)"),
+    order_by: str = Query("id", description="Campos: id|name|relevance (com q)"),
+    desc: bool = Query(False, description="Ordenação descrescente"),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description=f"Cursor opaco recebido em {NEXT_CURSOR_HEADER}; substitui offset"),
+):
+    stmt, order_map = build_company_query(q)
+    order_key = order_by if order_by in order_map else "id"
+    cols, fields = read_select(stmt, CompanyRead)
+    rows, next_cursor = await afetch_rows(
+        session, cols, order_map[order_key], Company.id, desc, order_key, limit, cursor, offset
+    )
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return rows_response(fields, rows, headers)
+
+# ":int" deixa /companies/export e /companies/bulk caírem no router sync
+@router.get("/{company_id:int}", response_model=CompanyRead)
+async def get_company(company_id: int, session: AsyncSession = Depends(get_async_session)):
+    company = await session.get(Company, company_id)
+    if not company:
+        raise HTTPException(404, "Company not found")
+    return company
+
+@router.get("/{company_id:int}/overview", response_model=CompanyOverview)
+async def company_overview(
+    company_id: int,
+    limit: int = Query(OVERVIEW_LIMIT, ge=1, le=1000, description="Máximo de contatos e de negócios listados"),
+    session: AsyncSession = Depends(get_async_session),
+):
+    queries = overview_queries(company_id, limit)
+    company = (await session.execute(queries.company)).first()
+    if not company:
+        raise HTTPException(404, "Company not found")
+    rest = [(await session.execute(stmt)).all() for stmt in queries[1:]]
+    return json_response(overview_payload(company, *rest))
+
+@router.put("/{company_id:int}", response_model=CompanyRead)
+async def update_company(company_id: int, data: CompanyCreate, session: AsyncSession = Depends(get_async_session)):
+    company = await session.get(Company, company_id)
+    if not company:
+        raise HTTPException(404, "Company not found")
+    for k, v in data.model_dump(exclude_unset=True).items():
+        setattr(company, k, v)
+    session.add(company)
+    await session.commit()
+    invalidate_company(company_id)
+    await session.refresh(company)
+    notify_company("updated", company)
+    return company
+
+@router.patch("/{company_id:int}", response_model=CompanyRead)
+async def patch_company(company_id: int, data: CompanyUpdate, session: AsyncSession = Depends(get_async_session)):
+    changes = data.model_dump(exclude_unset=True)
+    stmt, fields = update_returning(Company, CompanyRead, company_id, changes)
+    row = (await session.execute(stmt)).first()
+    if not row:
+        raise patch_miss(False, "Company not found", changes)
+    if not changes:
+        return returned_response(CompanyRead, fields, row)
+    await session.commit()
+    invalidate_company(company_id)
+    notify_company("updated", returned_row(CompanyRead, fields, row))
+    return returned_response(CompanyRead, fields, row)
+
+@router.delete("/{company_id:int}", status_code=204)
+async def delete_company(company_id: int, session: AsyncSession = Depends(get_async_session)):
+    company = await session.get(Company, company_id)
+    if not company:
+        raise HTTPException(404, "Company not found")
+    removed = [(await session.execute(stmt)).rowcount for stmt in company_cascade([company_id])]
+    await session.delete(company)
+    await session.commit()
+    invalidate_company(company_id)
+    invalidate_dependents(removed)
+    notify_company("deleted", {"id": company_id})
+    return
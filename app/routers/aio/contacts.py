@@ -0,0 +1,95 @@
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ...models import Contact, ContactCreate, ContactRead, ContactReadWithCompany, ContactUpdate
+from ...database import current_binds, get_async_session
+from ...pagination import NEXT_CURSOR_HEADER, afetch_rows
+from ...serialization import json_response, patch_miss, read_select, returned_response, update_returning
+from ...expand import EXPAND_DESCRIPTION, aexpand_rows, parse_expand
+from ..contacts import build_contact_query
+from ...cache import invalidate_contact
+from ...dedup import check_duplicates, report_duplicates
+from ...settings import settings
+
+router = APIRouter(prefix="/contacts", tags=["contacts"])
+
+@router.post("/", response_model=ContactRead, status_code=201)
+async def create_contact(data: ContactCreate, response: Response, session: AsyncSession = Depends(get_async_session)):
+    contact = Contact.model_validate(data)
+    session.add(contact)
+    await session.commit()
+    invalidate_contact()
+    await session.refresh(contact)
+    if settings.dedup_check_on_create:
+        ids = await run_in_threadpool(check_duplicates, current_binds().read_engine, "contact", contact)
+        report_duplicates(response, ids)
+    return contact
+
+@router.get("/", response_model=List[ContactReadWithCompany])
+async def list_contacts(
+    session: AsyncSession = Depends(get_async_session),
+    q: Optional[str] = Query(None, description="Busca por nome ou e-mail"),
+    company_id: Optional[int] = Query(None, description="Filtrar por empresa"),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description=f"Cursor opaco recebido em {NEXT_CURSOR_HEADER}; substitui offset"),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+):
+    expanded = parse_expand(expand)
+    stmt, _ = build_contact_query(q, company_id)
+    cols, fields = read_select(stmt, ContactRead)
+    rows, next_cursor = await afetch_rows(session, cols, Contact.id, Contact.id, False, "id", limit, cursor, offset)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return json_response(await aexpand_rows(session, fields, rows, expanded), headers)
+
+@router.get("/{contact_id:int}", response_model=ContactReadWithCompany)
+async def get_contact(
+    contact_id: int,
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    session: AsyncSession = Depends(get_async_session),
+):
+    expanded = parse_expand(expand)
+    stmt, fields = read_select(select(Contact).where(Contact.id == contact_id), ContactRead)
+    row = (await session.execute(stmt)).first()
+    if not row:
+        raise HTTPException(404, "Contact not found")
+    return json_response((await aexpand_rows(session, fields, [row], expanded))[0])
+
+@router.put("/{contact_id:int}", response_model=ContactRead)
+async def update_contact(contact_id: int, data: ContactCreate, session: AsyncSession = Depends(get_async_session)):
+    contact = await session.get(Contact, contact_id)
+    if not contact:
+        raise HTTPException(404, "Contact not found")
+    update_data = data.model_dump(exclude_unset=True)
+    for k, v in update_data.items():
+        setattr(contact, k, v)
+    session.add(contact)
+    await session.commit()
+    invalidate_contact(contact_id)
+    await session.refresh(contact)
+    return contact
+
+@router.patch("/{contact_id:int}", response_model=ContactRead)
+async def patch_contact(contact_id: int, data: ContactUpdate, session: AsyncSession = Depends(get_async_session)):
+    changes = data.model_dump(exclude_unset=True)
+    stmt, fields = update_returning(Contact, ContactRead, contact_id, changes)
+    row = (await session.execute(stmt)).first()
+    if not row:
+        raise patch_miss(await session.get(Contact, contact_id) is not None, "Contact not found", changes)
+    if not changes:
+        return returned_response(ContactRead, fields, row)
+    await session.commit()
+    invalidate_contact(contact_id)
+    return returned_response(ContactRead, fields, row)
+
+@router.delete("/{contact_id:int}", status_code=204)
+async def delete_contact(contact_id: int, session: AsyncSession = Depends(get_async_session)):
+    contact = await session.get(Contact, contact_id)
+    if not contact:
+        raise HTTPException(404, "Contact not found")
+    await session.delete(contact)
+    await session.commit()
+    invalidate_contact(contact_id)
+    return
@@ -0,0 +1,133 @@
+from typing import Dict, List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ...models import Deal, DealCreate, DealRead, DealReadWithCompany, DealUpdate
+from ...database import get_async_session
+from ...pagination import NEXT_CURSOR_HEADER, afetch_rows
+from ...serialization import json_response, patch_miss, read_select, returned_response, update_returning
+from ...expand import EXPAND_DESCRIPTION, aexpand_rows, parse_expand
+from ...cache import invalidate_deal
+from ..deals import (
+    STAGES,
+    STAGE_COUNTS_STMT,
+    STAGE_VALUES_STMT,
+    build_deal_query,
+    counts_by_stage,
+    ensure_valid_stage,
+    values_by_stage,
+)
+
+router = APIRouter(prefix="/deals", tags=["deals"])
+
+
+# ------------------- CRUD ------------------- #
+
+@router.post("/", response_model=DealRead, status_code=201)
+async def create_deal(data: DealCreate, session: AsyncSession = Depends(get_async_session)):
+    ensure_valid_stage(data.stage)
+    deal = Deal.model_validate(data)
+    session.add(deal)
+    await session.commit()
+    invalidate_deal()
+    await session.refresh(deal)
+    return deal
+
+
+@router.get("/", response_model=List[DealReadWithCompany])
+async def list_deals(
+    session: AsyncSession = Depends(get_async_session),
+    company_id: Optional[int] = Query(None),
+    stage: Optional[str] = Query(None, description=f"Etapa ({', '.join(STAGES)})"),
+    q: Optional[str] = Query(None, description="Busca por título ou notas"),
+    min_value: Optional[float] = Query(None, ge=0),
+    max_value: Optional[float] = Query(None, ge=0),
+    order_by: str = Query("id", description="Campos: id|value|expected_close_date|probability|relevance (com q)"),
+    desc: bool = Query(False),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description=f"Cursor opaco recebido em {NEXT_CURSOR_HEADER}; substitui offset"),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+):
+    expanded = parse_expand(expand)
+    stmt, order_map = build_deal_query(company_id, stage, q, min_value, max_value)
+    order_key = order_by if order_by in order_map else "id"
+    cols, fields = read_select(stmt, DealRead)
+    rows, next_cursor = await afetch_rows(
+        session, cols, order_map[order_key], Deal.id, desc, order_key, limit, cursor, offset
+    )
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return json_response(await aexpand_rows(session, fields, rows, expanded), headers)
+
+
+# ":int" deixa /deals/export e /deals/bulk caírem no router sync
+@router.get("/{deal_id:int}", response_model=DealReadWithCompany)
+async def get_deal(
+    deal_id: int,
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    session: AsyncSession = Depends(get_async_session),
+):
+    expanded = parse_expand(expand)
+    stmt, fields = read_select(select(Deal).where(Deal.id == deal_id), DealRead)
+    row = (await session.execute(stmt)).first()
+    if not row:
+        raise HTTPException(404, "Negócio não encontrado")
+    return json_response((await aexpand_rows(session, fields, [row], expanded))[0])
+
+
+@router.put("/{deal_id:int}", response_model=DealRead)
+async def update_deal(deal_id: int, data: DealCreate, session: AsyncSession = Depends(get_async_session)):
+    deal = await session.get(Deal, deal_id)
+    if not deal:
+        raise HTTPException(404, "Negócio não encontrado")
+    ensure_valid_stage(data.stage)
+    for k, v in data.model_dump(exclude_unset=True).items():
+        setattr(deal, k, v)
+    session.add(deal)
+    await session.commit()
+    invalidate_deal(deal_id)
+    await session.refresh(deal)
+    return deal
+
+
+@router.patch("/{deal_id:int}", response_model=DealRead)
+async def patch_deal(deal_id: int, data: DealUpdate, session: AsyncSession = Depends(get_async_session)):
+    changes = data.model_dump(exclude_unset=True)
+    stmt, fields = update_returning(Deal, DealRead, deal_id, changes)
+    row = (await session.execute(stmt)).first()
+    if not row:
+        raise patch_miss(await session.get(Deal, deal_id) is not None, "Negócio não encontrado", changes)
+    if not changes:
+        return returned_response(DealRead, fields, row)
+    await session.commit()
+    invalidate_deal(deal_id)
+    return returned_response(DealRead, fields, row)
+
+
+@router.delete("/{deal_id:int}", status_code=204)
+async def delete_deal(deal_id: int, session: AsyncSession = Depends(get_async_session)):
+    deal = await session.get(Deal, deal_id)
+    if not deal:
+        raise HTTPException(404, "Negócio não encontrado")
+    await session.delete(deal)
+    await session.commit()
+    invalidate_deal(deal_id)
+    return
+
+
+# ------------------- RELATÓRIOS ------------------- #
+
+@router.get("/summary/stage-counts")
+async def stage_counts(session: AsyncSession = Depends(get_async_session)) -> Dict[str, int]:
+    """
+    Quantidade de negócios por etapa (lida de deal_stage_stats, mantida por triggers).
+    """
+    return counts_by_stage((await session.exec(STAGE_COUNTS_STMT)).all())
+
+
+@router.get("/summary/stage-values")
+async def stage_values(session: AsyncSession = Depends(get_async_session)) -> Dict[str, float]:
+    """
+    Soma total de valores por etapa (lida de deal_stage_stats, mantida por triggers).
+    """
+    return values_by_stage((await session.exec(STAGE_VALUES_STMT)).all())
@@ -0,0 +1,87 @@
+from typing import Optional, Tuple, List
+from fastapi import APIRouter, Depends, Query, Request, Form
+from fastapi.responses import HTMLResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ...bulk_delete import company_cascade, invalidate_dependents
+from ...cache import invalidate_company
+from ...counting import Total, acount_total
+from ...database import get_async_session
+from ...live import CLIENT_HEADER, company_fragment, publish_company
+from ...models import Company
+from ...pagination import afetch_page
+from ..companies import build_company_query
+from ..ui import MAX_PAGE_SIZE, companies_context, list_response
+
+router = APIRouter(prefix="/ui", tags=["ui"])
+
+async def _fetch_companies(
+    session: AsyncSession,
+    q: Optional[str],
+    order_by: str,
+    desc: bool,
+    page: int,
+    size: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Company], Total, Optional[str]]:
+    base, order_map = build_company_query(q)
+
+    # ordenação (id desempata para o cursor ser estável)
+    order_key = order_by if order_by in order_map else "id"
+
+    # paginação: cursor quando vier do botão "Próxima", senão offset pela página;
+    # a sonda de size + 1 linhas diz se há próxima
+    offset = (page - 1) * size
+    items, next_cursor = await afetch_page(
+        session, base, order_map[order_key], Company.id, desc, order_key, size, cursor, offset
+    )
+    # total: de graça na última página, senão contagem em cache ou estimativa (app/counting.py)
+    total = await acount_total(session, Company, q, offset, len(items), next_cursor is not None)
+    return items, total, next_cursor
+
+@router.get("/companies", response_class=HTMLResponse)
+async def ui_companies(
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    q: Optional[str] = Query(None),
+    order_by: str = Query("id"),
+    desc: bool = Query(False),
+    page: int = Query(1, ge=1),
+    size: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+):
+    items, total, next_cursor = await _fetch_companies(session, q, order_by, desc, page, size, cursor)
+    ctx = companies_context(items, total, next_cursor, q, order_by, desc, page, size)
+    return list_response(request, "companies", ctx)
+
+@router.post("/companies", response_class=HTMLResponse)
+async def ui_create_company(
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    name: str = Form(...),
+    email: Optional[str] = Form(None),
+    phone: Optional[str] = Form(None),
+    website: Optional[str] = Form(None),
+    notes: Optional[str] = Form(None),
+):
+    c = Company(name=name, email=email, phone=phone, website=website, notes=notes)
+    session.add(c)
+    await session.commit()
+    invalidate_company()
+    await session.refresh(c)
+    # só o fragmento da linha nova; as outras abas recebem o mesmo por SSE
+    publish_company("created", c, request.headers.get(CLIENT_HEADER))
+    return HTMLResponse(company_fragment("created", c, flash=f"Empresa “{c.name}” criada (#{c.id})."))
+
+@router.delete("/companies/{company_id:int}", response_class=HTMLResponse)
+async def ui_delete_company(company_id: int, request: Request, session: AsyncSession = Depends(get_async_session)):
+    obj = await session.get(Company, company_id)
+    if obj:
+        removed = [(await session.execute(stmt)).rowcount for stmt in company_cascade([company_id])]
+        await session.delete(obj)
+        await session.commit()
+        invalidate_company(company_id)
+        invalidate_dependents(removed)
+        publish_company("deleted", {"id": company_id}, request.headers.get(CLIENT_HEADER))
+    # remove a linha onde ela estiver; a página não é consultada de novo
+    return HTMLResponse(company_fragment("deleted", {"id": company_id}, flash=f"Empresa #{company_id} excluída."))
@@ -0,0 +1,33 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+from ..changes import CHANGE_TABLES, current_version, parse_entities, stream_changes
+from ..database import current_binds, get_session
+
+router = APIRouter(tags=["changes"])
+
+CHANGES_UNTIL_HEADER = "X-Changes-Until"
+
+
+@router.get("/changes")
+def list_changes(
+    session: Session = Depends(get_session),
+    since: int = Query(0, ge=0, description="Última versão já sincronizada (0 = carga completa)"),
+    limit: Optional[int] = Query(10_000, ge=1, le=1_000_000, description="Máximo de mudanças nesta resposta"),
+    entities: Optional[str] = Query(None, description=f"Separadas por vírgula: {', '.join(CHANGE_TABLES)}"),
+):
+    """
+    NDJSON com as mudanças depois de `since`, em ordem de versão: {"op": "upsert",
+    "data": {...}} para linhas criadas/alteradas e {"op": "delete"} para exclusões.
+    Próxima chamada: since = versão da última linha recebida; com menos linhas que
+    `limit`, o cliente está em dia até o X-Changes-Until.
+    """
+    until, pruned_through = current_version(session.connection())
+    if 0 < since < pruned_through:
+        raise HTTPException(410, f"Tombstones até a versão {pruned_through} já foram descartadas; refaça com since=0")
+    return StreamingResponse(
+        stream_changes(current_binds().read_engine, since, until, limit, parse_entities(entities)),
+        media_type="application/x-ndjson",
+        headers={CHANGES_UNTIL_HEADER: str(until)},
+    )
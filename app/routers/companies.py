@@ -1,46 +1,151 @@
-﻿from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Depends, Query
-from sqlmodel import Session, select
-from ..models import Company, CompanyCreate, CompanyRead
-from ..database import engine
+﻿from typing import List, NamedTuple, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from sqlmodel import Session, func, select
+from ..models import (
+    STAGES, BulkDelete, BulkDeleteResult, BulkResult, Company, CompanyCreate, CompanyDuplicates, CompanyOverview, CompanyRead, CompanyUpdate, Contact,
+    ContactRead, Deal, DealRead,
+)
+from ..database import current_binds, get_session
+from ..bulk import bulk_insert, bulk_openapi
+from ..bulk_delete import bulk_delete, company_cascade, invalidate_dependents, require_targets
+from ..export import export_response
+from ..search import apply_search
+from ..pagination import NEXT_CURSOR_HEADER, fetch_rows
+from ..serialization import (
+    json_response, patch_miss, read_select, returned_response, returned_row, rows_response, update_returning,
+)
+from ..cache import invalidate_company
+from ..live import notify_company, notify_company_reload
+from ..dedup import check_duplicates, duplicate_report, report_duplicates
+from ..settings import settings
 
 router = APIRouter(prefix="/companies", tags=["companies"])
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+def build_company_query(q: Optional[str] = None):
+    """
+    Devolve (select filtrado de Company, colunas de ordenação aceitas em order_by).
+    """
+    stmt = select(Company)
+    rank = None
+    if q:
+        stmt, rank = apply_search(stmt, Company, q)
+
+    # ordenação simples
+    order_map = {
+        "id": Company.id,
+        "name": Company.name,
+    }
+    if rank is not None:
+        order_map["relevance"] = rank
+    return stmt, order_map
+
+OVERVIEW_LIMIT = 200
+
+class OverviewQueries(NamedTuple):
+    company: object
+    contacts: object
+    deals: object
+    stages: object
+
+def overview_queries(company_id: int, limit: int) -> OverviewQueries:
+    """
+    As consultas de /companies/{id}/overview: a empresa, até `limit` contatos e
+    negócios (por id) e os totais por etapa de todos os negócios da empresa.
+    """
+    company, _ = read_select(select(Company).where(Company.id == company_id), CompanyRead)
+    contacts, _ = read_select(
+        select(Contact).where(Contact.company_id == company_id).order_by(Contact.id).limit(limit), ContactRead
+    )
+    deals, _ = read_select(select(Deal).where(Deal.company_id == company_id).order_by(Deal.id).limit(limit), DealRead)
+    stages = (
+        select(Deal.stage, func.count(), func.coalesce(func.sum(Deal.value), 0.0))
+        .where(Deal.company_id == company_id)
+        .group_by(Deal.stage)
+    )
+    return OverviewQueries(company, contacts, deals, stages)
+
+def overview_payload(company, contacts, deals, stages) -> dict:
+    totals = {stage: {"deal_count": 0, "value_sum": 0.0} for stage in STAGES}
+    for stage, count, value_sum in stages:
+        totals[stage] = {"deal_count": count, "value_sum": float(value_sum)}
+    return {
+        "company": dict(zip(CompanyRead.model_fields, company)),
+        "contacts": [dict(zip(ContactRead.model_fields, row)) for row in contacts],
+        "deals": [dict(zip(DealRead.model_fields, row)) for row in deals],
+        "stages": totals,
+    }
 
 @router.post("/", response_model=CompanyRead, status_code=201)
-def create_company(data: CompanyCreate, session: Session = Depends(get_session)):
+def create_company(data: CompanyCreate, response: Response, session: Session = Depends(get_session)):
     company = Company.model_validate(data)
     session.add(company)
     session.commit()
+    invalidate_company()
     session.refresh(company)
+    notify_company("created", company)
+    if settings.dedup_check_on_create:
+        report_duplicates(response, check_duplicates(current_binds().read_engine, "company", company))
     return company
 
+@router.post("/bulk", response_model=BulkResult, openapi_extra=bulk_openapi("CompanyCreate"))
+async def bulk_create_companies(request: Request):
+    result = await bulk_insert(request, Company, CompanyCreate)
+    if result.inserted:
+        # lote não vira linha a linha: as abas abertas recarregam a listagem uma vez
+        notify_company_reload()
+    return result
+
+@router.post("/bulk-delete", response_model=BulkDeleteResult)
+def bulk_delete_companies(
+    data: Optional[BulkDelete] = None,
+    q: Optional[str] = Query(None, description="Busca por nome (prefixo das palavras)"),
+    all_companies: bool = Query(False, alias="all", description="Obrigatório para apagar sem filtros nem ids"),
+):
+    """
+    Apaga as empresas que casam com os filtros (os da listagem, na query string)
+    e/ou com `ids`, junto com os contatos e negócios delas, em lotes curtos.
+    """
+    data = data or BulkDelete()
+    require_targets(data, all_companies, "todas as empresas", q)
+    return bulk_delete(Company, build_company_query(q)[0], data)
+
 @router.get("/", response_model=List[CompanyRead])
 def list_companies(
     session: Session = Depends(get_session),
-    q: Optional[str] = Query(None, description="Busca por nome (contains)"),
-    order_by: str = Query("id", description="Campos: id|name"),
+    q: Optional[str] = Query(None, description="Busca por nome (prefixo das palavras)"),
+    order_by: str = Query("id", description="Campos: id|name|relevance (com q)"),
     desc: bool = Query(False, description="Ordenação descrescente"),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description=f"Cursor opaco recebido em {NEXT_CURSOR_HEADER}; substitui offset"),
 ):
-    stmt = select(Company)
-    if q:
-        stmt = stmt.where(Company.name.contains(q))
+    stmt, order_map = build_company_query(q)
+    order_key = order_by if order_by in order_map else "id"
+    cols, fields = read_select(stmt, CompanyRead)
+    rows, next_cursor = fetch_rows(
+        session, cols, order_map[order_key], Company.id, desc, order_key, limit, cursor, offset
+    )
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return rows_response(fields, rows, headers)
 
-    # ordenação simples
-    order_map = {
-        "id": Company.id,
-        "name": Company.name,
-    }
-    order_col = order_map.get(order_by, Company.id)
-    stmt = stmt.order_by(order_col.desc() if desc else order_col.asc())
+@router.get("/export")
+def export_companies(
+    q: Optional[str] = Query(None, description="Busca por nome (prefixo das palavras)"),
+    fmt: str = Query("csv", alias="format", description="csv|ndjson"),
+):
+    stmt, _ = build_company_query(q)
+    return export_response(stmt, CompanyRead, fmt, "companies")
 
-    stmt = stmt.offset(offset).limit(limit)
-    return session.exec(stmt).all()
+@router.get("/duplicates", response_model=CompanyDuplicates)
+def company_duplicates(
+    min_score: Optional[float] = Query(None, gt=0, le=1, description="Pontuação mínima (padrão: CRM_DEDUP_MIN_SCORE)"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    Pares de possíveis duplicatas, da maior pontuação para a menor: e-mail igual,
+    mesmo domínio (site ou e-mail) ou nome parecido. Ver app/dedup.py.
+    """
+    return json_response(duplicate_report(current_binds().read_engine, "company", min_score, limit))
 
 @router.get("/{company_id}", response_model=CompanyRead)
 def get_company(company_id: int, session: Session = Depends(get_session)):
@@ -49,6 +154,22 @@ def get_company(company_id: int, session: Session = Depends(get_session)):
         raise HTTPException(404, "Company not found")
     return company
 
+@router.get("/{company_id}/overview", response_model=CompanyOverview)
+def company_overview(
+    company_id: int,
+    limit: int = Query(OVERVIEW_LIMIT, ge=1, le=1000, description="Máximo de contatos e de negócios listados"),
+    session: Session = Depends(get_session),
+):
+    """
+    Empresa, contatos, negócios e totais por etapa numa ida só: quatro consultas,
+    qualquer que seja o tamanho da carteira.
+    """
+    queries = overview_queries(company_id, limit)
+    company = session.execute(queries.company).first()
+    if not company:
+        raise HTTPException(404, "Company not found")
+    return json_response(overview_payload(company, *(session.execute(stmt).all() for stmt in queries[1:])))
+
 @router.put("/{company_id}", response_model=CompanyRead)
 def update_company(company_id: int, data: CompanyCreate, session: Session = Depends(get_session)):
     company = session.get(Company, company_id)
@@ -58,14 +179,36 @@ def update_company(company_id: int, data: CompanyCreate, session: Session = Depe
         setattr(company, k, v)
     session.add(company)
     session.commit()
+    invalidate_company(company_id)
     session.refresh(company)
+    notify_company("updated", company)
     return company
 
+@router.patch("/{company_id}", response_model=CompanyRead)
+def patch_company(company_id: int, data: CompanyUpdate, session: Session = Depends(get_session)):
+    """Atualização parcial: só os campos enviados, num único UPDATE ... RETURNING."""
+    changes = data.model_dump(exclude_unset=True)
+    stmt, fields = update_returning(Company, CompanyRead, company_id, changes)
+    row = session.execute(stmt).first()
+    if not row:
+        raise patch_miss(False, "Company not found", changes)
+    if not changes:
+        # corpo vazio: devolve a linha como está, sem commit, invalidação nem evento
+        return returned_response(CompanyRead, fields, row)
+    session.commit()
+    invalidate_company(company_id)
+    notify_company("updated", returned_row(CompanyRead, fields, row))
+    return returned_response(CompanyRead, fields, row)
+
 @router.delete("/{company_id}", status_code=204)
 def delete_company(company_id: int, session: Session = Depends(get_session)):
     company = session.get(Company, company_id)
     if not company:
         raise HTTPException(404, "Company not found")
+    removed = [session.execute(stmt).rowcount for stmt in company_cascade([company_id])]
     session.delete(company)
     session.commit()
+    invalidate_company(company_id)
+    invalidate_dependents(removed)
+    notify_company("deleted", {"id": company_id})
     return
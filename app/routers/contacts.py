@@ -1,45 +1,110 @@
 ﻿from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from sqlmodel import Session, select
-from ..models import Contact, ContactCreate, ContactRead
-from ..database import engine
+from ..models import (
+    BulkDelete, BulkDeleteResult, BulkResult, Contact, ContactCreate, ContactDuplicates, ContactRead, ContactReadWithCompany, ContactUpdate,
+)
+from ..database import current_binds, get_session
+from ..bulk import bulk_insert, bulk_openapi
+from ..bulk_delete import bulk_delete, require_targets
+from ..export import export_response
+from ..search import apply_search
+from ..pagination import NEXT_CURSOR_HEADER, fetch_rows
+from ..serialization import json_response, patch_miss, read_select, returned_response, update_returning
+from ..expand import EXPAND_DESCRIPTION, expand_rows, parse_expand
+from ..cache import invalidate_contact
+from ..dedup import check_duplicates, duplicate_report, report_duplicates
+from ..settings import settings
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+def build_contact_query(q: Optional[str] = None, company_id: Optional[int] = None):
+    """
+    Devolve (select filtrado de Contact, colunas de ordenação); contatos só ordenam por id.
+    """
+    stmt = select(Contact)
+    if q:
+        stmt, _ = apply_search(stmt, Contact, q)
+    if company_id:
+        stmt = stmt.where(Contact.company_id == company_id)
+    return stmt, {"id": Contact.id}
 
 @router.post("/", response_model=ContactRead, status_code=201)
-def create_contact(data: ContactCreate, session: Session = Depends(get_session)):
+def create_contact(data: ContactCreate, response: Response, session: Session = Depends(get_session)):
     contact = Contact.model_validate(data)
     session.add(contact)
     session.commit()
+    invalidate_contact()
     session.refresh(contact)
+    if settings.dedup_check_on_create:
+        report_duplicates(response, check_duplicates(current_binds().read_engine, "contact", contact))
     return contact
 
-@router.get("/", response_model=List[ContactRead])
+@router.post("/bulk", response_model=BulkResult, openapi_extra=bulk_openapi("ContactCreate"))
+async def bulk_create_contacts(request: Request):
+    return await bulk_insert(request, Contact, ContactCreate)
+
+@router.post("/bulk-delete", response_model=BulkDeleteResult)
+def bulk_delete_contacts(
+    data: Optional[BulkDelete] = None,
+    q: Optional[str] = Query(None, description="Busca por nome ou e-mail"),
+    company_id: Optional[int] = Query(None, description="Filtrar por empresa"),
+    all_contacts: bool = Query(False, alias="all", description="Obrigatório para apagar sem filtros nem ids"),
+):
+    """Apaga os contatos que casam com os filtros da listagem e/ou com `ids`, em lotes curtos."""
+    data = data or BulkDelete()
+    require_targets(data, all_contacts, "todos os contatos", q, company_id)
+    return bulk_delete(Contact, build_contact_query(q, company_id)[0], data)
+
+@router.get("/", response_model=List[ContactReadWithCompany])
 def list_contacts(
     session: Session = Depends(get_session),
     q: Optional[str] = Query(None, description="Busca por nome ou e-mail"),
     company_id: Optional[int] = Query(None, description="Filtrar por empresa"),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description=f"Cursor opaco recebido em {NEXT_CURSOR_HEADER}; substitui offset"),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
 ):
-    stmt = select(Contact)
-    if q:
-        stmt = stmt.where((Contact.name.contains(q)) | (Contact.email.contains(q)))
-    if company_id:
-        stmt = stmt.where(Contact.company_id == company_id)
-    stmt = stmt.offset(offset).limit(limit)
-    return session.exec(stmt).all()
+    expanded = parse_expand(expand)
+    stmt, _ = build_contact_query(q, company_id)
+    cols, fields = read_select(stmt, ContactRead)
+    rows, next_cursor = fetch_rows(session, cols, Contact.id, Contact.id, False, "id", limit, cursor, offset)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return json_response(expand_rows(session, fields, rows, expanded), headers)
 
-@router.get("/{contact_id}", response_model=ContactRead)
-def get_contact(contact_id: int, session: Session = Depends(get_session)):
-    contact = session.get(Contact, contact_id)
-    if not contact:
+@router.get("/export")
+def export_contacts(
+    q: Optional[str] = Query(None, description="Busca por nome ou e-mail"),
+    company_id: Optional[int] = Query(None, description="Filtrar por empresa"),
+    fmt: str = Query("csv", alias="format", description="csv|ndjson"),
+):
+    stmt, _ = build_contact_query(q, company_id)
+    return export_response(stmt, ContactRead, fmt, "contacts")
+
+@router.get("/duplicates", response_model=ContactDuplicates)
+def contact_duplicates(
+    min_score: Optional[float] = Query(None, gt=0, le=1, description="Pontuação mínima (padrão: CRM_DEDUP_MIN_SCORE)"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    Pares de possíveis duplicatas: e-mail igual em qualquer empresa, ou nome
+    parecido na mesma empresa. Ver app/dedup.py.
+    """
+    return json_response(duplicate_report(current_binds().read_engine, "contact", min_score, limit))
+
+@router.get("/{contact_id}", response_model=ContactReadWithCompany)
+def get_contact(
+    contact_id: int,
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    session: Session = Depends(get_session),
+):
+    expanded = parse_expand(expand)
+    stmt, fields = read_select(select(Contact).where(Contact.id == contact_id), ContactRead)
+    row = session.execute(stmt).first()
+    if not row:
         raise HTTPException(404, "Contact not found")
-    return contact
+    return json_response((expand_rows(session, fields, [row], expanded))[0])
 
 @router.put("/{contact_id}", response_model=ContactRead)
 def update_contact(contact_id: int, data: ContactCreate, session: Session = Depends(get_session)):
@@ -51,9 +116,25 @@ def update_contact(contact_id: int, data: ContactCreate, session: Session = Depe
         setattr(contact, k, v)
     session.add(contact)
     session.commit()
+    invalidate_contact(contact_id)
     session.refresh(contact)
     return contact
 
+@router.patch("/{contact_id}", response_model=ContactRead)
+def patch_contact(contact_id: int, data: ContactUpdate, session: Session = Depends(get_session)):
+    """Atualização parcial: só os campos enviados, num único UPDATE ... RETURNING."""
+    changes = data.model_dump(exclude_unset=True)
+    stmt, fields = update_returning(Contact, ContactRead, contact_id, changes)
+    row = session.execute(stmt).first()
+    if not row:
+        raise patch_miss(session.get(Contact, contact_id) is not None, "Contact not found", changes)
+    if not changes:
+        # corpo vazio: devolve a linha como está, sem commit nem invalidação
+        return returned_response(ContactRead, fields, row)
+    session.commit()
+    invalidate_contact(contact_id)
+    return returned_response(ContactRead, fields, row)
+
 @router.delete("/{contact_id}", status_code=204)
 def delete_contact(contact_id: int, session: Session = Depends(get_session)):
     contact = session.get(Contact, contact_id)
@@ -61,4 +142,5 @@ def delete_contact(contact_id: int, session: Session = Depends(get_session)):
         raise HTTPException(404, "Contact not found")
     session.delete(contact)
     session.commit()
+    invalidate_contact(contact_id)
     return
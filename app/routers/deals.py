@@ -1,8 +1,23 @@
-﻿from typing import List, Optional, Dict
-from fastapi import APIRouter, HTTPException, Depends, Query
+﻿from datetime import date
+from typing import List, Optional, Dict
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from sqlalchemy import literal_column, or_, update
 from sqlmodel import Session, select, func
-from ..models import Deal, DealCreate, DealRead
-from ..database import engine
+from ..models import (
+    BulkDelete, BulkDeleteResult, BulkResult, BulkUpdateResult, Deal, DealBulkUpdate, DealCreate, DealFacets, DealRead, DealReadWithCompany,
+    DealStageStats, DealUpdate, ForecastResult,
+)
+from ..database import get_session
+from ..bulk import bulk_insert, bulk_openapi
+from ..bulk_delete import bulk_delete, require_targets
+from ..export import export_response
+from ..search import apply_search
+from ..pagination import NEXT_CURSOR_HEADER, fetch_rows
+from ..serialization import json_response, patch_miss, read_select, returned_response, update_returning
+from ..expand import EXPAND_DESCRIPTION, expand_rows, parse_expand
+from ..cache import invalidate_all, invalidate_deal
+from ..forecast import GROUP_BY_DESCRIPTION, ForecastFilters, forecast, parse_group_by
+from ..facets import VALUE_EDGES, FacetFilters, facets, parse_edges
 
 # Etapas possíveis do pipeline
 STAGES = [
@@ -17,11 +32,8 @@ STAGES = [
 
 router = APIRouter(prefix="/deals", tags=["deals"])
 
-
-# Dependência de sessão de banco
-def get_session():
-    with Session(engine) as session:
-        yield session
+# o SQLite exige constante (não parâmetro) no segundo argumento de likelihood()
+SELECTIVE = literal_column("0.02")
 
 
 # Validação simples de etapa
@@ -33,6 +45,45 @@ def ensure_valid_stage(value: Optional[str]) -> Optional[str]:
     return value
 
 
+# Filtros da listagem; também usados por quem precisa do mesmo recorte de negócios
+def build_deal_query(
+    company_id: Optional[int] = None,
+    stage: Optional[str] = None,
+    q: Optional[str] = None,
+    min_value: Optional[float] = None,
+    max_value: Optional[float] = None,
+):
+    """
+    Devolve (select filtrado de Deal, colunas de ordenação aceitas em order_by).
+    """
+    stmt = select(Deal)
+    rank = None
+
+    if company_id:
+        stmt = stmt.where(Deal.company_id == company_id)
+    if stage:
+        ensure_valid_stage(stage)
+        stmt = stmt.where(Deal.stage == stage)
+    if q:
+        stmt, rank = apply_search(stmt, Deal, q)
+    # likelihood(): sem isso o SQLite supõe que a faixa de valor pega quase tudo e
+    # prefere varrer a tabela na ordem pedida em vez de usar ix_deal_value
+    if min_value is not None:
+        stmt = stmt.where(func.likelihood(Deal.value >= min_value, SELECTIVE))
+    if max_value is not None:
+        stmt = stmt.where(func.likelihood(Deal.value <= max_value, SELECTIVE))
+
+    order_map = {
+        "id": Deal.id,
+        "value": Deal.value,
+        "expected_close_date": Deal.expected_close_date,
+        "probability": Deal.probability,
+    }
+    if rank is not None:
+        order_map["relevance"] = rank
+    return stmt, order_map
+
+
 # ------------------- CRUD ------------------- #
 
 @router.post("/", response_model=DealRead, status_code=201)
@@ -41,11 +92,69 @@ def create_deal(data: DealCreate, session: Session = Depends(get_session)):
     deal = Deal.model_validate(data)
     session.add(deal)
     session.commit()
+    invalidate_deal()
     session.refresh(deal)
     return deal
 
 
-@router.get("/", response_model=List[DealRead])
+@router.post("/bulk", response_model=BulkResult, openapi_extra=bulk_openapi("DealCreate"))
+async def bulk_create_deals(request: Request):
+    return await bulk_insert(request, Deal, DealCreate, check=lambda data: ensure_valid_stage(data.stage))
+
+
+@router.post("/bulk-update", response_model=BulkUpdateResult)
+def bulk_update_deals(
+    data: DealBulkUpdate,
+    session: Session = Depends(get_session),
+    company_id: Optional[int] = Query(None),
+    stage: Optional[str] = Query(None, description=f"Etapa ({', '.join(STAGES)})"),
+    q: Optional[str] = Query(None, description="Busca por título ou notas"),
+    min_value: Optional[float] = Query(None, ge=0),
+    max_value: Optional[float] = Query(None, ge=0),
+    all_deals: bool = Query(False, alias="all", description="Obrigatório para atualizar sem nenhum filtro"),
+):
+    """
+    Muda etapa, probabilidade e/ou vendedor de todos os negócios que casam com os
+    filtros (os mesmos da listagem, na query string) num único UPDATE. Conta só
+    as linhas que de fato mudaram.
+    """
+    changes = data.model_dump(exclude_unset=True)
+    if not changes:
+        raise HTTPException(422, "Nada para atualizar: envie stage, probability e/ou owner")
+    if not all_deals and all(v is None for v in (company_id, stage, q, min_value, max_value)):
+        raise HTTPException(422, "Sem filtros isso atualiza todos os negócios; confirme com all=true")
+    stmt, _ = build_deal_query(company_id, stage, q, min_value, max_value)
+    result = session.execute(
+        update(Deal)
+        .where(Deal.id.in_(stmt.with_only_columns(Deal.id)))
+        # linhas já no estado pedido ficam de fora (nem disparam os triggers)
+        .where(or_(*(getattr(Deal, k).is_distinct_from(v) for k, v in changes.items())))
+        .values(**changes)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    if result.rowcount:
+        invalidate_all("deal")
+    return {"updated": result.rowcount}
+
+
+@router.post("/bulk-delete", response_model=BulkDeleteResult)
+def bulk_delete_deals(
+    data: Optional[BulkDelete] = None,
+    company_id: Optional[int] = Query(None),
+    stage: Optional[str] = Query(None, description=f"Etapa ({', '.join(STAGES)})"),
+    q: Optional[str] = Query(None, description="Busca por título ou notas"),
+    min_value: Optional[float] = Query(None, ge=0),
+    max_value: Optional[float] = Query(None, ge=0),
+    all_deals: bool = Query(False, alias="all", description="Obrigatório para apagar sem filtros nem ids"),
+):
+    """Apaga os negócios que casam com os filtros da listagem e/ou com `ids`, em lotes curtos."""
+    data = data or BulkDelete()
+    require_targets(data, all_deals, "todos os negócios", company_id, stage, q, min_value, max_value)
+    return bulk_delete(Deal, build_deal_query(company_id, stage, q, min_value, max_value)[0], data)
+
+
+@router.get("/", response_model=List[DealReadWithCompany])
 def list_deals(
     session: Session = Depends(get_session),
     company_id: Optional[int] = Query(None),
@@ -53,44 +162,101 @@ def list_deals(
     q: Optional[str] = Query(None, description="Busca por título ou notas"),
     min_value: Optional[float] = Query(None, ge=0),
     max_value: Optional[float] = Query(None, ge=0),
-    order_by: str = Query("id", description="Campos: id|value|expected_close_date|probability"),
+    order_by: str = Query("id", description="Campos: id|value|expected_close_date|probability|relevance (com q)"),
     desc: bool = Query(False),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description=f"Cursor opaco recebido em {NEXT_CURSOR_HEADER}; substitui offset"),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
 ):
-    stmt = select(Deal)
+    expanded = parse_expand(expand)
+    stmt, order_map = build_deal_query(company_id, stage, q, min_value, max_value)
+    order_key = order_by if order_by in order_map else "id"
+    cols, fields = read_select(stmt, DealRead)
+    rows, next_cursor = fetch_rows(
+        session, cols, order_map[order_key], Deal.id, desc, order_key, limit, cursor, offset
+    )
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return json_response(expand_rows(session, fields, rows, expanded), headers)
 
-    if company_id:
-        stmt = stmt.where(Deal.company_id == company_id)
-    if stage:
-        ensure_valid_stage(stage)
-        stmt = stmt.where(Deal.stage == stage)
-    if q:
-        stmt = stmt.where((Deal.title.contains(q)) | (Deal.notes.contains(q)))
-    if min_value is not None:
-        stmt = stmt.where(Deal.value >= min_value)
-    if max_value is not None:
-        stmt = stmt.where(Deal.value <= max_value)
 
-    order_map = {
-        "id": Deal.id,
-        "value": Deal.value,
-        "expected_close_date": Deal.expected_close_date,
-        "probability": Deal.probability,
-    }
-    order_col = order_map.get(order_by, Deal.id)
-    stmt = stmt.order_by(order_col.desc() if desc else order_col.asc())
+@router.get("/export")
+def export_deals(
+    company_id: Optional[int] = Query(None),
+    stage: Optional[str] = Query(None, description=f"Etapa ({', '.join(STAGES)})"),
+    q: Optional[str] = Query(None, description="Busca por título ou notas"),
+    min_value: Optional[float] = Query(None, ge=0),
+    max_value: Optional[float] = Query(None, ge=0),
+    fmt: str = Query("csv", alias="format", description="csv|ndjson"),
+):
+    stmt, _ = build_deal_query(company_id, stage, q, min_value, max_value)
+    return export_response(stmt, DealRead, fmt, "deals")
+
 
-    stmt = stmt.offset(offset).limit(limit)
-    return session.exec(stmt).all()
+@router.get("/forecast", response_model=ForecastResult)
+def deal_forecast(
+    session: Session = Depends(get_session),
+    group_by: List[str] = Query(["month"], description=GROUP_BY_DESCRIPTION),
+    company_id: Optional[List[int]] = Query(None),
+    stage: Optional[List[str]] = Query(None, description=f"Etapas ({', '.join(STAGES)})"),
+    owner: Optional[List[str]] = Query(None),
+    min_value: Optional[float] = Query(None, ge=0),
+    max_value: Optional[float] = Query(None, ge=0),
+    min_probability: Optional[int] = Query(None, ge=0, le=100),
+    max_probability: Optional[int] = Query(None, ge=0, le=100),
+    close_from: Optional[date] = Query(None, description="Fechamento previsto a partir de (inclusive)"),
+    close_to: Optional[date] = Query(None, description="Fechamento previsto até (inclusive)"),
+    order_by: str = Query("key", description="key|weighted_value"),
+    limit: int = Query(1000, ge=1, le=100_000),
+    engine: str = Query("auto", description="auto|numpy|sql (auto = snapshot em memória se disponível)"),
+):
+    """
+    Previsão ponderada (value * probability / 100) por período, vendedor, empresa
+    e/ou etapa. Negócios sem data de fechamento ficam no grupo null.
+    """
+    for s in stage or ():
+        ensure_valid_stage(s)
+    filters = ForecastFilters(
+        company_id, stage, owner, min_value, max_value, min_probability, max_probability, close_from, close_to
+    )
+    return json_response(forecast(session, parse_group_by(group_by), filters, order_by, limit, engine))
 
 
-@router.get("/{deal_id}", response_model=DealRead)
-def get_deal(deal_id: int, session: Session = Depends(get_session)):
-    deal = session.get(Deal, deal_id)
-    if not deal:
+@router.get("/facets", response_model=DealFacets)
+def deal_facets(
+    session: Session = Depends(get_session),
+    company_id: Optional[int] = Query(None),
+    stage: Optional[str] = Query(None, description=f"Etapa ({', '.join(STAGES)})"),
+    q: Optional[str] = Query(None, description="Busca por título ou notas"),
+    min_value: Optional[float] = Query(None, ge=0),
+    max_value: Optional[float] = Query(None, ge=0),
+    buckets: Optional[List[float]] = Query(
+        None, description=f"Limites das faixas de valor, repetível (padrão: {' '.join(f'{e:g}' for e in VALUE_EDGES)})"
+    ),
+    facet_limit: int = Query(20, ge=1, le=1000, description="Máximo de vendedores e de empresas listados"),
+    engine: str = Query("auto", description="auto|numpy|sql (auto = snapshot em memória se disponível)"),
+):
+    """
+    Totais, etapas, vendedores, empresas e faixas de valor dos negócios que casam
+    com os filtros da listagem, numa ida só. Cada faceta ignora o próprio filtro.
+    """
+    ensure_valid_stage(stage)
+    filters = FacetFilters(company_id, stage, q, min_value, max_value)
+    return json_response(facets(session, filters, parse_edges(buckets), facet_limit, engine))
+
+
+@router.get("/{deal_id}", response_model=DealReadWithCompany)
+def get_deal(
+    deal_id: int,
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    session: Session = Depends(get_session),
+):
+    expanded = parse_expand(expand)
+    stmt, fields = read_select(select(Deal).where(Deal.id == deal_id), DealRead)
+    row = session.execute(stmt).first()
+    if not row:
         raise HTTPException(404, "Negócio não encontrado")
-    return deal
+    return json_response((expand_rows(session, fields, [row], expanded))[0])
 
 
 @router.put("/{deal_id}", response_model=DealRead)
@@ -103,10 +269,27 @@ def update_deal(deal_id: int, data: DealCreate, session: Session = Depends(get_s
         setattr(deal, k, v)
     session.add(deal)
     session.commit()
+    invalidate_deal(deal_id)
     session.refresh(deal)
     return deal
 
 
+@router.patch("/{deal_id}", response_model=DealRead)
+def patch_deal(deal_id: int, data: DealUpdate, session: Session = Depends(get_session)):
+    """Atualização parcial: só os campos enviados, num único UPDATE ... RETURNING."""
+    changes = data.model_dump(exclude_unset=True)
+    stmt, fields = update_returning(Deal, DealRead, deal_id, changes)
+    row = session.execute(stmt).first()
+    if not row:
+        raise patch_miss(session.get(Deal, deal_id) is not None, "Negócio não encontrado", changes)
+    if not changes:
+        # corpo vazio: devolve a linha como está, sem commit nem invalidação
+        return returned_response(DealRead, fields, row)
+    session.commit()
+    invalidate_deal(deal_id)
+    return returned_response(DealRead, fields, row)
+
+
 @router.delete("/{deal_id}", status_code=204)
 def delete_deal(deal_id: int, session: Session = Depends(get_session)):
     deal = session.get(Deal, deal_id)
@@ -114,32 +297,42 @@ def delete_deal(deal_id: int, session: Session = Depends(get_session)):
         raise HTTPException(404, "Negócio não encontrado")
     session.delete(deal)
     session.commit()
+    invalidate_deal(deal_id)
     return
 
 
 # ------------------- RELATÓRIOS ------------------- #
 
-@router.get("/summary/stage-counts")
-def stage_counts(session: Session = Depends(get_session)) -> Dict[str, int]:
-    """
-    Quantidade de negócios por etapa.
-    """
-    stmt = select(Deal.stage, func.count(Deal.id)).group_by(Deal.stage)
-    rows = session.exec(stmt).all()
+STAGE_COUNTS_STMT = select(DealStageStats.stage, DealStageStats.deal_count)
+STAGE_VALUES_STMT = select(DealStageStats.stage, DealStageStats.deal_count, DealStageStats.value_sum)
+
+
+def counts_by_stage(rows) -> Dict[str, int]:
     counts = {stage: 0 for stage in STAGES}
     for stage, total in rows:
         counts[stage] = total
     return counts
 
 
+def values_by_stage(rows) -> Dict[str, float]:
+    totals = {stage: 0.0 for stage in STAGES}
+    for stage, count, total in rows:
+        # etapa esvaziada pode guardar resíduo de arredondamento das subtrações
+        totals[stage] = float(total or 0.0) if count else 0.0
+    return totals
+
+
+@router.get("/summary/stage-counts")
+def stage_counts(session: Session = Depends(get_session)) -> Dict[str, int]:
+    """
+    Quantidade de negócios por etapa (lida de deal_stage_stats, mantida por triggers).
+    """
+    return counts_by_stage(session.exec(STAGE_COUNTS_STMT).all())
+
+
 @router.get("/summary/stage-values")
 def stage_values(session: Session = Depends(get_session)) -> Dict[str, float]:
     """
-    Soma total de valores por etapa.
+    Soma total de valores por etapa (lida de deal_stage_stats, mantida por triggers).
     """
-    stmt = select(Deal.stage, func.coalesce(func.sum(Deal.value), 0.0)).group_by(Deal.stage)
-    rows = session.exec(stmt).all()
-    totals = {stage: 0.0 for stage in STAGES}
-    for stage, total in rows:
-        totals[stage] = float(total or 0.0)
-    return totals
+    return values_by_stage(session.exec(STAGE_VALUES_STMT).all())
@@ -0,0 +1,93 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+from ..bulk import body_format, bulk_openapi
+from ..database import get_session
+from ..jobs import IMPORT_TARGETS, JOB_KINDS, job_payload, results_dir, runner, save_upload, upload_path
+from ..models import JOB_STATUSES, Job, JobCreate, JobRead
+from ..serialization import json_response
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+# o corpo depende de {entity}: um oneOf com o *Create de cada alvo
+IMPORT_OPENAPI = bulk_openapi(*(create.__name__ for _, create, _ in IMPORT_TARGETS.values()))
+
+
+def _get_job(session: Session, job_id: int) -> Job:
+    job = session.get(Job, job_id)
+    if not job:
+        raise HTTPException(404, "Job não encontrado")
+    return job
+
+
+@router.post("/", response_model=JobRead, status_code=202)
+def create_job(data: JobCreate, session: Session = Depends(get_session)):
+    """
+    Enfileira um job; acompanhe em GET /jobs/{id} (cabeçalho Location).
+    kinds: export (params de /{entity}/export + entity), forecast (params de
+    /deals/forecast), stage-report; import entra por POST /jobs/import/{entity}.
+    """
+    job = runner.submit(session, data.kind, data.params)
+    return json_response(job_payload(job), {"Location": f"/jobs/{job.id}"}, status_code=202)
+
+
+@router.post("/import/{entity}", response_model=JobRead, status_code=202, openapi_extra=IMPORT_OPENAPI)
+async def import_job(entity: str, request: Request, session: Session = Depends(get_session)):
+    """
+    Importação em segundo plano: mesmo corpo (JSON, NDJSON ou CSV) e mesmas
+    validações de /{entity}/bulk. O arquivo é gravado em disco antes de o job
+    entrar na fila; o relatório (inseridos e erros por linha) sai em
+    GET /jobs/{id}/result.
+    """
+    if entity not in IMPORT_TARGETS:
+        raise HTTPException(422, f"entity inválida. Use {', '.join(IMPORT_TARGETS)}")
+    fmt = body_format(request.headers.get("content-type"))
+    upload = await save_upload(request, fmt)
+    params = {"entity": entity, "format": fmt, "upload": upload}
+    try:
+        job = await run_in_threadpool(runner.submit, session, "import", params)
+    except BaseException:
+        upload_path(upload).unlink(missing_ok=True)
+        raise
+    return json_response(job_payload(job), {"Location": f"/jobs/{job.id}"}, status_code=202)
+
+
+@router.get("/", response_model=List[JobRead])
+def list_jobs(
+    session: Session = Depends(get_session),
+    status: Optional[str] = Query(None, description=f"Status ({', '.join(JOB_STATUSES)})"),
+    kind: Optional[str] = Query(None, description=f"Tipo ({', '.join(JOB_KINDS)})"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    stmt = select(Job).order_by(Job.id.desc()).limit(limit)
+    if status:
+        stmt = stmt.where(Job.status == status)
+    if kind:
+        stmt = stmt.where(Job.kind == kind)
+    return json_response([job_payload(job) for job in session.exec(stmt).all()])
+
+
+@router.get("/{job_id}", response_model=JobRead)
+def get_job(job_id: int, session: Session = Depends(get_session)):
+    return json_response(job_payload(_get_job(session, job_id)))
+
+
+@router.post("/{job_id}/cancel", response_model=JobRead, status_code=202)
+def cancel_job(job_id: int, session: Session = Depends(get_session)):
+    _get_job(session, job_id)
+    if not runner.cancel(job_id):
+        raise HTTPException(409, "Job já terminou")
+    session.expire_all()
+    return json_response(job_payload(_get_job(session, job_id)), status_code=202)
+
+
+@router.get("/{job_id}/result")
+def job_result(job_id: int, session: Session = Depends(get_session)):
+    job = _get_job(session, job_id)
+    if job.status != "succeeded":
+        raise HTTPException(409, f"Job sem resultado (status {job.status})")
+    path = results_dir() / job.result_file
+    if not path.exists():
+        raise HTTPException(410, "Resultado já descartado")
+    return FileResponse(path, media_type=job.result_media_type, filename=f"{job.kind}-{job.id}{path.suffix}")
@@ -1,49 +1,87 @@
-from typing import Optional, Tuple, List
+import secrets
+from typing import Dict, List, Optional, Tuple
 from fastapi import APIRouter, Depends, Query, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select, func
-from pathlib import Path
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
+from markupsafe import Markup
+from sqlmodel import Session, select
 
-from ..database import engine
-from ..models import Company
-
-PROJECT_ROOT = Path(__file__).resolve().parents[2]
-TEMPLATES_DIR = PROJECT_ROOT / "templates"
+from ..bulk_delete import company_cascade, invalidate_dependents
+from ..cache import invalidate_company
+from ..counting import Filters, Total, count_total
+from ..database import get_session
+from ..live import CLIENT_HEADER, broker, company_fragment, publish_company
+from ..models import STAGES, Company, Contact, Deal
+from ..pagination import fetch_page
+from ..rendering import fragments, page_context, render_page
+from .companies import build_company_query
+from .contacts import build_contact_query
+from .deals import build_deal_query
 
 router = APIRouter(prefix="/ui", tags=["ui"])
-templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
-def get_session():
-    with Session(engine) as s:
-        yield s
+# páginas com CRM_UI_STREAM_ROWS linhas ou mais saem em streaming (ver app/rendering.py)
+MAX_PAGE_SIZE = 100
 
-def _fetch_companies(
+def _fetch_page(
     session: Session,
+    model,
+    stmt,
+    order_map: dict,
     q: Optional[str],
     order_by: str,
     desc: bool,
     page: int,
     size: int,
-) -> Tuple[List[Company], int]:
-    base = select(Company)
-    if q:
-        base = base.where(Company.name.contains(q))
+    cursor: Optional[str] = None,
+    filters: Filters = (),
+) -> Tuple[list, Total, Optional[str]]:
+    # ordenação (id desempata para o cursor ser estável)
+    order_key = order_by if order_by in order_map else "id"
+
+    # paginação: cursor quando vier do botão "Próxima", senão offset pela página;
+    # a sonda de size + 1 linhas diz se há próxima
+    offset = (page - 1) * size
+    items, next_cursor = fetch_page(
+        session, stmt, order_map[order_key], model.id, desc, order_key, size, cursor, offset
+    )
+    # total: de graça na última página, senão contagem em cache ou estimativa (app/counting.py)
+    total = count_total(session, model, q, offset, len(items), next_cursor is not None, filters)
+    return items, total, next_cursor
 
-    # total seguro
-    total_stmt = select(func.count()).select_from(base.subquery())
-    total = session.exec(total_stmt).one()
+def _company_names(session: Session, items) -> Dict[int, str]:
+    ids = {item.company_id for item in items}
+    if not ids:
+        return {}
+    return dict(session.execute(select(Company.id, Company.name).where(Company.id.in_(ids))).all())
 
-    # ordenação
-    order_map = {"id": Company.id, "name": Company.name}
-    order_col = order_map.get(order_by, Company.id)
+def live_insert(q: Optional[str], order_by: str, desc: bool, page: int, has_next: bool) -> Optional[str]:
+    """
+    Se empresas novas aparecem nesta página: ordem por id, sem busca, na ponta
+    onde o id mais alto cai (fim da última página ou início da primeira em desc).
+    """
+    if q or order_by != "id":
+        return None
+    if desc:
+        return "head" if page == 1 else None
+    return None if has_next else "tail"
 
-    # paginação
-    offset = (page - 1) * size
-    items = session.exec(
-        base.order_by(order_col.desc() if desc else order_col.asc()).offset(offset).limit(size)
-    ).all()
-    return items, total
+def company_rows(items) -> List[Markup]:
+    return fragments.render("companies/_row.html", items, lambda c: (c.id, c.row_version), lambda c: {"c": c})
+
+def companies_context(items, total: Total, next_cursor, q, order_by, desc, page, size) -> dict:
+    """Contexto da listagem de empresas, o mesmo nas rotas sync e async."""
+    return page_context(
+        "/ui/companies", company_rows(items), total, next_cursor, page, size,
+        {"q": q or "", "order_by": order_by, "desc": desc},
+        live_insert=live_insert(q, order_by, desc, page, next_cursor is not None),
+    )
+
+def list_response(request: Request, entity: str, ctx: dict) -> Response:
+    if request.headers.get("HX-Request"):
+        return render_page(request, f"{entity}/_list.html", ctx)
+    # id da aba: o broadcast pula quem fez a escrita (ver app/live.py)
+    ctx.update(client_id=secrets.token_hex(8), client_header=CLIENT_HEADER)
+    return render_page(request, f"{entity}/index.html", ctx)
 
 @router.get("/", response_class=HTMLResponse)
 def home():
@@ -57,24 +95,76 @@ def ui_companies(
     order_by: str = Query("id"),
     desc: bool = Query(False),
     page: int = Query(1, ge=1),
-    size: int = Query(10, ge=1, le=100),
+    size: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
 ):
-    items, total = _fetch_companies(session, q, order_by, desc, page, size)
-    ctx = {
-        "request": request,
-        "companies": items,
-        "q": q or "",
-        "order_by": order_by,
-        "desc": desc,
-        "page": page,
-        "size": size,
-        "total": total,
-        "has_prev": page > 1,
-        "has_next": page * size < total,
-    }
-    if request.headers.get("HX-Request"):
-        return templates.TemplateResponse("companies/_list.html", ctx)
-    return templates.TemplateResponse("companies/index.html", ctx)
+    stmt, order_map = build_company_query(q)
+    items, total, next_cursor = _fetch_page(session, Company, stmt, order_map, q, order_by, desc, page, size, cursor)
+    ctx = companies_context(items, total, next_cursor, q, order_by, desc, page, size)
+    return list_response(request, "companies", ctx)
+
+@router.get("/contacts", response_class=HTMLResponse)
+def ui_contacts(
+    request: Request,
+    session: Session = Depends(get_session),
+    q: Optional[str] = Query(None),
+    page: int = Query(1, ge=1),
+    size: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+):
+    stmt, order_map = build_contact_query(q)
+    items, total, next_cursor = _fetch_page(session, Contact, stmt, order_map, q, "id", False, page, size, cursor)
+    names = _company_names(session, items)
+    rows = fragments.render(
+        "contacts/_row.html",
+        items,
+        # o nome da empresa vem de outra tabela: entra na chave junto com a versão da linha
+        lambda c: (c.id, c.row_version, names.get(c.company_id)),
+        lambda c: {"c": c, "company": names.get(c.company_id)},
+    )
+    ctx = page_context("/ui/contacts", rows, total, next_cursor, page, size, {"q": q or ""})
+    return list_response(request, "contacts", ctx)
+
+@router.get("/deals", response_class=HTMLResponse)
+def ui_deals(
+    request: Request,
+    session: Session = Depends(get_session),
+    q: Optional[str] = Query(None),
+    stage: Optional[str] = Query(None),
+    order_by: str = Query("id"),
+    desc: bool = Query(False),
+    page: int = Query(1, ge=1),
+    size: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+):
+    stage = stage or None  # "Todas" no select manda vazio
+    stmt, order_map = build_deal_query(stage=stage, q=q)
+    filters = (("stage", stage),) if stage else ()
+    items, total, next_cursor = _fetch_page(
+        session, Deal, stmt, order_map, q, order_by, desc, page, size, cursor, filters
+    )
+    names = _company_names(session, items)
+    rows = fragments.render(
+        "deals/_row.html",
+        items,
+        lambda d: (d.id, d.row_version, names.get(d.company_id)),
+        lambda d: {"d": d, "company": names.get(d.company_id)},
+    )
+    ctx = page_context(
+        "/ui/deals", rows, total, next_cursor, page, size,
+        {"q": q or "", "stage": stage or "", "order_by": order_by, "desc": desc},
+        stages=STAGES,
+    )
+    return list_response(request, "deals", ctx)
+
+@router.get("/events")
+async def ui_events(client: Optional[str] = Query(None)):
+    """Fragmentos publicados pelas escritas em empresas, por Server-Sent Events."""
+    return StreamingResponse(
+        broker.stream(client),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.post("/companies", response_class=HTMLResponse)
 def ui_create_company(
@@ -89,54 +179,21 @@ def ui_create_company(
     c = Company(name=name, email=email, phone=phone, website=website, notes=notes)
     session.add(c)
     session.commit()
+    invalidate_company()
     session.refresh(c)
-    # volta para primeira página
-    items, total = _fetch_companies(session, None, "id", False, 1, 10)
-    ctx = {
-        "request": request,
-        "companies": items,
-        "q": "",
-        "order_by": "id",
-        "desc": False,
-        "page": 1,
-        "size": 10,
-        "total": total,
-        "has_prev": False,
-        "has_next": 10 < total,
-    }
-    return templates.TemplateResponse("companies/_list.html", ctx)
+    # só o fragmento da linha nova; as outras abas recebem o mesmo por SSE
+    publish_company("created", c, request.headers.get(CLIENT_HEADER))
+    return HTMLResponse(company_fragment("created", c, flash=f"Empresa “{c.name}” criada (#{c.id})."))
 
 @router.delete("/companies/{company_id}", response_class=HTMLResponse)
-def ui_delete_company(
-    company_id: int,
-    request: Request,
-    session: Session = Depends(get_session),
-    q: Optional[str] = Query(None),
-    order_by: str = Query("id"),
-    desc: bool = Query(False),
-    page: int = Query(1, ge=1),
-    size: int = Query(10, ge=1, le=100),
-):
+def ui_delete_company(company_id: int, request: Request, session: Session = Depends(get_session)):
     obj = session.get(Company, company_id)
     if obj:
+        removed = [session.execute(stmt).rowcount for stmt in company_cascade([company_id])]
         session.delete(obj)
         session.commit()
-
-    items, total = _fetch_companies(session, q, order_by, desc, page, size)
-    if not items and page > 1:
-        page -= 1
-        items, total = _fetch_companies(session, q, order_by, desc, page, size)
-
-    ctx = {
-        "request": request,
-        "companies": items,
-        "q": q or "",
-        "order_by": order_by,
-        "desc": desc,
-        "page": page,
-        "size": size,
-        "total": total,
-        "has_prev": page > 1,
-        "has_next": page * size < total,
-    }
-    return templates.TemplateResponse("companies/_list.html", ctx)
+        invalidate_company(company_id)
+        invalidate_dependents(removed)
+        publish_company("deleted", {"id": company_id}, request.headers.get(CLIENT_HEADER))
+    # remove a linha onde ela estiver; a página não é consultada de novo
+    return HTMLResponse(company_fragment("deleted", {"id": company_id}, flash=f"Empresa #{company_id} excluída."))
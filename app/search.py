@@ -0,0 +1,159 @@
+# app/search.py
+"""
+Busca textual com SQLite FTS5.
+
+Cada tabela pesquisável ganha uma tabela FTS5 de conteúdo externo
+(`company_fts`, `contact_fts`, `deal_fts`) mantida em sincronia por triggers.
+Os parâmetros `q` das listagens passam por `apply_search`, que faz busca por
+prefixo ordenável por relevância (bm25). Se o SQLite não tiver FTS5, volta para
+o LIKE '%q%' de antes.
+
+Reconstrução dos índices de um banco existente:
+    python -m app.search rebuild
+"""
+import re
+import sqlite3
+import sys
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import column, func, literal_column, or_, select, table
+
+from .models import Company, Contact, Deal
+
+# tabela base -> (modelo, colunas indexadas, pesos do bm25)
+SEARCH_TABLES: Dict[str, Tuple[type, List[str], List[float]]] = {
+    "company": (Company, ["name"], [1.0]),
+    "contact": (Contact, ["name", "email"], [2.0, 1.0]),
+    "deal": (Deal, ["title", "notes"], [3.0, 1.0]),
+}
+
+# remove_diacritics: "saude" encontra "Saúde"; prefix: acelera buscas de 2-3 letras
+TOKENIZER = "unicode61 remove_diacritics 2"
+PREFIX = "2 3"
+
+
+@lru_cache(maxsize=1)
+def fts5_available() -> bool:
+    try:
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        conn.close()
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _fts_ddl(base: str, cols: List[str]) -> List[str]:
+    fts = f"{base}_fts"
+    col_list = ", ".join(cols)
+    new_vals = ", ".join(f"new.{c}" for c in cols)
+    old_vals = ", ".join(f"old.{c}" for c in cols)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{col_list}, content='{base}', content_rowid='id', "
+        f"tokenize='{TOKENIZER}', prefix='{PREFIX}')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {base} BEGIN "
+        f"INSERT INTO {fts}(rowid, {col_list}) VALUES (new.id, {new_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {base} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_vals}); END",
+        # só reindexa quando uma coluna indexada está no UPDATE
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {col_list} ON {base} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_vals}); "
+        f"INSERT INTO {fts}(rowid, {col_list}) VALUES (new.id, {new_vals}); END",
+    ]
+
+
+def install_search(engine) -> None:
+    """Cria tabelas FTS e triggers que faltarem; índices novos são populados na hora."""
+    if not fts5_available():
+        return
+    with engine.begin() as conn:
+        for base, (_, cols, _) in SEARCH_TABLES.items():
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (f"{base}_fts",)
+            ).first()
+            for ddl in _fts_ddl(base, cols):
+                conn.exec_driver_sql(ddl)
+            if not exists:
+                conn.exec_driver_sql(f"INSERT INTO {base}_fts({base}_fts) VALUES ('rebuild')")
+
+
+def rebuild_search(engine, tables: Optional[List[str]] = None) -> None:
+    """Recria o conteúdo dos índices FTS (todos, ou só os de `tables`) a partir das tabelas base."""
+    install_search(engine)
+    with engine.begin() as conn:
+        for base in SEARCH_TABLES:
+            if tables is not None and base not in tables:
+                continue
+            conn.exec_driver_sql(f"INSERT INTO {base}_fts({base}_fts) VALUES ('rebuild')")
+            conn.exec_driver_sql(f"INSERT INTO {base}_fts({base}_fts) VALUES ('optimize')")
+
+
+def fts_query(q: str) -> Optional[str]:
+    """
+    Converte o texto digitado em uma expressão FTS5 de prefixo:
+    'tech nov' -> '"tech"* "nov"*' (todas as palavras, cada uma como prefixo).
+    """
+    tokens = re.findall(r"\w+", q)
+    if not tokens:
+        return None
+    return " ".join('"%s"*' % tok for tok in tokens)
+
+
+def _like(model, cols: List[str], q: str):
+    # autoescape: % e _ digitados são literais, como no FTS
+    return or_(*[getattr(model, c).contains(q, autoescape=True) for c in cols])
+
+
+def apply_search(stmt, model, q: str):
+    """
+    Filtra `stmt` pelo texto `q` e devolve (stmt, coluna de relevância).
+    A relevância é o bm25 (menor = melhor); é None quando caiu no LIKE.
+    """
+    base = model.__tablename__
+    _, cols, weights = SEARCH_TABLES[base]
+    expr = fts_query(q)
+    if expr is None or not fts5_available():
+        return stmt.where(_like(model, cols, q)), None
+
+    fts = table(f"{base}_fts", column("rowid"))
+    fts_ref = literal_column(f"{base}_fts")
+    hits = (
+        select(fts.c.rowid.label("rowid"), func.bm25(fts_ref, *weights).label("rank"))
+        .where(fts_ref.match(expr))
+        .subquery(f"{base}_hits")
+    )
+    return stmt.join(hits, hits.c.rowid == model.id), hits.c.rank
+
+
+def match_ids(model, q: str):
+    """
+    Os mesmos ids que `apply_search` deixa passar, sem bm25 nem junção com a
+    tabela base, em ordem crescente de id (o que o FTS5 já entrega). Para contar.
+    """
+    base = model.__tablename__
+    _, cols, _ = SEARCH_TABLES[base]
+    expr = fts_query(q)
+    if expr is None or not fts5_available():
+        return select(model.id.label("id")).where(_like(model, cols, q))
+    fts = table(f"{base}_fts", column("rowid"))
+    return select(fts.c.rowid.label("id")).where(literal_column(f"{base}_fts").match(expr))
+
+
+def main():
+    from .database import engine, create_db_and_tables
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("uso: python -m app.search rebuild")
+        sys.exit(2)
+    if not fts5_available():
+        print("SQLite sem suporte a FTS5; nada a fazer.")
+        sys.exit(1)
+    create_db_and_tables()
+    rebuild_search(engine)
+    print("Índices de busca reconstruídos.")
+
+
+if __name__ == "__main__":
+    main()
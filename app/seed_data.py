@@ -1,86 +1,272 @@
 # app/seed_data.py
-from random import choice, randint, uniform
+"""
+Gerador de dados sintéticos. Completa o banco até as quantidades pedidas
+(sem argumentos: o top-up de demonstração de 3 empresas, 4 contatos e 12
+negócios) e serve para montar bases do tamanho da produção:
+
+    python -m app.seed_data --companies 100000 --contacts 1000000 --deals 5000000
+
+As contagens atuais vêm de COUNT(*) e as linhas entram por INSERT executemany
+em lotes. Em cargas grandes os índices secundários e os triggers (busca e
+deal_stage_stats) saem durante a carga e voltam no fim, com a busca e os
+agregados recalculados de uma vez. --seed fixa o gerador: mesma semente e
+mesmas quantidades, mesmos dados.
+
+Distribuições: funil de etapas (muitas em prospecção, poucas em contrato),
+valores log-normais, poucos vendedores com a maior parte da carteira, empresas
+antigas com mais contatos e negócios, datas de fechamento concentradas nos
+próximos meses (algumas vencidas, ~10% sem data).
+"""
+import argparse
+import math
+import random
+import time
 from datetime import date, timedelta
-from sqlmodel import Session, select
-from .database import engine, create_db_and_tables
-from .models import Company, Contact, Deal
+from itertools import accumulate
+from typing import Iterator, List, Sequence, Tuple
+
+from sqlalchemy import insert
+
+from .database import create_db_and_tables, engine, make_engine
+from .models import STAGES, Company, Contact, Deal
+from .changes import stamp_unversioned
+from .search import rebuild_search
+from .stats import reconcile
+
+DEMO_COMPANIES = 3
+DEMO_CONTACTS = 4
+DEMO_DEALS = 12
+
+BATCH_SIZE = 50_000
+# a partir daqui compensa tirar índices/triggers e reconstruir no fim
+BULK_THRESHOLD = 20_000
+
+# fatia do funil em cada etapa (soma 100)
+STAGE_WEIGHTS = [30, 20, 15, 12, 10, 8, 5]
+PROB_MAP = {
+    "prospeccao": 10, "oportunidade": 20, "identificacao": 30, "viabilidade": 40,
+    "precificacao": 60, "proposta": 75, "contrato": 95,
+}
+
+DEMO_COMPANY_ROWS = [
+    {"name": "TechNova", "email": "contato@technova.com", "phone": "11988887777",
+     "website": "www.technova.com.br", "notes": "Cliente em prospecção inicial"},
+    {"name": "AgroVale", "email": "vendas@agrovale.com.br", "phone": "11977776666", "website": None, "notes": None},
+    {"name": "Saude+ Clínicas", "email": "contato@saudemais.com", "phone": "1133334444", "website": None, "notes": None},
+]
+DEMO_CONTACTS_ROWS = [
+    ("Ana Silva", "ana@technova.com", "Compras"),
+    ("Bruno Souza", "bruno@agrovale.com.br", "Diretor"),
+    ("Carla Lima", "carla@saudemais.com", "Gerente"),
+    ("Diego Alves", "diego@technova.com", "TI"),
+]
 
-STAGES = [
-    "prospeccao", "oportunidade", "identificacao",
-    "viabilidade", "precificacao", "proposta", "contrato",
+NAME_PARTS = [
+    "Tech", "Agro", "Saude", "Log", "Fin", "Edu", "Construt", "Energ", "Varejo", "Ind",
+    "Nova", "Vale", "Sul", "Norte", "Prime", "Max", "Verde", "Alfa", "Beta", "Delta",
 ]
+COMPANY_SUFFIXES = ["Ltda", "S.A.", "ME", "Tecnologia", "Serviços", "Comércio", "Consultoria", "Group"]
+FIRST_NAMES = [
+    "Ana", "Bruno", "Carla", "Diego", "Eduarda", "Felipe", "Gabriela", "Henrique", "Isabela", "João",
+    "Larissa", "Marcos", "Natália", "Otávio", "Paula", "Rafael", "Sofia", "Thiago", "Vanessa", "William",
+]
+LAST_NAMES = [
+    "Silva", "Souza", "Lima", "Alves", "Pereira", "Costa", "Oliveira", "Santos", "Rodrigues", "Ferreira",
+    "Almeida", "Nascimento", "Carvalho", "Gomes", "Martins", "Araújo", "Ribeiro", "Barbosa", "Rocha", "Dias",
+]
+ROLES = ["Compras", "Diretor", "Gerente", "TI", "Financeiro", "CEO", "Operações", "Marketing", None]
+DEAL_KINDS = ["Implantação", "Licenças", "Consultoria", "Suporte anual", "Expansão", "Migração", "Treinamento"]
+NOTE_WORDS = [
+    "urgente", "renovação", "orçamento", "concorrente", "desconto", "piloto", "reunião",
+    "contrato", "integração", "aprovação", "diretoria", "prazo",
+]
+OWNERS = [f"{first} {last}" for first, last in zip(FIRST_NAMES, reversed(LAST_NAMES))] + ["Marcos"]
+
+
+def _zipf_cum_weights(n: int, s: float = 1.1) -> List[float]:
+    return list(accumulate(1 / (k ** s) for k in range(1, n + 1)))
+
+
+OWNER_CUM_WEIGHTS = _zipf_cum_weights(len(OWNERS))
+STAGE_CUM_WEIGHTS = list(accumulate(STAGE_WEIGHTS))
+
+
+def _skewed(rng: random.Random, ids: Sequence[int]) -> int:
+    # empresas mais antigas (ids baixos) concentram contatos e negócios
+    return ids[int(len(ids) * rng.random() ** 2)]
+
+
+def company_rows(rng: random.Random, start: int, n: int) -> Iterator[dict]:
+    for i in range(start, start + n):
+        base = f"{rng.choice(NAME_PARTS)}{rng.choice(NAME_PARTS).lower()}"
+        slug = f"{base.lower()}{i}"
+        yield {
+            "name": f"{base} {rng.choice(COMPANY_SUFFIXES)} {i}",
+            "email": f"contato@{slug}.com.br",
+            "phone": f"11{rng.randrange(10**8, 10**9)}",
+            "website": f"www.{slug}.com.br" if rng.random() < 0.7 else None,
+            "notes": None,
+        }
+
+
+def contact_rows(rng: random.Random, start: int, n: int, company_ids: Sequence[int]) -> Iterator[dict]:
+    for i in range(start, start + n):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield {
+            "name": f"{first} {last}",
+            "email": f"{first.lower()}.{i}@exemplo.com.br" if rng.random() < 0.9 else None,
+            "phone": f"119{rng.randrange(10**7, 10**8)}" if rng.random() < 0.6 else None,
+            "role": rng.choice(ROLES),
+            "company_id": _skewed(rng, company_ids),
+        }
+
+
+def deal_rows(rng: random.Random, start: int, n: int, company_ids: Sequence[int]) -> Iterator[dict]:
+    today = date.today()
+    stages = rng.choices(STAGES, cum_weights=STAGE_CUM_WEIGHTS, k=n)
+    owners = rng.choices(OWNERS, cum_weights=OWNER_CUM_WEIGHTS, k=n)
+    mu = math.log(20_000)
+    for i, stage, owner in zip(range(start, start + n), stages, owners):
+        closes_in = int(rng.triangular(-90, 365, 45))
+        notes = " ".join(rng.sample(NOTE_WORDS, 3)) if rng.random() < 0.3 else None
+        yield {
+            "title": f"{rng.choice(DEAL_KINDS)} #{i}",
+            "company_id": _skewed(rng, company_ids),
+            "value": round(min(rng.lognormvariate(mu, 1.0), 5_000_000), 2),
+            "stage": stage,
+            "probability": max(0, min(100, PROB_MAP[stage] + rng.randint(-10, 10))),
+            "expected_close_date": today + timedelta(days=closes_in) if rng.random() < 0.9 else None,
+            "owner": owner,
+            "notes": notes,
+        }
+
+
+def _batches(rows: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _count(conn, table: str) -> int:
+    return conn.exec_driver_sql(f"SELECT COUNT(*) FROM {table}").scalar()
+
+
+def _suspend_derived(conn, table: str) -> List[str]:
+    """Remove índices secundários e triggers de `table`; devolve o DDL para recriá-los."""
+    objects = conn.exec_driver_sql(
+        "SELECT type, name, sql FROM sqlite_master "
+        "WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,),
+    ).all()
+    for kind, name, _ in objects:
+        conn.exec_driver_sql(f"DROP {kind.upper()} {name}")
+    return [sql for _, _, sql in objects]
+
+
+def _load(conn, model, rows: Iterator[dict], n: int, batch_size: int) -> None:
+    table = model.__tablename__
+    bulk = n >= BULK_THRESHOLD
+    ddl = _suspend_derived(conn, table) if bulk else []
+    conn.commit()
+    done = 0
+    started = time.perf_counter()
+    for batch in _batches(rows, batch_size):
+        conn.execute(insert(model.__table__), batch)
+        conn.commit()
+        done += len(batch)
+        if bulk:
+            rate = done / (time.perf_counter() - started)
+            print(f"  {table}: {done}/{n} ({rate:,.0f} linhas/s)", end="\r", flush=True)
+    if bulk:
+        print()
+        print(f"  {table}: recriando {len(ddl)} índice(s)/trigger(s)...")
+        for sql in ddl:
+            conn.exec_driver_sql(sql)
+        conn.commit()
+
+
+def generate(
+    bind=engine,
+    companies: int = DEMO_COMPANIES,
+    contacts: int = DEMO_CONTACTS,
+    deals: int = DEMO_DEALS,
+    seed: int = 42,
+    batch_size: int = BATCH_SIZE,
+) -> Tuple[int, int, int]:
+    """
+    Completa as tabelas até as quantidades alvo e devolve quantas linhas
+    entraram em cada uma (empresas, contatos, negócios).
+    """
+    create_db_and_tables(bind)
+    rng = random.Random(seed)
+    with bind.connect() as conn:
+        # a carga pode ser refeita do zero; não precisa esperar o fsync de cada lote
+        conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        have = {m: _count(conn, m.__tablename__) for m in (Company, Contact, Deal)}
+        need = {
+            Company: max(0, companies - have[Company]),
+            Contact: max(0, contacts - have[Contact]),
+            Deal: max(0, deals - have[Deal]),
+        }
+
+        if need[Company]:
+            if have[Company] == 0 and companies <= len(DEMO_COMPANY_ROWS):
+                rows = iter(DEMO_COMPANY_ROWS[: need[Company]])
+            else:
+                rows = company_rows(rng, have[Company] + 1, need[Company])
+            _load(conn, Company, rows, need[Company], batch_size)
+
+        company_ids = [cid for (cid,) in conn.exec_driver_sql("SELECT id FROM company ORDER BY id")]
+        if company_ids and need[Contact]:
+            if have[Contact] == 0 and contacts <= len(DEMO_CONTACTS_ROWS):
+                rows = (
+                    {"name": n, "email": e, "phone": None, "role": r, "company_id": rng.choice(company_ids)}
+                    for n, e, r in DEMO_CONTACTS_ROWS[: need[Contact]]
+                )
+            else:
+                rows = contact_rows(rng, have[Contact] + 1, need[Contact], company_ids)
+            _load(conn, Contact, rows, need[Contact], batch_size)
+        if company_ids and need[Deal]:
+            _load(conn, Deal, deal_rows(rng, have[Deal] + 1, need[Deal], company_ids), need[Deal], batch_size)
+        conn.commit()
+
+    bulk_tables = [m.__tablename__ for m, n in need.items() if n >= BULK_THRESHOLD]
+    if bulk_tables:
+        print("Reconstruindo busca e agregados...")
+        rebuild_search(bind, tables=bulk_tables)
+        # carga sem triggers: as linhas entram no feed de mudanças aqui, de uma vez
+        with bind.begin() as conn:
+            stamp_unversioned(conn, bulk_tables)
+    if need[Deal] >= BULK_THRESHOLD:
+        reconcile(bind, fix=True)
+    if not company_ids:
+        need[Contact] = need[Deal] = 0
+    return need[Company], need[Contact], need[Deal]
 
-TARGET_COMPANIES = 3
-TARGET_CONTACTS  = 4
-TARGET_DEALS     = 12
-
-def top_up_data(session: Session):
-    # --- Companies ---
-    existing_companies = session.exec(select(Company)).all()
-    need_companies = max(0, TARGET_COMPANIES - len(existing_companies))
-    base_companies = [
-        Company(name="TechNova", email="contato@technova.com", phone="11988887777", website="www.technova.com.br", notes="Cliente em prospecção inicial"),
-        Company(name="AgroVale", email="vendas@agrovale.com.br", phone="11977776666"),
-        Company(name="Saude+ Clínicas", email="contato@saudemais.com", phone="1133334444"),
-    ]
-    # insira diferentes das já existentes pelo nome
-    existing_names = {c.name for c in existing_companies}
-    for c in base_companies:
-        if need_companies <= 0:
-            break
-        if c.name not in existing_names:
-            session.add(c)
-            need_companies -= 1
-    session.commit()
-
-    companies = session.exec(select(Company)).all()
-
-    # --- Contacts ---
-    existing_contacts = session.exec(select(Contact)).all()
-    need_contacts = max(0, TARGET_CONTACTS - len(existing_contacts))
-    base_contacts = [
-        ("Ana Silva", "ana@technova.com", "Compras"),
-        ("Bruno Souza", "bruno@agrovale.com.br", "Diretor"),
-        ("Carla Lima", "carla@saudemais.com", "Gerente"),
-        ("Diego Alves", "diego@technova.com", "TI"),
-    ]
-    i = 0
-    while need_contacts > 0 and companies:
-        nome, email, role = base_contacts[i % len(base_contacts)]
-        session.add(Contact(name=nome, email=email, role=role, company_id=choice(companies).id))
-        i += 1
-        need_contacts -= 1
-    session.commit()
-
-    # --- Deals ---
-    existing_deals = session.exec(select(Deal)).all()
-    need_deals = max(0, TARGET_DEALS - len(existing_deals))
-    prob_map = {
-        "prospeccao": 10, "oportunidade": 20, "identificacao": 30, "viabilidade": 40,
-        "precificacao": 60, "proposta": 75, "contrato": 95
-    }
-    for _ in range(need_deals):
-        comp = choice(companies)
-        value = round(uniform(5000, 60000), 2)
-        stage = choice(STAGES)
-        expected = date.today() + timedelta(days=randint(7, 60))
-        session.add(Deal(
-            title=f"Projeto {comp.name} #{randint(100,999)}",
-            company_id=comp.id,
-            value=value,
-            stage=stage,
-            probability=prob_map[stage],
-            expected_close_date=str(expected),
-            owner="Marcos",
-            notes="Seed automático (top-up)"
-        ))
-    session.commit()
 
 def main():
-    create_db_and_tables()
-    with Session(engine) as session:
-        top_up_data(session)
-        print("Seed/top-up concluído.")
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos até as quantidades pedidas.")
+    parser.add_argument("--companies", type=int, default=DEMO_COMPANIES)
+    parser.add_argument("--contacts", type=int, default=DEMO_CONTACTS)
+    parser.add_argument("--deals", type=int, default=DEMO_DEALS)
+    parser.add_argument("--seed", type=int, default=42, help="semente do gerador (reprodutível)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--database-url", help="banco alvo (padrão: CRM_DATABASE_URL)")
+    args = parser.parse_args()
+
+    bind = make_engine(args.database_url) if args.database_url else engine
+    started = time.perf_counter()
+    added = generate(bind, args.companies, args.contacts, args.deals, args.seed, args.batch_size)
+    print(
+        "Seed/top-up concluído: +%d empresas, +%d contatos, +%d negócios em %.1fs."
+        % (*added, time.perf_counter() - started)
+    )
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,75 @@
+# app/serialization.py
+"""
+Caminho rápido de serialização para as listagens.
+
+Em vez de carregar objetos ORM e deixar o FastAPI revalidar cada um contra o
+response_model (model_dump → validação → jsonable_encoder → json.dumps), a
+consulta seleciona só as colunas do modelo *Read e as tuplas vão direto para o
+orjson. O response_model continua declarado na rota, então o schema do OpenAPI
+não muda; os dados já vêm validados do banco (foram gravados pelos *Create).
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import orjson
+from fastapi import HTTPException, Response
+from sqlalchemy import exists, select, update
+
+from .models import Company
+
+
+def read_select(stmt, read_model) -> Tuple[object, List[str]]:
+    """
+    Troca as colunas do select de uma entidade pelas de `read_model`, na ordem
+    do modelo. Joins e filtros (inclusive a busca) continuam valendo.
+    """
+    entity = stmt.column_descriptions[0]["entity"]
+    fields = list(read_model.model_fields)
+    return stmt.with_only_columns(*[getattr(entity, f) for f in fields]), fields
+
+
+def update_returning(model, read_model, row_id: int, changes: Dict[str, Any]) -> Tuple[object, List[str]]:
+    """
+    PATCH numa ida só: UPDATE ... RETURNING com as colunas de `read_model`
+    (sem o SELECT antes e o refresh depois). Sem mudanças, só lê a linha.
+    Trocar company_id por uma empresa que não existe não casa nenhuma linha
+    (o SQLite roda sem PRAGMA foreign_keys); ver patch_miss.
+    """
+    fields = list(read_model.model_fields)
+    cols = [getattr(model, f) for f in fields]
+    if not changes:
+        return select(*cols).where(model.id == row_id), fields
+    stmt = update(model).where(model.id == row_id)
+    if changes.get("company_id") is not None and "company_id" in model.__table__.c:
+        stmt = stmt.where(exists().where(Company.id == changes["company_id"]))
+    stmt = stmt.values(**changes).returning(*cols).execution_options(synchronize_session=False)
+    return stmt, fields
+
+
+def patch_miss(found: bool, not_found: str, changes: Dict[str, Any]) -> HTTPException:
+    """Erro do PATCH sem linha: 404 se o registro não existe, senão faltou a empresa (422)."""
+    if not found:
+        return HTTPException(404, not_found)
+    return HTTPException(422, f"company_id {changes['company_id']} não encontrada")
+
+
+def returned_row(read_model, fields: List[str], row: Sequence) -> Dict[str, Any]:
+    # pelo read_model: o SQLite devolve REAL sem parte fracionária como int (0 em vez de 0.0)
+    return read_model.model_validate(dict(zip(fields, row))).model_dump()
+
+
+def returned_response(read_model, fields: List[str], row: Sequence) -> Response:
+    return json_response(returned_row(read_model, fields, row))
+
+
+def dump_rows(fields: List[str], rows: Sequence[Sequence]) -> bytes:
+    # orjson serializa date/datetime nativamente, no mesmo formato ISO do pydantic
+    return orjson.dumps([dict(zip(fields, row)) for row in rows])
+
+
+def rows_response(fields: List[str], rows: Sequence[Sequence], headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(dump_rows(fields, rows), media_type="application/json", headers=headers)
+
+
+def json_response(content: Any, headers: Optional[Dict[str, str]] = None, status_code: int = 200) -> Response:
+    """Para conteúdo já montado em dicts/listas (ex.: itens com relações embutidas)."""
+    return Response(orjson.dumps(content), status_code=status_code, media_type="application/json", headers=headers)
@@ -0,0 +1,119 @@
+# app/settings.py
+"""
+Configuração do app via variáveis de ambiente (prefixo CRM_) ou arquivo .env.
+
+Exemplos:
+    CRM_DATABASE_URL=sqlite:////dados/crm.db
+    CRM_SYNCHRONOUS=FULL
+    CRM_READ_POOL=false        # GETs usam o mesmo pool das escritas
+    CRM_ASYNC=1                # rotas async (ver app/main.py)
+    CRM_CACHE_ENABLED=false    # desliga o cache de respostas
+    CRM_METRICS_SERVER_TIMING=true
+    CRM_MULTI_TENANT=1         # um banco por tenant (ver app/tenancy.py)
+    CRM_ADMISSION_LIMITS='{"/deals/summary/*": 4}'
+"""
+from typing import Dict, List, Literal, Optional
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="CRM_", env_file=".env", extra="ignore")
+
+    database_url: str = "sqlite:///./crm.db"
+    echo_sql: bool = False
+    async_routes: bool = Field(False, validation_alias="CRM_ASYNC")
+
+    # PRAGMAs aplicados em toda conexão SQLite nova
+    journal_mode: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"] = "WAL"
+    synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    cache_size_kib: int = Field(64 * 1024, ge=0)  # por conexão
+    mmap_size: int = Field(256 * 1024 * 1024, ge=0)
+    temp_store: Literal["DEFAULT", "FILE", "MEMORY"] = "MEMORY"
+    busy_timeout_ms: int = Field(5000, ge=0)
+
+    # pool de escrita e pool somente leitura usado pelos GETs
+    pool_size: int = Field(5, ge=1)
+    max_overflow: int = Field(10, ge=0)
+    read_pool: bool = True
+    read_pool_size: int = Field(10, ge=1)
+
+    # cache de respostas GET (ver app/cache.py)
+    cache_enabled: bool = True
+    cache_ttl_seconds: float = Field(30.0, gt=0)
+    cache_max_entries: int = Field(1024, ge=1)
+    cache_max_bytes: int = Field(64 * 1024 * 1024, ge=0)
+
+    # coalescência de GETs idênticos e admissão por rota (ver app/admission.py)
+    threadpool_size: int = Field(40, ge=1)  # threads das rotas sync (o padrão do anyio é 40)
+    coalesce_enabled: bool = True
+    coalesce_routes: List[str] = [
+        "/deals/summary/*", "/deals/forecast", "/deals/facets", "/companies/*/overview", "/ui/companies",
+    ]
+    # destas, só o fragmento do HTMX (HX-Request): a página inteira leva o client id da aba para o SSE
+    coalesce_fragment_routes: List[str] = ["/ui/*"]
+    admission_enabled: bool = True
+    admission_default_limit: int = Field(16, ge=0)  # por rota (método + molde); 0 = sem limite
+    admission_limits: Dict[str, int] = {
+        "/*/export": 4, "/*/duplicates": 4, "/*/bulk-delete": 2, "/deals/forecast": 8,
+    }
+    admission_max_queue: int = Field(64, ge=0)  # por rota ou grupo; além disso 503 na hora
+    admission_queue_timeout_ms: float = Field(2000.0, ge=0)
+    admission_exempt: List[str] = ["/", "/metrics", "/ui/events", "/docs", "/openapi.json"]
+
+    # instrumentação (ver app/metrics.py)
+    metrics_enabled: bool = True
+    metrics_server_timing: bool = False  # cabeçalho Server-Timing nas respostas
+    slow_query_ms: float = Field(200.0, ge=0)
+
+    # snapshot de negócios da previsão e das facetas (ver app/deal_snapshot.py)
+    forecast_snapshot: bool = True  # false = /deals/forecast sempre GROUP BY no SQLite
+    facets_snapshot: bool = True  # false = /deals/facets sempre GROUP BY no SQLite
+    deal_snapshot_warmup: bool = True  # carrega o snapshot no startup, em segundo plano
+
+    # atualizações ao vivo da UI (ver app/live.py)
+    ui_events_heartbeat_seconds: float = Field(15.0, gt=0)
+    ui_events_queue_size: int = Field(256, ge=1)  # por aba; cheia = recarga da listagem
+
+    # renderização da UI (ver app/templating.py e app/rendering.py)
+    ui_bytecode_cache: bool = True
+    ui_bytecode_cache_dir: Optional[str] = None  # None = diretório temporário do Jinja
+    ui_templates_auto_reload: bool = True  # false = não confere a data dos templates a cada página
+    ui_fragment_cache_bytes: int = Field(16 * 1024 * 1024, ge=0)  # HTML das linhas; 0 = desliga
+    ui_stream_rows: int = Field(100, ge=1)  # páginas com pelo menos tantas linhas saem em streaming
+    ui_gzip_min_bytes: int = Field(1024, ge=0)
+    ui_gzip_level: int = Field(5, ge=1, le=9)
+
+    # totais da paginação da UI (ver app/counting.py)
+    ui_count_exact_limit: int = Field(10_000, ge=1)  # buscas com mais resultados têm total estimado
+    ui_count_ttl_seconds: float = Field(60.0, gt=0)
+    ui_count_cache_entries: int = Field(512, ge=1)
+
+    # jobs em segundo plano (ver app/jobs.py)
+    jobs_workers: int = Field(2, ge=1)
+    jobs_max_pending: int = Field(32, ge=1)  # na fila + rodando; acima disso POST /jobs devolve 503
+    jobs_dir: str = "./jobs"  # arquivos de resultado
+    jobs_retention_hours: float = Field(24.0, gt=0)
+    jobs_progress_seconds: float = Field(0.5, ge=0)
+
+    # exclusão em massa (ver app/bulk_delete.py)
+    bulk_delete_chunk: int = Field(1000, ge=1, le=10_000)  # linhas por tabela em cada transação
+    bulk_delete_archive_dir: str = "./archive"  # NDJSON das linhas apagadas com archive=true
+
+    # duplicatas de empresas e contatos (ver app/dedup.py)
+    dedup_min_score: float = Field(0.8, gt=0, le=1)
+    dedup_check_on_create: bool = True  # cabeçalho X-Possible-Duplicates nos POST
+    dedup_warmup: bool = True  # monta os índices no startup, em segundo plano
+
+    # vários clientes num processo, um arquivo SQLite por tenant (ver app/tenancy.py)
+    multi_tenant: bool = False
+    tenant_header: str = "X-Tenant"
+    tenant_domain: Optional[str] = None  # ex.: crm.exemplo.com -> tenant "acme" em acme.crm.exemplo.com
+    tenant_dir: str = "./tenants"
+    tenant_max_open: int = Field(256, ge=1)  # tenants com engines abertos (LRU); os demais são fechados
+    tenant_pool_size: int = Field(2, ge=1)  # por pool (escrita e leitura) de cada tenant
+    tenant_auto_create: bool = False  # tenant sem banco: cria na primeira requisição em vez de 404
+
+
+settings = Settings()
@@ -0,0 +1,131 @@
+# app/stats.py
+"""
+Agregados materializados do pipeline (tabela deal_stage_stats).
+
+Triggers em `deal` somam e subtraem cada linha inserida, alterada ou apagada,
+na mesma transação da escrita, então qualquer caminho (CRUD, lote, UPDATE em
+massa) mantém a tabela em dia e os resumos leem só uma linha por etapa.
+
+Conferência contra um recálculo completo:
+    python -m app.stats reconcile          # só relata divergências
+    python -m app.stats reconcile --fix    # e regrava a tabela
+"""
+import math
+import sys
+from typing import Dict, List, Tuple
+
+from .models import STAGES
+
+STATS_TABLE = "deal_stage_stats"
+
+_ADD_NEW = (
+    f"INSERT INTO {STATS_TABLE}(stage, deal_count, value_sum, weighted_sum) "
+    "VALUES (new.stage, 1, new.value, new.value * new.probability) "
+    "ON CONFLICT(stage) DO UPDATE SET "
+    "deal_count = deal_count + 1, "
+    "value_sum = value_sum + excluded.value_sum, "
+    "weighted_sum = weighted_sum + excluded.weighted_sum;"
+)
+_SUB_OLD = (
+    f"UPDATE {STATS_TABLE} SET "
+    "deal_count = deal_count - 1, "
+    "value_sum = value_sum - old.value, "
+    "weighted_sum = weighted_sum - old.value * old.probability "
+    "WHERE stage = old.stage;"
+)
+
+TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS deal_stats_ai AFTER INSERT ON deal BEGIN {_ADD_NEW} END",
+    f"CREATE TRIGGER IF NOT EXISTS deal_stats_ad AFTER DELETE ON deal BEGIN {_SUB_OLD} END",
+    # só quando muda algo que entra nos agregados
+    "CREATE TRIGGER IF NOT EXISTS deal_stats_au AFTER UPDATE OF stage, value, probability ON deal "
+    f"BEGIN {_SUB_OLD} {_ADD_NEW} END",
+]
+
+RECOMPUTE_SQL = (
+    "SELECT stage, COUNT(*), COALESCE(SUM(value), 0.0), COALESCE(SUM(value * probability), 0.0) "
+    "FROM deal GROUP BY stage"
+)
+
+Totals = Tuple[int, float, float]
+
+
+def _recompute(conn) -> Dict[str, Totals]:
+    totals = {stage: (0, 0.0, 0.0) for stage in STAGES}
+    for stage, count, value_sum, weighted_sum in conn.exec_driver_sql(RECOMPUTE_SQL):
+        totals[stage] = (count, float(value_sum), float(weighted_sum))
+    return totals
+
+
+def _write(conn, totals: Dict[str, Totals]) -> None:
+    conn.exec_driver_sql(f"DELETE FROM {STATS_TABLE}")
+    conn.exec_driver_sql(
+        f"INSERT INTO {STATS_TABLE}(stage, deal_count, value_sum, weighted_sum) VALUES (?, ?, ?, ?)",
+        [(stage, *vals) for stage, vals in totals.items()],
+    )
+
+
+def install_stats(engine) -> None:
+    """Cria os triggers e, se a tabela ainda estiver vazia, calcula os agregados atuais."""
+    with engine.begin() as conn:
+        for ddl in TRIGGERS:
+            conn.exec_driver_sql(ddl)
+        if conn.exec_driver_sql(f"SELECT COUNT(*) FROM {STATS_TABLE}").scalar() == 0:
+            _write(conn, _recompute(conn))
+
+
+def _close(a: float, b: float) -> bool:
+    # somas incrementais de float acumulam erro de arredondamento
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+
+
+def reconcile(engine, fix: bool = False) -> List[str]:
+    """
+    Compara a tabela com um GROUP BY completo de `deal` e devolve as divergências.
+    Com fix=True regrava a tabela dentro da mesma transação (sem janela de escrita).
+    """
+    with engine.begin() as conn:
+        expected = _recompute(conn)
+        stored = {
+            stage: (count, value_sum, weighted_sum)
+            for stage, count, value_sum, weighted_sum in conn.exec_driver_sql(
+                f"SELECT stage, deal_count, value_sum, weighted_sum FROM {STATS_TABLE}"
+            )
+        }
+        problems = []
+        for stage in sorted(set(expected) | set(stored)):
+            exp = expected.get(stage, (0, 0.0, 0.0))
+            got = stored.get(stage)
+            if got is None:
+                if exp[0]:
+                    problems.append(f"{stage}: ausente (esperado {exp})")
+                continue
+            if got[0] != exp[0] or not _close(got[1], exp[1]) or not _close(got[2], exp[2]):
+                problems.append(f"{stage}: tabela {got} != recálculo {exp}")
+        if fix and problems:
+            _write(conn, expected)
+    return problems
+
+
+def main():
+    from .database import engine, create_db_and_tables
+
+    args = sys.argv[1:]
+    if not args or args[0] != "reconcile" or set(args[1:]) - {"--fix"}:
+        print("uso: python -m app.stats reconcile [--fix]")
+        sys.exit(2)
+    create_db_and_tables()
+    fix = "--fix" in args
+    problems = reconcile(engine, fix=fix)
+    for problem in problems:
+        print(problem)
+    if not problems:
+        print("deal_stage_stats confere com o recálculo.")
+    elif fix:
+        print(f"{len(problems)} etapa(s) corrigida(s).")
+    else:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# app/templating.py
+"""
+Ambiente Jinja da UI (app/templates), compartilhado pelos routers, por
+app/rendering.py e pelos fragmentos ao vivo (app/live.py).
+
+O bytecode compilado vai para disco (CRM_UI_BYTECODE_CACHE_DIR, ou o
+diretório temporário do Jinja): worker novo não recompila os templates. Com
+CRM_UI_TEMPLATES_AUTO_RELOAD=false o Jinja também deixa de conferir a data
+dos arquivos a cada get_template.
+"""
+from pathlib import Path
+from typing import Optional
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import BytecodeCache, Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from .settings import settings
+
+TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
+
+
+def _bytecode_cache() -> Optional[BytecodeCache]:
+    if not settings.ui_bytecode_cache:
+        return None
+    if settings.ui_bytecode_cache_dir:
+        Path(settings.ui_bytecode_cache_dir).mkdir(parents=True, exist_ok=True)
+    return FileSystemBytecodeCache(settings.ui_bytecode_cache_dir)
+
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=True,
+    bytecode_cache=_bytecode_cache(),
+    auto_reload=settings.ui_templates_auto_reload,
+)
+templates = Jinja2Templates(env=env)
@@ -0,0 +1,328 @@
+# app/tenancy.py
+"""
+Modo multi-tenant (CRM_MULTI_TENANT=1): um arquivo SQLite por cliente, todos
+servidos pelo mesmo processo.
+
+- O tenant vem do cabeçalho CRM_TENANT_HEADER (X-Tenant) ou, com
+  CRM_TENANT_DOMAIN=crm.exemplo.com, do subdomínio (acme.crm.exemplo.com).
+  O nome vira nome de arquivo: minúsculas, dígitos, "-" e "_".
+- TenantMiddleware põe os engines do tenant em current_binds()
+  (app/database.py) durante a requisição: sessões, cache de respostas,
+  totais da UI, SSE, jobs, exportações, duplicatas e previsão passam a ser
+  por tenant sem que os handlers saibam disso.
+- Engines e pools abrem sob demanda e ficam num LRU de até
+  CRM_TENANT_MAX_OPEN tenants; o que sai do LRU é descartado (dispose) e
+  libera arquivos e memória. Snapshots de previsão e índices de duplicatas
+  são por engine e saem junto.
+- Esquema: o banco de um tenant novo é copiado (VACUUM INTO) de um modelo em
+  memória, montado uma vez por processo com create_db_and_tables. O PRAGMA
+  user_version guarda a impressão digital desse esquema; um banco que já
+  existia só passa por create_db_and_tables (migração) quando ela não bate.
+
+    python -m app.tenancy create acme beta   # cria os bancos
+    python -m app.tenancy list
+"""
+import argparse
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy.pool import StaticPool
+from sqlmodel import create_engine
+
+from .database import Binds, create_db_and_tables, make_tenant_binds, use_binds
+from .settings import Settings, settings
+
+TENANT_NAME = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+DB_SUFFIX = ".db"
+
+# sem tenant: raiz, métricas e documentação da API
+EXEMPT_PATHS = {"/", "/metrics", "/docs", "/docs/oauth2-redirect", "/redoc", "/openapi.json"}
+
+
+# ------------------- esquema ------------------- #
+
+def schema_fingerprint(conn) -> int:
+    """CRC do sqlite_master (tabelas, índices, triggers), no intervalo de PRAGMA user_version."""
+    rows = conn.exec_driver_sql(
+        "SELECT type, name, sql FROM sqlite_master WHERE sql IS NOT NULL ORDER BY type, name"
+    ).all()
+    return zlib.crc32(repr([tuple(row) for row in rows]).encode()) & 0x7FFFFFFF
+
+
+class SchemaTemplate:
+    """Banco vazio em memória com o esquema atual; cada tenant novo é uma cópia dele."""
+
+    def __init__(self):
+        self._engine = None
+        self._fingerprint = 0
+        self._lock = threading.Lock()
+
+    def _ensure(self):
+        # chamado com o lock
+        if self._engine is None:
+            engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+            create_db_and_tables(engine)
+            with engine.begin() as conn:
+                self._fingerprint = schema_fingerprint(conn)
+                conn.exec_driver_sql(f"PRAGMA user_version = {self._fingerprint}")
+            self._engine = engine
+        return self._engine
+
+    @property
+    def fingerprint(self) -> int:
+        if self._engine is None:
+            with self._lock:
+                self._ensure()
+        return self._fingerprint
+
+    def copy_to(self, path: Path) -> bool:
+        """Cria `path` com o esquema; False se outro processo/thread criou antes."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.unlink(missing_ok=True)
+        try:
+            with self._lock:
+                with self._ensure().connect() as conn:
+                    conn.exec_driver_sql("VACUUM INTO ?", (str(tmp),))
+            # link falha se o arquivo já existe: criação atômica entre processos
+            os.link(tmp, path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            tmp.unlink(missing_ok=True)
+
+
+template = SchemaTemplate()
+
+
+# ------------------- engines por tenant ------------------- #
+
+@dataclass
+class TenantStats:
+    hits: int = 0
+    opens: int = 0
+    evictions: int = 0
+    created: int = 0
+    migrations: int = 0  # bancos que passaram por create_db_and_tables ao abrir
+    not_found: int = 0
+
+
+class TenantEngines:
+    """LRU de Binds por tenant; abrir é preguiçoso, sair do LRU é dispose."""
+
+    def __init__(self, root: str, max_open: int, cfg: Settings = settings):
+        self.root = Path(root)
+        self.max_open = max_open
+        # pools pequenos: são muitos tenants, cada um com poucas requisições simultâneas
+        self.cfg = cfg.model_copy(update={"pool_size": cfg.tenant_pool_size, "read_pool_size": cfg.tenant_pool_size})
+        self.stats = TenantStats()
+        self._open: "OrderedDict[str, Binds]" = OrderedDict()
+        self._opening: Dict[str, threading.Lock] = {}
+        self._closing: List[Binds] = []  # engines async: o dispose é aguardado no event loop
+        self._recovered: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+    def path(self, tenant: str) -> Path:
+        return self.root / f"{tenant}{DB_SUFFIX}"
+
+    def names(self) -> List[str]:
+        if not self.root.is_dir():
+            return []
+        return sorted(p.name[: -len(DB_SUFFIX)] for p in self.root.glob(f"*{DB_SUFFIX}"))
+
+    def create(self, tenant: str) -> bool:
+        """Cria o banco do tenant; False se já existia."""
+        if self.path(tenant).exists() or not template.copy_to(self.path(tenant)):
+            return False
+        self.stats.created += 1
+        return True
+
+    def cached(self, tenant: str) -> Optional[Binds]:
+        """Os engines se o tenant já está aberto; nunca bloqueia em I/O."""
+        with self._lock:
+            binds = self._open.get(tenant)
+            if binds is not None:
+                self._open.move_to_end(tenant)
+                self.stats.hits += 1
+            return binds
+
+    def get(self, tenant: str, create: bool = False) -> Optional[Binds]:
+        """Engines do tenant, abrindo se preciso; None se o banco não existe (e create=False)."""
+        binds = self.cached(tenant)
+        if binds is not None:
+            return binds
+        with self._lock:
+            opening = self._opening.setdefault(tenant, threading.Lock())
+        with opening:  # uma abertura por tenant; as outras esperam e reaproveitam
+            binds = self.cached(tenant)
+            if binds is not None:
+                return binds
+            evicted = []
+            try:
+                binds = self._open_tenant(tenant, create)
+            finally:
+                with self._lock:
+                    # no mesmo lock da inserção: quem chegar agora já acha o tenant aberto
+                    self._opening.pop(tenant, None)
+                    if binds is not None:
+                        self._open[tenant] = binds
+                        while len(self._open) > self.max_open:
+                            evicted.append(self._open.popitem(last=False)[1])
+            for old in evicted:
+                self._dispose(old)
+        return binds
+
+    def _open_tenant(self, tenant: str, create: bool) -> Optional[Binds]:
+        path = self.path(tenant)
+        if not path.exists():
+            if not create:
+                self.stats.not_found += 1
+                return None
+            if self.create(tenant):
+                self._recovered.add(tenant)  # banco novo: não há jobs para recuperar
+        binds = make_tenant_binds(str(path), self.cfg, tenant)
+        self._migrate(binds)
+        if tenant not in self._recovered:
+            # jobs órfãos de um processo anterior: uma vez por tenant neste processo
+            from .jobs import recover_jobs
+
+            with use_binds(binds):
+                recover_jobs()
+            self._recovered.add(tenant)
+        self.stats.opens += 1
+        return binds
+
+    def _migrate(self, binds: Binds) -> None:
+        fingerprint = template.fingerprint
+        with binds.engine.connect() as conn:
+            current = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        if current != fingerprint:
+            create_db_and_tables(binds.engine)
+            with binds.engine.begin() as conn:
+                conn.exec_driver_sql(f"PRAGMA user_version = {fingerprint}")
+            self.stats.migrations += 1
+
+    def _dispose(self, binds: Binds) -> None:
+        # conexões em uso por requisições em andamento fecham quando voltarem ao pool
+        self.stats.evictions += 1
+        binds.engine.dispose()
+        if binds.read_engine is not binds.engine:
+            binds.read_engine.dispose()
+        if binds.async_engine is not None:
+            with self._lock:
+                self._closing.append(binds)
+
+    @property
+    def closing(self) -> bool:
+        return bool(self._closing)
+
+    async def close_pending(self) -> None:
+        """Dispose dos engines async que saíram do LRU (só dá para fazer no event loop)."""
+        with self._lock:
+            pending, self._closing = self._closing, []
+        for binds in pending:
+            await binds.async_engine.dispose()
+            if binds.async_read_engine is not binds.async_engine:
+                await binds.async_read_engine.dispose()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            opened = list(self._open.values())
+            self._open.clear()
+        for binds in opened:
+            self._dispose(binds)
+        await self.close_pending()
+
+
+tenant_engines = TenantEngines(settings.tenant_dir, settings.tenant_max_open)
+
+
+# ------------------- resolução ------------------- #
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def tenant_from_host(host: str, domain: str) -> Optional[str]:
+    """acme.crm.exemplo.com (domain crm.exemplo.com) -> "acme"; outro host -> None."""
+    host = host.split(":", 1)[0].lower()
+    suffix = "." + domain.lower().strip(".")
+    if not host.endswith(suffix):
+        return None
+    label = host[: -len(suffix)]
+    return label if label and "." not in label else None
+
+
+def resolve_tenant(scope, cfg: Settings = settings) -> Optional[str]:
+    """Cabeçalho primeiro (clientes da API), subdomínio depois (navegador)."""
+    tenant = _header(scope, cfg.tenant_header.lower().encode("latin-1"))
+    if tenant:
+        return tenant.strip().lower()
+    if cfg.tenant_domain:
+        host = _header(scope, b"host")
+        if host:
+            return tenant_from_host(host, cfg.tenant_domain)
+    return None
+
+
+class TenantMiddleware:
+    def __init__(self, app, engines: TenantEngines = tenant_engines):
+        self.app = app
+        self.engines = engines
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+        tenant = resolve_tenant(scope)
+        if tenant is None:
+            detail = f"Tenant ausente: use o cabeçalho {settings.tenant_header} ou o subdomínio"
+            return await JSONResponse({"detail": detail}, status_code=400)(scope, receive, send)
+        if not TENANT_NAME.match(tenant):
+            return await JSONResponse({"detail": "Tenant inválido"}, status_code=400)(scope, receive, send)
+        binds = self.engines.cached(tenant)
+        if binds is None:
+            # abrir pode migrar o esquema ou criar o arquivo: fora do event loop
+            binds = await run_in_threadpool(self.engines.get, tenant, settings.tenant_auto_create)
+            if binds is None:
+                return await JSONResponse({"detail": "Tenant não encontrado"}, status_code=404)(scope, receive, send)
+        if self.engines.closing:
+            await self.engines.close_pending()
+        with use_binds(binds):
+            await self.app(scope, receive, send)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bancos dos tenants (CRM_TENANT_DIR).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    create = sub.add_parser("create", help="cria os bancos (os que já existem ficam como estão)")
+    create.add_argument("names", nargs="+")
+    sub.add_parser("list", help="lista os tenants")
+    args = parser.parse_args()
+
+    if args.cmd == "list":
+        print("\n".join(tenant_engines.names()))
+        return
+    for name in args.names:
+        if not TENANT_NAME.match(name):
+            parser.error(f"nome inválido: {name}")
+    created = sum(tenant_engines.create(name) for name in args.names)
+    print(f"{created} tenant(s) criado(s) em {tenant_engines.root}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# benchmarks/admission.py
+"""
+Rajada de painéis com rotas lentas no meio (app/admission.py).
+
+Sobe um uvicorn por configuração num banco temporário e, por --seconds,
+roda ao mesmo tempo três tipos de cliente:
+
+- painéis: abrem juntos e pedem as mesmas leituras (resumos por etapa,
+  /ui/companies, facetas), enquanto um cliente de escrita cria negócios e
+  derruba o cache de respostas a cada --write-ms;
+- lentos: exportações CSV completas, uma atrás da outra;
+- rápidos: detalhe de negócio por id.
+
+Para cada configuração (tudo desligado, só coalescência, coalescência e
+admissão) mostra vazão, p50/p99 e 503 por tipo de cliente, além dos
+statements SQL executados e das caronas/rejeições vistas em /metrics.
+Requer httpx.
+
+    python -m benchmarks.admission [--deals 50000] [--dashboards 32] [--slow 16] [--seconds 10]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.async_load import STAGES, free_port, seed, start_server
+
+CONFIGS = [
+    ("desligado", {"CRM_COALESCE_ENABLED": "0", "CRM_ADMISSION_ENABLED": "0"}),
+    ("coalescência", {"CRM_COALESCE_ENABLED": "1", "CRM_ADMISSION_ENABLED": "0"}),
+    ("coalescência + admissão", {"CRM_COALESCE_ENABLED": "1", "CRM_ADMISSION_ENABLED": "1"}),
+]
+
+DASHBOARD = [
+    "/deals/summary/stage-counts",
+    "/deals/summary/stage-values",
+    "/ui/companies",
+    "/deals/facets?stage=proposta",
+]
+
+
+class Tally:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.shed = 0
+        self.errors = 0
+
+    async def get(self, client: httpx.AsyncClient, path: str) -> None:
+        start = time.perf_counter()
+        try:
+            resp = await client.get(path)
+            if resp.status_code == 503:
+                self.shed += 1
+            elif resp.status_code >= 400:
+                self.errors += 1
+        except httpx.HTTPError:
+            self.errors += 1
+        self.latencies.append(time.perf_counter() - start)
+
+    def row(self, name: str, elapsed: float) -> str:
+        lat = sorted(self.latencies) or [float("nan")]
+        p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+        return (
+            f"  {name:<22} {len(self.latencies) / elapsed:>8.0f} {statistics.median(lat) * 1000:>8.1f} "
+            f"{p99 * 1000:>9.1f} {self.shed:>6} {self.errors:>6}"
+        )
+
+
+async def run_load(base: str, args, deals: int) -> Dict[str, Tally]:
+    tallies = {"painéis": Tally(), "lentos": Tally(), "rápidos": Tally()}
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=120) as client:
+        deadline = time.perf_counter() + args.seconds
+
+        async def dashboards():
+            # todos os painéis abrem juntos a cada rodada
+            while time.perf_counter() < deadline:
+                await asyncio.gather(*(
+                    tallies["painéis"].get(client, path) for _ in range(args.dashboards) for path in DASHBOARD
+                ))
+
+        async def writer():
+            while time.perf_counter() < deadline:
+                body = {"title": "Novo", "company_id": 1, "value": 1000.0, "stage": random.choice(STAGES)}
+                try:
+                    await client.post("/deals/", json=body)
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(args.write_ms / 1000)
+
+        async def slow():
+            while time.perf_counter() < deadline:
+                await tallies["lentos"].get(client, "/deals/export?format=csv")
+
+        async def fast():
+            while time.perf_counter() < deadline:
+                await tallies["rápidos"].get(client, f"/deals/{random.randint(1, deals)}")
+                await asyncio.sleep(0.005)
+
+        await asyncio.gather(
+            dashboards(), writer(), *(slow() for _ in range(args.slow)), *(fast() for _ in range(args.fast))
+        )
+    return tallies
+
+
+def server_metrics(base: str) -> Dict[str, float]:
+    text = httpx.get(f"{base}/metrics", timeout=30).text
+    totals: Dict[str, float] = {}
+    for line in text.splitlines():
+        if line.startswith(("crm_sql_statements_total", "crm_coalesce_", "crm_admission_rejected_total",
+                            "crm_admission_timeouts_total")):
+            name, value = line.rsplit(" ", 1)
+            name = name.split("{", 1)[0]
+            totals[name] = totals.get(name, 0.0) + float(value)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--deals", type=int, default=50000)
+    parser.add_argument("--dashboards", type=int, default=32, help="painéis abertos juntos a cada rodada")
+    parser.add_argument("--slow", type=int, default=16, help="clientes pedindo exportações")
+    parser.add_argument("--fast", type=int, default=8, help="clientes pedindo detalhes por id")
+    parser.add_argument("--write-ms", type=float, default=50.0)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"{'configuração / cliente':<24} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>9} {'503':>6} {'erros':>6}")
+    for name, env in CONFIGS:
+        workdir = tempfile.mkdtemp(prefix="crm-admission-")
+        port = free_port()
+        proc = start_server(workdir, False, port, dict(env, CRM_DEDUP_WARMUP="0"))
+        base = f"http://127.0.0.1:{port}"
+        try:
+            seed(base, args.deals)
+            before = server_metrics(base)
+            start = time.perf_counter()
+            tallies = asyncio.run(run_load(base, args, args.deals))
+            elapsed = time.perf_counter() - start
+            m = {k: v - before.get(k, 0.0) for k, v in server_metrics(base).items()}
+            print(name)
+            for kind, tally in tallies.items():
+                print(tally.row(kind, elapsed))
+            print(
+                f"  SQL {m.get('crm_sql_statements_total', 0):,.0f} statements, "
+                f"{m.get('crm_coalesce_followers_total', 0):,.0f} caronas, "
+                f"{m.get('crm_admission_rejected_total', 0) + m.get('crm_admission_timeouts_total', 0):,.0f} recusadas"
+            )
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
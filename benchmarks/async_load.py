@@ -0,0 +1,142 @@
+# benchmarks/async_load.py
+"""
+Carga concorrente nas rotas sync (threadpool) e async (CRM_ASYNC=1).
+
+Sobe um uvicorn por modo num banco temporário com dados de exemplo e dispara
+uma mistura de leituras com N clientes simultâneos, medindo vazão e latência
+(p50/p99). Requer httpx.
+
+    python -m benchmarks.async_load [--clients 50 200 1000] [--requests 5000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+STAGES = ["prospeccao", "oportunidade", "identificacao", "viabilidade", "precificacao", "proposta", "contrato"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str, async_mode: bool, port: int, extra_env=None) -> subprocess.Popen:
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT), CRM_ASYNC="1" if async_mode else "0", **(extra_env or {}))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1).raise_for_status()
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("uvicorn não subiu")
+
+
+def seed(base: str, deals: int) -> None:
+    companies = [{"name": f"Empresa {i}"} for i in range(200)]
+    httpx.post(f"{base}/companies/bulk", json=companies, timeout=60).raise_for_status()
+    rows = [
+        {
+            "title": f"Projeto {i}",
+            "company_id": 1 + i % 200,
+            "value": float(random.randint(1000, 90000)),
+            "stage": random.choice(STAGES),
+            "probability": random.randint(0, 100),
+        }
+        for i in range(deals)
+    ]
+    body = "\n".join(json.dumps(r) for r in rows)
+    resp = httpx.post(
+        f"{base}/deals/bulk", content=body, headers={"content-type": "application/x-ndjson"}, timeout=120
+    )
+    resp.raise_for_status()
+
+
+def request_mix(deals: int):
+    return [
+        lambda: "/deals/?limit=50",
+        lambda: f"/deals/{random.randint(1, deals)}",
+        lambda: f"/deals/?stage={random.choice(STAGES)}&order_by=value&desc=true&limit=20",
+        lambda: "/deals/summary/stage-counts",
+        lambda: f"/companies/{random.randint(1, 200)}",
+        lambda: "/companies/?q=empresa&limit=20",
+    ]
+
+
+async def run_load(base: str, clients: int, total: int, deals: int):
+    mix = request_mix(deals)
+    latencies = []
+    errors = 0
+    remaining = total
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                path = random.choice(mix)()
+                start = time.perf_counter()
+                try:
+                    resp = await client.get(path)
+                    if resp.status_code >= 500:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return len(latencies) / elapsed, statistics.median(latencies), p99, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--deals", type=int, default=50000)
+    args = parser.parse_args()
+
+    print(f"{'modo':<6} {'clientes':>8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'erros':>6}")
+    for async_mode in (False, True):
+        workdir = tempfile.mkdtemp(prefix="crm-load-")
+        port = free_port()
+        proc = start_server(workdir, async_mode, port)
+        base = f"http://127.0.0.1:{port}"
+        try:
+            seed(base, args.deals)
+            for clients in args.clients:
+                rps, p50, p99, errors = asyncio.run(run_load(base, clients, args.requests, args.deals))
+                mode = "async" if async_mode else "sync"
+                print(f"{mode:<6} {clients:>8} {rps:>9.0f} {p50 * 1000:>9.1f} {p99 * 1000:>9.1f} {errors:>6}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
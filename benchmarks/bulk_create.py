@@ -0,0 +1,88 @@
+# benchmarks/bulk_create.py
+"""
+Compara criação de negócios um a um (POST /deals/) com /deals/bulk
+em JSON, NDJSON e CSV. Roda num banco temporário, não toca no crm.db.
+
+    python -m benchmarks.bulk_create [--per-row 2000] [--bulk 50000]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+STAGES = ["prospeccao", "oportunidade", "identificacao", "viabilidade", "precificacao", "proposta", "contrato"]
+
+
+def make_deals(n: int, company_id: int):
+    return [
+        {
+            "title": f"Negócio {i}",
+            "company_id": company_id,
+            "value": float(1000 + i % 50000),
+            "stage": STAGES[i % len(STAGES)],
+            "probability": (i * 7) % 101,
+            "expected_close_date": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            "owner": f"vendedor{i % 20}",
+        }
+        for i in range(n)
+    ]
+
+
+def to_ndjson(rows) -> bytes:
+    return "\n".join(json.dumps(r) for r in rows).encode()
+
+
+def to_csv(rows) -> bytes:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode()
+
+
+def report(label: str, n: int, seconds: float) -> None:
+    print(f"{label:<22} {n:>8} linhas  {seconds:8.2f}s  {n / seconds:>10.0f} linhas/s  {seconds / n * 1e6:8.1f} µs/linha")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--per-row", type=int, default=2000)
+    parser.add_argument("--bulk", type=int, default=50000)
+    args = parser.parse_args()
+
+    # o app usa ./crm.db relativo ao diretório atual
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    os.chdir(tempfile.mkdtemp(prefix="crm-bench-"))
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        company_id = client.post("/companies/", json={"name": "Benchmark"}).json()["id"]
+
+        rows = make_deals(args.per_row, company_id)
+        start = time.perf_counter()
+        for row in rows:
+            client.post("/deals/", json=row).raise_for_status()
+        report("POST /deals/ (1 a 1)", len(rows), time.perf_counter() - start)
+
+        rows = make_deals(args.bulk, company_id)
+        bodies = [
+            ("bulk JSON", json.dumps(rows).encode(), "application/json"),
+            ("bulk NDJSON", to_ndjson(rows), "application/x-ndjson"),
+            ("bulk CSV", to_csv(rows), "text/csv"),
+        ]
+        for label, body, content_type in bodies:
+            start = time.perf_counter()
+            resp = client.post("/deals/bulk", content=body, headers={"content-type": content_type})
+            resp.raise_for_status()
+            assert resp.json()["inserted"] == len(rows), resp.json()
+            report(label, len(rows), time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+# benchmarks/e2e.py
+"""
+Suíte ponta a ponta: latência e vazão de cada rota da API e da UI contra uma
+base gerada por app.seed_data, com resultados guardados para comparar execuções.
+
+    python -m benchmarks.e2e run --dataset medium --label antes
+    python -m benchmarks.e2e run --dataset medium --label depois [--async] [--no-cache]
+    python -m benchmarks.e2e compare benchmarks/results/<antes>.json benchmarks/results/<depois>.json
+
+Datasets (empresas/contatos/negócios): small 1k/10k/50k, medium 10k/100k/500k,
+large 100k/1M/5M. Cada um é gerado uma vez em benchmarks/.data/ (mesma semente,
+mesmos dados) e copiado para um diretório temporário a cada execução, então
+toda execução parte do mesmo estado. Os parâmetros das requisições também vêm
+de um gerador com semente fixa.
+
+Cada rota recebe --requests requisições com --concurrency clientes; o JSON em
+benchmarks/results/ traz p50/p95/p99, média, req/s e erros por rota, além do
+commit, do dataset e da configuração usados.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.async_load import REPO_ROOT, free_port, start_server
+
+DATA_DIR = REPO_ROOT / "benchmarks" / ".data"
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+DATASETS = {
+    "small": (1_000, 10_000, 50_000),
+    "medium": (10_000, 100_000, 500_000),
+    "large": (100_000, 1_000_000, 5_000_000),
+}
+
+STAGES = ["prospeccao", "oportunidade", "identificacao", "viabilidade", "precificacao", "proposta", "contrato"]
+SEARCH_TERMS = ["tech", "agro", "nova", "silva", "ana", "implanta", "urgente", "contrato", "vale sul"]
+
+# (caminho, kwargs do httpx) de uma requisição
+Call = Tuple[str, dict]
+
+
+@dataclass
+class Route:
+    name: str
+    method: str
+    build: Callable[[random.Random, dict], Call]
+    # guarda algo da resposta (ids criados) para as rotas seguintes
+    collect: Optional[Callable[[httpx.Response, dict], None]] = None
+    # remoções: quais ids criados a rota consome (limita o número de requisições)
+    consumes: Optional[str] = None
+
+
+def _pick(rng: random.Random, ctx: dict, entity: str) -> int:
+    return rng.randint(1, ctx["max_id"][entity])
+
+
+def _take(ctx: dict, key: str) -> int:
+    # ids criados pela própria execução; update/delete nunca tocam no dataset
+    return ctx["created"][key].pop()
+
+
+def _own(rng: random.Random, ctx: dict, key: str) -> int:
+    # atualizações preferem o que a execução criou; o banco é uma cópia de qualquer forma
+    created = ctx["created"][key]
+    return created[-1] if created else _pick(rng, ctx, key)
+
+
+def _created(key: str):
+    def collect(resp: httpx.Response, ctx: dict) -> None:
+        if resp.status_code == 201:
+            ctx["created"][key].append(resp.json()["id"])
+    return collect
+
+
+def _company(rng: random.Random) -> dict:
+    return {"name": f"Bench {rng.randrange(10**9)}", "email": "bench@exemplo.com"}
+
+
+def _contact(rng: random.Random, ctx: dict) -> dict:
+    return {"name": f"Bench {rng.randrange(10**9)}", "company_id": _pick(rng, ctx, "company")}
+
+
+def _deal(rng: random.Random, ctx: dict) -> dict:
+    return {
+        "title": f"Bench {rng.randrange(10**9)}",
+        "company_id": _pick(rng, ctx, "company"),
+        "value": float(rng.randint(1_000, 90_000)),
+        "stage": rng.choice(STAGES),
+        "probability": rng.randint(0, 100),
+    }
+
+
+def _bulk(rows: List[dict]) -> dict:
+    return {"content": "\n".join(json.dumps(r) for r in rows), "headers": {"content-type": "application/x-ndjson"}}
+
+
+HX = {"headers": {"HX-Request": "true"}}
+
+ROUTES: List[Route] = [
+    Route("root", "GET", lambda rng, ctx: ("/", {})),
+    # ---- empresas ----
+    Route("companies.list", "GET", lambda rng, ctx: ("/companies/?limit=50", {})),
+    Route("companies.list.name_desc", "GET", lambda rng, ctx: ("/companies/?order_by=name&desc=true&limit=50", {})),
+    Route("companies.list.offset", "GET", lambda rng, ctx: (f"/companies/?limit=50&offset={rng.randint(0, 5000)}", {})),
+    Route("companies.search", "GET", lambda rng, ctx: (f"/companies/?q={rng.choice(SEARCH_TERMS)}&order_by=relevance&limit=20", {})),
+    Route("companies.get", "GET", lambda rng, ctx: (f"/companies/{_pick(rng, ctx, 'company')}", {})),
+    Route("companies.overview", "GET", lambda rng, ctx: (f"/companies/{_pick(rng, ctx, 'company')}/overview", {})),
+    Route("companies.create", "POST", lambda rng, ctx: ("/companies/", {"json": _company(rng)}), _created("company")),
+    Route("companies.update", "PUT", lambda rng, ctx: (f"/companies/{_own(rng, ctx, 'company')}", {"json": _company(rng)})),
+    Route("companies.patch", "PATCH", lambda rng, ctx: (f"/companies/{_own(rng, ctx, 'company')}", {"json": {"notes": f"nota {rng.randrange(10**6)}"}})),
+    Route("companies.bulk", "POST", lambda rng, ctx: ("/companies/bulk", _bulk([_company(rng) for _ in range(100)]))),
+    Route("companies.export", "GET", lambda rng, ctx: (f"/companies/export?q={rng.choice(SEARCH_TERMS)}&format=ndjson", {})),
+    # ---- contatos ----
+    Route("contacts.list", "GET", lambda rng, ctx: ("/contacts/?limit=50", {})),
+    Route("contacts.by_company", "GET", lambda rng, ctx: (f"/contacts/?company_id={_pick(rng, ctx, 'company')}", {})),
+    Route("contacts.search", "GET", lambda rng, ctx: (f"/contacts/?q={rng.choice(SEARCH_TERMS)}&limit=20", {})),
+    Route("contacts.get", "GET", lambda rng, ctx: (f"/contacts/{_pick(rng, ctx, 'contact')}", {})),
+    Route("contacts.list.expand", "GET", lambda rng, ctx: (f"/contacts/?company_id={_pick(rng, ctx, 'company')}&expand=company", {})),
+    Route("contacts.create", "POST", lambda rng, ctx: ("/contacts/", {"json": _contact(rng, ctx)}), _created("contact")),
+    Route("contacts.update", "PUT", lambda rng, ctx: (f"/contacts/{_own(rng, ctx, 'contact')}", {"json": _contact(rng, ctx)})),
+    Route("contacts.patch", "PATCH", lambda rng, ctx: (f"/contacts/{_own(rng, ctx, 'contact')}", {"json": {"role": rng.choice(["Compras", "TI", "Diretor"])}})),
+    Route("contacts.bulk", "POST", lambda rng, ctx: ("/contacts/bulk", _bulk([_contact(rng, ctx) for _ in range(100)]))),
+    Route("contacts.export", "GET", lambda rng, ctx: (f"/contacts/export?company_id={_pick(rng, ctx, 'company')}", {})),
+    # ---- negócios ----
+    Route("deals.list", "GET", lambda rng, ctx: ("/deals/?limit=50", {})),
+    Route("deals.by_stage_value", "GET", lambda rng, ctx: (f"/deals/?stage={rng.choice(STAGES)}&order_by=value&desc=true&limit=50", {})),
+    Route("deals.min_value", "GET", lambda rng, ctx: (f"/deals/?min_value={rng.randint(50_000, 500_000)}&order_by=expected_close_date&limit=50", {})),
+    Route("deals.by_company", "GET", lambda rng, ctx: (f"/deals/?company_id={_pick(rng, ctx, 'company')}", {})),
+    Route("deals.search", "GET", lambda rng, ctx: (f"/deals/?q={rng.choice(SEARCH_TERMS)}&order_by=relevance&limit=20", {})),
+    Route("deals.get", "GET", lambda rng, ctx: (f"/deals/{_pick(rng, ctx, 'deal')}", {})),
+    Route("deals.get.expand", "GET", lambda rng, ctx: (f"/deals/{_pick(rng, ctx, 'deal')}?expand=company", {})),
+    Route("deals.list.expand", "GET", lambda rng, ctx: (f"/deals/?stage={rng.choice(STAGES)}&limit=50&expand=company", {})),
+    Route("deals.summary.counts", "GET", lambda rng, ctx: ("/deals/summary/stage-counts", {})),
+    Route("deals.summary.values", "GET", lambda rng, ctx: ("/deals/summary/stage-values", {})),
+    Route("deals.forecast", "GET", lambda rng, ctx: (f"/deals/forecast?group_by=month,{rng.choice(['owner', 'stage'])}", {})),
+    Route("deals.create", "POST", lambda rng, ctx: ("/deals/", {"json": _deal(rng, ctx)}), _created("deal")),
+    Route("deals.update", "PUT", lambda rng, ctx: (f"/deals/{_own(rng, ctx, 'deal')}", {"json": _deal(rng, ctx)})),
+    Route("deals.patch", "PATCH", lambda rng, ctx: (f"/deals/{_own(rng, ctx, 'deal')}", {"json": {"stage": rng.choice(STAGES)}})),
+    Route("deals.bulk_update", "POST", lambda rng, ctx: (f"/deals/bulk-update?company_id={_pick(rng, ctx, 'company')}", {"json": {"owner": f"Bench {rng.randrange(20)}"}})),
+    Route("deals.bulk", "POST", lambda rng, ctx: ("/deals/bulk", _bulk([_deal(rng, ctx) for _ in range(100)]))),
+    Route("deals.export", "GET", lambda rng, ctx: (f"/deals/export?company_id={_pick(rng, ctx, 'company')}&format=ndjson", {})),
+    # ---- UI ----
+    Route("ui.companies", "GET", lambda rng, ctx: ("/ui/companies", {})),
+    Route("ui.companies.search", "GET", lambda rng, ctx: (f"/ui/companies?q={rng.choice(SEARCH_TERMS)}", HX)),
+    Route("ui.companies.page", "GET", lambda rng, ctx: (f"/ui/companies?page={rng.randint(2, 50)}&order_by=name", HX)),
+    Route("ui.companies.create", "POST", lambda rng, ctx: ("/ui/companies", {"data": {"name": _company(rng)["name"]}})),
+    # ---- remoções por último, sobre o que a execução criou ----
+    Route("deals.delete", "DELETE", lambda rng, ctx: (f"/deals/{_take(ctx, 'deal')}", {}), consumes="deal"),
+    Route("contacts.delete", "DELETE", lambda rng, ctx: (f"/contacts/{_take(ctx, 'contact')}", {}), consumes="contact"),
+    Route("ui.companies.delete", "DELETE", lambda rng, ctx: (f"/ui/companies/{_take(ctx, 'company')}", HX), consumes="company"),
+    Route("companies.delete", "DELETE", lambda rng, ctx: (f"/companies/{_take(ctx, 'company')}", {}), consumes="company"),
+]
+
+
+# ------------------- dataset ------------------- #
+
+def dataset_path(name: str, seed: int) -> Path:
+    return DATA_DIR / f"{name}-s{seed}.db"
+
+
+def ensure_dataset(name: str, seed: int) -> Path:
+    path = dataset_path(name, seed)
+    if path.exists():
+        return path
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    companies, contacts, deals = DATASETS[name]
+    tmp = path.with_suffix(".tmp")
+    print(f"Gerando dataset {name} em {path} (uma vez só)...")
+    subprocess.run(
+        [
+            sys.executable, "-m", "app.seed_data",
+            "--companies", str(companies), "--contacts", str(contacts), "--deals", str(deals),
+            "--seed", str(seed), "--database-url", f"sqlite:///{tmp}",
+        ],
+        cwd=REPO_ROOT,
+        check=True,
+    )
+    # junta o WAL no arquivo principal antes de copiar
+    with sqlite3.connect(tmp) as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA journal_mode=DELETE")
+    tmp.rename(path)
+    return path
+
+
+def _max_ids(db: Path) -> Dict[str, int]:
+    with sqlite3.connect(db) as conn:
+        return {t: conn.execute(f"SELECT MAX(id) FROM {t}").fetchone()[0] or 1 for t in ("company", "contact", "deal")}
+
+
+# ------------------- medição ------------------- #
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct))]
+
+
+async def measure(client: httpx.AsyncClient, route: Route, rng: random.Random, ctx: dict, n: int, concurrency: int):
+    # remoções montam a chamada na hora, as demais antes de medir
+    calls = [] if route.consumes else [route.build(rng, ctx) for _ in range(n)]
+    latencies: List[float] = []
+    errors = 0
+    queue = list(range(n))
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            i = queue.pop()
+            path, kwargs = calls[i] if calls else route.build(rng, ctx)
+            start = time.perf_counter()
+            try:
+                resp = await client.request(route.method, path, **kwargs)
+                if resp.status_code >= 400:
+                    errors += 1
+                elif route.collect:
+                    route.collect(resp, ctx)
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "method": route.method,
+        "requests": n,
+        "errors": errors,
+        "rps": round(n / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+async def run_routes(base: str, routes: List[Route], ctx: dict, args) -> Dict[str, dict]:
+    rng = random.Random(args.seed)
+    results = {}
+    # rotas que consomem os mesmos ids dividem o que foi criado
+    pending = Counter(r.consumes for r in routes if r.consumes)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=120) as client:
+        for route in routes:
+            n = args.requests
+            if route.consumes:
+                n = min(n, len(ctx["created"][route.consumes]) // pending[route.consumes])
+                pending[route.consumes] -= 1
+            elif route.name.endswith((".export", ".bulk")):
+                n = max(1, n // 10)
+            if n == 0:
+                continue
+            # aquecimento fora da conta (exceto escritas, que consumiriam ids)
+            if route.method == "GET":
+                for _ in range(min(5, n)):
+                    path, kwargs = route.build(rng, ctx)
+                    await client.get(path, **kwargs)
+            results[route.name] = await measure(client, route, rng, ctx, n, args.concurrency)
+            r = results[route.name]
+            print(
+                f"{route.name:<28} {r['rps']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+                f"{r['p99_ms']:>9.2f} {r['errors']:>6}"
+            )
+    return results
+
+
+def _git_revision() -> Dict[str, object]:
+    def git(*cmd):
+        return subprocess.run(["git", *cmd], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def cmd_run(args) -> Path:
+    source = ensure_dataset(args.dataset, args.seed)
+    workdir = Path(tempfile.mkdtemp(prefix="crm-e2e-"))
+    db = workdir / "crm.db"
+    shutil.copyfile(source, db)
+    ctx = {"max_id": _max_ids(db), "created": {"company": [], "contact": [], "deal": []}}
+    routes = [r for r in ROUTES if not args.only or any(r.name.startswith(p) for p in args.only)]
+
+    env = {"CRM_DATABASE_URL": f"sqlite:///{db}", "CRM_CACHE_ENABLED": "false" if args.no_cache else "true"}
+    port = free_port()
+    proc = start_server(str(workdir), args.async_mode, port, env)
+    print(f"{'rota':<28} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'erros':>6}")
+    try:
+        results = asyncio.run(run_routes(f"http://127.0.0.1:{port}", routes, ctx, args))
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    out = RESULTS_DIR / f"{stamp}-{args.dataset}-{args.label}.json"
+    meta = {
+        "label": args.label,
+        "timestamp": stamp,
+        **_git_revision(),
+        "dataset": {"name": args.dataset, "seed": args.seed, "rows": dict(zip(("company", "contact", "deal"), DATASETS[args.dataset]))},
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "async": args.async_mode,
+            "cache": not args.no_cache,
+        },
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+    }
+    out.write_text(json.dumps({"meta": meta, "routes": results}, indent=2, ensure_ascii=False))
+    print(f"Resultados em {out.relative_to(REPO_ROOT)}")
+    return out
+
+
+def cmd_compare(args) -> int:
+    base = json.loads(Path(args.base).read_text())
+    new = json.loads(Path(args.new).read_text())
+    for key in ("dataset", "config"):
+        if base["meta"][key] != new["meta"][key]:
+            print(f"aviso: {key} diferente entre as execuções: {base['meta'][key]} x {new['meta'][key]}")
+    print(f"{'rota':<28} {'p50 ms':>17} {'p99 ms':>17} {'req/s':>17}")
+    regressions = 0
+    for name, b in base["routes"].items():
+        n = new["routes"].get(name)
+        if n is None:
+            print(f"{name:<28} (ausente na nova execução)")
+            continue
+        cells = []
+        for metric, higher_is_better in (("p50_ms", False), ("p99_ms", False), ("rps", True)):
+            delta = (n[metric] - b[metric]) / b[metric] * 100 if b[metric] else 0.0
+            worse = -delta if higher_is_better else delta
+            flag = "!" if worse > args.threshold else " "
+            cells.append(f"{n[metric]:>8.1f} {delta:>+6.0f}%{flag}")
+        if any(c.endswith("!") for c in cells):
+            regressions += 1
+        print(f"{name:<28} {' '.join(cells)}")
+    for name in new["routes"].keys() - base["routes"].keys():
+        print(f"{name:<28} (nova)")
+    print(f"{regressions} rota(s) pioraram mais de {args.threshold:.0f}%.")
+    return 1 if regressions and args.fail else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    run = sub.add_parser("run", help="mede todas as rotas e grava o resultado")
+    run.add_argument("--dataset", choices=list(DATASETS), default="small")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--requests", type=int, default=200, help="requisições por rota")
+    run.add_argument("--concurrency", type=int, default=8)
+    run.add_argument("--label", default="run")
+    run.add_argument("--async", dest="async_mode", action="store_true", help="CRM_ASYNC=1")
+    run.add_argument("--no-cache", action="store_true", help="desliga o cache de respostas")
+    run.add_argument("--only", nargs="+", help="prefixos de rota (ex.: deals. ui.)")
+
+    compare = sub.add_parser("compare", help="compara dois resultados")
+    compare.add_argument("base")
+    compare.add_argument("new")
+    compare.add_argument("--threshold", type=float, default=10.0, help="piora em %% que conta como regressão")
+    compare.add_argument("--fail", action="store_true", help="sai com 1 se houver regressão")
+
+    args = parser.parse_args()
+    if args.cmd == "run":
+        cmd_run(args)
+    else:
+        sys.exit(cmd_compare(args))
+
+
+if __name__ == "__main__":
+    main()
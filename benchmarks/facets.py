@@ -0,0 +1,149 @@
+# benchmarks/facets.py
+"""
+Facetas dos negócios em escala (GET /deals/facets, app/facets.py): snapshot
+NumPy contra os GROUP BY no SQLite, sobre os datasets do benchmark ponta a
+ponta (o "large" tem 5 milhões de negócios). Mede a carga do snapshot, a
+latência de cada consulta nos dois caminhos (conferindo que batem) e o custo
+de aplicar deltas de escrita comparado a recarregar tudo.
+
+Metas (um núcleo): consulta de facetas em até 50 ms por milhão de negócios no
+snapshot, qualquer combinação de filtros; delta de 1.000 escritas em até 5 ms.
+Com q a busca no FTS5 vem antes e custa à parte, proporcional aos acertos
+(centenas de milissegundos para ~700 mil ids no large): é o que aparece
+acima da meta nas linhas de busca.
+
+    python -m benchmarks.facets [--dataset large] [--repeat 20] [--sql-repeat 1] [--no-sql]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from benchmarks.e2e import DATASETS, STAGES, ensure_dataset  # noqa: E402
+
+TARGET_MS_PER_MILLION = 50.0
+TARGET_DELTA_MS = 5.0  # por 1.000 escritas
+
+QUERIES = [
+    ("sem filtro", {}),
+    ("etapa", {"stage": "proposta"}),
+    ("empresa", {"company_id": 42}),
+    ("faixa de valor", {"min_value": 10_000, "max_value": 50_000}),
+    ("empresa + etapa + valor", {"company_id": 42, "stage": "proposta", "min_value": 1_000}),
+    ("busca", {"q": "implanta"}),
+    ("busca + etapa", {"q": "urgente", "stage": "contrato"}),
+]
+
+
+def _rounded(payload: dict) -> dict:
+    def fix(x):
+        if isinstance(x, float):
+            return round(x, 2)
+        if isinstance(x, dict):
+            return {k: fix(v) for k, v in x.items() if k not in ("engine", "version")}
+        if isinstance(x, list):
+            return [fix(v) for v in x]
+        return x
+
+    return fix(payload)
+
+
+def timed(fn, repeat: int):
+    result = fn()  # aquece (e carrega o snapshot na primeira)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times) * 1000
+
+
+def synthetic_delta(snapshot, k: int, rng: random.Random):
+    """k escritas: metade alterações, um quarto inserções e um quarto exclusões."""
+    n = snapshot.n
+    top = int(snapshot.ids[n - 1])
+    existing = [int(snapshot.ids[rng.randrange(n)]) for _ in range(k - k // 2)]
+    # linhas no formato de SNAPSHOT_COLUMNS: id, empresa, valor, probabilidade, etapa, vendedor, dia
+    rows = [
+        (deal_id, rng.randint(1, 1000), float(rng.randint(1000, 90000)), rng.randint(0, 100), rng.choice(STAGES),
+         f"Vendedor {rng.randint(1, 50)}", 20_000 + rng.randint(0, 365))
+        for deal_id in existing[: k // 2]
+    ]
+    rows += [(top + 1 + i, 1, 1000.0, 10, STAGES[0], None, 20_000) for i in range(k // 4)]
+    return rows, existing[k // 2:]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", choices=sorted(DATASETS), default="large")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=20, help="repetições por consulta no snapshot")
+    parser.add_argument("--sql-repeat", type=int, default=1, help="repetições por consulta no SQLite")
+    parser.add_argument("--no-sql", action="store_true", help="só o snapshot (os GROUP BY levam segundos no large)")
+    parser.add_argument("--deltas", type=int, nargs="+", default=[1, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    from sqlmodel import Session
+    from app.database import make_engine
+    from app.deal_snapshot import snapshot_store
+    from app.facets import VALUE_EDGES, FacetFilters, facets
+    from app.settings import settings
+
+    db = ensure_dataset(args.dataset, args.seed)
+    # sem instrumentação: os GROUP BY cairiam no log de consultas lentas a cada repetição
+    cfg = settings.model_copy(update={"metrics_enabled": False})
+    engine = make_engine(f"sqlite:///{db}", read_only=True, cfg=cfg)
+
+    # a primeira consulta carrega o snapshot do engine (o mesmo que o endpoint usa)
+    store = snapshot_store(engine)
+    start = time.perf_counter()
+    with store.view() as view:
+        owners = len(view.owners)
+    load = time.perf_counter() - start
+    snapshot = store.snapshot
+    rows = len(snapshot)
+    target = TARGET_MS_PER_MILLION * max(1.0, rows / 1e6)
+    print(
+        f"snapshot: {rows:,} negócios em {load:.2f}s ({rows / load:,.0f} linhas/s), "
+        f"{snapshot.nbytes / 2**20:.0f} MiB, {owners} vendedores; meta {target:.0f} ms/consulta"
+    )
+
+    # a consulta completa, como o endpoint: conferência de versão, FTS5, snapshot e nomes das empresas
+    print(f"{'consulta':<28} {'negócios':>9} {'numpy ms':>9} {'meta':>5} {'sql ms':>9} {'ganho':>7}  confere")
+    with Session(engine) as session:
+        for name, options in QUERIES:
+            filters = FacetFilters(**options)
+            fast, fast_ms = timed(lambda: facets(session, filters, VALUE_EDGES, 20, "numpy"), args.repeat)
+            line = (
+                f"{name:<28} {fast['totals']['deal_count']:>9,} {fast_ms:>9.2f} "
+                f"{'ok' if fast_ms <= target else 'ACIMA':>5}"
+            )
+            if not args.no_sql:
+                slow, slow_ms = timed(lambda: facets(session, filters, VALUE_EDGES, 20, "sql"), args.sql_repeat)
+                same = _rounded(fast) == _rounded(slow)
+                line += f" {slow_ms:>9.1f} {slow_ms / fast_ms:>6.0f}x  {'ok' if same else 'DIVERGE'}"
+            print(line)
+
+    # deltas sintéticos aplicados direto no snapshot (o arquivo do dataset não muda)
+    rng = random.Random(args.seed)
+    print(f"{'escritas':>8} {'delta ms':>9} {'meta':>5} {'recarga ms':>11}")
+    for k in args.deltas:
+        times = []
+        for _ in range(5):
+            delta_rows, gone = synthetic_delta(snapshot, k, rng)
+            start = time.perf_counter()
+            snapshot.apply(delta_rows, gone)
+            times.append(time.perf_counter() - start)
+        ms = statistics.median(times) * 1000
+        ok = ms <= TARGET_DELTA_MS * max(1.0, k / 1000)
+        print(f"{k:>8,} {ms:>9.2f} {'ok' if ok else 'ACIMA':>5} {load * 1000:>11.0f}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/forecast.py
+"""
+Previsão do pipeline em escala: snapshot NumPy (app/forecast.py) contra o
+GROUP BY no SQLite, sobre os datasets do benchmark ponta a ponta (o "large"
+tem 5 milhões de negócios). Mede a carga do snapshot, a latência de cada
+consulta nos dois caminhos e confere que os resultados batem.
+
+    python -m benchmarks.forecast [--dataset large] [--repeat 20] [--sql-repeat 1] [--no-sql]
+"""
+import argparse
+import math
+import statistics
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from benchmarks.e2e import DATASETS, ensure_dataset  # noqa: E402
+
+QUERIES = [
+    ("totais", [], {}),
+    ("mês", ["month"], {}),
+    ("semana", ["week"], {}),
+    ("vendedor", ["owner"], {}),
+    ("etapa", ["stage"], {}),
+    ("empresa (top 50)", ["company_id"], {"order_by": "weighted_value", "limit": 50}),
+    ("mês x vendedor", ["month", "owner"], {}),
+    ("semana x etapa, 2 etapas", ["week", "stage"], {"stage": ["proposta", "contrato"]}),
+    ("vendedor, prob >= 50, valor >= 10k", ["owner"], {"min_probability": 50, "min_value": 10_000}),
+    ("empresa x mês (top 100)", ["company_id", "month"], {"order_by": "weighted_value", "limit": 100}),
+    ("mês, 100 empresas", ["month"], {"company_id": list(range(1, 101))}),
+]
+
+
+def _same(a: dict, b: dict) -> bool:
+    if a["group_count"] != b["group_count"] or len(a["rows"]) != len(b["rows"]):
+        return False
+    pairs = list(zip(a["rows"], b["rows"])) + [(a["totals"], b["totals"])]
+    return all(
+        x["group"] == y["group"]
+        and x["deal_count"] == y["deal_count"]
+        and math.isclose(x["weighted_value"], y["weighted_value"], rel_tol=1e-9, abs_tol=1e-6)
+        for x, y in pairs
+    )
+
+
+def timed(fn, repeat: int):
+    result = fn()  # aquece
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", choices=sorted(DATASETS), default="large")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=20, help="repetições por consulta no snapshot")
+    parser.add_argument("--sql-repeat", type=int, default=1, help="repetições por consulta no SQLite")
+    parser.add_argument("--no-sql", action="store_true", help="só o snapshot (o GROUP BY leva segundos no large)")
+    args = parser.parse_args()
+
+    from sqlmodel import Session
+    from app.database import make_engine
+    from app.deal_snapshot import DealSnapshot, DealView
+    from app.forecast import ForecastFilters, snapshot_forecast, sql_forecast
+    from app.settings import settings
+
+    db = ensure_dataset(args.dataset, args.seed)
+    # sem instrumentação: o GROUP BY cairia no log de consultas lentas a cada repetição
+    cfg = settings.model_copy(update={"metrics_enabled": False})
+    engine = make_engine(f"sqlite:///{db}", read_only=True, cfg=cfg)
+
+    start = time.perf_counter()
+    snapshot = DealSnapshot.load(engine)
+    load = time.perf_counter() - start
+    view = DealView(snapshot)
+    print(
+        f"snapshot: {len(snapshot):,} negócios em {load:.2f}s ({len(snapshot) / load:,.0f} linhas/s), "
+        f"{snapshot.nbytes / 2**20:.0f} MiB, {len(view.owners)} vendedores"
+    )
+    print(f"{'consulta':<36} {'grupos':>7} {'numpy ms':>9} {'sql ms':>9} {'ganho':>7}  confere")
+    with Session(engine) as session:
+        for name, group_by, options in QUERIES:
+            options = dict(options)
+            order_by = options.pop("order_by", "key")
+            limit = options.pop("limit", 100_000)
+            filters = ForecastFilters(**options)
+            fast, fast_ms = timed(lambda: snapshot_forecast(view, group_by, filters, order_by, limit), args.repeat)
+            line = f"{name:<36} {fast['group_count']:>7} {fast_ms:>9.2f}"
+            if not args.no_sql:
+                slow, slow_ms = timed(lambda: sql_forecast(session, group_by, filters, order_by, limit), args.sql_repeat)
+                line += f" {slow_ms:>9.1f} {slow_ms / fast_ms:>6.0f}x  {'ok' if _same(fast, slow) else 'DIVERGE'}"
+            print(line)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/render.py
+"""
+Tempo de renderização das listagens da UI (app/rendering.py), sem servidor
+nem banco: objetos Company/Deal em memória, os templates de app/templates.
+
+Para cada tamanho de página mede, por página:
+- frio: cache de fragmentos vazio (toda linha é renderizada);
+- quente: todas as linhas no cache (só a moldura da tabela é renderizada);
+- 1% alterado: row_version novo em 1% das linhas, como depois de escritas;
+- gzip: compressão do corpo e tamanho final;
+- primeiro bloco: tempo até o primeiro bloco em streaming (generate()).
+
+Mostra também o custo de compilar todos os templates num processo novo, sem
+e com o cache de bytecode em disco.
+
+    python -m benchmarks.render [--sizes 10 100 1000 5000] [--repeat 20]
+"""
+import argparse
+import gzip
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from benchmarks.async_load import STAGES  # noqa: E402
+
+
+def timed(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def make_deals(n: int):
+    from app.models import Deal
+
+    return [
+        Deal(
+            id=i, row_version=i, title=f"Projeto {i} – implantação", value=1000.0 + i * 7.5,
+            stage=STAGES[i % len(STAGES)], probability=i % 100, expected_close_date=date(2025, 1 + i % 12, 1),
+            owner=f"Vendedor {i % 50}", company_id=1 + i % 200,
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def compile_all(cache_dir) -> float:
+    """ms para carregar todos os templates num Environment novo (como num worker que acabou de subir)."""
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+    from app.templating import TEMPLATES_DIR
+
+    env = Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR), autoescape=True,
+        bytecode_cache=FileSystemBytecodeCache(cache_dir) if cache_dir else None,
+    )
+    start = time.perf_counter()
+    for name in env.list_templates():
+        env.get_template(name)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    from app.counting import Total
+    from app.rendering import FragmentCache, _blocks, page_context
+    from app.settings import settings
+    from app.templating import templates
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        plain = statistics.median(compile_all(None) for _ in range(5))
+        compile_all(cache_dir)  # grava o bytecode
+        cached = statistics.median(compile_all(cache_dir) for _ in range(5))
+    print(f"compilar os templates: {plain:.1f} ms sem cache de bytecode, {cached:.1f} ms com\n")
+
+    template = templates.get_template("deals/_list.html")
+    names = {i: f"Empresa {i}" for i in range(1, 201)}
+    print(f"{'linhas':>6} {'frio ms':>8} {'quente ms':>10} {'1% ms':>7} {'gzip ms':>8} {'KiB':>7} {'gz KiB':>7} "
+          f"{'1º bloco ms':>12}")
+    for size in args.sizes:
+        deals = make_deals(size)
+
+        def page(cache: FragmentCache):
+            rows = cache.render(
+                "deals/_row.html", deals,
+                lambda d: (d.id, d.row_version, names.get(d.company_id)),
+                lambda d: {"d": d, "company": names.get(d.company_id)},
+            )
+            ctx = page_context("/ui/deals", rows, Total(size * 10), "cursor", 1, size,
+                               {"q": "", "stage": "", "order_by": "id", "desc": False})
+            return ctx
+
+        cold = timed(lambda: template.render(page(FragmentCache(0))), args.repeat)
+        warm_cache = FragmentCache(settings.ui_fragment_cache_bytes)
+        page(warm_cache)
+        warm = timed(lambda: template.render(page(warm_cache)), args.repeat)
+
+        def churn():
+            for d in deals[:: 100]:
+                d.row_version += size
+            return template.render(page(warm_cache))
+
+        changed = timed(churn, args.repeat)
+        body = template.render(page(warm_cache)).encode()
+        gz_ms = timed(lambda: gzip.compress(body, settings.ui_gzip_level, mtime=0), args.repeat)
+        gz = gzip.compress(body, settings.ui_gzip_level, mtime=0)
+        first = timed(lambda: next(_blocks(template.generate(page(warm_cache)))), args.repeat)
+        print(f"{size:>6} {cold:>8.2f} {warm:>10.2f} {changed:>7.2f} {gz_ms:>8.2f} {len(body) / 1024:>7.0f} "
+              f"{len(gz) / 1024:>7.0f} {first:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
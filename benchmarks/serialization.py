@@ -0,0 +1,111 @@
+# benchmarks/serialization.py
+"""
+Custo por linha de uma página de listagem: caminho antigo (objetos ORM
+revalidados pelo response_model do FastAPI e codificados com json) contra o
+caminho rápido de app/serialization.py (tuplas de colunas + orjson).
+
+Mede consulta + serialização, sem HTTP, num banco em memória.
+
+    python -m benchmarks.serialization [--rows 20000] [--page 200] [--repeat 200]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+STAGES = ["prospeccao", "oportunidade", "identificacao", "viabilidade", "precificacao", "proposta", "contrato"]
+
+
+def seed(engine, rows: int):
+    from sqlalchemy import insert
+    from app.models import Company, Contact, Deal
+
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Company.__table__),
+            [{"name": f"Empresa {i}", "email": f"contato{i}@empresa.com", "website": f"https://e{i}.com"} for i in range(rows)],
+        )
+        conn.execute(
+            insert(Contact.__table__),
+            [{"name": f"Pessoa {i}", "email": f"p{i}@empresa.com", "role": "Compras", "company_id": 1 + i % rows} for i in range(rows)],
+        )
+        conn.execute(
+            insert(Deal.__table__),
+            [
+                {
+                    "title": f"Negócio {i}",
+                    "company_id": 1 + i % rows,
+                    "value": float(1000 + i % 50000),
+                    "stage": STAGES[i % len(STAGES)],
+                    "probability": (i * 7) % 101,
+                    "owner": f"vendedor{i % 20}",
+                }
+                for i in range(rows)
+            ],
+        )
+
+
+def old_path(session, entity, field, page: int) -> bytes:
+    from fastapi.routing import serialize_response
+    from sqlmodel import select
+
+    items = session.exec(select(entity).order_by(entity.id).limit(page)).all()
+    # o que a rota fazia: response_model valida cada objeto e o JSONResponse usa json.dumps
+    content = asyncio.run(serialize_response(field=field, response_content=items))
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def fast_path(session, entity, read_model, page: int) -> bytes:
+    from sqlmodel import select
+    from app.serialization import dump_rows, read_select
+
+    stmt, fields = read_select(select(entity), read_model)
+    rows = session.execute(stmt.order_by(entity.id).limit(page)).all()
+    return dump_rows(fields, rows)
+
+
+def timed(fn, repeat: int) -> float:
+    fn()  # aquece caches do SQLite e do pydantic
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--page", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    from fastapi.utils import create_model_field
+    from sqlmodel import Session, create_engine
+    from app.database import create_db_and_tables
+    from app.models import Company, CompanyRead, Contact, ContactRead, Deal, DealRead
+
+    engine = create_engine("sqlite://")
+    create_db_and_tables(engine)
+    seed(engine, args.rows)
+
+    per_page = args.page * args.repeat
+    print(f"{'modelo':<12} {'antigo µs/linha':>16} {'rápido µs/linha':>16} {'ganho':>7}")
+    with Session(engine) as session:
+        for entity, read_model in ((Deal, DealRead), (Contact, ContactRead), (Company, CompanyRead)):
+            field = create_model_field(name="response", type_=List[read_model], mode="serialization")
+            old = timed(lambda: old_path(session, entity, field, args.page), args.repeat)
+            fast = timed(lambda: fast_path(session, entity, read_model, args.page), args.repeat)
+            print(
+                f"{read_model.__name__:<12} {old / per_page * 1e6:>16.2f} {fast / per_page * 1e6:>16.2f} "
+                f"{old / fast:>6.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/sqlite_contention.py
+"""
+Contenção de escrita/leitura entre processos, como vários workers do uvicorn.
+
+Compara o engine antigo (create_engine puro: journal de rollback, sem PRAGMAs)
+com make_engine() (WAL, busy_timeout etc.) e o pool somente leitura. Cada
+configuração roda num banco temporário novo.
+
+    python -m benchmarks.sqlite_contention [--writers 4] [--readers 4] [--seconds 10]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+
+def _engines(mode: str, url: str):
+    from sqlmodel import create_engine
+    from app.database import make_engine
+
+    if mode == "padrão":
+        plain = create_engine(url, connect_args={"check_same_thread": False})
+        return plain, plain
+    return make_engine(url), make_engine(url, read_only=True)
+
+
+def _worker(mode: str, url: str, role: str, seconds: float, out):
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    write_engine, read_engine = _engines(mode, url)
+    ops = errors = 0
+    latencies = []
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            if role == "writer":
+                with write_engine.begin() as conn:
+                    conn.execute(
+                        text(
+                            "INSERT INTO deal(title, value, stage, probability, company_id) "
+                            "VALUES ('bench', :v, 'proposta', 50, 1)"
+                        ),
+                        {"v": ops},
+                    )
+            else:
+                with read_engine.connect() as conn:
+                    conn.execute(text("SELECT * FROM deal ORDER BY id DESC LIMIT 50")).all()
+                    conn.execute(text("SELECT * FROM deal_stage_stats")).all()
+            ops += 1
+        except OperationalError:
+            # "database is locked" e afins
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0.0
+    out.put((role, ops, errors, p99))
+
+
+def run(mode: str, writers: int, readers: int, seconds: float):
+    workdir = tempfile.mkdtemp(prefix="crm-contention-")
+    url = f"sqlite:///{workdir}/crm.db"
+
+    from sqlmodel import Session, create_engine
+    from app.database import create_db_and_tables
+    from app.models import Company
+
+    setup = create_engine(url)
+    create_db_and_tables(setup)
+    with Session(setup) as session:
+        session.add(Company(name="Bench"))
+        session.commit()
+    if mode == "padrão":
+        with setup.connect() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=DELETE")
+    setup.dispose()
+
+    out = mp.Queue()
+    procs = [mp.Process(target=_worker, args=(mode, url, "writer", seconds, out)) for _ in range(writers)]
+    procs += [mp.Process(target=_worker, args=(mode, url, "reader", seconds, out)) for _ in range(readers)]
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    for role in ("writer", "reader"):
+        rows = [r for r in results if r[0] == role]
+        ops = sum(r[1] for r in rows)
+        errors = sum(r[2] for r in rows)
+        p99 = max((r[3] for r in rows), default=0.0)
+        print(f"{mode:<8} {role:<7} {ops / seconds:>10.0f} {errors:>8} {p99 * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="crm-contention-"))
+    print(f"{'engine':<8} {'papel':<7} {'ops/s':>10} {'erros':>8} {'p99 ms':>10}")
+    for mode in ("padrão", "ajustado"):
+        run(mode, args.writers, args.readers, args.seconds)
+
+
+if __name__ == "__main__":
+    mp.set_start_method("spawn")
+    main()
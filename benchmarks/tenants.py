@@ -0,0 +1,178 @@
+# benchmarks/tenants.py
+"""
+Milhares de tenants num processo (CRM_MULTI_TENANT=1).
+
+Cria N bancos de tenant (cópia do esquema modelo, ver app/tenancy.py) com
+alguns dados cada, sobe um uvicorn e dispara leituras e escritas em tenants
+sorteados (X-Tenant), com o LRU de engines menor que N (abre e fecha o tempo
+todo) e maior (todos ficam abertos). Além de vazão e latência, mostra quantos
+tenants ficaram abertos, aberturas/descartes do LRU e o RSS e os arquivos
+abertos do servidor no fim. Requer httpx.
+
+    python -m benchmarks.tenants [--tenants 2000] [--max-open 64 4096] [--requests 20000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.async_load import REPO_ROOT, STAGES, free_port, start_server
+
+COMPANIES = 20
+DEALS = 100
+
+
+def create_tenants(root: Path, n: int) -> float:
+    """Cria os bancos pelo CLI (mesmo caminho de produção); devolve ms por tenant."""
+    names = [f"t{i:05d}" for i in range(n)]
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT), CRM_TENANT_DIR=str(root))
+    start = time.perf_counter()
+    for i in range(0, n, 500):
+        subprocess.run([sys.executable, "-m", "app.tenancy", "create", *names[i:i + 500]], env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000 / n
+
+
+def seed(root: Path) -> None:
+    """Dados no primeiro banco (os triggers de busca, resumos e feed rodam) e cópia para os demais."""
+    rng = random.Random(42)
+    paths = sorted(root.glob("*.db"))
+    conn = sqlite3.connect(paths[0])
+    with conn:
+        conn.executemany("INSERT INTO company(name) VALUES (?)", [(f"Empresa {i}",) for i in range(COMPANIES)])
+        conn.executemany(
+            "INSERT INTO deal(title, value, stage, probability, company_id) VALUES (?, ?, ?, ?, ?)",
+            [
+                (f"Projeto {i}", float(rng.randint(1000, 90000)), rng.choice(STAGES), rng.randint(0, 100),
+                 1 + i % COMPANIES)
+                for i in range(DEALS)
+            ],
+        )
+    conn.close()
+    for path in paths[1:]:
+        shutil.copyfile(paths[0], path)
+
+
+def request_mix():
+    return [
+        ("GET", lambda: "/deals/?limit=20"),
+        ("GET", lambda: f"/deals/{random.randint(1, DEALS)}"),
+        ("GET", lambda: "/deals/summary/stage-counts"),
+        ("GET", lambda: f"/companies/{random.randint(1, COMPANIES)}"),
+        ("GET", lambda: "/companies/?q=empresa&limit=10"),
+        ("POST", lambda: "/companies/"),
+    ]
+
+
+def pick_tenant(n: int, hot: bool) -> str:
+    # hot: 80% das requisições em 10% dos tenants
+    if hot and random.random() < 0.8:
+        return f"t{random.randrange(max(1, n // 10)):05d}"
+    return f"t{random.randrange(n):05d}"
+
+
+async def run_load(base: str, n: int, clients: int, total: int, hot: bool):
+    mix = request_mix()
+    latencies: List[float] = []
+    errors = 0
+    remaining = total
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                method, path = random.choice(mix)
+                headers = {"X-Tenant": pick_tenant(n, hot)}
+                start = time.perf_counter()
+                try:
+                    if method == "POST":
+                        resp = await client.post(path(), json={"name": "Nova"}, headers=headers)
+                    else:
+                        resp = await client.get(path(), headers=headers)
+                    if resp.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return len(latencies) / elapsed, statistics.median(latencies), p99, errors
+
+
+def tenant_metrics(base: str) -> Dict[str, float]:
+    text = httpx.get(f"{base}/metrics", timeout=30).text
+    return {
+        name: float(value)
+        for name, value in (line.split() for line in text.splitlines() if line.startswith("crm_tenant_"))
+    }
+
+
+def process_usage(pid: int):
+    """(RSS em MiB, descritores abertos) do servidor, via /proc (só Linux)."""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+        rss = next(int(line.split()[1]) for line in status.splitlines() if line.startswith("VmRSS"))
+        return rss / 1024, len(os.listdir(f"/proc/{pid}/fd"))
+    except (OSError, StopIteration):
+        return float("nan"), -1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", type=int, default=2000)
+    parser.add_argument("--max-open", type=int, nargs="+", default=[64, 4096])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=64)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="crm-tenants-"))
+    root = workdir / "tenants"
+    per_tenant = create_tenants(root, args.tenants)
+    seed(root)
+    print(f"{args.tenants} tenants criados ({per_tenant:.2f} ms/tenant, CLI incluso)")
+
+    print(f"{'max_open':>8} {'acesso':<8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'erros':>6} "
+          f"{'abertos':>8} {'aberturas':>9} {'descartes':>9} {'RSS MiB':>8} {'fds':>6}")
+    for max_open in args.max_open:
+        for hot in (False, True):
+            port = free_port()
+            env = {"CRM_MULTI_TENANT": "1", "CRM_TENANT_DIR": str(root), "CRM_TENANT_MAX_OPEN": str(max_open),
+                   "CRM_DEDUP_WARMUP": "0", "CRM_JOBS_DIR": str(workdir / "jobs")}
+            proc = start_server(str(workdir), False, port, env)
+            base = f"http://127.0.0.1:{port}"
+            try:
+                rps, p50, p99, errors = asyncio.run(run_load(base, args.tenants, args.clients, args.requests, hot))
+                m = tenant_metrics(base)
+                rss, fds = process_usage(proc.pid)
+                print(
+                    f"{max_open:>8} {'quente' if hot else 'uniforme':<8} {rps:>8.0f} {p50 * 1000:>8.1f} "
+                    f"{p99 * 1000:>8.1f} {errors:>6} {m.get('crm_tenant_open', 0):>8.0f} "
+                    f"{m.get('crm_tenant_opens_total', 0):>9.0f} {m.get('crm_tenant_evictions_total', 0):>9.0f} "
+                    f"{rss:>8.0f} {fds:>6}"
+                )
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+if __name__ == "__main__":
+    main()
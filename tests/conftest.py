@@ -0,0 +1,47 @@
+"""
+Banco, jobs e arquivo de exclusões num diretório temporário: as settings são
+lidas no import de app, então o ambiente é montado antes de qualquer import.
+"""
+import os
+import tempfile
+
+_root = tempfile.mkdtemp(prefix="crm-tests-")
+os.environ.setdefault("CRM_DATABASE_URL", f"sqlite:///{_root}/crm.db")
+os.environ.setdefault("CRM_JOBS_DIR", f"{_root}/jobs")
+os.environ.setdefault("CRM_BULK_DELETE_ARCHIVE_DIR", f"{_root}/archive")
+# sem cargas em segundo plano no startup
+os.environ.setdefault("CRM_DEDUP_WARMUP", "false")
+os.environ.setdefault("CRM_DEAL_SNAPSHOT_WARMUP", "false")
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def company(client):
+    """Cria empresas: company("Nome") -> id."""
+    def create(name: str = "Empresa") -> int:
+        response = client.post("/companies/", json={"name": name})
+        assert response.status_code == 201, response.text
+        return response.json()["id"]
+
+    return create
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Banco novo e vazio, com o esquema atual (tabelas, FTS, triggers), para contas exatas."""
+    from app.database import create_db_and_tables, make_engine
+
+    engine = make_engine(f"sqlite:///{tmp_path}/crm.db")
+    create_db_and_tables(engine)
+    yield engine
+    engine.dispose()
@@ -0,0 +1,54 @@
+"""Coalescência de GETs (app/admission.py): quais rotas entram e o fragmento do HTMX nas da UI."""
+import asyncio
+import itertools
+
+import pytest
+
+from app.admission import Coalescer, CoalescingMiddleware
+from app.settings import settings
+
+
+@pytest.mark.parametrize("path, fragment, expected", [
+    ("/deals/facets", False, True),
+    ("/ui/companies", True, True),
+    ("/ui/companies", False, False),  # página inteira: client id próprio da aba
+    ("/ui/events", True, False),
+    ("/deals/", True, False),
+])
+def test_default_routes(path, fragment, expected):
+    c = Coalescer(settings.coalesce_routes, settings.coalesce_fragment_routes)
+    assert c.matches(path, fragment) is expected
+
+
+def _run(coalescer: Coalescer, headers: list, n: int = 3) -> list:
+    counter = itertools.count()
+
+    async def page(scope, receive, send):
+        body = str(next(counter)).encode()
+        await asyncio.sleep(0.05)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": body})
+
+    async def one():
+        scope = {"type": "http", "method": "GET", "path": "/ui/companies", "query_string": b"", "headers": headers}
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await CoalescingMiddleware(page, coalescer)(scope, None, send)
+        return sent[-1]["body"]
+
+    async def main():
+        return await asyncio.gather(*(one() for _ in range(n)))
+
+    return asyncio.run(main())
+
+
+def test_ui_fragment_is_coalesced_full_page_is_not():
+    c = Coalescer(["/ui/companies"], ["/ui/*"])
+    assert len(set(_run(c, []))) == 3
+    assert c.stats.followers == 0
+
+    assert len(set(_run(c, [(b"hx-request", b"true")]))) == 1
+    assert c.stats.followers == 2
@@ -0,0 +1,116 @@
+"""Exclusão em massa (app/bulk_delete.py): lotes, filtro conferido de novo, arquivo e falha no meio."""
+from pathlib import Path
+
+import orjson
+import pytest
+from sqlmodel import Session, select
+
+from app import bulk_delete as bd
+from app.database import current_binds
+from app.models import Company, Contact, Deal
+from app.settings import settings
+
+
+@pytest.fixture
+def chunk(monkeypatch):
+    def set_chunk(size: int) -> None:
+        monkeypatch.setattr(settings, "bulk_delete_chunk", size)
+
+    return set_chunk
+
+
+def _deals(client, company_id: int, n: int, stage: str = "prospeccao") -> list:
+    ids = []
+    for i in range(n):
+        response = client.post("/deals/", json={"title": f"Negócio {i}", "company_id": company_id, "stage": stage})
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+    return ids
+
+
+def _contacts(client, company_id: int, n: int) -> list:
+    return [
+        client.post("/contacts/", json={"name": f"Contato {i}", "company_id": company_id}).json()["id"]
+        for i in range(n)
+    ]
+
+
+def _alive(model, ids) -> list:
+    with Session(current_binds().engine) as session:
+        return sorted(session.exec(select(model.id).where(model.id.in_(ids))).all())
+
+
+def test_company_with_more_dependents_than_a_chunk(client, company, chunk):
+    chunk(3)
+    target = company("Muitos Dependentes")
+    deals, contacts = _deals(client, target, 7), _contacts(client, target, 5)
+    response = client.post("/companies/bulk-delete", json={"ids": [target]})
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["companies"], result["contacts"], result["deals"]) == (1, 5, 7)
+    # 3+3 dependentes, 3+2, e o último negócio junto com a empresa
+    assert result["transactions"] == 3
+    assert _alive(Company, [target]) == _alive(Deal, deals) == _alive(Contact, contacts) == []
+
+
+def test_row_that_stops_matching_mid_run_stays(client, company, chunk, monkeypatch):
+    chunk(2)
+    owner = company("Filtro Muda")
+    ids = _deals(client, owner, 4, stage="proposta")
+    chunks = bd._id_chunks
+
+    def moving(*args):
+        for i, part in enumerate(chunks(*args)):
+            yield part
+            if i == 0:
+                # outra escrita entre os lotes: o último deixa de casar com stage=proposta
+                with Session(current_binds().engine) as session:
+                    session.get(Deal, ids[-1]).stage = "contrato"
+                    session.commit()
+
+    monkeypatch.setattr(bd, "_id_chunks", moving)
+    response = client.post(f"/deals/bulk-delete?company_id={owner}&stage=proposta", json={"ids": ids})
+    assert response.status_code == 200, response.text
+    assert response.json()["deals"] == 3
+    assert _alive(Deal, ids) == [ids[-1]]
+
+
+def test_archive_writes_deleted_rows(client, company, chunk):
+    chunk(2)
+    target = company("Arquivada")
+    deals, contacts = _deals(client, target, 3), _contacts(client, target, 1)
+    response = client.post("/companies/bulk-delete", json={"ids": [target], "archive": True})
+    assert response.status_code == 200, response.text
+    name = response.json()["archive"]
+    assert name.startswith("company-") and name.endswith(".ndjson")
+    lines = [orjson.loads(line) for line in (Path(settings.bulk_delete_archive_dir) / name).read_bytes().splitlines()]
+    archived = {}
+    for line in lines:
+        archived.setdefault(line["entity"], []).append(line["row"])
+    assert sorted(r["id"] for r in archived["deal"]) == deals
+    assert [r["id"] for r in archived["contact"]] == contacts
+    assert archived["company"] == [{**archived["company"][0], "id": target, "name": "Arquivada"}]
+    assert all(r["company_id"] == target for r in archived["deal"] + archived["contact"])
+
+
+def test_failure_keeps_committed_chunks_and_invalidates(client, company, chunk, monkeypatch):
+    chunk(2)
+    owner = company("Falha No Meio")
+    ids = _deals(client, owner, 5)
+    delete_chunk = bd._delete_chunk
+    calls = []
+
+    def failing(*args):
+        calls.append(args[3])
+        if len(calls) == 2:
+            raise RuntimeError("disco cheio")
+        delete_chunk(*args)
+
+    invalidated = []
+    monkeypatch.setattr(bd, "_delete_chunk", failing)
+    monkeypatch.setattr(bd, "invalidate_all", invalidated.append)
+    with pytest.raises(RuntimeError):
+        client.post("/deals/bulk-delete", json={"ids": ids})
+    # o primeiro lote foi gravado e os caches dele invalidados; os demais ficam
+    assert _alive(Deal, ids) == ids[2:]
+    assert invalidated == ["deal"]
@@ -0,0 +1,172 @@
+"""Cache de respostas (app/cache.py): ETag/304, invalidação por escrita, TTL e LRU."""
+import json
+import time
+
+import pytest
+
+from app.cache import CacheEntry, ResponseCache, response_cache
+
+
+def _entry(body: bytes = b"x", tags=("deal",), ttl: float = 60.0) -> CacheEntry:
+    return CacheEntry(body=body, headers=[], etag='"e"', last_modified=time.time(),
+                      expires=time.monotonic() + ttl, tags=tags)
+
+
+# ------------------- ResponseCache ------------------- #
+
+def test_expired_entry_is_a_miss_and_is_dropped():
+    cache = ResponseCache()
+    cache.put(("k",), _entry(ttl=-1), (0,))
+    assert cache.get(("k",)) is None
+    assert len(cache) == 0 and cache.bytes == 0
+    assert cache.stats.misses == 1
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.put(("a",), _entry(), (0,))
+    cache.put(("b",), _entry(), (0,))
+    assert cache.get(("a",)) is not None  # "a" passa a ser o mais recente
+    cache.put(("c",), _entry(), (0,))
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) is not None and cache.get(("c",)) is not None
+    assert cache.stats.evictions == 1
+
+
+def test_byte_budget_evicts_and_oversized_is_skipped():
+    cache = ResponseCache(max_bytes=10)
+    cache.put(("a",), _entry(b"12345"), (0,))
+    cache.put(("b",), _entry(b"123456"), (0,))
+    assert cache.get(("a",)) is None
+    assert cache.bytes == 6
+    assert cache.put(("c",), _entry(b"x" * 11), (0,)) is False
+    assert cache.get(("c",)) is None
+
+
+def test_invalidate_drops_by_tag_and_refuses_stale_put():
+    cache = ResponseCache()
+    cache.put(("list",), _entry(tags=("deal", "deal:list")), (0, 0))
+    cache.put(("one",), _entry(tags=("deal", "deal:1")), (0, 0))
+    generations = cache.generations(("deal", "deal:list"))
+    cache.invalidate("deal:list")
+    assert cache.get(("list",)) is None
+    assert cache.get(("one",)) is not None
+    # leitura que começou antes da escrita não volta para o cache
+    assert cache.put(("list",), _entry(tags=("deal", "deal:list")), generations) is False
+    assert cache.put(("list",), _entry(tags=("deal", "deal:list")), cache.generations(("deal", "deal:list")))
+
+
+# ------------------- middleware ------------------- #
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    response_cache.clear()
+
+
+def test_etag_and_not_modified(client, company):
+    path = f"/companies/{company('Com ETag')}"
+    first = client.get(path)
+    assert first.headers["x-cache"] == "MISS"
+    second = client.get(path)
+    assert second.headers["x-cache"] == "HIT"
+    assert second.content == first.content and second.headers["etag"] == first.headers["etag"]
+
+    not_modified = client.get(path, headers={"if-none-match": first.headers["etag"]})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert client.get(path, headers={"if-none-match": '"outro"'}).status_code == 200
+    since = client.get(path, headers={"if-modified-since": first.headers["last-modified"]})
+    assert since.status_code == 304
+    assert client.get(path, headers={"if-modified-since": "Mon, 01 Jan 2001 00:00:00 GMT"}).status_code == 200
+
+
+def test_deep_pages_are_not_cached(client):
+    assert "x-cache" not in client.get("/deals/?offset=10").headers
+    assert client.get("/deals/?offset=0").headers["x-cache"] == "MISS"
+
+
+def _wait(client, job_id: int) -> dict:
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} não terminou")
+
+
+def _post_deal(client, owner, ids):
+    client.post("/deals/", json={"title": "Novo", "company_id": owner})
+
+
+def _patch_deal(client, owner, ids):
+    client.patch(f"/deals/{ids[0]}", json={"title": "Renomeado", "stage": "proposta"})
+
+
+def _delete_deal(client, owner, ids):
+    client.delete(f"/deals/{ids[0]}")
+
+
+def _bulk_create(client, owner, ids):
+    response = client.post("/deals/bulk", json=[{"title": "Em lote", "company_id": owner}])
+    assert response.json()["inserted"] == 1
+
+
+def _bulk_update(client, owner, ids):
+    assert client.post(f"/deals/bulk-update?company_id={owner}", json={"owner": "Nova"}).json()["updated"]
+
+
+def _bulk_delete(client, owner, ids):
+    assert client.post(f"/deals/bulk-delete?company_id={owner}", json={"ids": ids[:1]}).json()["deals"] == 1
+
+
+def _import_job(client, owner, ids):
+    body = json.dumps({"title": "Importado", "company_id": owner})
+    response = client.post("/jobs/import/deals", content=body, headers={"content-type": "application/x-ndjson"})
+    assert _wait(client, response.json()["id"])["status"] == "succeeded"
+
+
+def _patch_company(client, owner, ids):
+    client.patch(f"/companies/{owner}", json={"name": "Renomeada"})
+
+
+@pytest.mark.parametrize("write, read", [
+    (_post_deal, "/deals/?company_id={owner}"),
+    (_patch_deal, "/deals/?company_id={owner}"),
+    (_patch_deal, "/deals/{deal}"),
+    (_patch_deal, "/deals/summary/stage-counts"),
+    (_delete_deal, "/deals/{deal}"),
+    (_delete_deal, "/deals/?company_id={owner}"),
+    (_bulk_create, "/deals/?company_id={owner}"),
+    (_bulk_update, "/deals/{deal}"),
+    (_bulk_update, "/deals/?company_id={owner}"),
+    (_bulk_delete, "/deals/?company_id={owner}"),
+    (_bulk_delete, "/companies/{owner}/overview"),
+    (_import_job, "/deals/?company_id={owner}"),
+    (_import_job, "/deals/summary/stage-counts"),
+    (_patch_company, "/companies/{owner}"),
+    (_patch_company, "/deals/?company_id={owner}&expand=company"),
+])
+def test_every_write_path_invalidates(client, company, write, read):
+    owner = company("Invalidada")
+    ids = [client.post("/deals/", json={"title": f"N{i}", "company_id": owner, "value": 10}).json()["id"]
+           for i in range(2)]
+    path = read.format(owner=owner, deal=ids[0])
+    before = client.get(path)
+    assert client.get(path).headers["x-cache"] == "HIT"
+
+    write(client, owner, ids)
+    after = client.get(path)
+    # um 404 (negócio apagado) nem passa pelo cache
+    assert after.headers.get("x-cache", "MISS") == "MISS"
+    assert after.content != before.content
+
+
+def test_contact_patch_invalidates_detail(client, company):
+    contact = client.post("/contacts/", json={"name": "Lia", "company_id": company()}).json()
+    path = f"/contacts/{contact['id']}"
+    client.get(path)
+    assert client.get(path).headers["x-cache"] == "HIT"
+    client.patch(path, json={"name": "Lia Souza"})
+    after = client.get(path)
+    assert after.headers["x-cache"] == "MISS"
+    assert after.json()["name"] == "Lia Souza"
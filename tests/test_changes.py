@@ -0,0 +1,143 @@
+"""Feed de mudanças (app/changes.py, GET /changes): versões, tombstones, paginação por since e o 410."""
+import orjson
+import pytest
+from sqlalchemy import delete, update
+from sqlmodel import Session
+
+from app.changes import SNAPSHOT_OPTION, current_version, prune_tombstones, read_delta
+from app.database import current_binds
+from app.models import Company, Contact, Deal
+from app.routers.changes import CHANGES_UNTIL_HEADER
+
+
+def _feed(client, **params) -> list:
+    response = client.get("/changes", params=params)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [orjson.loads(line) for line in response.content.splitlines()]
+
+
+def _version(engine) -> int:
+    with engine.connect() as conn:
+        return current_version(conn)[0]
+
+
+def test_every_write_stamps_a_new_version(db):
+    with Session(db) as session:
+        company = Company(name="Versionada")
+        session.add(company)
+        session.commit()
+        session.add(Contact(name="Ana", company_id=company.id))
+        session.add(Deal(title="D", company_id=company.id))
+        session.commit()
+        first = session.get(Company, company.id).row_version
+        assert first > 0 and session.get(Company, company.id).updated_at is not None
+        versions = {first, session.get(Contact, 1).row_version, session.get(Deal, 1).row_version}
+        assert len(versions) == 3  # únicas entre as três tabelas
+    assert _version(db) == max(versions)
+
+    with db.begin() as conn:
+        conn.execute(update(Company).where(Company.id == company.id).values(name="Renomeada"))
+    with Session(db) as session:
+        assert session.get(Company, company.id).row_version == _version(db) > first
+
+    # UPDATE que só mexe nos carimbos não conta como mudança
+    before = _version(db)
+    with db.begin() as conn:
+        conn.execute(update(Company).values(updated_at=None))
+    assert _version(db) == before
+
+
+def test_delete_leaves_a_tombstone_and_read_delta_sees_it(db):
+    with Session(db) as session:
+        companies = [Company(name=f"E{i}") for i in range(3)]
+        session.add_all(companies)
+        session.commit()
+        ids = [c.id for c in companies]
+    since = _version(db)
+    with db.begin() as conn:
+        conn.execute(update(Company).where(Company.id == ids[0]).values(name="E0 novo"))
+        conn.execute(delete(Company).where(Company.id == ids[1]))
+
+    with db.connect() as conn:
+        delta = read_delta(conn, "company", since, [Company.id, Company.name], cap=10)
+    assert delta.since == since and delta.version == _version(db)
+    assert [tuple(r) for r in delta.rows] == [(ids[0], "E0 novo")]
+    assert delta.gone == [ids[1]]
+    with db.connect() as conn:
+        assert read_delta(conn, "company", since, [Company.id], cap=0) is None  # mais que cap: recarregar
+        assert read_delta(conn, "company", delta.version, [Company.id], cap=0).rows == []
+
+
+def test_read_delta_runs_in_one_read_transaction(db):
+    with db.connect() as conn:
+        with conn.execution_options(**{SNAPSHOT_OPTION: True}).begin():
+            before = current_version(conn)[0]
+            assert conn.connection.driver_connection.in_transaction
+            with Session(db) as session:
+                session.add(Company(name="Durante a leitura"))
+                session.commit()
+            # o mesmo instante até o fim da transação
+            assert current_version(conn)[0] == before
+        assert not conn.connection.driver_connection.in_transaction
+        assert current_version(conn)[0] > before
+
+
+def test_prune_drops_old_tombstones_and_read_delta_asks_for_reload(db):
+    with Session(db) as session:
+        session.add(Company(name="Vai sumir"))
+        session.commit()
+    since = _version(db)
+    with db.begin() as conn:
+        conn.execute(delete(Company))
+    assert prune_tombstones(db, keep_days=1) == 0  # recém-criada fica
+    assert prune_tombstones(db, keep_days=-1) == 1
+    with db.connect() as conn:
+        assert read_delta(conn, "company", since, [Company.id], cap=10) is None
+        assert current_version(conn)[1] == _version(db)
+
+
+def test_feed_pages_by_since(client, company):
+    since = _version(current_binds().engine)
+    owner = company("Feed")
+    deals = [client.post("/deals/", json={"title": f"F{i}", "company_id": owner}).json()["id"] for i in range(3)]
+    client.patch(f"/deals/{deals[0]}", json={"title": "F0 novo"})
+    client.delete(f"/deals/{deals[1]}")
+
+    response = client.get("/changes", params={"since": since})
+    until = int(response.headers[CHANGES_UNTIL_HEADER])
+    seen, cursor = [], since
+    while True:
+        page = _feed(client, since=cursor, limit=2)
+        assert len(page) <= 2
+        seen += page
+        if len(page) < 2:
+            break
+        cursor = page[-1]["version"]
+    versions = [c["version"] for c in seen]
+    assert versions == sorted(versions) and len(set(versions)) == len(versions)
+    assert versions[-1] == until
+
+    # a última versão de cada linha: o deal 0 renomeado, o 1 apagado
+    last = {(c["entity"], c["id"]): c for c in seen}
+    assert last[("company", owner)]["op"] == "upsert"
+    assert last[("deal", deals[0])]["data"]["title"] == "F0 novo"
+    assert last[("deal", deals[1])]["op"] == "delete"
+    assert ("deal", deals[2]) in last
+    assert all(c["entity"] == "deal" for c in _feed(client, since=since, entities="deal"))
+
+
+def test_since_before_prune_is_410(client, company):
+    company_id = company("Apagada Antes")
+    since = _version(current_binds().engine)
+    client.delete(f"/companies/{company_id}")
+    prune_tombstones(current_binds().engine, keep_days=-1)
+    response = client.get("/changes", params={"since": since})
+    assert response.status_code == 410
+    # a carga completa (since=0) continua valendo
+    assert client.get("/changes", params={"since": 0, "limit": 1}).status_code == 200
+
+
+@pytest.mark.parametrize("params", [{"since": -1}, {"limit": 0}])
+def test_bad_params_are_422(client, params):
+    assert client.get("/changes", params=params).status_code == 422
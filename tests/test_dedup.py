@@ -0,0 +1,61 @@
+"""X-Possible-Duplicates nos POST, com o índice de duplicatas frio e montado."""
+import pytest
+
+from app.database import current_binds
+from app.dedup import DUPLICATES_HEADER, DedupStore, build_index, dedup_store
+
+
+def _stores():
+    bind = current_binds().read_engine
+    return [dedup_store(bind, entity) for entity in ("company", "contact")]
+
+
+@pytest.fixture
+def cold(client, monkeypatch):
+    """Índice ainda não montado (e sem montar no meio do teste)."""
+    monkeypatch.setattr(DedupStore, "warm_async", lambda self: None)
+    for store in _stores():
+        monkeypatch.setattr(store, "_index", None)
+
+
+@pytest.fixture
+def warm(client, monkeypatch):
+    for store in _stores():
+        monkeypatch.setattr(store, "_index", build_index(store.bind, store.spec))
+
+
+def _duplicates(response):
+    assert response.status_code == 201
+    header = response.headers.get(DUPLICATES_HEADER)
+    return [int(i) for i in header.split(",")] if header else []
+
+
+def test_cold_company_same_email(client, cold):
+    first = client.post("/companies/", json={"name": "Frio Um", "email": "contato@frio-um.com.br"}).json()
+    response = client.post("/companies/", json={"name": "Outra Razão", "email": "Contato@Frio-Um.com.br"})
+    assert _duplicates(response) == [first["id"]]
+
+
+def test_cold_company_same_name(client, cold):
+    first = client.post("/companies/", json={"name": "Padaria Fria Nome"}).json()
+    assert _duplicates(client.post("/companies/", json={"name": "Padaria Fria Nome"})) == [first["id"]]
+
+
+def test_cold_contact_same_name_only_within_company(client, cold, company):
+    owner, other = company("Fria Dona"), company("Fria Outra")
+    first = client.post("/contacts/", json={"name": "Joana Fria", "company_id": owner}).json()
+    same = client.post("/contacts/", json={"name": "Joana Fria", "company_id": owner})
+    assert _duplicates(same) == [first["id"]]
+    assert _duplicates(client.post("/contacts/", json={"name": "Joana Fria", "company_id": other})) == []
+
+
+def test_cold_no_duplicates(client, cold):
+    response = client.post("/companies/", json={"name": "Sem Par Frio", "email": "unico@sem-par.com.br"})
+    assert _duplicates(response) == []
+
+
+def test_warm_index_catches_up(client, warm):
+    # criada depois da montagem: chega ao índice pelo feed de mudanças
+    first = client.post("/companies/", json={"name": "Quente Um", "email": "oi@quente-um.com.br"}).json()
+    response = client.post("/companies/", json={"name": "Quente Dois", "email": "oi+crm@quente-um.com.br"})
+    assert first["id"] in _duplicates(response)
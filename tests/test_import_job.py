@@ -0,0 +1,67 @@
+"""Job de importação: arquivo enviado, lotes do bulk e progresso pelo JobContext."""
+import json
+import time
+
+from app.jobs import upload_path
+
+
+def _wait(client, job_id: int) -> dict:
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} não terminou")
+
+
+def test_import_ndjson_reports_rows_and_progress(client, company):
+    owner = company("Importadora")
+    rows = [{"title": f"Importado {i}", "company_id": owner, "value": i} for i in range(25)]
+    rows[3]["stage"] = "inexistente"
+    rows[7]["company_id"] = 999_999
+    body = "\n".join(json.dumps(r) for r in rows) + "\n{quebrado\n"
+    response = client.post("/jobs/import/deals", content=body, headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 202, response.text
+    assert response.headers["location"] == f"/jobs/{response.json()['id']}"
+
+    job = _wait(client, response.json()["id"])
+    assert job["status"] == "succeeded", job
+    assert (job["done"], job["total"]) == (26, 26)
+    assert job["message"] == "23 inserido(s), 3 erro(s)"
+    report = client.get(job["result_url"]).json()
+    assert report["inserted"] == 23
+    assert [e["row"] for e in report["errors"]] == [4, 8, 26]
+    deals = client.get(f"/deals/?company_id={owner}&limit=100").json()
+    assert len(deals) == 23
+    assert not upload_path(job["params"]["upload"]).exists()
+
+
+def test_import_csv_companies(client):
+    body = "name,email\nCSV Um,um@csv.com\nCSV Dois,\n"
+    response = client.post("/jobs/import/companies", content=body, headers={"content-type": "text/csv"})
+    job = _wait(client, response.json()["id"])
+    assert job["status"] == "succeeded", job
+    assert job["message"] == "2 inserido(s), 0 erro(s)"
+    names = [c["name"] for c in client.get("/companies/?q=CSV").json()]
+    assert sorted(names) == ["CSV Dois", "CSV Um"]
+
+
+def test_import_rejects_bad_entity_and_type(client):
+    assert client.post("/jobs/import/users", content="[]").status_code == 422
+    assert client.post("/jobs/import/deals", content="x", headers={"content-type": "text/plain"}).status_code == 415
+
+
+def test_import_params_cannot_point_outside_jobs_dir(client):
+    params = {"entity": "deals", "format": "json", "upload": "../crm.db"}
+    assert client.post("/jobs/", json={"kind": "import", "params": params}).status_code == 422
+
+
+def test_import_openapi_lists_every_entity_schema(client):
+    body = client.get("/openapi.json").json()["paths"]["/jobs/import/{entity}"]["post"]["requestBody"]
+    refs = [s["$ref"].rsplit("/", 1)[1] for s in body["content"]["application/x-ndjson"]["schema"]["oneOf"]]
+    assert refs == ["CompanyCreate", "ContactCreate", "DealCreate"]
+    assert body["content"]["application/json"]["schema"]["items"]["oneOf"] == \
+        body["content"]["application/x-ndjson"]["schema"]["oneOf"]
+    deals = client.get("/openapi.json").json()["paths"]["/deals/bulk"]["post"]["requestBody"]
+    assert deals["content"]["application/x-ndjson"]["schema"] == {"$ref": "#/components/schemas/DealCreate"}
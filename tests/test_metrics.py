@@ -0,0 +1,35 @@
+"""/metrics: o formato de stats_lines e as famílias de cada subsistema."""
+from dataclasses import dataclass
+
+from app.metrics import stats_lines
+
+
+@dataclass
+class _Stats:
+    hits: int = 0
+    wait_seconds: float = 0.0
+
+
+def test_stats_lines_plain_and_labeled():
+    assert stats_lines("crm_x", _Stats(3, 0.5), {"hits": "Acertos.", "wait_seconds": "Espera."}) == [
+        "# HELP crm_x_hits_total Acertos.",
+        "# TYPE crm_x_hits_total counter",
+        "crm_x_hits_total 3",
+        "# HELP crm_x_wait_seconds_total Espera.",
+        "# TYPE crm_x_wait_seconds_total counter",
+        "crm_x_wait_seconds_total 0.5",
+    ]
+    assert stats_lines("crm_x", {"a": _Stats(1), 'b"c': _Stats(2)}, {"hits": "Acertos."}, "route")[2:] == [
+        'crm_x_hits_total{route="a"} 1',
+        'crm_x_hits_total{route="b\\"c"} 2',
+    ]
+
+
+def test_metrics_endpoint_exposes_every_family(client):
+    client.get("/deals/")
+    text = client.get("/metrics").text
+    for family in ("crm_http_requests_total", "crm_cache_hits_total", "crm_ui_count_hits_total",
+                   "crm_ui_events_published_total", "crm_ui_pages_streamed_total", "crm_dedup_checks_total",
+                   "crm_deal_snapshot_loads_total", "crm_coalesce_leaders_total", "crm_admission_admitted_total"):
+        assert f"# TYPE {family} counter" in text
+    assert "# TYPE crm_cache_entries gauge" in text
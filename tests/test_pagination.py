@@ -0,0 +1,118 @@
+"""Paginação por cursor: NULL e desc, empates no valor ordenado e cursores adulterados."""
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+
+DATES = [None, "2026-03-01", None, "2026-01-15", "2026-03-01", "2026-03-01", None]
+VALUES = [100.0, 50.0, 100.0, 100.0, 0.0, 50.0, 100.0]
+
+
+@pytest.fixture(scope="module")
+def deals(client):
+    """Negócios de uma empresa só, com datas nulas e valores repetidos."""
+    owner = client.post("/companies/", json={"name": "Paginada"}).json()["id"]
+    rows = []
+    for i, (close, value) in enumerate(zip(DATES, VALUES)):
+        body = {"title": f"Página {i}", "company_id": owner, "value": value, "expected_close_date": close}
+        response = client.post("/deals/", json=body)
+        assert response.status_code == 201, response.text
+        rows.append(response.json())
+    return owner, rows
+
+
+def _walk(client, owner: int, order_by: str, desc: bool, limit: int = 2) -> list:
+    params = {"company_id": owner, "order_by": order_by, "desc": desc, "limit": limit}
+    ids, pages = [], 0
+    while True:
+        response = client.get("/deals/", params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page) <= limit
+        ids += [row["id"] for row in page]
+        pages += 1
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return ids
+        assert pages < 20
+        params["cursor"] = cursor
+
+
+def _expected(rows, field: str, desc: bool) -> list:
+    # a ordem do SQLite: NULL antes de tudo no ASC e depois de tudo no DESC; o id desempata
+    def key(row):
+        value = row[field]
+        return (value is not None, value if value is not None else 0, row["id"])
+
+    return [row["id"] for row in sorted(rows, key=key, reverse=desc)]
+
+
+@pytest.mark.parametrize("desc", [False, True])
+@pytest.mark.parametrize("order_by", ["expected_close_date", "value", "id"])
+def test_cursor_walks_every_row_once_in_order(client, deals, order_by, desc):
+    owner, rows = deals
+    field = "id" if order_by == "id" else order_by
+    assert _walk(client, owner, order_by, desc) == _expected(rows, field, desc)
+
+
+@pytest.mark.parametrize("limit", [1, 3, 7])
+def test_page_size_does_not_change_the_order(client, deals, limit):
+    owner, rows = deals
+    assert _walk(client, owner, "value", True, limit) == _expected(rows, "value", True)
+
+
+def test_last_page_has_no_cursor(client, deals):
+    owner, rows = deals
+    response = client.get("/deals/", params={"company_id": owner, "limit": len(rows)})
+    assert len(response.json()) == len(rows)
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("value", True, 12.5, 7)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "value", True) == (12.5, 7)
+
+
+def _raw(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "!!!",
+    "abc",
+    _raw({"order": "value"}),
+    _raw(["value", True, 1.0]),
+    _raw(["value", True, [1, 2], 3]),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_garbage_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as err:
+        decode_cursor(cursor, "value", True)
+    assert err.value.status_code == 400
+
+
+@pytest.mark.parametrize("cursor", [
+    encode_cursor("probability", True, 1, 3),
+    encode_cursor("value", False, 1.0, 3),
+    _raw(["value", True, 1.0, "3"]),
+])
+def test_cursor_of_another_ordering_is_400(cursor):
+    with pytest.raises(HTTPException) as err:
+        decode_cursor(cursor, "value", True)
+    assert err.value.status_code == 400
+
+
+@pytest.mark.parametrize("cursor", [
+    "não-é-cursor",
+    _raw(["expected_close_date", False, "ontem", 1]),
+    _raw(["expected_close_date", False, 20260101, 1]),
+    encode_cursor("value", False, 1.0, 1),
+])
+def test_tampered_cursor_on_the_endpoint_is_400(client, deals, cursor):
+    owner, _ = deals
+    params = {"company_id": owner, "order_by": "expected_close_date", "cursor": cursor}
+    assert client.get("/deals/", params=params).status_code == 400
@@ -0,0 +1,81 @@
+"""PATCH de empresas, contatos e negócios: empresa inexistente, tipos da linha do RETURNING e corpo vazio."""
+import pytest
+
+from app.changes import current_version
+from app.database import current_binds
+from app.live import broker
+
+
+def test_patch_deal_rejects_missing_company(client, company):
+    owner = company("Dona do negócio")
+    deal = client.post("/deals/", json={"title": "Licenças", "company_id": owner}).json()
+    response = client.patch(f"/deals/{deal['id']}", json={"company_id": 999_999})
+    assert response.status_code == 422
+    assert client.get(f"/deals/{deal['id']}").json()["company_id"] == owner
+
+
+def test_patch_deal_moves_to_existing_company(client, company):
+    first, second = company("Primeira"), company("Segunda")
+    deal = client.post("/deals/", json={"title": "Migração", "company_id": first}).json()
+    response = client.patch(f"/deals/{deal['id']}", json={"company_id": second})
+    assert response.status_code == 200
+    assert response.json()["company_id"] == second
+
+
+def test_patch_missing_deal_is_404(client):
+    assert client.patch("/deals/999999", json={"company_id": 999_999}).status_code == 404
+    assert client.patch("/deals/999999", json={"title": "x"}).status_code == 404
+
+
+def test_patch_contact_rejects_missing_company(client, company):
+    owner = company("Dona do contato")
+    contact = client.post("/contacts/", json={"name": "Rita", "company_id": owner}).json()
+    response = client.patch(f"/contacts/{contact['id']}", json={"company_id": 999_999})
+    assert response.status_code == 422
+    assert client.get(f"/contacts/{contact['id']}").json()["company_id"] == owner
+
+
+def test_patch_returns_float_value(client, company):
+    deal = client.post("/deals/", json={"title": "Zero", "company_id": company(), "value": 5}).json()
+    response = client.patch(f"/deals/{deal['id']}", json={"value": 0})
+    assert response.status_code == 200
+    assert isinstance(response.json()["value"], float)
+    assert response.text.count('"value":0.0') == 1
+
+
+def test_patch_company_returns_the_read_model(client, company):
+    company_id = company("Antes")
+    response = client.patch(f"/companies/{company_id}", json={"name": "Depois"})
+    assert response.status_code == 200
+    assert response.json() == client.get(f"/companies/{company_id}").json()
+    assert response.json()["name"] == "Depois"
+    assert client.patch("/companies/999999", json={"name": "x"}).status_code == 404
+
+
+def _version() -> int:
+    with current_binds().engine.connect() as conn:
+        return current_version(conn)[0]
+
+
+@pytest.mark.parametrize("entity", ["companies", "contacts", "deals"])
+def test_empty_patch_writes_nothing(client, company, entity):
+    owner = company("Sem Mudança")
+    bodies = {
+        "companies": None,
+        "contacts": {"name": "Vazio", "company_id": owner},
+        "deals": {"title": "Vazio", "company_id": owner, "value": 3},
+    }
+    record_id = owner if bodies[entity] is None else client.post(f"/{entity}/", json=bodies[entity]).json()["id"]
+    path = f"/{entity}/{record_id}"
+    current = client.get(path)
+    assert client.get(path).headers["x-cache"] == "HIT"
+    published, version = broker.stats.published, _version()
+
+    response = client.patch(path, json={})
+    assert response.status_code == 200
+    assert response.json() == current.json()
+    # nem commit (row_version), nem invalidação do cache, nem evento para a UI
+    assert client.get(path).headers["x-cache"] == "HIT"
+    assert broker.stats.published == published
+    assert _version() == version
+    assert client.patch(f"/{entity}/999999", json={}).status_code == 404
@@ -0,0 +1,39 @@
+"""Nenhuma listagem, resumo ou feed de mudanças pode cair em varredura de tabela."""
+import pytest
+from sqlmodel import select
+
+from app.models import Deal
+from app.query_plans import all_statements, explain, plan_engine, table_scans
+
+STATEMENTS = list(all_statements())
+
+
+@pytest.fixture(scope="module")
+def conn():
+    engine = plan_engine()
+    with engine.connect() as conn:
+        yield conn
+    engine.dispose()
+
+
+@pytest.mark.parametrize(
+    ("base", "filtered", "stmt"),
+    [(base, filtered, stmt) for base, _, filtered, stmt in STATEMENTS],
+    ids=[label for _, label, _, _ in STATEMENTS],
+)
+def test_no_table_scan(conn, base, filtered, stmt):
+    plan = explain(conn, stmt)
+    assert table_scans(base, filtered, plan) == [], plan
+
+
+def test_covers_every_builder_and_router_statement():
+    labels = [label for _, label, _, _ in STATEMENTS]
+    for base in ("deal", "contact", "company"):
+        assert any(label.startswith(f"{base} filters=") for label in labels)
+    assert {"stage-counts", "stage-values"} <= set(labels)
+
+
+def test_detects_a_scan(conn):
+    # filtro em coluna sem índice: a conferência tem que acusar
+    stmt = select(Deal).where(Deal.notes == "x")
+    assert table_scans("deal", True, explain(conn, stmt)) == ["SCAN deal"]
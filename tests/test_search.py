@@ -0,0 +1,140 @@
+"""Busca (app/search.py): triggers do FTS5, montagem da expressão, LIKE de reserva e o rebuild."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from sqlmodel import Session, select
+
+from app import search
+from app.models import Company, Deal
+from app.search import apply_search, fts_query, match_ids
+
+pytestmark = pytest.mark.skipif(not search.fts5_available(), reason="SQLite sem FTS5")
+
+
+def _found(engine, model, q: str) -> list:
+    with Session(engine) as session:
+        return sorted(session.execute(match_ids(model, q)).scalars().all())
+
+
+def _searched(engine, model, q: str) -> list:
+    stmt, _ = apply_search(select(model.id), model, q)
+    with Session(engine) as session:
+        return sorted(session.execute(stmt).scalars().all())
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("tech nov", '"tech"* "nov"*'),
+    ('O"Brien', '"O"* "Brien"*'),
+    ("a-b.c", '"a"* "b"* "c"*'),
+    ("x OR y", '"x"* "OR"* "y"*'),
+    ("NEAR(a b)", '"NEAR"* "a"* "b"*'),
+    ("  Saúde  ", '"Saúde"*'),
+    ("'\"*()^:", None),
+    ("", None),
+])
+def test_fts_query_quotes_every_token(q, expected):
+    assert fts_query(q) == expected
+
+
+def test_triggers_follow_insert_update_delete(db):
+    with Session(db) as session:
+        company = Company(name="Panificadora Aurora")
+        session.add(company)
+        session.commit()
+        company_id = company.id
+    assert _found(db, Company, "aurora") == [company_id]
+    assert _found(db, Company, "panif") == [company_id]
+
+    with Session(db) as session:
+        session.get(Company, company_id).name = "Confeitaria Boreal"
+        session.commit()
+    assert _found(db, Company, "aurora") == []
+    assert _found(db, Company, "boreal") == [company_id]
+
+    with Session(db) as session:
+        # coluna fora do índice: o trigger de UPDATE OF não dispara e o índice segue certo
+        session.get(Company, company_id).website = "https://boreal.com.br"
+        session.commit()
+    assert _found(db, Company, "confeitaria") == [company_id]
+
+    with Session(db) as session:
+        session.delete(session.get(Company, company_id))
+        session.commit()
+    assert _found(db, Company, "boreal") == []
+
+
+def test_deal_notes_and_diacritics(db):
+    with Session(db) as session:
+        owner = Company(name="Hospital")
+        session.add(owner)
+        session.commit()
+        deal = Deal(title="Renovação", notes="contrato de saúde", company_id=owner.id)
+        session.add(deal)
+        session.commit()
+        deal_id = deal.id
+    assert _found(db, Deal, "saude") == [deal_id]
+    assert _found(db, Deal, "renov contr") == [deal_id]
+    assert _searched(db, Deal, "Saúde") == [deal_id]
+
+
+def test_punctuation_in_q_is_not_an_fts_error(db):
+    with Session(db) as session:
+        session.add(Company(name='Bar do "Zé" (Centro)'))
+        session.commit()
+    for q in ['"Zé"', "do (Centro", "zé*", "Centro)", "bar: do"]:
+        assert len(_searched(db, Company, q)) == 1, q
+
+
+def test_like_fallback_without_fts(db, monkeypatch):
+    with Session(db) as session:
+        session.add_all([Company(name="Desconto 50% à vista"), Company(name="Metal_Forte"), Company(name="Outra")])
+        session.commit()
+    monkeypatch.setattr(search, "fts5_available", lambda: False)
+    stmt, rank = apply_search(select(Company.name), Company, "50%")
+    assert rank is None
+    with Session(db) as session:
+        assert session.execute(stmt).scalars().all() == ["Desconto 50% à vista"]
+    # % e _ são literais, não curingas do LIKE
+    assert len(_found(db, Company, "%")) == 1
+    assert len(_found(db, Company, "l_F")) == 1
+    assert _found(db, Company, "_") == _found(db, Company, "Metal_")
+
+
+def test_only_punctuation_uses_like(db):
+    with Session(db) as session:
+        session.add_all([Company(name="A&B"), Company(name="C")])
+        session.commit()
+    stmt, rank = apply_search(select(Company.name), Company, "&")
+    assert rank is None
+    with Session(db) as session:
+        assert session.execute(stmt).scalars().all() == ["A&B"]
+
+
+def _run_search(url: str, *args: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "CRM_DATABASE_URL": url}
+    return subprocess.run(
+        [sys.executable, "-m", "app.search", *args],
+        cwd=Path(__file__).parents[1], env=env, capture_output=True, text=True, timeout=60,
+    )
+
+
+def test_rebuild_command_repopulates_index(db):
+    with Session(db) as session:
+        session.add(Company(name="Reconstruída Ltda"))
+        session.commit()
+    with db.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO company_fts(company_fts) VALUES ('delete-all')")
+    assert _found(db, Company, "reconstru") == []
+
+    result = _run_search(str(db.url), "rebuild")
+    assert result.returncode == 0, result.stderr
+    assert len(_found(db, Company, "reconstru")) == 1
+
+
+def test_rebuild_command_usage(db):
+    result = _run_search(str(db.url))
+    assert result.returncode == 2
+    assert "uso:" in result.stdout
@@ -0,0 +1,142 @@
+"""deal_stage_stats (app/stats.py): triggers contra um GROUP BY, reconcile --fix e as rotas de resumo."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import delete, insert, update
+from sqlmodel import Session
+
+from app.database import current_binds
+from app.models import STAGES, Company, Deal
+from app.stats import RECOMPUTE_SQL, STATS_TABLE, reconcile
+
+
+def _stored(engine) -> dict:
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"SELECT stage, deal_count, value_sum, weighted_sum FROM {STATS_TABLE}")
+        return {stage: (n, v, w) for stage, n, v, w in rows if n}
+
+
+def _grouped(engine) -> dict:
+    with engine.connect() as conn:
+        return {stage: (n, v, w) for stage, n, v, w in conn.exec_driver_sql(RECOMPUTE_SQL)}
+
+
+def _assert_in_sync(engine) -> None:
+    stored, grouped = _stored(engine), _grouped(engine)
+    assert stored.keys() == grouped.keys()
+    for stage, (n, v, w) in grouped.items():
+        assert stored[stage][0] == n
+        assert stored[stage][1:] == pytest.approx((v, w))
+    assert reconcile(engine) == []
+
+
+@pytest.fixture
+def owner(db) -> int:
+    with Session(db) as session:
+        company = Company(name="Pipeline")
+        session.add(company)
+        session.commit()
+        return company.id
+
+
+def test_triggers_follow_every_write_path(db, owner):
+    with Session(db) as session:
+        deals = [Deal(title=f"D{i}", company_id=owner, stage=STAGES[i % 3], value=100.0 * i, probability=10 * i)
+                 for i in range(6)]
+        session.add_all(deals)
+        session.commit()
+        ids = [d.id for d in deals]
+    _assert_in_sync(db)
+    assert _stored(db)[STAGES[0]] == (2, 300.0, 9000.0)  # i=0 e i=3: 300 * 30
+
+    with db.begin() as conn:
+        # lote (executemany), como o bulk create
+        conn.execute(insert(Deal), [
+            {"title": f"L{i}", "company_id": owner, "stage": "proposta", "value": 10.0, "probability": 50}
+            for i in range(4)
+        ])
+    _assert_in_sync(db)
+
+    with Session(db) as session:
+        deal = session.get(Deal, ids[1])
+        deal.stage, deal.value, deal.probability = "contrato", 999.5, 90
+        session.commit()
+    _assert_in_sync(db)
+
+    with db.begin() as conn:
+        # coluna fora dos agregados: o trigger de UPDATE OF não dispara
+        conn.execute(update(Deal).where(Deal.id == ids[2]).values(title="renomeado"))
+        # UPDATE em massa, como o bulk-update
+        conn.execute(update(Deal).where(Deal.stage == "proposta").values(stage="contrato", probability=100))
+    _assert_in_sync(db)
+
+    with db.begin() as conn:
+        conn.execute(delete(Deal).where(Deal.id.in_(ids[:3])))
+    _assert_in_sync(db)
+
+    with db.begin() as conn:
+        conn.execute(delete(Deal))
+    assert _stored(db) == {}
+    assert reconcile(db) == []
+
+
+def test_reconcile_fix_repairs_drift(db, owner):
+    with Session(db) as session:
+        session.add_all([Deal(title="A", company_id=owner, value=50.0, probability=20),
+                         Deal(title="B", company_id=owner, stage="proposta", value=70.0)])
+        session.commit()
+    with db.begin() as conn:
+        conn.exec_driver_sql(f"UPDATE {STATS_TABLE} SET deal_count = deal_count + 5 WHERE stage = 'prospeccao'")
+        conn.exec_driver_sql(f"DELETE FROM {STATS_TABLE} WHERE stage = 'proposta'")
+
+    problems = reconcile(db)
+    assert len(problems) == 2
+    assert any(p.startswith("prospeccao:") for p in problems)
+    assert any(p.startswith("proposta: ausente") for p in problems)
+    assert reconcile(db) == problems  # sem --fix nada muda
+
+    assert reconcile(db, fix=True) == problems
+    _assert_in_sync(db)
+
+
+def _run_stats(url: str, *args: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "CRM_DATABASE_URL": url}
+    return subprocess.run(
+        [sys.executable, "-m", "app.stats", *args],
+        cwd=Path(__file__).parents[1], env=env, capture_output=True, text=True, timeout=60,
+    )
+
+
+def test_reconcile_command(db, owner):
+    with Session(db) as session:
+        session.add(Deal(title="A", company_id=owner, value=10.0))
+        session.commit()
+    assert _run_stats(str(db.url), "reconcile").returncode == 0
+    with db.begin() as conn:
+        conn.exec_driver_sql(f"UPDATE {STATS_TABLE} SET value_sum = value_sum + 1")
+    assert _run_stats(str(db.url), "reconcile").returncode == 1
+    fixed = _run_stats(str(db.url), "reconcile", "--fix")
+    assert fixed.returncode == 0, fixed.stderr
+    assert "corrigida" in fixed.stdout
+    assert reconcile(db) == []
+    assert _run_stats(str(db.url), "reconcile", "--now").returncode == 2
+
+
+def test_summary_routes_match_group_by(client, company):
+    owner = company("Resumo")
+    ids = [
+        client.post("/deals/", json={"title": f"R{i}", "company_id": owner, "stage": stage, "value": value}).json()["id"]
+        for i, (stage, value) in enumerate([("proposta", 1200.0), ("contrato", 80.5), ("proposta", 33.0)])
+    ]
+    assert client.patch(f"/deals/{ids[0]}", json={"stage": "contrato", "value": 1000.0}).status_code == 200
+    assert client.delete(f"/deals/{ids[2]}").status_code in (200, 204)
+
+    engine = current_binds().engine
+    grouped = _grouped(engine)
+    counts = client.get("/deals/summary/stage-counts").json()
+    values = client.get("/deals/summary/stage-values").json()
+    assert counts == {stage: grouped.get(stage, (0,))[0] for stage in STAGES}
+    assert values == pytest.approx({stage: grouped.get(stage, (0, 0.0))[1] for stage in STAGES})
@@ -0,0 +1,24 @@
+"""Listagem de empresas da UI: limite de página e a página atual que o htmx reenvia."""
+import re
+
+import pytest
+
+from app.routers.ui import MAX_PAGE_SIZE
+
+PAGE_INPUT = re.compile(r'<input type="hidden" name="page" value="(\d+)">')
+
+
+@pytest.mark.parametrize("path", ["/ui/companies", "/ui/contacts", "/ui/deals"])
+def test_page_size_is_capped(client, path):
+    assert client.get(path, params={"size": MAX_PAGE_SIZE}).status_code == 200
+    assert client.get(path, params={"size": MAX_PAGE_SIZE + 1}).status_code == 422
+
+
+def test_page_input_follows_each_swap(client):
+    client.post("/companies/bulk", json=[{"name": f"Paginada {i}"} for i in range(5)])
+    full = client.get("/ui/companies", params={"q": "Paginada", "size": 2}).text
+    assert PAGE_INPUT.findall(full) == ["1"]
+
+    # o fragmento que troca #list traz a página nova junto
+    second = client.get("/ui/companies", params={"q": "Paginada", "size": 2, "page": 2}, headers={"HX-Request": "true"})
+    assert PAGE_INPUT.findall(second.text) == ["2"]